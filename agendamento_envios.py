@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Agendamento de Envios por Horário de Engajamento
+Lê do banco de analytics em que hora do dia os destinatários abrem e
+respondem, agregando por domínio e por tipo de provedor, e estima para cada
+destinatário a taxa de engajamento de cada hora da janela de envio.
+
+Domínios com pouco histórico herdam o perfil do provedor, que herda o
+perfil geral (média ponderada por envios, com PSEUDO_ENVIOS de peso para o
+nível de cima). O agendador tira de uma fila de prioridade os destinatários
+com maior taxa esperada e os encaixa na melhor hora ainda com vaga, dia a
+dia, respeitando o limite diário (aquecimento) e a capacidade de cada hora.
+"""
+
+import heapq
+import math
+import os
+import sqlite3
+from array import array
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import banco_dados
+from registro_envios import SQL_ENVIADOS
+
+# Peso de cada sinal no perfil de horários: resposta vale mais que abertura
+PESO_ABERTURA = 1.0
+PESO_RESPOSTA = 3.0
+
+# Quantos envios o nível de cima "vale" ao suavizar domínio → provedor → geral
+PSEUDO_ENVIOS = 20.0
+# Taxa de engajamento suposta quando não há histórico nenhum
+TAXA_PADRAO = 0.2
+
+# Uma hora pode receber até FOLGA x a cota média por hora restante do dia
+FOLGA_HORA = 2.0
+
+DOMINIOS_PROVEDOR = {
+    'gmail.com': 'gmail',
+    'hotmail.com': 'outlook',
+    'outlook.com': 'outlook',
+    'live.com': 'outlook',
+    'msn.com': 'outlook',
+    'uol.com.br': 'outros',
+    'yahoo.com.br': 'outros',
+}
+
+
+def classificar_provedor(email):
+    """Tipo de provedor do destinatário (mesmas classes de email_campaigns.provedor_tipo)"""
+    domain = email.rsplit('@', 1)[-1].lower()
+    provedor = DOMINIOS_PROVEDOR.get(domain)
+    if provedor:
+        return provedor
+    if domain.endswith('.gov.br'):
+        return 'governo'
+    if domain.endswith('.edu.br'):
+        return 'educacional'
+    return 'corporativo'
+
+
+class HistoricoEngajamento:
+    """Envios e eventos (aberturas/respostas) por hora do dia, por domínio e provedor"""
+
+    def __init__(self):
+        self.envios = defaultdict(int)
+        self.eventos = defaultdict(lambda: [0.0] * 24)
+
+    @classmethod
+    def carregar(cls, db_files):
+        """Soma o histórico dos bancos (legado e shards de campanha)"""
+        historico = cls()
+        for db_file in db_files:
+            try:
+                conn = banco_dados.conectar(db_file)
+                try:
+                    historico._ler(conn)
+                finally:
+                    conn.close()
+            except sqlite3.OperationalError:
+                # Banco sem email_campaigns (ainda sem envios)
+                continue
+        return historico
+
+    @classmethod
+    def carregar_padrao(cls, db_file='email_analytics.db'):
+        """Banco principal mais os shards das campanhas (inclusive arquivadas)"""
+        from armazenamento_shards import ArmazenamentoShards, DIRETORIO_SHARDS
+
+        arquivos = [db_file] if os.path.exists(db_file) else []
+        if os.path.isdir(DIRETORIO_SHARDS):
+            shards = ArmazenamentoShards(db_legado=db_file)
+            arquivos.extend(arquivo for _, arquivo in shards.arquivos(incluir_legado=False,
+                                                                      incluir_arquivadas=True))
+        return cls.carregar(arquivos)
+
+    def _ler(self, conn):
+        dominio = "lower(substr(email_destino, instr(email_destino, '@') + 1))"
+        for provedor, dom, enviados in conn.execute(f'''
+            SELECT provedor_tipo, {dominio}, COUNT(*) FROM email_campaigns WHERE {SQL_ENVIADOS} GROUP BY 1, 2
+        '''):
+            self._somar_envios(provedor, dom, enviados)
+
+        for provedor, dom, hora, peso in conn.execute(f'''
+            SELECT provedor_tipo, dominio, hora, SUM(peso) FROM (
+                SELECT provedor_tipo, {dominio} AS dominio,
+                       CAST(strftime('%H', primeiro_abertura) AS INTEGER) AS hora, ? AS peso
+                FROM email_campaigns WHERE primeiro_abertura IS NOT NULL AND {SQL_ENVIADOS}
+                UNION ALL
+                SELECT provedor_tipo, {dominio},
+                       CAST(strftime('%H', data_resposta) AS INTEGER), ?
+                FROM email_campaigns WHERE data_resposta IS NOT NULL
+            )
+            WHERE hora IS NOT NULL
+            GROUP BY 1, 2, 3
+        ''', (PESO_ABERTURA, PESO_RESPOSTA)):
+            self._somar_eventos(provedor, dom, hora, peso)
+
+    def _somar_envios(self, provedor, dominio, enviados):
+        for chave in (None, ('provedor', provedor), ('dominio', dominio)):
+            self.envios[chave] += enviados
+
+    def _somar_eventos(self, provedor, dominio, hora, peso):
+        for chave in (None, ('provedor', provedor), ('dominio', dominio)):
+            self.eventos[chave][hora] += peso
+
+    def taxas(self, chave, horas, base):
+        """Taxa por hora (eventos/envio) do grupo, puxada para base quando há poucos envios"""
+        enviados = self.envios.get(chave, 0)
+        eventos = self.eventos[chave] if chave in self.eventos else None
+        if not enviados and not eventos:
+            return base
+        return [
+            ((eventos[hora] if eventos else 0.0) + PSEUDO_ENVIOS * b) / (enviados + PSEUDO_ENVIOS)
+            for hora, b in zip(horas, base)
+        ]
+
+
+class AgendadorEnvios:
+    """Distribui os destinatários em horários (dia, hora) pela taxa de engajamento esperada"""
+
+    def __init__(self, historico, start_time="09:00", end_time="17:00", limites_diarios=(),
+                 limite_padrao=80, capacidade_hora=None):
+        self.historico = historico
+        self.inicio = datetime.strptime(start_time, "%H:%M").time()
+        self.fim = datetime.strptime(end_time, "%H:%M").time()
+        fim_hora = self.fim.hour + (1 if self.fim.minute else 0)
+        self.horas = list(range(self.inicio.hour, fim_hora)) or [self.inicio.hour]
+        self.limites_diarios = list(limites_diarios)
+        self.limite_padrao = limite_padrao
+        self.capacidade_hora = capacidade_hora
+
+        base = [TAXA_PADRAO / len(self.horas)] * len(self.horas)
+        self._geral = historico.taxas(None, self.horas, base)
+        self._por_provedor = {}
+        self._por_dominio = {}
+
+    def taxas(self, email):
+        """Taxa esperada de engajamento em cada hora da janela (self.horas)"""
+        dominio = email.rsplit('@', 1)[-1].lower()
+        taxas = self._por_dominio.get(dominio)
+        if taxas is None:
+            provedor = classificar_provedor(email)
+            base = self._por_provedor.get(provedor)
+            if base is None:
+                base = self.historico.taxas(('provedor', provedor), self.horas, self._geral)
+                self._por_provedor[provedor] = base
+            taxas = self.historico.taxas(('dominio', dominio), self.horas, base)
+            self._por_dominio[dominio] = taxas
+        return taxas
+
+    def horario_preferido(self, email):
+        """Hora (0-23) de maior engajamento esperado para o destinatário"""
+        taxas = self.taxas(email)
+        return self.horas[max(range(len(taxas)), key=taxas.__getitem__)]
+
+    def limite_do_dia(self, dia_campanha):
+        if dia_campanha <= len(self.limites_diarios):
+            return self.limites_diarios[dia_campanha - 1]
+        return self.limite_padrao
+
+    def _slots_do_dia(self, data, agora):
+        """[(indice da hora, início do slot, fim do slot)] ainda por vir nesse dia, cortados pela janela"""
+        slots = []
+        fim_janela = datetime.combine(data, self.fim)
+        for i, hora in enumerate(self.horas):
+            inicio = datetime.combine(data, self.inicio) if hora == self.inicio.hour \
+                else datetime.combine(data, datetime.min.time()).replace(hour=hora)
+            fim_slot = min(inicio.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1), fim_janela)
+            if fim_slot <= agora or inicio >= fim_janela:
+                continue
+            slots.append((i, max(inicio, agora), fim_slot))
+        return slots
+
+    def planejar(self, destinatarios, agora=None):
+        """
+        Gera (horário, posição) em ordem de envio, dia a dia
+
+        destinatarios: sequência de (email, prioridade); a posição devolvida é
+        o índice na sequência. Entre taxas iguais vai primeiro a prioridade
+        menor (Email1 antes de Email3), depois a ordem original. A fila tem um
+        item por (domínio, prioridade), não por destinatário: as posições
+        ficam em array('q'), então milhões de destinatários cabem em memória.
+        """
+        agora = agora or datetime.now()
+        grupos = {}
+        for posicao, (email, prioridade) in enumerate(destinatarios):
+            chave = (email.rsplit('@', 1)[-1].lower(), prioridade)
+            grupo = grupos.get(chave)
+            if grupo is None:
+                grupo = grupos[chave] = [array('q'), 0, self.taxas(email)]
+            grupo[0].append(posicao)
+        fila = [(-max(taxas), chave[1], posicoes[0], chave) for chave, (posicoes, _, taxas) in grupos.items()]
+        heapq.heapify(fila)
+
+        data = agora.date()
+        dia_campanha = 1
+        while fila:
+            slots = self._slots_do_dia(data, agora if data == agora.date() else datetime.combine(data, self.inicio))
+            vagas = {}
+            if slots:
+                limite = self.limite_do_dia(dia_campanha)
+                cota_hora = max(1, math.ceil(limite * FOLGA_HORA / len(slots)))
+                if self.capacidade_hora:
+                    cota_hora = min(cota_hora, self.capacidade_hora)
+                # Hora incompleta (campanha começando às 16:55, janela acabando às
+                # 17:30) recebe a cota proporcional aos minutos que sobram nela
+                for i, inicio, fim_slot in slots:
+                    cota = math.floor(cota_hora * (fim_slot - inicio).total_seconds() / 3600)
+                    if cota:
+                        vagas[i] = cota
+                if not vagas and data != agora.date():
+                    # Janela mais curta que um envio: ao menos um por dia
+                    vagas[slots[0][0]] = 1
+                inicio_slot = {i: inicio for i, inicio, _ in slots}
+
+            if vagas:
+                agenda = []
+                while fila and len(agenda) < limite and vagas:
+                    negativo, prioridade, posicao, chave = fila[0]
+                    grupo = grupos[chave]
+                    posicoes, proximo, taxas = grupo
+                    i = max(vagas, key=taxas.__getitem__)
+                    agenda.append((inicio_slot[i], negativo, prioridade, posicao))
+                    vagas[i] -= 1
+                    if not vagas[i]:
+                        del vagas[i]
+
+                    proximo += 1
+                    grupo[1] = proximo
+                    if proximo < len(posicoes):
+                        heapq.heapreplace(fila, (negativo, prioridade, posicoes[proximo], chave))
+                    else:
+                        heapq.heappop(fila)
+                        del grupos[chave]
+
+                agenda.sort()
+                for horario, _, _, posicao in agenda:
+                    yield horario, posicao
+                dia_campanha += 1
+            data += timedelta(days=1)
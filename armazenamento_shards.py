@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Armazenamento de Analytics por Campanha
+Cada campanha grava em seu próprio arquivo SQLite (shard), com as mesmas
+tabelas do email_analytics.db: campanhas diferentes não disputam o mesmo lock
+de escrita e uma campanha antiga é arquivada movendo um arquivo.
+
+O tracking_id de uma campanha leva o código dela como prefixo
+("<codigo>-<id>"), então o roteador sabe o shard de cada evento sem consultar
+nada além do catálogo em memória. IDs sem prefixo (envios antigos ou sem
+campanha) continuam no email_analytics.db.
+
+Relatórios entre campanhas anexam (ATTACH) os shards sob demanda e consultam
+as visões email_campaigns_todas e tracking_events_todas (esta, se pedido,
+também com os eventos arquivados em Parquet).
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import banco_dados
+from registro_envios import SQL_ENVIADOS
+from tracking_ids import SEPARADOR_CAMPANHA, codificar_id, decodificar_id, gerar_tracking_id
+
+DIRETORIO_SHARDS = 'analytics_shards'
+ARQUIVO_CATALOGO = 'catalogo.db'
+SUBPASTA_ARQUIVO = 'arquivadas'
+
+# Intervalo mínimo entre recargas do catálogo por prefixo desconhecido
+# (prefixos forjados não viram uma consulta ao banco por requisição)
+INTERVALO_RECARGA = 1.0
+
+SCHEMA_ANALYTICS = [
+    '''
+    CREATE TABLE IF NOT EXISTS email_campaigns (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tracking_id TEXT UNIQUE,
+        empresa_nome TEXT,
+        razao_social TEXT,
+        email_destino TEXT,
+        provedor_tipo TEXT,
+        assunto TEXT,
+        enviado_em TIMESTAMP,
+        status_entrega TEXT,
+        aberto BOOLEAN DEFAULT 0,
+        primeiro_abertura TIMESTAMP,
+        total_aberturas INTEGER DEFAULT 0,
+        clicou_link BOOLEAN DEFAULT 0,
+        primeiro_clique TIMESTAMP,
+        total_cliques INTEGER DEFAULT 0,
+        respondeu BOOLEAN DEFAULT 0,
+        data_resposta TIMESTAMP,
+        bounce BOOLEAN DEFAULT 0,
+        spam_reclamacao BOOLEAN DEFAULT 0,
+        dispositivo_abertura TEXT,
+        localizacao_abertura TEXT,
+        user_agent TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS tracking_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tracking_id TEXT,
+        evento_tipo TEXT,
+        timestamp TIMESTAMP,
+        ip_address TEXT,
+        user_agent TEXT,
+        dados_extras TEXT,
+        FOREIGN KEY (tracking_id) REFERENCES email_campaigns (tracking_id)
+    )
+    ''',
+    # Eventos movidos para Parquet (arquivamento_eventos): contagem diária e manifesto
+    '''
+    CREATE TABLE IF NOT EXISTS eventos_arquivados (
+        dia TEXT,
+        campanha TEXT,
+        evento_tipo TEXT,
+        classificacao TEXT,
+        eventos INTEGER DEFAULT 0,
+        PRIMARY KEY (dia, campanha, evento_tipo, classificacao)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS arquivos_eventos (
+        arquivo TEXT PRIMARY KEY,
+        mes TEXT,
+        campanha TEXT,
+        primeiro_id INTEGER,
+        ultimo_id INTEGER,
+        linhas INTEGER,
+        criado_em TIMESTAMP
+    )
+    ''',
+]
+
+# Colunas de email_campaigns criadas depois da primeira versão do schema
+COLUNAS_ACRESCENTADAS = {
+    'campanha': 'TEXT',
+    # remover, ausente, automatica, sem_interesse, interesse ou outra (classificacao_respostas)
+    'classe_resposta': 'TEXT',
+    # Assunto antes da personalização ({empresa}) e posição do email no cadastro (1=Email1, 2=Email2...)
+    'modelo_assunto': 'TEXT',
+    'prioridade_email': 'INTEGER',
+}
+
+# Colunas de tracking_events criadas depois (evento_id: id único do evento vindo dos logs dos nós)
+COLUNAS_EVENTOS_ACRESCENTADAS = {
+    'evento_id': 'TEXT',
+}
+
+
+def criar_schema(db_file):
+    """Tabelas de analytics + colunas acrescentadas depois (bancos antigos são migrados)"""
+    from filtro_bots import preparar_banco
+
+    conn = banco_dados.conectar(db_file)
+    try:
+        for ddl in SCHEMA_ANALYTICS:
+            conn.execute(ddl)
+        colunas = {linha[1] for linha in conn.execute("PRAGMA table_info(email_campaigns)")}
+        for coluna, tipo in COLUNAS_ACRESCENTADAS.items():
+            if coluna not in colunas:
+                conn.execute(f"ALTER TABLE email_campaigns ADD COLUMN {coluna} {tipo}")
+        colunas = {linha[1] for linha in conn.execute("PRAGMA table_info(tracking_events)")}
+        for coluna, tipo in COLUNAS_EVENTOS_ACRESCENTADAS.items():
+            if coluna not in colunas:
+                conn.execute(f"ALTER TABLE tracking_events ADD COLUMN {coluna} {tipo}")
+        # Reaplicar um trecho de log não duplica eventos (gravados direto ficam com NULL, que não conflita)
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tracking_events_evento_id ON tracking_events (evento_id)")
+        conn.commit()
+    finally:
+        conn.close()
+    preparar_banco(db_file)
+
+
+def ultimos_envios(arquivos, emails, tamanho_lote=500):
+    """
+    {email: (arquivo, id)} do envio mais recente (maior enviado_em) para cada
+    endereço, entre todos os arquivos: bounces e respostas sem tracking_id
+    marcam um envio só, não um por campanha que já escreveu para o endereço.
+    Dentro de um arquivo vale o último inserido (MAX(id)).
+    """
+    emails = list(set(emails))
+    melhores = {}
+    for arquivo in arquivos:
+        conn = banco_dados.conectar(arquivo)
+        try:
+            for inicio in range(0, len(emails), tamanho_lote):
+                lote = emails[inicio:inicio + tamanho_lote]
+                for email, id_envio, enviado_em in conn.execute(f'''
+                    SELECT email_destino, id, enviado_em FROM email_campaigns
+                    WHERE id IN (SELECT MAX(id) FROM email_campaigns
+                                 WHERE email_destino IN ({','.join('?' * len(lote))})
+                                 GROUP BY email_destino)
+                ''', lote):
+                    chave = (enviado_em or '', id_envio)
+                    if email not in melhores or chave > melhores[email][0]:
+                        melhores[email] = (chave, arquivo, id_envio)
+        finally:
+            conn.close()
+    return {email: (arquivo, id_envio) for email, (_, arquivo, id_envio) in melhores.items()}
+
+
+def _nome_arquivo(nome):
+    slug = re.sub(r'[^a-z0-9]+', '_', nome.lower()).strip('_')[:40] or 'campanha'
+    return f"{slug}.db"
+
+
+class ArmazenamentoShards:
+    """Catálogo de campanhas, roteamento tracking_id → shard e consultas entre shards"""
+
+    def __init__(self, diretorio=DIRETORIO_SHARDS, db_legado='email_analytics.db'):
+        self.diretorio = diretorio
+        self.db_legado = db_legado
+        self.catalogo = os.path.join(diretorio, ARQUIVO_CATALOGO)
+        self._caminhos = {}
+        self._ultima_recarga = 0.0
+        self._lock = threading.Lock()
+
+        os.makedirs(diretorio, exist_ok=True)
+        conn = sqlite3.connect(self.catalogo)
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS campanhas (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nome TEXT UNIQUE,
+                    arquivo TEXT,
+                    criada_em TIMESTAMP,
+                    arquivada BOOLEAN DEFAULT 0
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+        self._carregar_catalogo()
+
+    def _carregar_catalogo(self):
+        conn = sqlite3.connect(self.catalogo)
+        try:
+            linhas = conn.execute("SELECT id, arquivo FROM campanhas").fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            self._caminhos = {campanha_id: arquivo for campanha_id, arquivo in linhas}
+            self._ultima_recarga = time.monotonic()
+
+    def campanhas(self, incluir_arquivadas=False):
+        """Lista de dicts id, nome, codigo, arquivo, criada_em, arquivada"""
+        conn = sqlite3.connect(self.catalogo)
+        try:
+            filtro = '' if incluir_arquivadas else 'WHERE arquivada = 0'
+            linhas = conn.execute(
+                f"SELECT id, nome, arquivo, criada_em, arquivada FROM campanhas {filtro} ORDER BY id"
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {'id': i, 'nome': nome, 'codigo': codificar_id(i), 'arquivo': arquivo,
+             'criada_em': criada_em, 'arquivada': bool(arquivada)}
+            for i, nome, arquivo, criada_em, arquivada in linhas
+        ]
+
+    def criar_campanha(self, nome):
+        """Id da campanha (cria catálogo + shard na primeira vez)"""
+        conn = sqlite3.connect(self.catalogo)
+        try:
+            linha = conn.execute("SELECT id, arquivo FROM campanhas WHERE nome = ?", (nome,)).fetchone()
+            if linha is None:
+                cursor = conn.execute(
+                    "INSERT INTO campanhas (nome, criada_em) VALUES (?, ?)", (nome, datetime.now())
+                )
+                campanha_id = cursor.lastrowid
+                # Id no nome do arquivo: slugs iguais não colidem
+                arquivo = os.path.join(self.diretorio, f"{campanha_id:04d}_{_nome_arquivo(nome)}")
+                conn.execute("UPDATE campanhas SET arquivo = ? WHERE id = ?", (arquivo, campanha_id))
+                conn.commit()
+                linha = (campanha_id, arquivo)
+        finally:
+            conn.close()
+
+        campanha_id, arquivo = linha
+        criar_schema(arquivo)
+        with self._lock:
+            self._caminhos[campanha_id] = arquivo
+        return campanha_id
+
+    def arquivo(self, campanha_id):
+        return self._caminhos[campanha_id]
+
+    def gerar_tracking_id(self, campanha_id):
+        """tracking_id com o prefixo da campanha: '<codigo>-<id ordenável>'"""
+        return f"{codificar_id(campanha_id)}{SEPARADOR_CAMPANHA}{gerar_tracking_id()}"
+
+    def shard_de(self, tracking_id):
+        """Arquivo SQLite onde vivem o envio e os eventos desse tracking_id"""
+        codigo, separador, _ = tracking_id.partition(SEPARADOR_CAMPANHA)
+        if not separador:
+            return self.db_legado
+        try:
+            campanha_id = decodificar_id(codigo)
+        except KeyError:
+            return self.db_legado
+
+        caminho = self._caminhos.get(campanha_id)
+        if caminho is None and time.monotonic() - self._ultima_recarga > INTERVALO_RECARGA:
+            # Campanha criada por outro processo depois da carga
+            self._carregar_catalogo()
+            caminho = self._caminhos.get(campanha_id)
+        elif caminho is not None and not os.path.exists(caminho):
+            # Arquivada por outro processo: conectar criaria um shard vazio no caminho antigo
+            self._carregar_catalogo()
+            caminho = self._caminhos.get(campanha_id)
+        return caminho or self.db_legado
+
+    def arquivos(self, campanhas=None, incluir_legado=True, incluir_arquivadas=False):
+        """[(nome, arquivo)] dos shards selecionados (nomes ou ids de campanha)"""
+        selecionados = []
+        if incluir_legado and campanhas is None and os.path.exists(self.db_legado):
+            selecionados.append(('legado', self.db_legado))
+        for campanha in self.campanhas(incluir_arquivadas or campanhas is not None):
+            if campanhas is None or campanha['nome'] in campanhas or campanha['id'] in campanhas:
+                if os.path.exists(campanha['arquivo']):
+                    selecionados.append((campanha['nome'], campanha['arquivo']))
+        return selecionados
+
+    def consultar(self, sql, parametros=(), campanhas=None, incluir_legado=True, arquivados=None):
+        """
+        Executa sql sobre as visões email_campaigns_todas / tracking_events_todas
+
+        Os shards são anexados em grupos de até SQLITE_LIMIT_ATTACHED; com mais
+        shards do que isso, o sql roda uma vez por grupo e as linhas são
+        concatenadas (agrupe por campanha para totais exatos). Com arquivados
+        (um ArquivoEventos), os eventos arquivados de cada shard são
+        carregados numa tabela temporária e entram em tracking_events_todas.
+        Retorna (colunas, linhas).
+        """
+        shards = self.arquivos(campanhas, incluir_legado)
+        conn = sqlite3.connect(':memory:')
+        try:
+            limite = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+            colunas, linhas = [], []
+            for inicio in range(0, len(shards), limite):
+                grupo = shards[inicio:inicio + limite]
+                for i, (_, arquivo) in enumerate(grupo):
+                    conn.execute(f"ATTACH DATABASE ? AS s{i}", (arquivo,))
+                try:
+                    for tabela in ('email_campaigns', 'tracking_events'):
+                        fontes = [(nome, f"s{i}", tabela) for i, (nome, _) in enumerate(grupo)]
+                        if tabela == 'tracking_events' and arquivados is not None:
+                            fontes += self._carregar_arquivados(conn, grupo, arquivados)
+                        self._criar_visao(conn, tabela, fontes)
+                    cursor = conn.execute(sql, parametros)
+                    colunas = [d[0] for d in cursor.description or []]
+                    linhas.extend(cursor.fetchall())
+                finally:
+                    conn.execute("DROP VIEW IF EXISTS temp.email_campaigns_todas")
+                    conn.execute("DROP VIEW IF EXISTS temp.tracking_events_todas")
+                    for i in range(len(grupo)):
+                        conn.execute(f"DROP TABLE IF EXISTS temp.arquivados_s{i}")
+                        conn.execute(f"DETACH DATABASE s{i}")
+            return colunas, linhas
+        finally:
+            conn.close()
+
+    def _carregar_arquivados(self, conn, grupo, arquivados):
+        """Copia os eventos arquivados de cada shard para temp.arquivados_s<i>; retorna as fontes"""
+        fontes = []
+        for i, (nome, arquivo) in enumerate(grupo):
+            if not arquivados.manifesto(arquivo):
+                continue
+            tabela = f"arquivados_s{i}"
+            colunas = [linha[1] for linha in conn.execute(f"PRAGMA s{i}.table_info(tracking_events)")]
+            conn.execute(f"CREATE TEMP TABLE {tabela} AS SELECT * FROM s{i}.tracking_events WHERE 0")
+            inserir = f"INSERT INTO temp.{tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})"
+            for lote in arquivados.lotes(arquivo, colunas):
+                conn.executemany(inserir, lote)
+            fontes.append((nome, 'temp', tabela))
+        # Sem transação aberta: o DETACH do fim falharia com "database is locked"
+        conn.commit()
+        return fontes
+
+    def _criar_visao(self, conn, tabela, fontes):
+        """
+        UNION ALL por nome de coluna (bancos migrados têm colunas em outra
+        ordem); fontes = [(nome da campanha, esquema, tabela)]
+        """
+        por_fonte = [
+            [linha[1] for linha in conn.execute(f"PRAGMA {esquema}.table_info({origem})")]
+            for _, esquema, origem in fontes
+        ]
+        todas = []
+        for colunas in por_fonte:
+            todas.extend(c for c in colunas if c not in todas)
+
+        selects = []
+        for (nome, esquema, origem), colunas in zip(fontes, por_fonte):
+            if not colunas:
+                continue
+            campos = []
+            for coluna in todas:
+                if coluna == 'campanha':
+                    campos.append(f"COALESCE(campanha, '{nome.replace(chr(39), chr(39) * 2)}') AS campanha")
+                else:
+                    campos.append(coluna if coluna in colunas else f"NULL AS {coluna}")
+            selects.append(f"SELECT {', '.join(campos)} FROM {esquema}.{origem}")
+        if not selects:
+            selects.append("SELECT NULL AS campanha WHERE 0")
+        conn.execute(f"CREATE TEMP VIEW {tabela}_todas AS {' UNION ALL '.join(selects)}")
+
+    def resumo_campanhas(self, campanhas=None):
+        """Totais por campanha (uma linha por campanha, somando legado e shards)"""
+        return self.consultar(f'''
+            SELECT campanha,
+                   COUNT(*) AS enviados,
+                   COUNT(CASE WHEN aberto = 1 THEN 1 END) AS abertos,
+                   COUNT(CASE WHEN clicou_link = 1 THEN 1 END) AS cliques,
+                   COUNT(CASE WHEN respondeu = 1 THEN 1 END) AS respostas,
+                   COUNT(CASE WHEN bounce = 1 THEN 1 END) AS bounces
+            FROM email_campaigns_todas
+            WHERE {SQL_ENVIADOS}
+            GROUP BY campanha
+            ORDER BY MIN(enviado_em)
+        ''', campanhas=campanhas)
+
+    def arquivar(self, nome):
+        """Move o shard da campanha para arquivadas/ (o roteador segue o novo caminho)"""
+        conn = sqlite3.connect(self.catalogo)
+        try:
+            linha = conn.execute("SELECT id, arquivo FROM campanhas WHERE nome = ?", (nome,)).fetchone()
+            if linha is None:
+                raise ValueError(f"Campanha não encontrada: {nome}")
+            campanha_id, arquivo = linha
+
+            # Fecha as conexões do pool e consolida o WAL antes de mover: o
+            # arquivo principal fica completo
+            banco_dados.fechar(arquivo)
+            shard = sqlite3.connect(arquivo)
+            shard.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            shard.close()
+
+            destino_dir = os.path.join(self.diretorio, SUBPASTA_ARQUIVO)
+            os.makedirs(destino_dir, exist_ok=True)
+            destino = os.path.join(destino_dir, os.path.basename(arquivo))
+            os.replace(arquivo, destino)
+            for sufixo in ('-wal', '-shm'):
+                if os.path.exists(arquivo + sufixo):
+                    os.remove(arquivo + sufixo)
+
+            conn.execute("UPDATE campanhas SET arquivo = ?, arquivada = 1 WHERE id = ?", (destino, campanha_id))
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self._caminhos[campanha_id] = destino
+        return destino
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Arquivamento de Eventos
+Os eventos brutos de tracking_events mais antigos que DIAS_RETENCAO saem do
+SQLite para arquivos Parquet comprimidos (zstd), particionados por mês e
+campanha no layout "hive" que pyarrow.dataset, pandas e DuckDB leem direto:
+
+    arquivo_eventos/mes=2024-03/campanha=proposta_marco/<banco>-<id inicial>-<id final>.parquet
+
+No banco ficam só a contagem diária por campanha, tipo e classificação
+(eventos_arquivados) e o manifesto dos arquivos (arquivos_eventos): os
+totais continuam exatos sem abrir os Parquet, e relatórios que precisam dos
+eventos brutos leem as partições sob demanda.
+
+Cada Parquet é escrito num arquivo temporário e renomeado; remoção das
+linhas, manifesto e agregados entram numa transação só. Um Parquet fora do
+manifesto (arquivamento interrompido antes do commit) é apagado na próxima
+execução, e as linhas dele, que continuaram no banco, são arquivadas de novo.
+"""
+
+import glob
+import os
+import re
+from datetime import datetime, timedelta
+
+import banco_dados
+
+DIRETORIO_ARQUIVO_EVENTOS = 'arquivo_eventos'
+DIAS_RETENCAO = 90
+COMPRESSAO = 'zstd'
+# Linhas lidas do SQLite por vez (e por row group nos Parquet)
+TAMANHO_LOTE = 50000
+
+
+def _slug(nome):
+    return re.sub(r'[^a-z0-9]+', '_', (nome or '').lower()).strip('_')[:40] or 'sem_campanha'
+
+
+def _particao(mes, campanha):
+    return os.path.join(f"mes={mes}", f"campanha={_slug(campanha)}")
+
+
+def _base(db_file):
+    """Prefixo dos Parquet de um banco (shards têm nomes únicos, com o id da campanha)"""
+    return os.path.splitext(os.path.basename(db_file))[0]
+
+
+class ArquivoEventos:
+    """Move eventos antigos para Parquet particionado e os devolve sob demanda"""
+
+    def __init__(self, diretorio=DIRETORIO_ARQUIVO_EVENTOS, dias_retencao=DIAS_RETENCAO,
+                 tamanho_lote=TAMANHO_LOTE, compressao=COMPRESSAO):
+        self.diretorio = diretorio
+        self.dias_retencao = dias_retencao
+        self.tamanho_lote = tamanho_lote
+        self.compressao = compressao
+
+    def arquivar(self, arquivos, agora=None, compactar=True):
+        """
+        Arquiva os eventos anteriores ao corte em cada banco; arquivos =
+        [(nome_campanha, db_file)] como em ArmazenamentoShards.arquivos().
+        Com compactar, o VACUUM devolve ao disco o espaço liberado.
+        Retorna {'eventos': linhas arquivadas, 'arquivos': Parquet criados}.
+        """
+        corte = (agora or datetime.now()) - timedelta(days=self.dias_retencao)
+        totais = {'eventos': 0, 'arquivos': 0}
+        for nome, db_file in arquivos:
+            eventos, criados = self._arquivar_banco(nome, db_file, corte)
+            totais['eventos'] += eventos
+            totais['arquivos'] += criados
+            if eventos and compactar:
+                conn = banco_dados.conectar(db_file)
+                try:
+                    conn.execute("VACUUM")
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                finally:
+                    conn.close()
+        return totais
+
+    def _arquivar_banco(self, nome, db_file, corte):
+        from armazenamento_shards import criar_schema
+        from exportacao_streaming import esquema_parquet, importar_pyarrow, tabela_parquet
+
+        _, pq = importar_pyarrow()
+        criar_schema(db_file)
+        corte = corte.isoformat(sep=' ')
+        conn = banco_dados.conectar(db_file)
+        try:
+            self._remover_orfaos(conn, db_file)
+            colunas = [(linha[1], (linha[2] or '').upper())
+                       for linha in conn.execute("PRAGMA table_info(tracking_events)")]
+            schema = esquema_parquet(colunas)
+            selecao = ', '.join(f"e.{coluna}" for coluna, _ in colunas)
+
+            # (mês, campanha) → [writer, caminho temporário, primeiro id, último id, linhas]
+            particoes = {}
+            ultimo_id = 0
+            try:
+                while True:
+                    lote = conn.execute(f'''
+                        SELECT {selecao}, substr(e.timestamp, 1, 7), COALESCE(c.campanha, ?)
+                        FROM tracking_events e
+                        LEFT JOIN email_campaigns c ON c.tracking_id = e.tracking_id
+                        WHERE e.id > ? AND e.timestamp < ?
+                        ORDER BY e.id LIMIT ?
+                    ''', (nome, ultimo_id, corte, self.tamanho_lote)).fetchall()
+                    if not lote:
+                        break
+                    ultimo_id = lote[-1][0]
+
+                    grupos = {}
+                    for linha in lote:
+                        grupos.setdefault(linha[-2:], []).append(linha[:-2])
+                    for chave, linhas in grupos.items():
+                        particao = particoes.get(chave)
+                        if particao is None:
+                            temporario = os.path.join(self.diretorio, _particao(*chave),
+                                                      f".{_base(db_file)}-{len(particoes)}.tmp")
+                            os.makedirs(os.path.dirname(temporario), exist_ok=True)
+                            writer = pq.ParquetWriter(temporario, schema, compression=self.compressao)
+                            particao = particoes[chave] = [writer, temporario, linhas[0][0], 0, 0]
+                        particao[0].write_table(tabela_parquet(schema, linhas))
+                        particao[3] = linhas[-1][0]
+                        particao[4] += len(linhas)
+            finally:
+                for particao in particoes.values():
+                    particao[0].close()
+            if not particoes:
+                return 0, 0
+
+            manifesto = []
+            for (mes, campanha), (_, temporario, primeiro, ultimo, linhas) in particoes.items():
+                relativo = os.path.join(_particao(mes, campanha), f"{_base(db_file)}-{primeiro}-{ultimo}.parquet")
+                os.replace(temporario, os.path.join(self.diretorio, relativo))
+                manifesto.append((relativo, mes, campanha, primeiro, ultimo, linhas, datetime.now()))
+
+            with conn:
+                conn.execute('''
+                    INSERT INTO eventos_arquivados (dia, campanha, evento_tipo, classificacao, eventos)
+                    SELECT substr(e.timestamp, 1, 10), COALESCE(c.campanha, ?), COALESCE(e.evento_tipo, ''),
+                           COALESCE(e.classificacao, 'humano'), COUNT(*)
+                    FROM tracking_events e
+                    LEFT JOIN email_campaigns c ON c.tracking_id = e.tracking_id
+                    WHERE e.id <= ? AND e.timestamp < ?
+                    GROUP BY 1, 2, 3, 4
+                    ON CONFLICT (dia, campanha, evento_tipo, classificacao) DO UPDATE SET
+                        eventos = eventos + excluded.eventos
+                ''', (nome, ultimo_id, corte))
+                conn.executemany('''
+                    INSERT INTO arquivos_eventos (arquivo, mes, campanha, primeiro_id, ultimo_id, linhas, criado_em)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', manifesto)
+                removidos = conn.execute("DELETE FROM tracking_events WHERE id <= ? AND timestamp < ?",
+                                         (ultimo_id, corte)).rowcount
+        finally:
+            conn.close()
+        return removidos, len(manifesto)
+
+    def _remover_orfaos(self, conn, db_file):
+        """Apaga Parquet e temporários deste banco que não chegaram ao manifesto"""
+        registrados = {os.path.normpath(arquivo) for arquivo, in conn.execute("SELECT arquivo FROM arquivos_eventos")}
+        base = glob.escape(_base(db_file))
+        for padrao in (f"{base}-*.parquet", f".{base}-*.tmp"):
+            for caminho in glob.glob(os.path.join(glob.escape(self.diretorio), '*', '*', padrao)):
+                if os.path.normpath(os.path.relpath(caminho, self.diretorio)) not in registrados:
+                    os.remove(caminho)
+
+    def manifesto(self, db_file, meses=None, campanhas=None):
+        """[(caminho, mês, campanha, linhas)] dos Parquet do banco, em ordem de id"""
+        conn = banco_dados.conectar(db_file)
+        try:
+            linhas = conn.execute('''
+                SELECT arquivo, mes, campanha, linhas FROM arquivos_eventos ORDER BY primeiro_id
+            ''').fetchall()
+        finally:
+            conn.close()
+        return [
+            (os.path.join(self.diretorio, arquivo), mes, campanha, total)
+            for arquivo, mes, campanha, total in linhas
+            if (meses is None or mes in meses) and (campanhas is None or campanha in campanhas)
+        ]
+
+    def lotes(self, db_file, colunas, tamanho_lote=None, meses=None, campanhas=None):
+        """
+        Eventos arquivados do banco em lotes de tuplas na ordem de colunas
+        (colunas ausentes no Parquet vêm como None); meses ('AAAA-MM') e
+        campanhas escolhem as partições sem abrir as outras.
+        """
+        from exportacao_streaming import importar_pyarrow
+
+        _, pq = importar_pyarrow()
+        for caminho, _, _, _ in self.manifesto(db_file, meses, campanhas):
+            arquivo = pq.ParquetFile(caminho)
+            presentes = [coluna for coluna in colunas if coluna in arquivo.schema_arrow.names]
+            for batch in arquivo.iter_batches(batch_size=tamanho_lote or self.tamanho_lote, columns=presentes):
+                dados = batch.to_pydict()
+                vazia = [None] * batch.num_rows
+                yield list(zip(*(dados.get(coluna, vazia) for coluna in colunas)))
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Acesso Compartilhado ao SQLite
+Pool de conexões persistentes por arquivo de banco (email_analytics.db e
+shards de campanha). conectar() devolve uma conexão já aberta e configurada
+e conn.close() a devolve ao pool em vez de fechá-la, então o código que
+fazia connect → execute → commit → close continua igual e deixa de pagar a
+abertura e os PRAGMAs a cada operação.
+
+Conexões persistentes mantêm o cache de statements preparados do sqlite3
+(o mesmo SQL não é recompilado a cada chamada) e os PRAGMAs valem para a
+vida da conexão: WAL com synchronous=NORMAL (leitores não bloqueiam o
+escritor e o commit não faz fsync do journal), busy_timeout para esperar o
+lock de escrita de outro processo em vez de falhar, cache e mmap maiores.
+
+O pool é uma pilha compartilhada entre as threads, e não uma conexão fixa
+por thread: o servidor de desenvolvimento do Flask cria uma thread por
+requisição, e conexões presas à thread seriam reabertas a cada hit.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=30000",
+    "PRAGMA cache_size=-16000",      # 16 MB
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=134217728",    # 128 MB
+)
+
+# Statements preparados guardados por conexão (padrão do sqlite3: 128)
+CACHE_STATEMENTS = 256
+
+# Conexões ociosas mantidas por arquivo; as que sobrarem são fechadas
+MAX_OCIOSAS = 8
+
+
+class ConexaoPool(sqlite3.Connection):
+    """Conexão cujo close() devolve ao pool (descartando o que não teve commit)"""
+
+    pool = None
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.devolver(self)
+
+    def fechar_de_verdade(self):
+        super().close()
+
+
+class PoolConexoes:
+    """Conexões abertas de um arquivo SQLite, emprestadas a uma thread por vez"""
+
+    def __init__(self, db_file, max_ociosas=MAX_OCIOSAS):
+        self.db_file = db_file
+        self.max_ociosas = max_ociosas
+        self._livres = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _abrir(self):
+        conn = sqlite3.connect(self.db_file, timeout=30, factory=ConexaoPool, check_same_thread=False,
+                               cached_statements=CACHE_STATEMENTS)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        conn.pool = self
+        return conn
+
+    def pegar(self):
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Processo filho (fork): as conexões do pai não podem ser usadas aqui
+                self._livres = []
+                self._pid = os.getpid()
+            if self._livres:
+                return self._livres.pop()
+        return self._abrir()
+
+    def devolver(self, conn):
+        if conn.in_transaction:
+            # Sem commit: descarta, como fechar a conexão faria
+            conn.rollback()
+        with self._lock:
+            if len(self._livres) < self.max_ociosas and os.getpid() == self._pid:
+                self._livres.append(conn)
+                return
+        conn.fechar_de_verdade()
+
+    def fechar(self):
+        """Fecha as ociosas; as emprestadas fecham de vez ao voltar"""
+        with self._lock:
+            livres, self._livres = self._livres, []
+            self.max_ociosas = 0
+        for conn in livres:
+            conn.fechar_de_verdade()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool(db_file):
+    """Pool do arquivo (um por caminho absoluto, criado no primeiro uso)"""
+    chave = os.path.abspath(db_file)
+    p = _pools.get(chave)
+    if p is None:
+        with _pools_lock:
+            p = _pools.get(chave)
+            if p is None:
+                p = _pools[chave] = PoolConexoes(db_file)
+    return p
+
+
+def conectar(db_file):
+    """Substituto de sqlite3.connect(db_file): conexão do pool, devolvida no close()"""
+    return pool(db_file).pegar()
+
+
+@contextmanager
+def transacao(db_file):
+    """with transacao(db_file) as conn: ... (commit no fim, rollback em exceção)"""
+    conn = conectar(db_file)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def fechar(db_file=None):
+    """Fecha as conexões do arquivo (antes de mover/apagar o banco) ou de todos"""
+    with _pools_lock:
+        if db_file is None:
+            pools = list(_pools.values())
+            _pools.clear()
+        else:
+            p = _pools.pop(os.path.abspath(db_file), None)
+            pools = [p] if p else []
+    for p in pools:
+        p.fechar()
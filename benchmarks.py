@@ -0,0 +1,1898 @@
+#!/usr/bin/env python3
+"""
+Benchmarks do Automated Lead Generator
+Medições reproduzíveis de desempenho; cada benchmark retorna código de saída
+diferente de zero quando estoura o orçamento definido.
+
+Uso:
+    python benchmarks.py startup [--budget-ms 150] [--repeticoes 5]
+    python benchmarks.py nomes [--quantidade 2000000]
+    python benchmarks.py validacao [--quantidade 100000] [--dominios 2000] [--minimo 20000]
+    python benchmarks.py bounces [--quantidade 20000] [--minimo 2000]
+    python benchmarks.py tracking-ids [--quantidade 1000000] [--processos 4]
+    python benchmarks.py series [--quantidade 1000000] [--budget-ms 50]
+    python benchmarks.py plano [--quantidade 5000000] [--max-bytes 256]
+    python benchmarks.py sqlite [--operacoes 2000]
+    python benchmarks.py envios [--quantidade 5000] [--lote 100]
+    python benchmarks.py respostas [--mensagens 2000] [--respostas 20] [--budget-s 2]
+    python benchmarks.py classificacao [--quantidade 20000] [--minimo 2000]
+    python benchmarks.py arquivamento [--quantidade 500000] [--dias 90]
+    python benchmarks.py enriquecimento [--quantidade 300000] [--minimo 100000]
+    python benchmarks.py funil [--envios 1000000] [--eventos 10000000] [--budget-ms 1000]
+    python benchmarks.py ingestao [--nos 4] [--eventos 400000] [--minimo 10000]
+    python benchmarks.py deduplicacao [--aberturas 10000] [--minimo 200000]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos que devem carregar rápido: nenhum deles pode puxar pandas ao importar.
+# O segundo item é o framework inevitável, descontado do orçamento (o custo
+# do Flask não é do nosso código)
+MODULOS_STARTUP = [
+    ('cli', None),
+    ('perfilamento', None),
+    ('email_marketing_empresarial', None),
+    ('sistema_monitoramento_analytics', None),
+    ('email_marketing_com_tracking', None),
+    ('tracking_server', 'flask'),
+]
+MODULOS_PESADOS = ('pandas', 'numpy', 'openpyxl')
+
+
+def _executar_python(codigo, *flags):
+    """Roda um interpretador limpo no diretório do projeto"""
+    return subprocess.run(
+        [sys.executable, *flags, '-c', codigo],
+        cwd=DIRETORIO, capture_output=True, text=True
+    )
+
+
+def medir_import(modulo, repeticoes=5):
+    """Mediana do tempo de import (ms) e módulos pesados carregados junto"""
+    codigo = (
+        "import sys, time\n"
+        "t = time.perf_counter()\n"
+        f"import {modulo}\n"
+        "print((time.perf_counter() - t) * 1000)\n"
+        f"print(','.join(m for m in {MODULOS_PESADOS!r} if m in sys.modules))\n"
+    )
+    tempos = []
+    pesados = ''
+    for _ in range(repeticoes):
+        resultado = _executar_python(codigo)
+        if resultado.returncode != 0:
+            erro = resultado.stderr.strip().splitlines()[-1] if resultado.stderr else 'erro'
+            return None, erro
+        linhas = resultado.stdout.strip().splitlines()
+        tempos.append(float(linhas[0]))
+        pesados = linhas[1] if len(linhas) > 1 else ''
+    return statistics.median(tempos), pesados
+
+
+def top_imports(modulo, n=10):
+    """Maiores custos cumulativos segundo -X importtime"""
+    resultado = _executar_python(f"import {modulo}", '-X', 'importtime')
+    custos = []
+    for linha in resultado.stderr.splitlines():
+        m = re.match(r'import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)', linha)
+        if m:
+            custos.append((int(m.group(1)), m.group(3)))
+    return sorted(custos, reverse=True)[:n]
+
+
+def benchmark_startup(budget_ms=150.0, repeticoes=5):
+    """Guarda de latência de inicialização da CLI e dos módulos principais"""
+    print("⏱️ BENCHMARK DE INICIALIZAÇÃO")
+    print("=" * 50)
+    falhas = []
+
+    for modulo, framework in MODULOS_STARTUP:
+        tempo, extra = medir_import(modulo, repeticoes)
+        if tempo is None:
+            print(f"⚠️ {modulo:35s} não importável aqui ({extra})")
+            continue
+
+        proprio = tempo
+        nota = ''
+        if framework:
+            tempo_framework, _ = medir_import(framework, repeticoes)
+            proprio = max(tempo - (tempo_framework or 0), 0)
+            nota = f" ({proprio:.1f}ms sem {framework})"
+
+        status = "✅"
+        if extra:
+            status = "❌"
+            falhas.append(f"{modulo} importa {extra} na inicialização")
+        elif proprio > budget_ms:
+            status = "❌"
+            falhas.append(f"{modulo} levou {proprio:.1f}ms (orçamento {budget_ms:.0f}ms)")
+        print(f"{status} {modulo:35s} {tempo:8.1f}ms{nota}")
+
+    # Tempo de ponta a ponta de `cli.py --help`
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, 'cli.py', '--help'], cwd=DIRETORIO, capture_output=True)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    print(f"\n🚀 cli.py --help (processo completo): {statistics.median(tempos):.1f}ms")
+
+    print("\n🔍 Maiores imports de cli:")
+    for custo, nome in top_imports('cli'):
+        print(f"   {custo / 1000:8.1f}ms  {nome}")
+
+    if falhas:
+        print("\n❌ Orçamento de inicialização violado:")
+        for falha in falhas:
+            print(f"   - {falha}")
+        return 1
+
+    print("\n✅ Inicialização dentro do orçamento")
+    return 0
+
+
+def gerar_nomes(quantidade, distintos=200000, semente=42):
+    """Nomes sintéticos com sufixos variados (e repetidos) e muitas duplicatas"""
+    import random
+
+    rng = random.Random(semente)
+    bases = ['Comércio', 'Indústria', 'Tecnologia', 'Serviços', 'Construtora', 'Padaria',
+             'Distribuidora', 'Açaí', 'Consultoria', 'Transportes', 'Casa', 'Acme']
+    sufixos = ['', '', '', ' LTDA', ' Ltda.', ' S.A.', ' S/A', ' SA', ' S.A', ' EIRELI', ' ME',
+               ' EPP', ' MICROEMPRESA', ' - ME', ' - EPP', ' - EIRELI', ' LIMITADA',
+               ' LTDA - ME', ' Eireli - EPP', ' ltda']
+    distintos_lista = [
+        f"{rng.choice(bases)} {rng.choice(bases)} {i}{rng.choice(sufixos)}"
+        for i in range(distintos)
+    ]
+    return [rng.choice(distintos_lista) for _ in range(quantidade)]
+
+
+# Entradas do comparativo com o laço original: bases (com acento, minúsculas,
+# "SA"/"ME" dentro da palavra) × um único sufixo que o laço já removia por inteiro
+CASOS_LEGADOS_NOMES = ['Acme', 'Padaria São José', 'Casa', 'Comércio de Açaí', 'ALIMENTOS SAME',
+                       'Tecnologia Ltda Brasil', 'Indústria Rome', 'transportes rápidos']
+SUFIXOS_CASOS_LEGADOS = ['', ' LTDA', ' Ltda.', ' ltda', ' S.A.', ' S/A', ' SA', ' S.A', ' EIRELI', ' ME',
+                         ' EPP', ' MICROEMPRESA', ' LIMITADA', ' epp']
+
+
+def benchmark_nomes(quantidade=2000000):
+    """clean_company_name original (laço) x normalizar_serie (regex única + memoização)"""
+    import pandas as pd
+    from normalizacao_nomes import limpar_nome_legado, normalizar_serie
+
+    print("🏷️ BENCHMARK DE NORMALIZAÇÃO DE NOMES")
+    print("=" * 50)
+    nomes = gerar_nomes(quantidade)
+    serie = pd.Series(nomes)
+
+    inicio = time.perf_counter()
+    legado = [limpar_nome_legado(n) for n in nomes]
+    t_legado = time.perf_counter() - inicio
+    print(f"Laço original:           {t_legado:8.2f}s ({quantidade / t_legado:,.0f} nomes/s)")
+
+    # Caminho real antigo: get_nome_empresa linha a linha via iterrows (amostra)
+    amostra = pd.DataFrame({'RazaoSocial': nomes[:100000], 'NomeFantasia': None})
+    inicio = time.perf_counter()
+    for _, row in amostra.iterrows():
+        nome = row.get('NomeFantasia')
+        nome = str(nome).strip() if pd.notna(nome) and str(nome).strip() else str(row.get('RazaoSocial')).strip()
+        limpar_nome_legado(nome)
+    taxa_linhas = len(amostra) / (time.perf_counter() - inicio)
+    print(f"Por linha (iterrows):    {quantidade / taxa_linhas:8.2f}s estimado ({taxa_linhas:,.0f} nomes/s)")
+
+    inicio = time.perf_counter()
+    vetor_legado = normalizar_serie(serie, legado=True)
+    t_vetor_legado = time.perf_counter() - inicio
+    print(f"Vetorizado (modo legado): {t_vetor_legado:7.2f}s ({t_legado / t_vetor_legado:.1f}x)")
+
+    inicio = time.perf_counter()
+    vetor = normalizar_serie(serie)
+    t_vetor = time.perf_counter() - inicio
+    print(f"Vetorizado (completo):   {t_vetor:8.2f}s ({t_legado / t_vetor:.1f}x)")
+
+    falhas = 0
+    divergencias_legado = sum(a != b for a, b in zip(legado, vetor_legado))
+    if divergencias_legado:
+        print(f"❌ Modo legado divergiu em {divergencias_legado} nomes")
+        falhas += 1
+
+    # Casos legados fixos: nomes com no máximo um sufixo da lista original, que
+    # o laço já limpava por inteiro; o modo completo tem de dar o mesmo resultado
+    casos_legados = [f"{base}{sufixo}" for base in CASOS_LEGADOS_NOMES for sufixo in SUFIXOS_CASOS_LEGADOS]
+    esperados = [limpar_nome_legado(nome) for nome in casos_legados]
+    obtidos = normalizar_serie(pd.Series(casos_legados)).tolist()
+    divergentes = [(nome, esperado, obtido) for nome, esperado, obtido in zip(casos_legados, esperados, obtidos)
+                   if esperado != obtido]
+    if divergentes:
+        nome, esperado, obtido = divergentes[0]
+        print(f"❌ Modo completo divergiu em {len(divergentes)} de {len(casos_legados)} casos legados, "
+              f"ex.: {nome!r} → {obtido!r}, esperado {esperado!r}")
+        falhas += 1
+    melhorias = sum(a != b for a, b in zip(legado, vetor))
+    if not falhas:
+        print(f"✅ Saída idêntica ao laço original nos {len(casos_legados)} casos legados | "
+              f"{melhorias} nomes com sufixo repetido ou separador pendurado agora limpos")
+    return 1 if falhas else 0
+
+
+# Casos fixos da validação: (email, válido, motivo, email final); MX do ResolverEstatico abaixo
+CASOS_VALIDACAO = [
+    ('joao@gmial.com', True, None, 'joao@gmail.com'),              # erro de digitação
+    ('maria@gamil.com', True, None, 'maria@gmail.com'),
+    ('ana@hotmal.com', True, None, 'ana@hotmail.com'),
+    ('pedro@outlok.com', True, None, 'pedro@outlok.com'),          # "erro" com MX próprio: mantido
+    (' Fulano@Empresa.com.br ', True, None, 'fulano@empresa.com.br'),
+    ('jose@ação.com.br', True, None, 'jose@xn--ao-siap.com.br'),   # IDN → punycode
+    ('contato@empresa.com.br', True, None, 'contato@empresa.com.br'),  # função: marcado, não rejeitado
+    ('teste@mailinator.com', False, 'descartavel', 'teste@mailinator.com'),
+    ('lixo@descartavel-local.net', False, 'descartavel', 'lixo@descartavel-local.net'),  # do arquivo
+    ('noreply@empresa.com.br', False, 'funcao', 'noreply@empresa.com.br'),
+    ('fulano@semmx.com.br', False, 'sem_mx', 'fulano@semmx.com.br'),
+    ('invalido@@empresa.com.br', False, 'sintaxe', None),
+    ('.ponto@empresa.com.br', False, 'sintaxe', None),
+    ('sem-tld@empresa', False, 'sintaxe', None),
+]
+# outlook.com fica sem MX de propósito: o pedro@outlok.com mantido não pode herdar o "sem_mx" dele
+MX_VALIDACAO = {
+    'gmail.com': ['gmail-smtp-in.l.google.com'], 'hotmail.com': ['hotmail-com.olc.protection.outlook.com'],
+    'outlok.com': ['mx.outlok.com'], 'empresa.com.br': ['mx.empresa.com.br'],
+    'xn--ao-siap.com.br': ['mx.xn--ao-siap.com.br'],
+}
+
+
+def benchmark_validacao(quantidade=100000, dominios=2000, atraso_ms=5.0, minimo=20000):
+    """Validação de emails com ResolverEstatico: casos fixos, uma consulta por domínio e cache de MX"""
+    import tempfile
+    from validacao_emails import (DOMINIOS_DESCARTAVEIS, CacheDNS, ResolverEstatico, ValidadorEmails,
+                                  carregar_descartaveis)
+
+    print("🔎 BENCHMARK DE VALIDAÇÃO DE EMAILS")
+    print("=" * 50)
+    falhas = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        arquivo = os.path.join(tmp, 'descartaveis.txt')
+        with open(arquivo, 'w', encoding='utf-8') as f:
+            f.write("# lista local\n  # comentário indentado\n  descartavel-local.net\n\n")
+        antes = set(DOMINIOS_DESCARTAVEIS)
+        carregar_descartaveis(arquivo)
+        acrescentados = DOMINIOS_DESCARTAVEIS - antes
+        try:
+            if acrescentados != {'descartavel-local.net'}:
+                print(f"❌ Arquivo de descartáveis carregou {sorted(acrescentados)}")
+                falhas += 1
+
+            resultados = ValidadorEmails(ResolverEstatico(MX_VALIDACAO)).validar_lote(
+                email for email, *_ in CASOS_VALIDACAO)
+            erradas = [(email, (resultados[email]['valido'], resultados[email]['motivo'], resultados[email]['email']))
+                       for email, *esperado in CASOS_VALIDACAO
+                       if (resultados[email]['valido'], resultados[email]['motivo'], resultados[email]['email'])
+                       != tuple(esperado)]
+            for email, obtido in erradas:
+                print(f"❌ {email!r}: {obtido}")
+            falhas += bool(erradas)
+            if not resultados['contato@empresa.com.br']['funcao']:
+                print("❌ contato@ não foi marcado como endereço de função")
+                falhas += 1
+            funcao = ValidadorEmails(ResolverEstatico(MX_VALIDACAO), rejeitar_funcao=True).validar_lote(
+                ['contato@empresa.com.br'])['contato@empresa.com.br']
+            if funcao['valido'] or funcao['motivo'] != 'funcao':
+                print(f"❌ rejeitar_funcao manteve contato@ ({funcao['motivo']})")
+                falhas += 1
+            print(f"Casos fixos:    {len(CASOS_VALIDACAO) - len(erradas)}/{len(CASOS_VALIDACAO)} corretos")
+        finally:
+            DOMINIOS_DESCARTAVEIS.difference_update(acrescentados)
+
+        # Volume: MX consultado uma vez por domínio distinto, em paralelo; na segunda
+        # rodada tudo vem do cache em disco
+        mapa = {f"empresa{d}.com.br": [f"mx.empresa{d}.com.br"] for d in range(dominios) if d % 10}
+        emails = [f"pessoa{i}@empresa{i % dominios}.com.br" for i in range(quantidade)]
+        cache = CacheDNS(os.path.join(tmp, 'dns_cache.db'))
+        rodadas = []
+        for _ in range(2):
+            resolver = ResolverEstatico(mapa, atraso=atraso_ms / 1000)
+            inicio = time.perf_counter()
+            resultados = ValidadorEmails(resolver, cache).validar_lote(emails)
+            rodadas.append((time.perf_counter() - inicio, resolver.consultas))
+        (t_frio, consultas_frio), (t_cache, consultas_cache) = rodadas
+        sem_mx = sum(r['motivo'] == 'sem_mx' for r in resultados.values())
+        print(f"Sem cache:      {t_frio:6.2f}s ({quantidade / t_frio:,.0f} emails/s, {consultas_frio} consultas de MX)")
+        print(f"Com cache:      {t_cache:6.2f}s ({quantidade / t_cache:,.0f} emails/s, {consultas_cache} consultas)")
+
+    if consultas_frio != dominios or consultas_cache:
+        print(f"❌ Esperadas {dominios} consultas sem cache e 0 com cache")
+        falhas += 1
+    if sem_mx != quantidade // 10:
+        print(f"❌ {sem_mx} emails sem MX, esperados {quantidade // 10}")
+        falhas += 1
+    if quantidade / t_cache < minimo:
+        print(f"❌ Abaixo do mínimo de {minimo:,.0f} emails/s")
+        falhas += 1
+    if not falhas:
+        print(f"✅ Digitação, descartáveis, função e sem MX corretos; uma consulta por domínio e "
+              f"{quantidade / t_cache:,.0f} emails/s com cache")
+    return 1 if falhas else 0
+
+
+MODELO_DSN = (
+    "From: Mail Delivery Subsystem <mailer-daemon@googlemail.com>\r\n"
+    "To: vendas@exemplo.com\r\n"
+    "Subject: Delivery Status Notification (Failure)\r\n"
+    "MIME-Version: 1.0\r\n"
+    "Content-Type: multipart/report; report-type=delivery-status; boundary=\"b{n}\"\r\n\r\n"
+    "--b{n}\r\nContent-Type: text/plain\r\n\r\nA mensagem não foi entregue a {email}.\r\n\r\n"
+    "--b{n}\r\nContent-Type: message/delivery-status\r\n{codificacao}\r\n"
+    "{dsn}\r\n"
+    "--b{n}\r\nContent-Type: text/rfc822-headers\r\n\r\n"
+    "To: {email}\r\nSubject: Proposta\r\nX-Tracking-ID: {tracking_id}\r\n\r\n--b{n}--\r\n"
+)
+MODELO_CAMPOS_DSN = (
+    "Reporting-MTA: dns; mx.google.com\r\n\r\n"
+    "Final-Recipient: rfc822; {email}\r\nAction: {acao}\r\nStatus: {status}\r\n"
+    "Diagnostic-Code: smtp; {diagnostico}\r\n"
+)
+MODELO_ARF = (
+    "From: feedback@provedor.com\r\n"
+    "Content-Type: multipart/report; report-type=feedback-report; boundary=\"f{n}\"\r\n\r\n"
+    "--f{n}\r\nContent-Type: text/plain\r\n\r\nReclamação de spam\r\n\r\n"
+    "--f{n}\r\nContent-Type: message/feedback-report\r\n\r\n"
+    "Feedback-Type: abuse\r\nUser-Agent: FBL/1.0\r\nVersion: 1\r\nOriginal-Rcpt-To: {email}\r\n\r\n"
+    "--f{n}\r\nContent-Type: message/rfc822\r\n\r\n"
+    "To: {email}\r\nList-Unsubscribe: <https://track/unsubscribe/{tracking_id}>\r\n\r\nOlá\r\n--f{n}--\r\n"
+)
+MODELO_EXIM = (
+    "From: Mail Delivery System <Mailer-Daemon@mx.exemplo.com.br>\r\n"
+    "X-Failed-Recipients: {email}\r\nSubject: Mail delivery failed\r\n\r\n"
+    "This message was created automatically by mail delivery software.\r\n\r\n"
+    "  {email}\r\n    SMTP error from remote mail server after RCPT TO:\r\n"
+    "    550 5.1.1 User unknown\r\n"
+)
+
+
+def gerar_maildir_bounces(diretorio, quantidade, semente=42):
+    """Maildir sintético: DSNs hard/soft, reclamações ARF, bounces Exim e DSNs em base64"""
+    import base64
+    import random
+
+    rng = random.Random(semente)
+    casos = [
+        ('failed', '5.1.1', '550 5.1.1 The email account does not exist'),
+        ('failed', '5.2.2', '552 5.2.2 Mailbox full'),
+        ('delayed', '4.4.1', '421 4.4.1 Connection timed out'),
+        ('failed', '5.7.1', '550 5.7.1 Message rejected by policy'),
+    ]
+    os.makedirs(os.path.join(diretorio, 'new'), exist_ok=True)
+    os.makedirs(os.path.join(diretorio, 'cur'), exist_ok=True)
+    envios = []
+    for n in range(quantidade):
+        email = f"contato{n}@empresa{n % 5000}.com.br"
+        tracking_id = f"{n:016x}"
+        envios.append((tracking_id, email))
+        sorteio = rng.random()
+        if sorteio < 0.1:
+            texto = MODELO_ARF.format(n=n, email=email, tracking_id=tracking_id)
+        elif sorteio < 0.2:
+            texto = MODELO_EXIM.format(email=email)
+        else:
+            acao, status, diagnostico = rng.choice(casos)
+            dsn = MODELO_CAMPOS_DSN.format(email=email, acao=acao, status=status, diagnostico=diagnostico)
+            codificacao = ''
+            if sorteio > 0.98:
+                # Parte delivery-status em base64: força o caminho lento
+                dsn = base64.encodebytes(dsn.encode()).decode()
+                codificacao = 'Content-Transfer-Encoding: base64\r\n'
+            texto = MODELO_DSN.format(n=n, email=email, codificacao=codificacao, dsn=dsn, tracking_id=tracking_id)
+        with open(os.path.join(diretorio, 'new', f"{n}.bench"), 'w', encoding='utf-8', newline='') as f:
+            f.write(texto)
+    return envios
+
+
+def benchmark_bounces(quantidade=20000, minimo=2000.0):
+    """Vazão do processamento de bounces sobre um maildir local"""
+    import sqlite3
+    import tempfile
+    from processamento_bounces import ProcessadorBounces, analisar_mensagem, ler_maildir
+
+    print("📭 BENCHMARK DE PROCESSAMENTO DE BOUNCES")
+    print("=" * 50)
+    with tempfile.TemporaryDirectory() as tmp:
+        maildir = os.path.join(tmp, 'bounces')
+        db_file = os.path.join(tmp, 'email_analytics.db')
+        envios = gerar_maildir_bounces(maildir, quantidade)
+
+        conn = sqlite3.connect(db_file)
+        conn.execute(
+            "CREATE TABLE email_campaigns (id INTEGER PRIMARY KEY AUTOINCREMENT, tracking_id TEXT UNIQUE, "
+            "email_destino TEXT, enviado_em TIMESTAMP, status_entrega TEXT, bounce BOOLEAN DEFAULT 0, "
+            "spam_reclamacao BOOLEAN DEFAULT 0)"
+        )
+        conn.executemany(
+            "INSERT INTO email_campaigns (tracking_id, email_destino, status_entrega) VALUES (?, ?, 'enviado')", envios
+        )
+        conn.commit()
+        conn.close()
+
+        inicio = time.perf_counter()
+        ocorrencias = sum(len(analisar_mensagem(dados)) for _, dados in ler_maildir(maildir, pular_lidas=False))
+        t_analise = time.perf_counter() - inicio
+        print(f"Só análise:        {t_analise:6.2f}s ({quantidade / t_analise:,.0f} DSN/s, {ocorrencias} ocorrências)")
+
+        inicio = time.perf_counter()
+        totais = ProcessadorBounces(db_file).processar_maildir(maildir)
+        t_total = time.perf_counter() - inicio
+        taxa = quantidade / t_total
+        print(f"Maildir → banco:   {t_total:6.2f}s ({taxa:,.0f} DSN/s)")
+        print(f"   {totais}")
+
+        conn = sqlite3.connect(db_file)
+        bounces, reclamacoes = conn.execute("SELECT SUM(bounce), SUM(spam_reclamacao) FROM email_campaigns").fetchone()
+        suprimidos = conn.execute("SELECT COUNT(*) FROM supressao WHERE suprimido = 1").fetchone()[0]
+        soft_bounces = conn.execute("SELECT SUM(soft_bounces) FROM supressao").fetchone()[0]
+        conn.close()
+        print(f"   bounce=1: {bounces} | spam_reclamacao=1: {reclamacoes} | suprimidos: {suprimidos}")
+
+        reprocessadas = ProcessadorBounces(db_file).processar_maildir(maildir)['mensagens']
+
+        # Mesmas mensagens lidas de novo (maildir restaurado, IMAP relendo a janela): nada soma
+        relidas = ProcessadorBounces(db_file).processar(ler_maildir(maildir, pular_lidas=False))
+        conn = sqlite3.connect(db_file)
+        soft_depois = conn.execute("SELECT SUM(soft_bounces) FROM supressao").fetchone()[0]
+        conn.close()
+
+    falhas = 0
+    if totais['sem_envio'] or totais['ignoradas']:
+        print(f"❌ {totais['sem_envio']} ocorrências sem envio, {totais['ignoradas']} mensagens não reconhecidas")
+        falhas += 1
+    if reprocessadas:
+        print(f"❌ Segunda passada reprocessou {reprocessadas} mensagens")
+        falhas += 1
+    contadas = relidas['hard'] + relidas['soft'] + relidas['reclamacao']
+    if contadas or soft_depois != soft_bounces:
+        print(f"❌ Releitura contou {contadas} ocorrências de novo (soft bounces {soft_bounces} → {soft_depois})")
+        falhas += 1
+    if taxa < minimo:
+        print(f"❌ Abaixo do mínimo de {minimo:,.0f} DSN/s")
+        falhas += 1
+    if not falhas:
+        print(f"✅ Acima de {minimo:,.0f} DSN/s, todas as ocorrências casadas, maildir marcado como lido, "
+              f"releitura sem recontagem")
+    return 1 if falhas else 0
+
+
+def _gerar_ids_processo(quantidade):
+    from tracking_ids import gerar_tracking_id
+    return [gerar_tracking_id() for _ in range(quantidade)]
+
+
+def benchmark_tracking_ids(quantidade=1000000, processos=4):
+    """gerar_tracking_id com MD5 x gerador ordenável; unicidade entre processos"""
+    import hashlib
+    from concurrent.futures import ProcessPoolExecutor
+    from datetime import datetime
+    from tracking_ids import GeradorTrackingId
+
+    print("🆔 BENCHMARK DE IDS DE TRACKING")
+    print("=" * 50)
+
+    inicio = time.perf_counter()
+    for i in range(quantidade):
+        raw_string = f"contato{i}@empresa.com.brEmpresa {i}{datetime.now().isoformat()}"
+        hashlib.md5(raw_string.encode()).hexdigest()[:16]
+    t_md5 = time.perf_counter() - inicio
+    print(f"MD5 (original):   {t_md5:6.2f}s ({quantidade / t_md5:,.0f} ids/s)")
+
+    gerador = GeradorTrackingId()
+    inicio = time.perf_counter()
+    ids = [gerador.gerar() for _ in range(quantidade)]
+    t_novo = time.perf_counter() - inicio
+    print(f"Ordenável:        {t_novo:6.2f}s ({quantidade / t_novo:,.0f} ids/s, {t_md5 / t_novo:.1f}x)")
+
+    falhas = 0
+    if ids != sorted(ids) or len(set(ids)) != len(ids):
+        print("❌ IDs do mesmo processo fora de ordem ou repetidos")
+        falhas += 1
+
+    por_processo = quantidade // processos
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        lotes = list(pool.map(_gerar_ids_processo, [por_processo] * processos))
+    todos = [i for lote in lotes for i in lote]
+    repetidos = len(todos) - len(set(todos))
+    print(f"{processos} processos:      {len(todos):,} ids, {repetidos} repetidos")
+    if repetidos or any(lote != sorted(lote) for lote in lotes):
+        print("❌ Colisão ou desordem entre processos")
+        falhas += 1
+    if t_novo > t_md5:
+        print("❌ Mais lento que o MD5 original")
+        falhas += 1
+
+    if not falhas:
+        print("✅ Sem colisões, ordenados por tempo e mais rápido que o MD5")
+    return 1 if falhas else 0
+
+
+def benchmark_series(quantidade=1000000, budget_ms=50.0, semente=42):
+    """Registro nos anéis de séries temporais e consulta das curvas"""
+    import random
+    import tempfile
+    from series_temporais import SeriesTemporais
+
+    print("📈 BENCHMARK DE SÉRIES TEMPORAIS")
+    print("=" * 50)
+
+    rng = random.Random(semente)
+    campanhas = [f"campanha_{i}" for i in range(20)]
+    provedores = ['gmail', 'outlook', 'yahoo', 'corporativo', 'uol', 'outro']
+    inicio_periodo = time.time() - 30 * 86400
+    # Aberturas ~4h (exponencial) depois do envio; o fluxo chega em ordem de tempo
+    eventos = []
+    for i in range(quantidade):
+        enviado = inicio_periodo + i * (30 * 86400 / quantidade)
+        campanha, provedor = rng.choice(campanhas), rng.choice(provedores)
+        eventos.append(('enviados', campanha, provedor, enviado, enviado))
+        if rng.random() < 0.3:
+            eventos.append(('aberturas', campanha, provedor, enviado + rng.expovariate(1 / 14400), enviado))
+    eventos.sort(key=lambda evento: evento[3])
+
+    falhas = 0
+    with tempfile.TemporaryDirectory() as diretorio:
+        series = SeriesTemporais(os.path.join(diretorio, 'series.db'), intervalo_descarga=3600)
+        inicio = time.perf_counter()
+        for evento in eventos:
+            series.registrar(*evento)
+        t_registro = time.perf_counter() - inicio
+        print(f"Registro:         {t_registro:6.2f}s ({len(eventos) / t_registro:,.0f} eventos/s)")
+
+        # Em produção a descarga roda a cada 30s; aqui 30 dias vão de uma vez
+        inicio = time.perf_counter()
+        linhas = series.descarregar()
+        t_descarga = time.perf_counter() - inicio
+        print(f"Descarga:         {t_descarga:6.2f}s ({linhas:,} buckets, {linhas / t_descarga:,.0f} buckets/s)")
+
+        tempos = {}
+        for nome, consulta in (
+            ('desde o envio (campanha)', lambda: series.curva_desde_envio('campanha_3', horas=72)),
+            ('desde o envio (tudo)', lambda: series.curva_desde_envio(horas=168)),
+            ('hora do dia (provedor)', lambda: series.curva_hora_do_dia(provedor='gmail')),
+        ):
+            inicio = time.perf_counter()
+            resultado = consulta()
+            tempos[nome] = (time.perf_counter() - inicio) * 1000
+            print(f"Curva {nome:26s} {tempos[nome]:7.1f} ms")
+
+        curva = series.curva_desde_envio(horas=168)
+        aberturas = sum(1 for evento in eventos if evento[0] == 'aberturas')
+        if sum(linha[1] for linha in curva) != aberturas:
+            print("❌ Aberturas da curva não batem com as registradas")
+            falhas += 1
+        por_dia = series.curva_hora_do_dia()
+        if sum(linha[1] for linha in por_dia) != quantidade:
+            print("❌ Envios por hora do dia não batem com os registrados")
+            falhas += 1
+
+    lentas = [nome for nome, ms in tempos.items() if ms > budget_ms]
+    if lentas:
+        print(f"❌ Acima de {budget_ms:.0f} ms: {', '.join(lentas)}")
+        falhas += 1
+    if not falhas:
+        print(f"✅ Totais conferem e todas as curvas abaixo de {budget_ms:.0f} ms")
+    return 1 if falhas else 0
+
+
+def benchmark_plano(quantidade=5000000, max_bytes=256, amostra=20000, semente=42):
+    """Memória do PlanoEnvio x lista de (índice, pd.Series, email, prioridade)"""
+    import random
+    import tempfile
+    import tracemalloc
+    from datetime import datetime
+    from plano_envio import PlanoEnvio
+    from agendamento_envios import AgendadorEnvios, HistoricoEngajamento
+
+    print("🗂️ BENCHMARK DO PLANO DE ENVIO")
+    print("=" * 50)
+
+    rng = random.Random(semente)
+    dominios = ['gmail.com', 'hotmail.com', 'uol.com.br'] + [f"empresa{i}.com.br" for i in range(2000)]
+
+    def empresa(i):
+        razao = f"EMPRESA {rng.choice(['ALFA', 'BETA', 'GAMA', 'DELTA'])} {i} COMERCIO E SERVICOS LTDA"
+        return i, razao, razao[8:-5], f"contato{i}@{rng.choice(dominios)}", rng.randint(1, 3)
+
+    # Custo antigo: cada item carregava a linha inteira do DataFrame
+    import pandas as pd
+    linhas = [empresa(i) for i in range(amostra)]
+    df = pd.DataFrame({'RazaoSocial': [l[1] for l in linhas], 'NomeFantasia': [None] * amostra,
+                       'Email1': [l[3] for l in linhas], 'Email2': [None] * amostra,
+                       'Email3': [None] * amostra, 'CNPJ': ['00.000.000/0001-00'] * amostra,
+                       'Municipio': ['SAO PAULO'] * amostra, 'UF': ['SP'] * amostra})
+    tracemalloc.start()
+    antigo = [(index, row, row['Email1'], 1) for index, row in df.iterrows()]
+    bytes_antigo = tracemalloc.get_traced_memory()[0] / amostra
+    tracemalloc.stop()
+    del antigo, df
+    print(f"Lista de pd.Series: {bytes_antigo:8,.0f} bytes/empresa "
+          f"(≈ {bytes_antigo * quantidade / 2**30:,.1f} GB para {quantidade:,})")
+
+    inicio = time.perf_counter()
+    plano = PlanoEnvio()
+    for i in range(quantidade):
+        plano.adicionar(*empresa(i))
+    t_montagem = time.perf_counter() - inicio
+    por_empresa = plano.tamanho_bytes() / quantidade
+    print(f"PlanoEnvio:         {por_empresa:8,.0f} bytes/empresa "
+          f"({plano.tamanho_bytes() / 2**20:,.0f} MB, montado em {t_montagem:.1f}s)")
+
+    inicio = time.perf_counter()
+    total = sum(1 for _ in plano)
+    t_iteracao = time.perf_counter() - inicio
+    print(f"Iteração:           {t_iteracao:6.2f}s ({total / t_iteracao:,.0f} envios/s)")
+
+    agendador = AgendadorEnvios(HistoricoEngajamento(), limites_diarios=[5, 10, 15, 25, 35, 50, 70],
+                                limite_padrao=5000)
+    inicio = time.perf_counter()
+    agendado = plano.agendar(agendador, agora=datetime(2026, 1, 5, 8))
+    t_agenda = time.perf_counter() - inicio
+    dias = sum(1 for _ in agendado.por_dia())
+    print(f"Agendamento:        {t_agenda:6.2f}s ({dias:,} dias)")
+
+    falhas = 0
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, 'plano.bin')
+        inicio = time.perf_counter()
+        agendado.salvar(caminho)
+        carregado = PlanoEnvio.carregar(caminho)
+        t_disco = time.perf_counter() - inicio
+        print(f"Salvar + carregar:  {t_disco:6.2f}s ({os.path.getsize(caminho) / 2**20:,.0f} MB em disco)")
+        if list(carregado[-1000:]) != list(agendado[-1000:]):
+            print("❌ Plano carregado difere do salvo")
+            falhas += 1
+
+    if len(agendado) != quantidade or sorted(agendado.indices) != list(range(quantidade)):
+        print("❌ Agendamento perdeu ou repetiu empresas")
+        falhas += 1
+    if por_empresa > max_bytes:
+        print(f"❌ Acima de {max_bytes} bytes por empresa")
+        falhas += 1
+    if not falhas:
+        print(f"✅ {bytes_antigo / por_empresa:.0f}x menor que a lista de linhas do pandas")
+    return 1 if falhas else 0
+
+
+def _percentis_us(tempos):
+    tempos = sorted(tempos)
+    return (tempos[len(tempos) // 2] * 1e6, tempos[min(len(tempos) - 1, int(len(tempos) * 0.99))] * 1e6)
+
+
+def benchmark_sqlite(operacoes=2000):
+    """Latência por operação: connect/close a cada chamada x pool do banco_dados"""
+    import sqlite3
+    import tempfile
+    import banco_dados
+    from armazenamento_shards import SCHEMA_ANALYTICS
+
+    print("🗄️  BENCHMARK DE ACESSO AO SQLITE")
+    print("=" * 50)
+
+    def envio(conn, i):
+        conn.execute('''
+            INSERT INTO email_campaigns (tracking_id, empresa_nome, razao_social, email_destino,
+                                         provedor_tipo, assunto, enviado_em, status_entrega)
+            VALUES (?, ?, ?, ?, ?, ?, datetime('now'), 'enviado')
+        ''', (f"id{i}", f"Empresa {i}", f"EMPRESA {i} LTDA", f"contato{i}@empresa.com.br",
+              'corporativo', 'Proposta'))
+
+    def evento(conn, i):
+        tracking_id = f"id{i}"
+        conn.execute('''
+            INSERT INTO tracking_events (tracking_id, evento_tipo, timestamp, ip_address, user_agent)
+            VALUES (?, 'abertura', datetime('now'), '127.0.0.1', 'Mozilla/5.0')
+        ''', (tracking_id,))
+        conn.execute('''
+            UPDATE email_campaigns SET aberto = 1, total_aberturas = total_aberturas + 1,
+                   primeiro_abertura = COALESCE(primeiro_abertura, datetime('now'))
+            WHERE tracking_id = ?
+        ''', (tracking_id,))
+        conn.execute("SELECT total_aberturas, provedor_tipo FROM email_campaigns WHERE tracking_id = ?",
+                     (tracking_id,)).fetchone()
+
+    def relatorio(conn, i):
+        # Últimos envios, como a tabela do dashboard
+        conn.execute('''
+            SELECT empresa_nome, email_destino, enviado_em, aberto, total_aberturas, clicou_link
+            FROM email_campaigns WHERE id <= ? ORDER BY id DESC LIMIT 50
+        ''', (i + 1,)).fetchall()
+
+    def medir(abrir, db_file):
+        resultados = {}
+        for nome, operacao, grava in (('envio', envio, True), ('evento', evento, True),
+                                      ('relatório', relatorio, False)):
+            tempos = []
+            for i in range(operacoes):
+                inicio = time.perf_counter()
+                conn = abrir(db_file)
+                operacao(conn, i)
+                if grava:
+                    conn.commit()
+                conn.close()
+                tempos.append(time.perf_counter() - inicio)
+            resultados[nome] = _percentis_us(tempos)
+        return resultados
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        bancos = {}
+        for rotulo in ('antes', 'depois'):
+            db_file = bancos[rotulo] = os.path.join(diretorio, f"{rotulo}.db")
+            conn = sqlite3.connect(db_file)
+            for ddl in SCHEMA_ANALYTICS:
+                conn.execute(ddl)
+            conn.execute("CREATE INDEX idx_tracking ON email_campaigns (tracking_id)")
+            conn.close()
+
+        antes = medir(sqlite3.connect, bancos['antes'])
+        depois = medir(banco_dados.conectar, bancos['depois'])
+        banco_dados.fechar()
+
+    print(f"{'operação':12s} {'antes p50':>10s} {'p99':>9s} {'depois p50':>11s} {'p99':>9s}  (µs)")
+    falhas = 0
+    for nome in antes:
+        (a50, a99), (d50, d99) = antes[nome], depois[nome]
+        print(f"{nome:12s} {a50:10.0f} {a99:9.0f} {d50:11.0f} {d99:9.0f}  {a50 / d50:5.1f}x")
+        if d50 >= a50:
+            print(f"❌ {nome}: o pool não ficou mais rápido")
+            falhas += 1
+    if not falhas:
+        print("✅ Pool mais rápido em todas as operações")
+    return 1 if falhas else 0
+
+
+def benchmark_envios(quantidade=5000, lote=100):
+    """Registro pendente → enviado por email: commit por operação x confirmações em lote"""
+    import sqlite3
+    import tempfile
+    import banco_dados
+    from armazenamento_shards import criar_schema
+    from registro_envios import RegistroEnvios, SQL_ENVIADOS
+
+    print("📨 BENCHMARK DE REGISTRO DE ENVIOS")
+    print("=" * 50)
+
+    falhas = 0
+    tempos = {}
+    with tempfile.TemporaryDirectory() as diretorio:
+        for rotulo, tamanho_lote in (('por envio', 1), (f'lote de {lote}', lote)):
+            db_file = os.path.join(diretorio, f"envios_{tamanho_lote}.db")
+            criar_schema(db_file)
+            registro = RegistroEnvios(db_file, intervalo_descarga=3600, tamanho_lote=tamanho_lote)
+            # Outra conexão (o servidor de tracking) vê a linha pendente antes do "SMTP"
+            leitor = sqlite3.connect(db_file)
+            invisiveis = 0
+            inicio = time.perf_counter()
+            for i in range(quantidade):
+                tracking_id = f"id{i:08d}"
+                registro.pendente(tracking_id, f"Empresa {i}", f"EMPRESA {i} LTDA", f"contato{i}@empresa.com.br",
+                                  'corporativo', 'Proposta')
+                if i % 500 == 0 and not leitor.execute(
+                        "SELECT 1 FROM email_campaigns WHERE tracking_id = ?", (tracking_id,)).fetchone():
+                    invisiveis += 1
+                # 1 em 20 falha no SMTP
+                if i % 20:
+                    registro.confirmar(tracking_id)
+                else:
+                    registro.falhar(tracking_id)
+            registro.descarregar()
+            tempos[rotulo] = time.perf_counter() - inicio
+            leitor.close()
+            print(f"{rotulo:14s} {tempos[rotulo]:6.2f}s ({quantidade / tempos[rotulo]:,.0f} envios/s)")
+            if invisiveis:
+                print(f"❌ {rotulo}: {invisiveis} linhas pendentes ainda não gravadas ao voltar de pendente()")
+                falhas += 1
+
+            conn = sqlite3.connect(db_file)
+            enviados = conn.execute(f"SELECT COUNT(*) FROM email_campaigns WHERE {SQL_ENVIADOS}").fetchone()[0]
+            total = conn.execute("SELECT COUNT(*) FROM email_campaigns").fetchone()[0]
+            conn.close()
+            banco_dados.fechar(db_file)
+            esperados = quantidade - (quantidade + 19) // 20
+            if total != quantidade or enviados != esperados:
+                print(f"❌ {rotulo}: {total} linhas / {enviados} enviados (esperado {quantidade} / {esperados})")
+                falhas += 1
+
+    por_envio, em_lote = tempos.values()
+    if em_lote >= por_envio:
+        print("❌ Gravação em lote não ficou mais rápida")
+        falhas += 1
+    if not falhas:
+        print(f"✅ Pendentes gravados antes do SMTP, falhas fora dos enviados e "
+              f"{por_envio / em_lote:.1f}x mais rápido com as confirmações em lote")
+    return 1 if falhas else 0
+
+
+class _CaixaIMAPLocal:
+    """
+    Servidor IMAP mínimo em memória (uma caixa INBOX) para os benchmarks
+
+    Entende o suficiente para o imaplib: CAPABILITY, LOGIN, SELECT, SEARCH,
+    FETCH (RFC822), UID SEARCH/FETCH (HEADER.FIELDS e BODY.PEEK[TEXT]<0.N>),
+    IDLE/DONE, NOOP, CLOSE e LOGOUT. Conta os bytes enviados aos clientes.
+    """
+
+    def __init__(self):
+        import socket
+        import socketserver
+        import threading
+
+        self.mensagens = []
+        self.bytes_enviados = 0
+        self._lock = threading.Lock()
+        self._em_idle = set()
+        caixa = self
+
+        class Sessao(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def handle(self):
+                self.escrita = threading.Lock()
+                self.escrever(b'* OK servidor IMAP local\r\n')
+                while True:
+                    linha = self.rfile.readline()
+                    if not linha:
+                        return
+                    partes = linha.rstrip(b'\r\n').split(b' ', 2)
+                    tag, comando = partes[0], partes[1].upper() if len(partes) > 1 else b''
+                    resto = partes[2] if len(partes) > 2 else b''
+                    if comando == b'UID':
+                        comando, _, resto = resto.partition(b' ')
+                        comando = b'UID ' + comando.upper()
+                    if not caixa._comando(self, tag, comando, resto):
+                        return
+
+            def escrever(self, dados):
+                with self.escrita:
+                    self.wfile.write(dados)
+                with caixa._lock:
+                    caixa.bytes_enviados += len(dados)
+
+        class Servidor(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.servidor = Servidor(('127.0.0.1', 0), Sessao)
+        self.porta = self.servidor.server_address[1]
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def adicionar(self, dados):
+        with self._lock:
+            self.mensagens.append(dados)
+            total = len(self.mensagens)
+            ociosas = list(self._em_idle)
+        for sessao in ociosas:
+            sessao.escrever(f'* {total} EXISTS\r\n'.encode())
+
+    def em_idle(self):
+        with self._lock:
+            return bool(self._em_idle)
+
+    def fechar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def _comando(self, sessao, tag, comando, resto):
+        ok = tag + b' OK concluido\r\n'
+        with self._lock:
+            mensagens = list(self.mensagens)
+        if comando == b'CAPABILITY':
+            sessao.escrever(b'* CAPABILITY IMAP4rev1 IDLE\r\n' + ok)
+        elif comando in (b'LOGIN', b'NOOP', b'CLOSE'):
+            sessao.escrever(ok)
+        elif comando == b'SELECT':
+            sessao.escrever(f'* {len(mensagens)} EXISTS\r\n* OK [UIDVALIDITY 1]\r\n'
+                            f'* OK [UIDNEXT {len(mensagens) + 1}]\r\n'.encode() + ok)
+        elif comando in (b'SEARCH', b'UID SEARCH'):
+            # UID = posição na caixa (nada é apagado); SINCE devolve tudo (tudo é da última semana)
+            uids = list(range(1, len(mensagens) + 1))
+            intervalo = re.search(rb'UID (\d+):\*', resto)
+            if intervalo:
+                uids = [u for u in uids if u >= int(intervalo.group(1))] or uids[-1:]
+            sessao.escrever(b'* SEARCH ' + b' '.join(b'%d' % u for u in uids) + b'\r\n' + ok)
+        elif comando in (b'FETCH', b'UID FETCH'):
+            conjunto, _, itens = resto.partition(b' ')
+            for uid in (int(u) for u in conjunto.split(b',')):
+                dados = mensagens[uid - 1]
+                cabecalho, _, corpo = dados.partition(b'\r\n\r\n')
+                literais = []
+                if b'HEADER.FIELDS' in itens.upper():
+                    campos = re.search(rb'\(([^()]*)\)\]', itens).group(1).lower().split()
+                    literais.append((b'BODY[HEADER.FIELDS (' + b' '.join(campos).upper() + b')]',
+                                     b''.join(c + b'\r\n' for c in cabecalho.split(b'\r\n')
+                                              if c.split(b':', 1)[0].lower() in campos) + b'\r\n'))
+                parcial = re.search(rb'BODY\.PEEK\[TEXT\]<0\.(\d+)>', itens, re.I)
+                if parcial:
+                    literais.append((b'BODY[TEXT]<0>', corpo[:int(parcial.group(1))]))
+                if not literais:
+                    literais.append((b'RFC822', dados))
+                resposta = b'* %d FETCH (UID %d' % (uid, uid)
+                for nome, literal in literais:
+                    resposta += b' %s {%d}\r\n' % (nome, len(literal)) + literal
+                sessao.escrever(resposta + b')\r\n')
+            sessao.escrever(ok)
+        elif comando == b'IDLE':
+            sessao.escrever(b'+ idling\r\n')
+            with self._lock:
+                self._em_idle.add(sessao)
+            sessao.rfile.readline()   # DONE
+            with self._lock:
+                self._em_idle.discard(sessao)
+            sessao.escrever(ok)
+        elif comando == b'LOGOUT':
+            sessao.escrever(b'* BYE\r\n' + ok)
+            return False
+        else:
+            sessao.escrever(tag + b' BAD comando desconhecido\r\n')
+        return True
+
+
+def _mensagem_imap(i, tamanho_corpo, tracking_id=None, remetente=None):
+    """Email de teste; com tracking_id é uma resposta citando o Message-ID do envio"""
+    cabecalhos = [
+        f"From: Contato {i} <{remetente or f'pessoa{i}@externo.com.br'}>",
+        "To: vendas@empresa.com.br",
+        f"Subject: {'Re: Proposta' if tracking_id else f'Assunto {i}'}",
+        "Date: " + time.strftime('%a, %d %b %Y %H:%M:%S -0300'),
+        f"Message-ID: <m{i}@externo.com.br>",
+    ]
+    if tracking_id:
+        cabecalhos += [f"In-Reply-To: <{tracking_id}@track.automated-lead-generator.com>",
+                       f"References: <{tracking_id}@track.automated-lead-generator.com>"]
+    return ('\r\n'.join(cabecalhos) + '\r\n\r\n' + 'x' * tamanho_corpo + '\r\n').encode()
+
+
+def benchmark_respostas(mensagens=2000, respostas=20, budget_s=2.0, tamanho_corpo=8000):
+    """Respostas: varredura da semana a cada checagem x IMAP IDLE + sincronização incremental"""
+    import email
+    import imaplib
+    import sqlite3
+    import tempfile
+    import threading
+    import banco_dados
+    from armazenamento_shards import criar_schema
+    from escuta_respostas import EscutaRespostas, SincronizacaoRespostas
+
+    print("📬 BENCHMARK DE DETECÇÃO DE RESPOSTAS (IMAP local)")
+    print("=" * 50)
+
+    falhas = 0
+    with tempfile.TemporaryDirectory() as diretorio:
+        db_file = os.path.join(diretorio, 'analytics.db')
+        criar_schema(db_file)
+        conn = sqlite3.connect(db_file)
+        conn.executemany("""
+            INSERT INTO email_campaigns (tracking_id, email_destino, enviado_em, status_entrega)
+            VALUES (?, ?, datetime('now'), 'enviado')
+        """, [(f"t{i:06d}", f"lead{i}@cliente.com.br") for i in range(respostas)])
+        conn.commit()
+        conn.close()
+
+        # Antes: uma checagem por resposta, cada uma com SEARCH da semana + RFC822 de tudo
+        caixa = _CaixaIMAPLocal()
+        for i in range(mensagens):
+            caixa.adicionar(_mensagem_imap(i, tamanho_corpo))
+        inicio = time.perf_counter()
+        cpu = time.process_time()
+        for _ in range(respostas):
+            imap = imaplib.IMAP4('127.0.0.1', caixa.porta)
+            imap.login('usuario', 'senha')
+            imap.select('INBOX')
+            _, ids = imap.search(None, '(SINCE "01-Jan-2000")')
+            for msg_id in ids[0].split():
+                _, dados = imap.fetch(msg_id, '(RFC822)')
+                email.message_from_bytes(dados[0][1])['From']
+            imap.logout()
+        t_antes, cpu_antes, bytes_antes = time.perf_counter() - inicio, time.process_time() - cpu, caixa.bytes_enviados
+        caixa.fechar()
+        print(f"Varredura x{respostas}:   {t_antes:6.2f}s  CPU {cpu_antes:6.2f}s  {bytes_antes / 1e6:8.1f} MB")
+
+        # Depois: uma sincronização inicial e IDLE; cada resposta chega com a sessão aberta
+        caixa = _CaixaIMAPLocal()
+        for i in range(mensagens):
+            caixa.adicionar(_mensagem_imap(i, tamanho_corpo))
+
+        def conectar():
+            imap = imaplib.IMAP4('127.0.0.1', caixa.porta)
+            imap.login('usuario', 'senha')
+            return imap
+
+        escuta = EscutaRespostas(conectar, SincronizacaoRespostas(db_file, 'track.automated-lead-generator.com'))
+        inicio = time.perf_counter()
+        cpu = time.process_time()
+        linha = threading.Thread(target=escuta.executar, daemon=True)
+        linha.start()
+        latencias = []
+        conn = sqlite3.connect(db_file)
+        try:
+            while not caixa.em_idle():
+                time.sleep(0.01)
+            for i in range(respostas):
+                tracking_id = f"t{i:06d}"
+                chegada = time.perf_counter()
+                caixa.adicionar(_mensagem_imap(mensagens + i, tamanho_corpo, tracking_id, f"lead{i}@cliente.com.br"))
+                while not conn.execute("SELECT respondeu FROM email_campaigns WHERE tracking_id = ?",
+                                       (tracking_id,)).fetchone()[0]:
+                    if time.perf_counter() - chegada > budget_s * 5:
+                        break
+                    time.sleep(0.005)
+                latencias.append(time.perf_counter() - chegada)
+        finally:
+            conn.close()
+            escuta.interromper()
+            linha.join(5)
+        t_depois, cpu_depois, bytes_depois = time.perf_counter() - inicio, time.process_time() - cpu, caixa.bytes_enviados
+        caixa.fechar()
+        banco_dados.fechar(db_file)
+        print(f"IDLE + incremental:  {t_depois:6.2f}s  CPU {cpu_depois:6.2f}s  {bytes_depois / 1e6:8.1f} MB")
+        print(f"Latência resposta → respondeu=1: p50 {statistics.median(latencias) * 1000:.0f} ms, "
+              f"máx {max(latencias) * 1000:.0f} ms")
+
+        conn = sqlite3.connect(db_file)
+        marcadas = conn.execute("SELECT COUNT(*) FROM email_campaigns WHERE respondeu = 1").fetchone()[0]
+        conn.close()
+
+    if marcadas != respostas:
+        print(f"❌ {marcadas} de {respostas} respostas registradas")
+        falhas += 1
+    if max(latencias) > budget_s:
+        print(f"❌ Latência acima de {budget_s:.1f}s")
+        falhas += 1
+    if bytes_depois >= bytes_antes or cpu_depois >= cpu_antes:
+        print("❌ Escuta não usou menos banda e CPU que as varreduras")
+        falhas += 1
+    if not falhas:
+        print(f"✅ Respostas em segundos com {bytes_antes / bytes_depois:.0f}x menos banda "
+              f"e {cpu_antes / cpu_depois:.0f}x menos CPU")
+    return 1 if falhas else 0
+
+
+def _resposta_classificada(i, classe):
+    """Resposta de teste com o texto típico da classe, variando codificação e estrutura"""
+    import base64
+    import quopri
+
+    textos = {
+        'remover': "REMOVER",
+        'ausente': "Estou fora do escritório até o dia 20, com acesso limitado ao email.",
+        'automatica': "Recebemos sua mensagem. Este é um aviso gerado automaticamente.",
+        'sem_interesse': "Obrigado, mas no momento não temos interesse na proposta.",
+        'interesse': "Olá! Tenho interesse, podemos marcar uma conversa na próxima semana?",
+        'outra': "Quem é o responsável por esse contato? Não encontrei o site de vocês.",
+    }
+    # O rodapé citado traz o "responda REMOVER" do nosso email: não pode virar descadastro
+    citacao = ("\r\n\r\nEm seg., 3 de jun. de 2024 às 10:00, Vendas <vendas@empresa.com.br> escreveu:\r\n"
+               "> Olá, temos uma proposta para sua empresa.\r\n"
+               "> Caso não queira mais receber, responda REMOVER.\r\n" + "> texto citado\r\n" * 40)
+    texto = textos[classe] + "\r\n\r\nAtenciosamente,\r\nContato " + str(i) + citacao
+    cabecalhos = [f"From: Contato {i} <pessoa{i}@cliente.com.br>", "Subject: Re: Proposta",
+                  "MIME-Version: 1.0"]
+    if classe == 'ausente':
+        # Metade sem cabeçalho de auto-resposta: o texto basta
+        cabecalhos[1] = "Subject: =?utf-8?q?Ausente=3A?= Re: Proposta"
+        if i % 2:
+            cabecalhos.append("Auto-Submitted: auto-replied")
+    elif classe == 'automatica':
+        cabecalhos.append(["Auto-Submitted: auto-replied", "X-Autoreply: yes", "Precedence: auto_reply"][i % 3])
+
+    variante = i % 4
+    if variante == 0:
+        corpo = texto.encode('utf-8')
+        cabecalhos += ["Content-Type: text/plain; charset=utf-8", "Content-Transfer-Encoding: 8bit"]
+    elif variante == 1:
+        corpo = quopri.encodestring(texto.encode('utf-8'))
+        cabecalhos += ["Content-Type: text/plain; charset=utf-8", "Content-Transfer-Encoding: quoted-printable"]
+    elif variante == 2:
+        corpo = base64.encodebytes(texto.encode('utf-8')).replace(b'\n', b'\r\n')
+        cabecalhos += ["Content-Type: text/plain; charset=utf-8", "Content-Transfer-Encoding: base64"]
+    else:
+        html = "<html><body><p>" + texto.replace("\r\n", "<br>") + "</p></body></html>"
+        corpo = (b"--lim\r\nContent-Type: text/plain; charset=utf-8\r\nContent-Transfer-Encoding: base64\r\n\r\n"
+                 + base64.encodebytes(texto.encode('utf-8')).replace(b'\n', b'\r\n')
+                 + b"\r\n--lim\r\nContent-Type: text/html; charset=utf-8\r\nContent-Transfer-Encoding: 8bit\r\n\r\n"
+                 + html.encode('utf-8') + b"\r\n--lim--\r\n")
+        cabecalhos.append('Content-Type: multipart/alternative; boundary="lim"')
+    return ('\r\n'.join(cabecalhos) + '\r\n\r\n').encode() + corpo
+
+
+def benchmark_classificacao(quantidade=20000, minimo=2000):
+    """Classificação de respostas (cabeçalhos + primeiro KB) e gravação da classe"""
+    import sqlite3
+    import tempfile
+    import banco_dados
+    from armazenamento_shards import criar_schema
+    from classificacao_respostas import LIMITE_CORPO, ClassificadorRespostas
+    from escuta_respostas import SincronizacaoRespostas
+
+    print("🏷️ BENCHMARK DE CLASSIFICAÇÃO DE RESPOSTAS")
+    print("=" * 50)
+
+    classes = ['remover', 'ausente', 'automatica', 'sem_interesse', 'interesse', 'outra']
+    esperadas = [classes[i % len(classes)] for i in range(quantidade)]
+    mensagens = []
+    for i, classe in enumerate(esperadas):
+        # Como chega do IMAP: cabeçalhos inteiros + só o começo do corpo
+        cabecalho, _, corpo = _resposta_classificada(i, classe).partition(b'\r\n\r\n')
+        mensagens.append(cabecalho + b'\r\n\r\n' + corpo[:LIMITE_CORPO])
+
+    classificador = ClassificadorRespostas()
+    inicio = time.perf_counter()
+    obtidas = classificador.classificar_lote(mensagens)
+    tempo = time.perf_counter() - inicio
+    taxa = quantidade / tempo
+    erros = [(esperada, obtida) for esperada, obtida in zip(esperadas, obtidas) if esperada != obtida]
+    print(f"Classificação: {quantidade} mensagens em {tempo:.2f}s ({taxa:,.0f} msgs/s), {len(erros)} erros")
+
+    falhas = 0
+    with tempfile.TemporaryDirectory() as diretorio:
+        db_file = os.path.join(diretorio, 'analytics.db')
+        criar_schema(db_file)
+        conn = sqlite3.connect(db_file)
+        conn.executemany("""
+            INSERT INTO email_campaigns (tracking_id, email_destino, enviado_em, status_entrega)
+            VALUES (?, ?, datetime('now'), 'enviado')
+        """, [(f"t{i:06d}", f"pessoa{i}@cliente.com.br") for i in range(quantidade)])
+        conn.commit()
+        conn.close()
+
+        sincronizacao = SincronizacaoRespostas(db_file, 'track.automated-lead-generator.com')
+        inicio = time.perf_counter()
+        gravadas = sincronizacao._gravar([([f"t{i:06d}"], f"pessoa{i}@cliente.com.br", None, classe)
+                                          for i, classe in enumerate(obtidas)])
+        tempo_gravacao = time.perf_counter() - inicio
+        banco_dados.fechar(db_file)
+        print(f"Gravação:      {gravadas} classes em {tempo_gravacao:.2f}s")
+
+        conn = sqlite3.connect(db_file)
+        por_classe = dict(conn.execute("SELECT classe_resposta, COUNT(*) FROM email_campaigns GROUP BY 1"))
+        respondidas = conn.execute("SELECT COUNT(*) FROM email_campaigns WHERE respondeu = 1").fetchone()[0]
+        suprimidos = conn.execute("SELECT COUNT(*) FROM supressao WHERE motivo = 'descadastro'").fetchone()[0]
+        conn.close()
+
+    if erros:
+        print(f"❌ {len(erros)} classificações erradas, ex.: esperada {erros[0][0]}, obtida {erros[0][1]}")
+        falhas += 1
+    if taxa < minimo:
+        print(f"❌ Abaixo de {minimo:,} msgs/s")
+        falhas += 1
+    humanas = sum(1 for classe in esperadas if classe not in ('ausente', 'automatica'))
+    if gravadas != quantidade or por_classe.get(None) or respondidas != humanas \
+            or suprimidos != esperadas.count('remover'):
+        print(f"❌ Gravação inconsistente: {por_classe}, {respondidas} respondidas, {suprimidos} suprimidos")
+        falhas += 1
+    if not falhas:
+        print(f"✅ {taxa:,.0f} msgs/s sem erros; {suprimidos} pedidos de REMOVER foram para a supressão")
+    return 1 if falhas else 0
+
+
+def benchmark_arquivamento(quantidade=500000, dias_retencao=90, meses=12):
+    """Arquivamento de tracking_events: tamanho do banco e consultas antes/depois, totais preservados"""
+    import random
+    import sqlite3
+    import tempfile
+    from datetime import datetime, timedelta
+    import banco_dados
+    from armazenamento_shards import ArmazenamentoShards, criar_schema
+    from arquivamento_eventos import ArquivoEventos
+    from dashboard_ao_vivo import ContadoresEventos
+    from exportacao_streaming import ExportadorStreaming
+
+    print("🗄️ BENCHMARK DE ARQUIVAMENTO DE EVENTOS")
+    print("=" * 50)
+
+    agora = datetime.now()
+    aleatorio = random.Random(7)
+    agentes = ["Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0",
+               "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148",
+               "Mozilla/5.0 (Windows NT 5.1; rv:11.0) Gecko Firefox/11.0 (via ggpht.com GoogleImageProxy)"]
+    falhas = 0
+    with tempfile.TemporaryDirectory() as diretorio:
+        db_file = os.path.join(diretorio, 'email_analytics.db')
+        criar_schema(db_file)
+        conn = sqlite3.connect(db_file)
+        envios = max(1, quantidade // 10)
+        conn.executemany("""
+            INSERT INTO email_campaigns (tracking_id, email_destino, enviado_em, status_entrega, campanha)
+            VALUES (?, ?, ?, 'enviado', ?)
+        """, [(f"t{i:07d}", f"lead{i}@cliente.com.br", agora, [None, 'Proposta Março', 'Reativação'][i % 3])
+              for i in range(envios)])
+        # Eventos em ordem cronológica, espalhados pelos últimos meses
+        inicio = agora - timedelta(days=30 * meses)
+        passo = (agora - inicio) / quantidade
+        conn.executemany("""
+            INSERT INTO tracking_events (tracking_id, evento_tipo, timestamp, ip_address, user_agent,
+                                         dados_extras, classificacao)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, ((f"t{aleatorio.randrange(envios):07d}", 'clique' if i % 5 == 0 else 'abertura', inicio + passo * i,
+               f"177.{i % 256}.{i // 256 % 256}.{i % 97}", agentes[i % 3],
+               'https://linkedin.com/company/exemplo' if i % 5 == 0 else None,
+               'proxy' if i % 3 == 2 else 'humano')
+              for i in range(quantidade)))
+        conn.commit()
+        conn.close()
+
+        def medir():
+            """(bytes do banco, ms da contagem do dashboard, ms de uma consulta da última semana)"""
+            banco_dados.fechar(db_file)
+            tamanho = os.path.getsize(db_file)
+            inicio_medida = time.perf_counter()
+            contadores = ContadoresEventos()
+            contadores.carregar_do_banco(db_file)
+            t_contagem = (time.perf_counter() - inicio_medida) * 1000
+            conn = banco_dados.conectar(db_file)
+            try:
+                inicio_medida = time.perf_counter()
+                conn.execute("""
+                    SELECT evento_tipo, COUNT(DISTINCT tracking_id) FROM tracking_events
+                    WHERE timestamp >= ? GROUP BY evento_tipo
+                """, (agora - timedelta(days=7),)).fetchall()
+                t_semana = (time.perf_counter() - inicio_medida) * 1000
+            finally:
+                conn.close()
+            return tamanho, t_contagem, t_semana, contadores.totais
+
+        sql_total = "SELECT evento_tipo, classificacao, COUNT(*) FROM tracking_events_todas GROUP BY 1, 2 ORDER BY 1, 2"
+        shards = ArmazenamentoShards(os.path.join(diretorio, 'shards'), db_legado=db_file)
+        _, eventos_antes = shards.consultar(sql_total)
+        tamanho_antes, contagem_antes, semana_antes, totais_antes = medir()
+        print(f"Antes:  banco {tamanho_antes / 1e6:7.1f} MB  contagem {contagem_antes:7.1f} ms  "
+              f"última semana {semana_antes:6.1f} ms")
+
+        arquivo = ArquivoEventos(os.path.join(diretorio, 'arquivo_eventos'), dias_retencao)
+        inicio_medida = time.perf_counter()
+        totais = arquivo.arquivar([('legado', db_file)], agora=agora)
+        t_arquivar = time.perf_counter() - inicio_medida
+        tamanho_parquet = sum(os.path.getsize(caminho) for caminho, *_ in arquivo.manifesto(db_file))
+        print(f"Arquivamento: {totais['eventos']:,} eventos em {totais['arquivos']} Parquet "
+              f"({tamanho_parquet / 1e6:.1f} MB) em {t_arquivar:.1f}s")
+
+        tamanho_depois, contagem_depois, semana_depois, totais_depois = medir()
+        print(f"Depois: banco {tamanho_depois / 1e6:7.1f} MB  contagem {contagem_depois:7.1f} ms  "
+              f"última semana {semana_depois:6.1f} ms")
+
+        # Sob demanda: os brutos arquivados voltam na visão e na exportação
+        inicio_medida = time.perf_counter()
+        _, eventos_depois = shards.consultar(sql_total, arquivados=arquivo)
+        t_sob_demanda = time.perf_counter() - inicio_medida
+        exportados = ExportadorStreaming(db_file, arquivo_eventos=arquivo).exportar_csv(
+            os.path.join(diretorio, 'export'))['tracking_events']
+        print(f"Consulta incluindo arquivados: {t_sob_demanda:.1f}s; exportação CSV: {exportados:,} eventos")
+        banco_dados.fechar(db_file)
+
+        # Segunda execução não arquiva nada de novo nem duplica
+        if arquivo.arquivar([('legado', db_file)], agora=agora)['eventos']:
+            print("❌ Segunda execução arquivou eventos de novo")
+            falhas += 1
+        banco_dados.fechar(db_file)
+
+    esperados = sum(1 for i in range(quantidade)
+                    if inicio + passo * i < agora - timedelta(days=dias_retencao))
+    if totais['eventos'] != esperados:
+        print(f"❌ {totais['eventos']:,} eventos arquivados, esperados {esperados:,}")
+        falhas += 1
+    if totais_depois != totais_antes:
+        print(f"❌ Contadores do dashboard mudaram: {totais_antes} → {totais_depois}")
+        falhas += 1
+    if eventos_depois != eventos_antes or exportados != quantidade:
+        print(f"❌ Eventos brutos perdidos: {eventos_antes} → {eventos_depois}, {exportados:,} exportados")
+        falhas += 1
+    if tamanho_depois > tamanho_antes * 0.5 or tamanho_parquet >= tamanho_antes - tamanho_depois:
+        print("❌ Banco não encolheu ou o Parquet ocupa mais que as linhas removidas")
+        falhas += 1
+    if not falhas:
+        print(f"✅ Banco {tamanho_antes / tamanho_depois:.1f}x menor, contagem {contagem_antes / contagem_depois:.1f}x "
+              f"mais rápida, Parquet {(tamanho_antes - tamanho_depois) / tamanho_parquet:.1f}x menor que as linhas; "
+              f"totais idênticos")
+    return 1 if falhas else 0
+
+
+def benchmark_enriquecimento(quantidade=300000, faixas=200000, minimo=100000):
+    """Dispositivo (user agent) e localização (GeoIP compacto em mmap) das aberturas"""
+    import ipaddress
+    import random
+    import sqlite3
+    import tempfile
+    from datetime import datetime
+    import banco_dados
+    from armazenamento_shards import criar_schema
+    from enriquecimento_eventos import EnriquecedorEventos, GeoIPCompacto, compilar_geoip
+
+    print("📱 BENCHMARK DE ENRIQUECIMENTO DE ABERTURAS")
+    print("=" * 50)
+
+    agentes = {
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+        "Mobile/15E148": "mobile · iOS · Apple Mail",
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko)":
+            "desktop · macOS · Apple Mail",
+        "Mozilla/4.0 (compatible; ms-office; MSOffice 16) Windows NT 10.0": "desktop · Windows · Outlook",
+        "Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) Gmail Mobile":
+            "mobile · Android · Gmail",
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 "
+        "Safari/537.36": "desktop · Windows · Chrome",
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 "
+        "Safari/537.36 Edg/120.0": "desktop · Windows · Edge",
+        "Mozilla/5.0 (iPad; CPU OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 "
+        "Mobile/15E148 Safari/604.1": "tablet · iOS · Safari",
+        "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Thunderbird/115.6":
+            "desktop · Linux · Thunderbird",
+    }
+    lista_agentes = list(agentes)
+    cidades = [("São Paulo", "SP"), ("Rio de Janeiro", "RJ"), ("Belo Horizonte", "MG"), ("Recife", "PE"),
+               ("Curitiba", "PR"), ("Porto Alegre", "RS"), ("Salvador", "BA"), ("Fortaleza", "CE")]
+    aleatorio = random.Random(47)
+
+    falhas = 0
+    with tempfile.TemporaryDirectory() as diretorio:
+        # Faixas IPv4 contíguas de tamanho variável (com buracos) + algumas IPv6, como no CSV da DB-IP
+        csv_path = os.path.join(diretorio, 'dbip-city-lite.csv')
+        esperado = []
+        inicio = 16777216
+        with open(csv_path, 'w', encoding='utf-8') as f:
+            for i in range(faixas):
+                fim = inicio + aleatorio.randrange(256, 20000)
+                cidade, estado = cidades[i % len(cidades)]
+                if i % 50:
+                    f.write(f'{ipaddress.IPv4Address(inicio)},{ipaddress.IPv4Address(fim)},SA,BR,'
+                            f'"{estado}","{cidade}",0,0\n')
+                    esperado.append((inicio, fim, f"{cidade}, {estado}, BR"))
+                inicio = fim + 1
+            for i in range(1000):
+                f.write(f'2804:{i:x}::,2804:{i:x}:ffff:ffff:ffff:ffff:ffff:ffff,SA,BR,"SP","Campinas",0,0\n')
+
+        geoip_file = os.path.join(diretorio, 'geoip.bin')
+        inicio_medida = time.perf_counter()
+        gravadas = compilar_geoip(csv_path, geoip_file)
+        t_compilar = time.perf_counter() - inicio_medida
+        print(f"Compilação: {gravadas:,} faixas em {t_compilar:.1f}s "
+              f"({os.path.getsize(geoip_file) / 1e6:.1f} MB, {os.path.getsize(csv_path) / 1e6:.1f} MB de CSV)")
+
+        # Aberturas: IPs quase todos distintos (pior caso do LRU de IPs), user agents repetidos;
+        # cada envio aberto três vezes em média, como nos relatórios reais
+        envios = max(1, quantidade // 3)
+        eventos = []
+        for i in range(quantidade):
+            if i % 10 == 9:
+                ip, local = f"2804:{aleatorio.randrange(1000):x}::{i >> 16:x}:{i & 0xffff:x}", "Campinas, SP, BR"
+            else:
+                faixa_ini, faixa_fim, local = esperado[aleatorio.randrange(len(esperado))]
+                ip = str(ipaddress.IPv4Address(aleatorio.randint(faixa_ini, faixa_fim)))
+            eventos.append((f"t{i % envios:07d}", ip, lista_agentes[i % len(lista_agentes)], local))
+
+        enriquecedor = EnriquecedorEventos(GeoIPCompacto(geoip_file))
+        inicio_medida = time.perf_counter()
+        obtidos = [enriquecedor.enriquecer(ip, agente) for _, ip, agente, _ in eventos]
+        t_inline = time.perf_counter() - inicio_medida
+        taxa_inline = quantidade / t_inline
+        erros = [(evento, obtido) for evento, obtido in zip(eventos, obtidos)
+                 if obtido != (agentes[evento[2]], evento[3])]
+        print(f"Inline:   {quantidade:,} aberturas em {t_inline:.2f}s ({taxa_inline:,.0f}/s), {len(erros)} erros")
+
+        # IP fora de qualquer faixa (buraco, privado) não inventa local
+        if enriquecedor.localizacao('250.0.0.1') or enriquecedor.localizacao('lixo'):
+            print("❌ IP fora das faixas recebeu localização")
+            falhas += 1
+
+        # Backfill sobre um banco com as aberturas já gravadas e envios sem enriquecimento
+        db_file = os.path.join(diretorio, 'email_analytics.db')
+        criar_schema(db_file)
+        conn = sqlite3.connect(db_file)
+        agora = datetime.now()
+        conn.executemany("""
+            INSERT INTO email_campaigns (tracking_id, email_destino, enviado_em, status_entrega, aberto)
+            VALUES (?, ?, ?, 'enviado', 1)
+        """, [(tracking_id, f"lead{i}@cliente.com.br", agora) for i, (tracking_id, *_) in enumerate(eventos[:envios])])
+        conn.executemany("""
+            INSERT INTO tracking_events (tracking_id, evento_tipo, timestamp, ip_address, user_agent, classificacao)
+            VALUES (?, 'abertura', ?, ?, ?, 'humano')
+        """, [(tracking_id, agora, ip, agente) for tracking_id, ip, agente, _ in eventos])
+        conn.commit()
+        conn.close()
+
+        backfill = EnriquecedorEventos(GeoIPCompacto(geoip_file))
+        inicio_medida = time.perf_counter()
+        lidos, atualizados = backfill.backfill(db_file)
+        t_backfill = time.perf_counter() - inicio_medida
+        taxa_backfill = atualizados / t_backfill
+        print(f"Backfill: {lidos:,} aberturas lidas, {atualizados:,} envios em {t_backfill:.2f}s "
+              f"({taxa_backfill:,.0f} envios/s)")
+        segunda = backfill.backfill(db_file)
+        banco_dados.fechar(db_file)
+
+        conn = sqlite3.connect(db_file)
+        gravados = dict(((tracking_id, (dispositivo, local)) for tracking_id, dispositivo, local in conn.execute(
+            "SELECT tracking_id, dispositivo_abertura, localizacao_abertura FROM email_campaigns")))
+        conn.close()
+
+    if erros:
+        (_, ip, agente, local), obtido = erros[0]
+        print(f"❌ {len(erros)} erros, ex.: {ip} / {agente[:40]} → {obtido}, esperado "
+              f"({agentes[agente]!r}, {local!r})")
+        falhas += 1
+    # Vale a primeira abertura de cada envio
+    if atualizados != envios or segunda != (0, 0) or any(
+            gravados[tracking_id] != (agentes[agente], local) for tracking_id, _, agente, local in eventos[:envios]):
+        print(f"❌ Backfill inconsistente: {atualizados:,} atualizados, segunda execução {segunda}")
+        falhas += 1
+    # No backfill cada envio é um UPDATE gravado: metade da vazão do inline basta
+    if taxa_inline < minimo or taxa_backfill < minimo / 2:
+        print(f"❌ Abaixo de {minimo:,} aberturas/s inline ou {minimo // 2:,} envios/s no backfill")
+        falhas += 1
+    if not falhas:
+        print(f"✅ {taxa_inline:,.0f} aberturas/s inline e {taxa_backfill:,.0f} envios/s no backfill, "
+              f"sem rede e sem erros")
+    return 1 if falhas else 0
+
+
+def benchmark_funil(envios=1000000, eventos=10000000, budget_ms=1000):
+    """Funil/coortes vetorizados: extração dos bancos e consultas sobre 10M de eventos"""
+    import sqlite3
+    import tempfile
+    import banco_dados
+    from armazenamento_shards import criar_schema
+    from funil_coortes import TEMPOS, FunilCoortes
+
+    print("🔻 BENCHMARK DE FUNIL E COORTES")
+    print("=" * 50)
+
+    falhas = 0
+    with tempfile.TemporaryDirectory() as diretorio:
+        db_file = os.path.join(diretorio, 'email_analytics.db')
+        criar_schema(db_file)
+        conn = sqlite3.connect(db_file)
+        inicio = time.perf_counter()
+        # Gerado no próprio SQLite (CTE recursiva): 60 dias de envios, ~35% abertos, parte dos
+        # cliques sem o pixel carregado, 3% de respostas e 1% de falhas de SMTP
+        conn.execute('''
+            WITH RECURSIVE n(k) AS (SELECT 0 UNION ALL SELECT k + 1 FROM n WHERE k + 1 < ?),
+            envio AS (SELECT k, (k * 2654435761) % 1000 AS h, 1704067200 + k * (5184000 / ?) AS t FROM n)
+            INSERT INTO email_campaigns (tracking_id, provedor_tipo, assunto, modelo_assunto, prioridade_email,
+                                         enviado_em, status_entrega, aberto, primeiro_abertura, clicou_link,
+                                         primeiro_clique, respondeu, data_resposta)
+            SELECT printf('t%08d', k),
+                   CASE k % 5 WHEN 0 THEN 'gmail' WHEN 1 THEN 'outlook' WHEN 2 THEN 'yahoo'
+                              WHEN 3 THEN 'corporativo' ELSE 'outros' END,
+                   printf('Proposta para Empresa %d', k), printf('Modelo %d para {empresa}', k % 7), 1 + k % 3,
+                   datetime(t, 'unixepoch'), CASE WHEN k % 100 = 99 THEN 'falhou' ELSE 'enviado' END,
+                   h BETWEEN 10 AND 349, CASE WHEN h BETWEEN 10 AND 349 THEN datetime(t + (k * 97) % 172800, 'unixepoch') END,
+                   h < 80, CASE WHEN h < 80 THEN datetime(t + 600 + (k * 31) % 259200, 'unixepoch') END,
+                   h % 37 = 0, CASE WHEN h % 37 = 0 THEN datetime(t + 3600 + (k * 13) % 604800, 'unixepoch') END
+            FROM envio
+        ''', (envios, envios))
+        conn.execute('''
+            WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < ?),
+            evento AS (SELECT i, (i * 2654435761) % ? AS k FROM n)
+            INSERT INTO tracking_events (tracking_id, evento_tipo, timestamp, classificacao)
+            SELECT printf('t%08d', k), CASE WHEN i % 10 = 0 THEN 'clique' ELSE 'abertura' END,
+                   datetime(1704067200 + k * (5184000 / ?) + i % 259200, 'unixepoch'),
+                   CASE WHEN i % 7 = 0 THEN 'proxy' ELSE 'humano' END
+            FROM evento
+        ''', (eventos, envios, envios))
+        conn.commit()
+        conn.close()
+        print(f"Banco gerado: {envios:,} envios, {eventos:,} eventos em {time.perf_counter() - inicio:.1f}s")
+
+        extratos = os.path.join(diretorio, 'extratos_funil')
+        funil = FunilCoortes([('legado', db_file)], extratos)
+        inicio = time.perf_counter()
+        extraidos = funil.atualizar()
+        t_extracao = time.perf_counter() - inicio
+        print(f"Extração colunar: {extraidos[0]:,} envios e {extraidos[1]:,} eventos em {t_extracao:.1f}s")
+
+        # Consultas sobre o extrato em memória
+        consultas = [
+            ("funil por coorte", lambda: funil.funil(('coorte',))),
+            ("funil provedor × modelo × prioridade", lambda: funil.funil(('provedor', 'modelo', 'prioridade'))),
+            ("funil coorte × provedor", lambda: funil.funil(('coorte', 'provedor'))),
+        ] + [(f"tempo até {etapa} por provedor", lambda etapa=etapa: funil.distribuicao(etapa, ('provedor',)))
+             for etapa in TEMPOS] + [
+            ("reaberturas por prioridade", lambda: funil.distribuicao_aberturas(('prioridade',))),
+        ]
+        resultados = {}
+        for nome, consulta in consultas:
+            inicio = time.perf_counter()
+            resultados[nome] = consulta()
+            tempo_ms = (time.perf_counter() - inicio) * 1000
+            print(f"  {nome:40s} {tempo_ms:7.1f} ms  ({len(resultados[nome][1])} grupos)")
+            if tempo_ms > budget_ms:
+                print(f"❌ {nome} acima de {budget_ms} ms")
+                falhas += 1
+
+        # Atualização incremental: só os eventos novos são lidos
+        conn = sqlite3.connect(db_file)
+        conn.executemany('''
+            INSERT INTO tracking_events (tracking_id, evento_tipo, timestamp, classificacao)
+            VALUES (?, 'abertura', '2024-03-01 12:00:00', 'humano')
+        ''', [(f"t{k:08d}",) for k in range(0, envios, max(1, envios // 100000))])
+        conn.commit()
+        conn.close()
+        banco_dados.fechar(db_file)
+        inicio = time.perf_counter()
+        _, eventos_depois = funil.atualizar()
+        t_incremental = time.perf_counter() - inicio
+        print(f"Atualização com {eventos_depois - extraidos[1]:,} eventos novos: {t_incremental:.1f}s")
+
+        # Outro processo (nova execução da CLI): eventos vêm do extrato salvo, só os envios são relidos
+        inicio = time.perf_counter()
+        if FunilCoortes([('legado', db_file)], extratos).atualizar() != (extraidos[0], eventos_depois):
+            print("❌ Extrato salvo diverge do extrato em memória")
+            falhas += 1
+        print(f"Nova execução com o extrato salvo: {time.perf_counter() - inicio:.1f}s")
+
+        # Conferência com o GROUP BY equivalente no SQLite
+        conn = sqlite3.connect(db_file)
+        inicio = time.perf_counter()
+        esperado = conn.execute('''
+            SELECT provedor_tipo, modelo_assunto, prioridade_email, COUNT(*),
+                   SUM(aberto = 1 OR clicou_link = 1 OR respondeu = 1), SUM(clicou_link = 1), SUM(respondeu = 1)
+            FROM email_campaigns WHERE status_entrega = 'enviado'
+            GROUP BY 1, 2, 3 ORDER BY 1, 2, 3
+        ''').fetchall()
+        eventos_sql = conn.execute('''
+            SELECT SUM(e.evento_tipo = 'abertura' AND e.classificacao = 'humano'),
+                   SUM(e.evento_tipo = 'clique' AND e.classificacao = 'humano'), SUM(e.classificacao != 'humano')
+            FROM tracking_events e JOIN email_campaigns c ON c.tracking_id = e.tracking_id
+            WHERE c.status_entrega = 'enviado'
+        ''').fetchone()
+        respostas_sql = conn.execute('''
+            SELECT COUNT(*) FROM email_campaigns
+            WHERE status_entrega = 'enviado' AND data_resposta IS NOT NULL
+        ''').fetchone()[0]
+        t_sql = time.perf_counter() - inicio
+        conn.close()
+        print(f"Mesmas contagens via GROUP BY no SQLite: {t_sql:.1f}s")
+
+    colunas, linhas = funil.funil(('provedor', 'modelo', 'prioridade'))
+    obtido = sorted(linha[:7] for linha in linhas)
+    if obtido != esperado:
+        print(f"❌ Funil diverge do SQLite: {obtido[:1]} × {esperado[:1]}")
+        falhas += 1
+    _, (total,) = funil.funil(())
+    if tuple(total[-3:]) != tuple(eventos_sql):
+        print(f"❌ Eventos divergem do SQLite: {total[-3:]} × {eventos_sql}")
+        falhas += 1
+    _, linhas_resposta = funil.distribuicao('resposta')
+    if linhas_resposta[0][0] != respostas_sql or sum(linhas_resposta[0][3:]) != respostas_sql:
+        print(f"❌ Distribuição de respostas com {linhas_resposta[0][0]:,}, esperadas {respostas_sql:,}")
+        falhas += 1
+    if not falhas:
+        maior = max(len(linhas) for _, linhas in resultados.values())
+        print(f"✅ Todas as consultas abaixo de {budget_ms} ms sobre {extraidos[1]:,} eventos "
+              f"(até {maior:,} grupos), contagens idênticas às do SQLite")
+    return 1 if falhas else 0
+
+
+def _escrever_log_no(diretorio, no, quantidade, envios, tamanho_segmento):
+    """Um nó de tracking: classifica e acrescenta ao log local (reinicia no meio)"""
+    from ingestao_eventos import LogEventos
+
+    esperado = {}
+    inicio = time.perf_counter()
+    for parte in (quantidade // 2, quantidade - quantidade // 2):
+        log = LogEventos(diretorio, no=no, tamanho_segmento=tamanho_segmento)
+        for i in range(parte):
+            k = hash((no, parte, i)) % envios
+            tipo = 'clique' if i % 10 == 0 else 'abertura'
+            classificacao = 'proxy' if i % 7 == 0 else 'humano'
+            tracking_id = f"t{k:07d}"
+            log.registrar(tipo, tracking_id, f"189.40.{i % 256}.{k % 256}", "Mozilla/5.0 (iPhone)", classificacao,
+                          "https://exemplo.com.br" if tipo == 'clique' else None)
+            chave = (tracking_id, tipo, classificacao == 'humano')
+            esperado[chave] = esperado.get(chave, 0) + 1
+        log.fechar()
+    return esperado, time.perf_counter() - inicio
+
+
+def benchmark_ingestao(nos=4, eventos=400000, envios=50000, minimo=10000):
+    """Vários nós gravando logs locais e o agregador aplicando ao banco sem duplicar"""
+    import shutil
+    import sqlite3
+    import tempfile
+    import threading
+    from concurrent.futures import ProcessPoolExecutor
+    import banco_dados
+    from armazenamento_shards import ArmazenamentoShards, criar_schema
+    from ingestao_eventos import AgregadorLogs, _segmentos
+
+    print("🔀 BENCHMARK DE INGESTÃO EM VÁRIOS NÓS")
+    print("=" * 50)
+
+    falhas = 0
+    with tempfile.TemporaryDirectory() as diretorio:
+        db_file = os.path.join(diretorio, 'email_analytics.db')
+        logs = os.path.join(diretorio, 'logs_eventos')
+        criar_schema(db_file)
+        conn = sqlite3.connect(db_file)
+        conn.executemany("INSERT INTO email_campaigns (tracking_id, status_entrega) VALUES (?, 'enviado')",
+                         [(f"t{k:07d}",) for k in range(envios)])
+        conn.commit()
+        conn.close()
+        shards = ArmazenamentoShards(os.path.join(diretorio, 'analytics_shards'), db_legado=db_file)
+
+        def agregador(**opcoes):
+            return AgregadorLogs(db_file, logs, shards=shards, **opcoes)
+
+        # Nós escrevendo em paralelo enquanto o agregador acompanha os logs (linhas pela metade incluídas)
+        principal = agregador()
+        terminou = threading.Event()
+        tempo_agregador = [0.0]
+
+        def acompanhar():
+            while not terminou.is_set():
+                inicio_passada = time.perf_counter()
+                principal.processar()
+                tempo_agregador[0] += time.perf_counter() - inicio_passada
+                time.sleep(0.05)
+
+        thread = threading.Thread(target=acompanhar)
+        thread.start()
+        inicio = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=nos) as pool:
+            resultados = list(pool.map(_escrever_log_no, [logs] * nos, [f"no{i}" for i in range(nos)],
+                                       [eventos // nos] * nos, [envios] * nos, [1 << 20] * nos))
+        t_escrita = time.perf_counter() - inicio
+        terminou.set()
+        thread.join()
+        inicio_passada = time.perf_counter()
+        principal.processar()
+        tempo_agregador[0] += time.perf_counter() - inicio_passada
+        t_total = time.perf_counter() - inicio
+
+        total = sum(sum(esperado.values()) for esperado, _ in resultados)
+        # Taxa somada dos nós (na mesma máquina eles disputam os núcleos com o agregador)
+        taxa_nos = total / t_escrita
+        taxa_agregador = total / tempo_agregador[0]
+        segmentos = sum(len(_segmentos(os.path.join(logs, f"no{i}"))) for i in range(nos))
+        print(f"Nós:       {nos} × {eventos // nos:,} eventos em {t_escrita:.2f}s "
+              f"({taxa_nos:,.0f}/s somando os nós, {segmentos} segmentos)")
+        print(f"Agregador: {principal.totais['aplicados']:,} eventos aplicados em {tempo_agregador[0]:.2f}s "
+              f"({taxa_agregador:,.0f}/s), tudo no banco {t_total:.2f}s após o início")
+
+        # Reaplicar tudo (posições perdidas) e um log copiado para outro nó não muda nada
+        conn = sqlite3.connect(db_file)
+        conn.execute("DELETE FROM posicoes_logs")
+        conn.commit()
+        conn.close()
+        banco_dados.fechar(db_file)
+        reaplicados = agregador().processar()
+        limpeza = agregador(apagar_consumidos=True)
+        limpeza.processar()
+        restantes = sum(len(_segmentos(os.path.join(logs, f"no{i}"))) for i in range(nos))
+        shutil.copytree(os.path.join(logs, 'no0'), os.path.join(logs, 'no0-copia'))
+        copia = agregador()
+        copiados = copia.processar()
+        print(f"Reaplicação: {reaplicados} eventos novos; log copiado: {copiados} novos, "
+              f"{copia.totais['duplicados']:,} ignorados; {restantes} segmentos após apagar os consumidos")
+        banco_dados.fechar(db_file)
+
+        conn = sqlite3.connect(db_file)
+        gravados = conn.execute("SELECT COUNT(*), COUNT(DISTINCT evento_id) FROM tracking_events").fetchone()
+        campanhas = {linha[0]: linha[1:] for linha in conn.execute('''
+            SELECT tracking_id, total_aberturas, total_cliques, aberturas_automaticas + cliques_automaticos,
+                   aberto, clicou_link
+            FROM email_campaigns
+        ''')}
+        conn.close()
+
+    esperado = {}
+    for parcial, _ in resultados:
+        for (tracking_id, tipo, humano), quantidade in parcial.items():
+            contagens = esperado.setdefault(tracking_id, [0, 0, 0])
+            contagens[2 if not humano else 0 if tipo == 'abertura' else 1] += quantidade
+    divergentes = [tracking_id for tracking_id, (aberturas, cliques, automaticos, aberto, clicou) in campanhas.items()
+                   if [aberturas, cliques, automaticos] != esperado.get(tracking_id, [0, 0, 0])
+                   or aberto != (aberturas > 0) or clicou != (cliques > 0)]
+    if gravados != (total, total) or divergentes:
+        print(f"❌ Banco inconsistente: {gravados[0]:,} eventos ({gravados[1]:,} ids) de {total:,}, "
+              f"{len(divergentes)} envios com contagens erradas")
+        falhas += 1
+    if reaplicados or copiados or copia.totais['duplicados'] == 0 or restantes != nos:
+        print("❌ Reaplicação duplicou eventos ou segmentos consumidos não foram apagados")
+        falhas += 1
+    if min(taxa_nos, taxa_agregador) < minimo:
+        print(f"❌ Abaixo de {minimo:,} eventos/s")
+        falhas += 1
+    if not falhas:
+        print(f"✅ {total:,} eventos de {nos} nós aplicados uma única vez, contagens idênticas às geradas")
+    return 1 if falhas else 0
+
+
+def benchmark_deduplicacao(aberturas=10000, minimo=200000, semente=50):
+    """Janela de deduplicação: custo por hit e escritas evitadas no banco"""
+    import random
+    import sqlite3
+    import tempfile
+    from datetime import datetime
+    import banco_dados
+    from armazenamento_shards import criar_schema
+    from ingestao_eventos import JANELA_DEDUP_SEGUNDOS, JanelaDeduplicacao, gravar_evento
+
+    print("🪞 BENCHMARK DE DEDUPLICAÇÃO DE HITS")
+    print("=" * 50)
+
+    # Cada abertura: hit do cliente com 0-3 re-renders em segundos, às vezes o proxy
+    # (outra impressão, conta à parte) e, às vezes, uma reabertura horas depois
+    aleatorio = random.Random(semente)
+    agente = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148"
+    hits = []
+    distintos = 0
+    for i in range(aberturas):
+        tracking_id = f"t{i % (aberturas // 2):07d}"
+        inicio = i * 0.5
+        for atraso_reabertura in (0, 7200) if i % 5 == 0 else (0,):
+            instante = inicio + atraso_reabertura
+            ip = f"189.40.{i % 256}.{aleatorio.randrange(256)}"
+            hits.append((instante, tracking_id, ip, agente))
+            hits.extend((instante + aleatorio.uniform(0.1, 20), tracking_id, ip, agente)
+                        for _ in range(aleatorio.randrange(4)))
+            distintos += 1
+            if i % 3 == 0:
+                hits.append((instante + aleatorio.uniform(0, 2), tracking_id, "66.249.84.1", "GoogleImageProxy"))
+                distintos += 1
+    hits.sort()
+
+    janela = JanelaDeduplicacao()
+    inicio_medida = time.perf_counter()
+    novos = [hit for hit in hits if janela.novo('abertura', hit[1], hit[2], hit[3], agora=hit[0])]
+    t_janela = time.perf_counter() - inicio_medida
+    taxa = len(hits) / t_janela
+    print(f"Janela de {JANELA_DEDUP_SEGUNDOS}s: {len(hits):,} hits → {len(novos):,} eventos "
+          f"em {t_janela * 1000:.0f} ms ({taxa:,.0f} hits/s)")
+
+    # Memória limitada: num pico acima de max_chaves as mais antigas saem antes do TTL
+    limitada = JanelaDeduplicacao(max_chaves=1000)
+    maior = 0
+    for instante, tracking_id, ip, agente_hit in hits:
+        limitada.novo('abertura', tracking_id, ip, agente_hit, agora=instante / 100)
+        maior = max(maior, len(limitada))
+
+    # Gravação hit a hit, como no servidor (um commit por requisição), com e sem a janela
+    tempos = {}
+    gravados = {}
+    with tempfile.TemporaryDirectory() as diretorio:
+        for nome, lista in (('sem janela', hits), ('com janela', novos)):
+            db_file = os.path.join(diretorio, nome.replace(' ', '_') + '.db')
+            criar_schema(db_file)
+            conn = sqlite3.connect(db_file)
+            conn.executemany("INSERT INTO email_campaigns (tracking_id, status_entrega) VALUES (?, 'enviado')",
+                             [(f"t{k:07d}",) for k in range(aberturas // 2)])
+            conn.commit()
+            conn.close()
+            agora = datetime.now()
+            inicio_medida = time.perf_counter()
+            for _, tracking_id, ip, agente_hit in lista:
+                conn = banco_dados.conectar(db_file)
+                with conn:
+                    gravar_evento(conn, 'abertura', tracking_id, agora, ip, agente_hit, 'humano')
+                conn.close()
+            tempos[nome] = time.perf_counter() - inicio_medida
+            banco_dados.fechar(db_file)
+            conn = sqlite3.connect(db_file)
+            gravados[nome] = conn.execute("SELECT COUNT(*) FROM tracking_events").fetchone()[0]
+            conn.close()
+            print(f"Gravação {nome}: {gravados[nome]:,} linhas em {tempos[nome]:.2f}s")
+
+    falhas = 0
+    if len(novos) != distintos or gravados['com janela'] != distintos:
+        print(f"❌ {len(novos):,} eventos passaram, esperados {distintos:,}")
+        falhas += 1
+    if janela.hits['abertura'] != len(hits) or janela.duplicados['abertura'] != len(hits) - len(novos):
+        print(f"❌ Contadores em memória: {janela.hits} hits, {janela.duplicados} duplicados")
+        falhas += 1
+    if maior > 1000:
+        print(f"❌ Janela limitada a 1.000 chaves chegou a {maior:,}")
+        falhas += 1
+    if taxa < minimo:
+        print(f"❌ Abaixo de {minimo:,} hits/s na janela")
+        falhas += 1
+    if not falhas:
+        print(f"✅ {1 - len(novos) / len(hits):.0%} dos hits sem escrita no banco "
+              f"({tempos['sem janela'] / tempos['com janela']:.1f}x menos tempo gravando), contagens exatas")
+    return 1 if falhas else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks do Automated Lead Generator')
+    sub = parser.add_subparsers(dest='benchmark', metavar='<benchmark>')
+    sub.required = True
+
+    p = sub.add_parser('startup', help='Tempo de import da CLI e dos módulos')
+    p.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_BUDGET_MS', 150)))
+    p.add_argument('--repeticoes', type=int, default=5)
+    p.set_defaults(func=lambda a: benchmark_startup(a.budget_ms, a.repeticoes))
+
+    p = sub.add_parser('nomes', help='Normalização de nomes de empresas')
+    p.add_argument('--quantidade', type=int, default=2000000)
+    p.set_defaults(func=lambda a: benchmark_nomes(a.quantidade))
+
+    p = sub.add_parser('validacao', help='Validação de emails com resolver estático (sem DNS)')
+    p.add_argument('--quantidade', type=int, default=100000)
+    p.add_argument('--dominios', type=int, default=2000, help='Domínios distintos (1 em 10 sem MX)')
+    p.add_argument('--minimo', type=int, default=20000, help='Emails por segundo exigidos com o cache de MX')
+    p.set_defaults(func=lambda a: benchmark_validacao(a.quantidade, a.dominios, minimo=a.minimo))
+
+    p = sub.add_parser('bounces', help='Processamento de DSNs de um maildir local')
+    p.add_argument('--quantidade', type=int, default=20000)
+    p.add_argument('--minimo', type=float, default=2000.0, help='Vazão mínima (DSN/s)')
+    p.set_defaults(func=lambda a: benchmark_bounces(a.quantidade, a.minimo))
+
+    p = sub.add_parser('tracking-ids', help='Geração de IDs de tracking')
+    p.add_argument('--quantidade', type=int, default=1000000)
+    p.add_argument('--processos', type=int, default=4)
+    p.set_defaults(func=lambda a: benchmark_tracking_ids(a.quantidade, a.processos))
+
+    p = sub.add_parser('series', help='Séries temporais de engajamento')
+    p.add_argument('--quantidade', type=int, default=1000000, help='Envios simulados')
+    p.add_argument('--budget-ms', type=float, default=50.0, help='Tempo máximo por curva')
+    p.set_defaults(func=lambda a: benchmark_series(a.quantidade, a.budget_ms))
+
+    p = sub.add_parser('plano', help='Memória e velocidade do plano de envio compacto')
+    p.add_argument('--quantidade', type=int, default=5000000)
+    p.add_argument('--max-bytes', type=int, default=256, help='Bytes máximos por empresa')
+    p.set_defaults(func=lambda a: benchmark_plano(a.quantidade, a.max_bytes))
+
+    p = sub.add_parser('sqlite', help='Latência por operação no SQLite (sem e com pool)')
+    p.add_argument('--operacoes', type=int, default=2000)
+    p.set_defaults(func=lambda a: benchmark_sqlite(a.operacoes))
+
+    p = sub.add_parser('envios', help='Registro de envios em duas fases (por envio x em lote)')
+    p.add_argument('--quantidade', type=int, default=5000)
+    p.add_argument('--lote', type=int, default=100)
+    p.set_defaults(func=lambda a: benchmark_envios(a.quantidade, a.lote))
+
+    p = sub.add_parser('respostas', help='Detecção de respostas: varreduras x IMAP IDLE (servidor local)')
+    p.add_argument('--mensagens', type=int, default=2000, help='Mensagens já na caixa')
+    p.add_argument('--respostas', type=int, default=20, help='Respostas que chegam durante a escuta')
+    p.add_argument('--budget-s', type=float, default=2.0, help='Latência máxima até respondeu=1')
+    p.set_defaults(func=lambda a: benchmark_respostas(a.mensagens, a.respostas, a.budget_s))
+
+    p = sub.add_parser('classificacao', help='Classificação de respostas (remover, ausente, interesse...)')
+    p.add_argument('--quantidade', type=int, default=20000, help='Respostas geradas')
+    p.add_argument('--minimo', type=int, default=2000, help='Mensagens por segundo exigidas')
+    p.set_defaults(func=lambda a: benchmark_classificacao(a.quantidade, a.minimo))
+
+    p = sub.add_parser('arquivamento', help='Arquivamento de eventos antigos em Parquet')
+    p.add_argument('--quantidade', type=int, default=500000, help='Eventos em 12 meses')
+    p.add_argument('--dias', type=int, default=90, help='Retenção no SQLite')
+    p.set_defaults(func=lambda a: benchmark_arquivamento(a.quantidade, a.dias))
+
+    p = sub.add_parser('enriquecimento', help='Dispositivo e GeoIP local das aberturas')
+    p.add_argument('--quantidade', type=int, default=300000, help='Aberturas geradas')
+    p.add_argument('--minimo', type=int, default=100000, help='Aberturas por segundo exigidas')
+    p.set_defaults(func=lambda a: benchmark_enriquecimento(a.quantidade, minimo=a.minimo))
+
+    p = sub.add_parser('funil', help='Funil e coortes vetorizados sobre milhões de eventos')
+    p.add_argument('--envios', type=int, default=1000000)
+    p.add_argument('--eventos', type=int, default=10000000)
+    p.add_argument('--budget-ms', type=float, default=1000, help='Tempo máximo de cada consulta')
+    p.set_defaults(func=lambda a: benchmark_funil(a.envios, a.eventos, a.budget_ms))
+
+    p = sub.add_parser('ingestao', help='Logs locais por nó de tracking e agregador idempotente')
+    p.add_argument('--nos', type=int, default=4, help='Instâncias de tracking (processos)')
+    p.add_argument('--eventos', type=int, default=400000, help='Eventos somando todos os nós')
+    p.add_argument('--minimo', type=int, default=10000, help='Eventos por segundo exigidos (nós somados e agregador)')
+    p.set_defaults(func=lambda a: benchmark_ingestao(a.nos, a.eventos, minimo=a.minimo))
+
+    p = sub.add_parser('deduplicacao', help='Janela de deduplicação de hits do pixel')
+    p.add_argument('--aberturas', type=int, default=10000)
+    p.add_argument('--minimo', type=int, default=200000, help='Hits por segundo exigidos na janela')
+    p.set_defaults(func=lambda a: benchmark_deduplicacao(a.aberturas, a.minimo))
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
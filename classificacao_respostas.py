@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Classificação de Respostas
+Separa as respostas recebidas em descadastro (o "REMOVER" pedido nos
+templates), ausência/férias, resposta automática, sem interesse, interesse
+e outras.
+
+Primeiro os cabeçalhos: Auto-Submitted, X-Autoreply/X-Autorespond e
+Precedence denunciam respostas automáticas sem olhar o corpo. Depois só o
+primeiro KB do texto decodificado, sem as linhas citadas (a citação do
+nosso próprio email traz o "responda REMOVER"), passa por uma única regex
+com um grupo nomeado por intenção: um só passe por finditer encontra todas
+as palavras-chave. A regex só tenta casar no início de palavra e roda sobre
+o texto já em minúsculas (re.I custa caro com tantas alternativas).
+"""
+
+import base64
+import binascii
+import re
+from email.parser import BytesParser
+from email.policy import compat32
+
+# Texto decodificado analisado por mensagem
+LIMITE_TEXTO = 1024
+# Bytes do corpo bruto buscados por mensagem (base64 ocupa 4/3 e há cabeçalhos MIME)
+LIMITE_CORPO = 4096
+
+REMOVER = 'remover'
+AUSENTE = 'ausente'
+AUTOMATICA = 'automatica'
+SEM_INTERESSE = 'sem_interesse'
+INTERESSE = 'interesse'
+OUTRA = 'outra'
+
+# Classes que contam como resposta de uma pessoa (respondeu = 1)
+CLASSES_HUMANAS = {REMOVER, SEM_INTERESSE, INTERESSE, OUTRA}
+
+# (intenção, padrão em minúsculas, começando em início de palavra); com mais de uma no texto vale a ordem daqui
+INTENCOES = [
+    (REMOVER, r'remover?\b|remova\b|descadastr|unsubscribe|remove me|opt[- ]out'
+              r'|n[aã]o (?:quero|desejo|tenho interesse em) (?:mais )?receber|pare de (?:me )?enviar'
+              r'|n[aã]o (?:me )?envie mais|retire (?:meu|o meu|este) (?:e-?mail|endere[cç]o|contato)'),
+    (AUSENTE, r'fora do escrit[oó]rio|ausente\b|aus[eê]ncia|de f[eé]rias|em f[eé]rias|licen[cç]a'
+              r'|estarei (?:fora|ausente|de volta)|retorno (?:no dia|em|dia)|out of (?:the )?office'
+              r'|on vacation|on leave|resposta autom[aá]tica|automatic reply|auto[- ]?reply'),
+    # Antes de INTERESSE: "não temos interesse" contém "temos interesse"
+    (SEM_INTERESSE, r'n[aã]o (?:tenho|temos|h[aá]) interesse|n[aã]o (?:estou|estamos|ficamos) interessad'
+                    r'|sem interesse|n[aã]o (?:precisamos|necessitamos)|n[aã]o [eé] (?:o )?(?:momento|prioridade)'
+                    r'|not interested|no thanks|n[aã]o, obrigad'),
+    (INTERESSE, r'tenho interesse|temos interesse|interessad[oa]s?\b|vamos conversar|podemos conversar'
+                r'|podemos (?:falar|agendar|marcar)|agendar|marcar uma (?:reuni[aã]o|conversa|call|liga[cç][aã]o)'
+                r'|me (?:liga|ligue|chame)|envie (?:mais )?(?:informa[cç][oõ]es|detalhes|a proposta|uma proposta)'
+                r'|gostaria de (?:saber|entender|conhecer) mais|quanto custa|or[cç]amento|interested\b'
+                r"|let'?s talk|schedule a (?:call|meeting)|sounds good"),
+]
+
+# Início da citação da mensagem original: daqui para baixo não é texto do remetente
+RE_CITACAO = re.compile(
+    r'^(?:>|-{2,}\s*(?:mensagem original|original message|forwarded message)'
+    r'|(?:em|on)\s.{0,120}\s(?:escreveu|wrote)\s*:|(?:de|from)\s*:.*@)',
+    re.I | re.M,
+)
+RE_TAGS = re.compile(r'<(?:style|script)\b.*?</(?:style|script)>|<[^>]+>', re.I | re.S)
+
+PRECEDENCIAS_AUTOMATICAS = {'auto_reply', 'bulk', 'junk'}
+
+
+def compilar_intencoes(intencoes=INTENCOES):
+    """Uma regex com um grupo nomeado por intenção (o "autômato" de palavras-chave)"""
+    return re.compile(r'\b(?:' + '|'.join(f"(?P<{classe}>{padrao})" for classe, padrao in intencoes) + ')')
+
+
+def resposta_automatica(cabecalhos):
+    """Cabeçalhos de resposta gerada por sistema (RFC 3834 e variantes comuns)"""
+    if (cabecalhos.get('Auto-Submitted') or 'no').strip().lower() != 'no':
+        return True
+    if cabecalhos.get('X-Autoreply') or cabecalhos.get('X-Autorespond'):
+        return True
+    return (cabecalhos.get('Precedence') or '').strip().lower() in PRECEDENCIAS_AUTOMATICAS
+
+
+def _decodificar_parte(parte, limite):
+    """Payload da parte em texto, tolerando corpo truncado (busca parcial do IMAP)"""
+    dados = parte.get_payload(decode=False)
+    if not isinstance(dados, str):
+        return ''
+    codificacao = (parte.get('Content-Transfer-Encoding') or '').strip().lower()
+    if codificacao == 'base64':
+        # Corta no último bloco completo: o corpo pode ter vindo pela metade
+        bruto = b''.join(dados.encode('ascii', 'replace').split())
+        bruto = bruto[:len(bruto) // 4 * 4]
+        try:
+            bruto = base64.b64decode(bruto)
+        except (binascii.Error, ValueError):
+            return ''
+    else:
+        # quoted-printable, 7bit e 8bit: o email.message já devolve os bytes originais
+        bruto = parte.get_payload(decode=True) or b''
+    texto = bruto.decode(parte.get_content_charset() or 'utf-8', 'replace')
+    if parte.get_content_subtype() == 'html':
+        texto = RE_TAGS.sub(' ', texto)
+    return texto[:limite * 2]
+
+
+class ClassificadorRespostas:
+    """Classe de cada resposta: remover, ausente, automatica, sem_interesse, interesse ou outra"""
+
+    def __init__(self, intencoes=None, limite_texto=LIMITE_TEXTO):
+        self._regex = compilar_intencoes(intencoes or INTENCOES)
+        self._prioridade = {classe: i for i, (classe, _) in enumerate(intencoes or INTENCOES)}
+        self.limite_texto = limite_texto
+        self._parser = BytesParser(policy=compat32)
+
+    def texto(self, mensagem):
+        """Primeiro KB do texto escrito pelo remetente (text/plain, senão text/html)"""
+        partes = [p for p in mensagem.walk() if p.get_content_maintype() == 'text']
+        partes.sort(key=lambda p: p.get_content_subtype() != 'plain')
+        if not partes:
+            return ''
+        texto = _decodificar_parte(partes[0], self.limite_texto)
+        citacao = RE_CITACAO.search(texto)
+        if citacao:
+            texto = texto[:citacao.start()]
+        return texto[:self.limite_texto]
+
+    def intencoes(self, texto):
+        """Intenções encontradas no texto (um passe pela regex combinada)"""
+        return {casamento.lastgroup for casamento in self._regex.finditer(texto.lower())}
+
+    def classificar(self, mensagem):
+        """Classe de uma email.message.Message (o corpo pode estar truncado)"""
+        if resposta_automatica(mensagem):
+            # Automática: só distingue ausência (o assunto costuma dizer "Ausente")
+            encontradas = self.intencoes(f"{mensagem.get('Subject') or ''}\n{self.texto(mensagem)}")
+            return AUSENTE if AUSENTE in encontradas else AUTOMATICA
+        # O assunto de uma resposta é o nosso ("Re: ..."): só o corpo conta
+        encontradas = self.intencoes(self.texto(mensagem))
+        if not encontradas:
+            return OUTRA
+        return min(encontradas, key=self._prioridade.__getitem__)
+
+    def classificar_bytes(self, dados):
+        return self.classificar(self._parser.parsebytes(dados))
+
+    def classificar_lote(self, mensagens):
+        """Lista de classes para um iterável de mensagens em bytes"""
+        return [self.classificar_bytes(dados) for dados in mensagens]
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+CLI Unificada - Automated Lead Generator
+Ponto de entrada único com subcomandos importados sob demanda:
+cada subcomando só carrega os módulos (pandas, Flask, IMAP...) que usa.
+
+Uso:
+    python cli.py send
+    python cli.py report
+    python cli.py report --campanha "Proposta Março"
+    python cli.py dashboard
+    python cli.py export --formato csv
+    python cli.py export --formato parquet --incluir-arquivados
+    python cli.py spam-score --csv contatos_proposta.csv
+    python cli.py validate --csv contatos_proposta.csv
+    python cli.py track --port 8080
+    python cli.py track --port 8081 --log-dir logs_eventos --no tracker-2 --node-id 2
+    python cli.py agregar-logs --apagar-consumidos
+    python cli.py imap-sync
+    python cli.py imap-sync --escutar
+    python cli.py bounces --maildir ~/Maildir/bounces
+    python cli.py campanhas --arquivar "Proposta Março"
+    python cli.py series --campanha "Proposta Março" --provedor gmail
+    python cli.py arquivar-eventos --dias 90
+    python cli.py enriquecer --compilar-geoip dbip-city-lite.csv
+    python cli.py funil --por coorte provedor --desde 2024-03-01
+    python cli.py funil --por modelo prioridade --etapa resposta
+    python cli.py <subcomando> --profile=cprofile
+"""
+
+import argparse
+import sys
+
+SECOES_RELATORIO = ('geral', 'por_provedor', 'timeline', 'top_engajamento', 'funil', 'tempos')
+
+
+def cmd_send(args):
+    """Inicia a campanha interativa (preview, anexo e confirmação)"""
+    from iniciar_campanha import main
+    main()
+
+
+def cmd_report(args):
+    """Mostra o relatório da campanha a partir do banco de analytics"""
+    from sistema_monitoramento_analytics import EmailAnalytics
+
+    relatorio = EmailAnalytics(campanha=args.campanha).gerar_relatorio_completo()
+    for secao in args.secoes or relatorio.keys():
+        print(f"\n📊 {secao.upper()}")
+        print("=" * 50)
+        print(relatorio[secao].to_string(index=False))
+
+
+def cmd_dashboard(args):
+    """Gera o dashboard HTML"""
+    from sistema_monitoramento_analytics import EmailAnalytics
+    EmailAnalytics().gerar_dashboard_html()
+
+
+def cmd_export(args):
+    """Exporta os dados detalhados em streaming"""
+    from sistema_monitoramento_analytics import EmailAnalytics
+    EmailAnalytics().exportar_dados_detalhados(args.formato, args.destino, args.incluir_arquivados)
+
+
+def cmd_spam_score(args):
+    """Pontua o template localmente, sem enviar emails"""
+    import json
+    from spam_score import AvaliadorSpam
+
+    with open(args.template, 'r', encoding='utf-8') as f:
+        template = json.load(f)
+
+    avaliador = AvaliadorSpam(limiar=args.limiar)
+    # Cabeçalhos que o envio com tracking adiciona
+    cabecalhos = {'List-Unsubscribe': '', 'Message-ID': ''} if args.com_cabecalhos else {}
+
+    if not args.csv:
+        valores = {'empresa': 'Empresa Exemplo', 'razao_social': 'EMPRESA EXEMPLO LTDA',
+                   'nome_empresa': 'Empresa Exemplo'}
+        resultado = avaliador.avaliar_template(template['subject'], template['body'], valores, cabecalhos)
+        print(avaliador.explicar(resultado))
+        return 1 if resultado['spam'] else 0
+
+    from email_marketing_empresarial import EmailMarketingEmpresarial
+    sistema = EmailMarketingEmpresarial(None, 0, None, None)
+    df = sistema.load_empresas_csv(args.csv)
+    destinatarios = [
+        {'empresa': nome, 'razao_social': razao, 'nome_empresa': nome}
+        for nome, razao in zip(sistema.get_nomes_empresas(df), df['RazaoSocial'])
+    ]
+    resultados, acima = avaliador.avaliar_campanha(destinatarios, template['subject'], template['body'], cabecalhos)
+    pior = max(range(len(resultados)), key=lambda i: resultados[i]['pontuacao'], default=None)
+
+    print(f"📊 {len(resultados)} destinatários avaliados | {acima} acima do limiar {args.limiar}")
+    if pior is not None:
+        print(f"Pior caso: {destinatarios[pior]['empresa']}")
+        print(avaliador.explicar(resultados[pior]))
+    return 1 if acima else 0
+
+
+def cmd_validate(args):
+    """Valida os emails do CSV (sintaxe, domínio, descartáveis e MX) sem enviar"""
+    from email_marketing_empresarial import EmailMarketingEmpresarial
+
+    sistema = EmailMarketingEmpresarial(None, 0, None, None)
+    df = sistema.load_empresas_csv(args.csv)
+    resumo = sistema.validar_emails(df)
+
+    print(f"📊 {len(sistema.validacao_emails)} emails distintos")
+    for motivo, total in resumo.items():
+        print(f"   {motivo:12s} {total}")
+    for original, resultado in sorted(sistema.validacao_emails.items()):
+        if resultado['corrigido_de']:
+            print(f"✏️ {original} → {resultado['email']}")
+    return 0
+
+
+def cmd_track(args):
+    """Sobe o servidor de tracking (pixel, cliques, descadastro)"""
+    import os
+    # Lidos na importação do tracking_server
+    if args.log_dir:
+        os.environ['TRACKING_LOG_DIR'] = args.log_dir
+    if args.no:
+        os.environ['TRACKING_NODE_NAME'] = args.no
+    if args.node_id is not None:
+        os.environ['TRACKING_NODE_ID'] = str(args.node_id)
+    from tracking_server import app
+    app.run(host=args.host, port=args.port, debug=args.debug)
+
+
+def cmd_imap_sync(args):
+    """Sincroniza respostas da caixa de entrada via IMAP (uma vez ou escutando em IDLE)"""
+    from sistema_monitoramento_analytics import EmailAnalytics
+
+    analytics = EmailAnalytics()
+    if args.escutar:
+        analytics.escutar_respostas(args.host, args.porta, not args.sem_ssl)
+    else:
+        analytics.monitorar_respostas_gmail(args.host, args.porta, not args.sem_ssl)
+
+
+def cmd_bounces(args):
+    """Processa bounces (DSN) e reclamações de spam, atualizando a supressão"""
+    from sistema_monitoramento_analytics import EmailAnalytics
+    EmailAnalytics().processar_bounces(args.maildir)
+
+
+def cmd_campanhas(args):
+    """Lista as campanhas com seus totais (somando os shards) ou arquiva uma"""
+    from armazenamento_shards import ArmazenamentoShards
+
+    shards = ArmazenamentoShards()
+    if args.arquivar:
+        print(f"📦 Campanha arquivada em {shards.arquivar(args.arquivar)}")
+        return 0
+
+    colunas, linhas = shards.resumo_campanhas()
+    print(" | ".join(f"{c:>10s}" for c in colunas))
+    for linha in linhas:
+        print(" | ".join(f"{str(v):>10s}" for v in linha))
+    return 0
+
+
+def cmd_series(args):
+    """Curvas de abertura por hora desde o envio e por hora do dia"""
+    from series_temporais import SeriesTemporais
+
+    series = SeriesTemporais()
+    if args.reconstruir:
+        from armazenamento_shards import ArmazenamentoShards
+        total = series.reconstruir(ArmazenamentoShards().arquivos(incluir_arquivadas=True))
+        print(f"🔁 Séries refeitas a partir de {total:,} envios")
+
+    print("\n📈 TAXA ACUMULADA POR HORA DESDE O ENVIO")
+    print("=" * 50)
+    for hora, aberturas, cliques, taxa_abertura, taxa_clique in series.curva_desde_envio(
+            args.campanha, args.provedor, args.horas):
+        print(f"{hora:4d}h  aberturas {aberturas:6d}  cliques {cliques:6d}  "
+              f"abertura {taxa_abertura:6.2f}%  clique {taxa_clique:6.2f}%")
+
+    print("\n🕐 ABERTURAS POR HORA DO DIA")
+    print("=" * 50)
+    for hora, enviados, aberturas, cliques, participacao in series.curva_hora_do_dia(args.campanha, args.provedor):
+        print(f"{hora:02d}:00  enviados {enviados:6d}  aberturas {aberturas:6d}  {participacao:6.2f}%")
+    return 0
+
+
+def cmd_arquivar_eventos(args):
+    """Move eventos antigos para Parquet por mês e campanha, deixando só a contagem no SQLite"""
+    from sistema_monitoramento_analytics import EmailAnalytics
+    EmailAnalytics().arquivar_eventos(args.dias, not args.sem_vacuum)
+    return 0
+
+
+def cmd_enriquecer(args):
+    """Preenche dispositivo e localização das aberturas já registradas (sem rede)"""
+    from sistema_monitoramento_analytics import EmailAnalytics
+    EmailAnalytics().enriquecer_aberturas(args.geoip, args.compilar_geoip)
+    return 0
+
+
+def cmd_agregar_logs(args):
+    """Aplica ao banco os eventos dos logs locais dos nós de tracking (sem duplicar)"""
+    from enriquecimento_eventos import EnriquecedorEventos
+    from ingestao_eventos import AgregadorLogs
+    from series_temporais import SeriesTemporais
+
+    agregador = AgregadorLogs(diretorio=args.diretorio, enriquecedor=EnriquecedorEventos.padrao(),
+                              series=SeriesTemporais(), apagar_consumidos=args.apagar_consumidos)
+    if not args.uma_vez:
+        agregador.executar(args.intervalo)
+    else:
+        agregador.processar()
+        agregador.series.descarregar()
+    totais = agregador.totais
+    print(f"🔀 {totais['aplicados']:,} eventos aplicados, {totais['duplicados']:,} duplicados ignorados, "
+          f"{totais['invalidos']:,} linhas inválidas")
+    return 0
+
+
+def cmd_funil(args):
+    """Funil enviado → aberto → clicado → respondido e tempos até cada etapa (todos os shards)"""
+    from datetime import date
+    from armazenamento_shards import ArmazenamentoShards
+    from funil_coortes import FunilCoortes
+
+    desde = date.fromisoformat(args.desde) if args.desde else None
+    ate = date.fromisoformat(args.ate) if args.ate else None
+    funil = FunilCoortes(ArmazenamentoShards().arquivos(args.campanha and [args.campanha], incluir_arquivadas=True))
+    envios, eventos = funil.atualizar()
+    print(f"🔻 FUNIL ({envios:,} envios, {eventos:,} eventos)")
+    print("=" * 50)
+    for titulo, (colunas, linhas) in (('', funil.funil(args.por, desde, ate)),
+                                       (f"⏱️ TEMPO ATÉ {args.etapa.upper()}",
+                                        funil.distribuicao(args.etapa, args.por, desde, ate))):
+        if titulo:
+            print(f"\n{titulo}")
+            print("=" * 50)
+        print(" | ".join(f"{c:>10s}" for c in colunas))
+        for linha in linhas:
+            print(" | ".join(f"{str(v):>10s}" for v in linha))
+    return 0
+
+
+def criar_parser():
+    """Monta o parser; nenhum módulo pesado é importado aqui"""
+    parser = argparse.ArgumentParser(
+        prog='cli.py',
+        description='Automated Lead Generator - campanhas, tracking e analytics'
+    )
+    sub = parser.add_subparsers(dest='comando', metavar='<comando>')
+    sub.required = True
+
+    p = sub.add_parser('send', help='Inicia campanha de email marketing')
+    p.set_defaults(func=cmd_send)
+
+    p = sub.add_parser('report', help='Relatório de aberturas, cliques e respostas')
+    p.add_argument('secoes', nargs='*', metavar='secao',
+                   help=f"Seções a exibir: {', '.join(SECOES_RELATORIO)} (padrão: todas)")
+    p.add_argument('--campanha', help='Relatório só do shard dessa campanha')
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser('dashboard', help='Gera dashboard_analytics.html')
+    p.set_defaults(func=cmd_dashboard)
+
+    p = sub.add_parser('export', help='Exporta emails e eventos (Excel, CSV ou Parquet)')
+    p.add_argument('--formato', choices=['excel', 'csv', 'parquet'], default='excel')
+    p.add_argument('--destino', help='Arquivo .xlsx ou diretório (CSV/Parquet)')
+    p.add_argument('--incluir-arquivados', action='store_true',
+                   help='Inclui os eventos já arquivados em Parquet (arquivar-eventos)')
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('spam-score', help='Pontuação anti-spam local do template')
+    p.add_argument('--template', default='template_email.json')
+    p.add_argument('--csv', help='Avalia cada empresa do CSV com o template personalizado')
+    p.add_argument('--limiar', type=float, default=5.0)
+    p.add_argument('--com-cabecalhos', action='store_true',
+                   help='Considera List-Unsubscribe e Message-ID presentes')
+    p.set_defaults(func=cmd_spam_score)
+
+    p = sub.add_parser('validate', help='Valida emails do CSV (sintaxe, domínio e MX)')
+    p.add_argument('--csv', default='contatos_proposta.csv')
+    p.set_defaults(func=cmd_validate)
+
+    p = sub.add_parser('track', help='Servidor de tracking')
+    p.add_argument('--host', default='0.0.0.0')
+    p.add_argument('--port', type=int, default=8080)
+    p.add_argument('--debug', action='store_true')
+    p.add_argument('--log-dir', help='Grava os eventos no log local do nó (vários nós + agregar-logs)')
+    p.add_argument('--no', help='Nome do nó no log (padrão: hostname-PID)')
+    p.add_argument('--node-id', type=int, help='TRACKING_NODE_ID, 0-255 e distinto por nó (obrigatório com --log-dir)')
+    p.set_defaults(func=cmd_track)
+
+    p = sub.add_parser('agregar-logs', help='Aplica os logs dos nós de tracking ao banco de analytics')
+    p.add_argument('--diretorio', default='logs_eventos')
+    p.add_argument('--intervalo', type=float, default=1.0, help='Segundos entre as leituras dos logs')
+    p.add_argument('--uma-vez', action='store_true', help='Aplica o que houver e sai')
+    p.add_argument('--apagar-consumidos', action='store_true',
+                   help='Remove os segmentos já aplicados e fechados pelo nó')
+    p.set_defaults(func=cmd_agregar_logs)
+
+    p = sub.add_parser('imap-sync', help='Verifica respostas via IMAP')
+    p.add_argument('--escutar', action='store_true',
+                   help='Fica conectado em IMAP IDLE registrando respostas assim que chegam')
+    p.add_argument('--host', default='imap.gmail.com')
+    p.add_argument('--porta', type=int, default=993)
+    p.add_argument('--sem-ssl', action='store_true', help='IMAP sem TLS (servidor de teste local)')
+    p.set_defaults(func=cmd_imap_sync)
+
+    p = sub.add_parser('bounces', help='Processa bounces e reclamações (maildir ou IMAP)')
+    p.add_argument('--maildir', help='Maildir local com os DSNs (padrão: caixa IMAP)')
+    p.set_defaults(func=cmd_bounces)
+
+    p = sub.add_parser('campanhas', help='Totais por campanha (todos os shards)')
+    p.add_argument('--arquivar', metavar='NOME', help='Move o shard da campanha para arquivadas/')
+    p.set_defaults(func=cmd_campanhas)
+
+    p = sub.add_parser('series', help='Curvas de abertura por hora desde o envio e hora do dia')
+    p.add_argument('--campanha', help='Nome da campanha (padrão: todas)')
+    p.add_argument('--provedor', help='gmail, outlook, corporativo... (padrão: todos)')
+    p.add_argument('--horas', type=int, default=48)
+    p.add_argument('--reconstruir', action='store_true',
+                   help='Refaz as séries a partir de email_campaigns (todos os shards)')
+    p.set_defaults(func=cmd_series)
+
+    p = sub.add_parser('arquivar-eventos', help='Move eventos antigos de tracking_events para Parquet')
+    p.add_argument('--dias', type=int, help='Retenção no SQLite em dias (padrão: 90)')
+    p.add_argument('--sem-vacuum', action='store_true',
+                   help='Não compacta o banco depois (o arquivo não encolhe até o próximo VACUUM)')
+    p.set_defaults(func=cmd_arquivar_eventos)
+
+    p = sub.add_parser('enriquecer', help='Dispositivo (user agent) e localização (GeoIP local) das aberturas')
+    p.add_argument('--geoip', help='Arquivo GeoIP: .mmdb (maxminddb) ou compilado (padrão: GEOIP_FILE ou geoip.bin)')
+    p.add_argument('--compilar-geoip', metavar='CSV',
+                   help='Compila antes o CSV de faixas da DB-IP (IP to City Lite) no arquivo --geoip')
+    p.set_defaults(func=cmd_enriquecer)
+
+    p = sub.add_parser('funil', help='Funil e coortes por dia de envio, provedor, modelo de assunto e prioridade')
+    p.add_argument('--por', nargs='*', default=['coorte'],
+                   choices=['coorte', 'provedor', 'modelo', 'prioridade', 'campanha'],
+                   help='Dimensões dos grupos (padrão: coorte)')
+    p.add_argument('--etapa', choices=['abertura', 'clique', 'resposta'], default='abertura',
+                   help='Distribuição do tempo desde o envio até essa etapa')
+    p.add_argument('--desde', metavar='AAAA-MM-DD', help='Primeira coorte (dia do envio)')
+    p.add_argument('--ate', metavar='AAAA-MM-DD', help='Última coorte')
+    p.add_argument('--campanha', help='Só o shard dessa campanha (padrão: todos os bancos)')
+    p.set_defaults(func=cmd_funil)
+
+    return parser
+
+
+def main(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+
+    invalidas = [s for s in getattr(args, 'secoes', []) if s not in SECOES_RELATORIO]
+    if invalidas:
+        parser.error(f"seção inválida: {', '.join(invalidas)}")
+
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    from perfilamento import executar_com_perfil
+    sys.exit(executar_com_perfil("cli", main))
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Dashboard Ao Vivo
+Contadores de eventos em memória no servidor de tracking, publicados via
+Server-Sent Events: aberturas e cliques aparecem em tempo real sem regerar
+HTML nem consultar o SQLite a cada atualização.
+
+Envios e respostas são gravados por outros processos (envio, IMAP) e, com
+vários nós de tracking, as aberturas/cliques únicos pelo agregador de logs:
+esses quatro totais são relidos do banco a cada INTERVALO_RECARGA segundos.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import banco_dados
+from registro_envios import SQL_ENVIADOS
+
+# Segundos entre as releituras de enviados/abertos/clicados/respostas (um COUNT por banco)
+INTERVALO_RECARGA = 30
+
+SQL_TOTAIS_ENVIOS = f'''
+    SELECT COUNT(*),
+           COUNT(CASE WHEN aberto = 1 THEN 1 END),
+           COUNT(CASE WHEN clicou_link = 1 THEN 1 END),
+           COUNT(CASE WHEN respondeu = 1 THEN 1 END)
+    FROM email_campaigns
+    WHERE {SQL_ENVIADOS}
+'''
+CAMPOS_ENVIOS = ('enviados', 'emails_abertos', 'emails_clicados', 'respostas')
+
+
+class ContadoresEventos:
+    """Contadores thread-safe; cada alteração incrementa a versão e acorda os streams"""
+
+    def __init__(self, max_recentes=20):
+        self._cond = threading.Condition()
+        self.versao = 0
+        self.totais = {
+            'enviados': 0,
+            'emails_abertos': 0,
+            'emails_clicados': 0,
+            'respostas': 0,
+            'aberturas': 0,
+            'cliques': 0,
+            'automaticos': 0,
+            # Hits repetidos descartados pela janela de deduplicação (desde a inicialização)
+            'duplicados': 0,
+        }
+        self.recentes = deque(maxlen=max_recentes)
+        self.iniciado_em = datetime.now().isoformat(timespec='seconds')
+
+    def carregar_do_banco(self, *db_files):
+        """Semeia os contadores com os totais atuais, somando os bancos (uma vez, na inicialização)"""
+        totais = dict.fromkeys(('enviados', 'emails_abertos', 'emails_clicados', 'respostas',
+                                'aberturas', 'cliques', 'automaticos'), 0)
+        for db_file in db_files:
+            try:
+                conn = banco_dados.conectar(db_file)
+                try:
+                    enviados, abertos, clicados, respostas = conn.execute(SQL_TOTAIS_ENVIOS).fetchone()
+                    # Eventos já arquivados em Parquet entram pela contagem diária
+                    por_tipo = dict(conn.execute('''
+                        SELECT evento_tipo, SUM(eventos) FROM (
+                            SELECT evento_tipo, COUNT(*) AS eventos FROM tracking_events
+                            WHERE classificacao IS NULL OR classificacao = 'humano'
+                            GROUP BY evento_tipo
+                            UNION ALL
+                            SELECT evento_tipo, SUM(eventos) FROM eventos_arquivados
+                            WHERE classificacao = 'humano'
+                            GROUP BY evento_tipo
+                        )
+                        GROUP BY evento_tipo
+                    ''').fetchall())
+                    automaticos = conn.execute('''
+                        SELECT (SELECT COUNT(*) FROM tracking_events
+                                WHERE classificacao IS NOT NULL AND classificacao != 'humano')
+                             + (SELECT COALESCE(SUM(eventos), 0) FROM eventos_arquivados
+                                WHERE classificacao != 'humano')
+                    ''').fetchone()[0]
+                finally:
+                    conn.close()
+            except sqlite3.OperationalError:
+                # Banco ainda não criado: não soma nada
+                continue
+
+            totais['enviados'] += enviados
+            totais['emails_abertos'] += abertos
+            totais['emails_clicados'] += clicados
+            totais['respostas'] += respostas
+            totais['aberturas'] += por_tipo.get('abertura', 0)
+            totais['cliques'] += por_tipo.get('clique', 0)
+            totais['automaticos'] += automaticos
+
+        with self._cond:
+            self.totais.update(totais)
+            self.versao += 1
+            self._cond.notify_all()
+
+    def recarregar_envios(self, *db_files):
+        """Relê só enviados/abertos/clicados/respostas (gravados fora deste processo)"""
+        totais = dict.fromkeys(CAMPOS_ENVIOS, 0)
+        for db_file in db_files:
+            try:
+                conn = banco_dados.conectar(db_file)
+                try:
+                    for campo, valor in zip(CAMPOS_ENVIOS, conn.execute(SQL_TOTAIS_ENVIOS).fetchone()):
+                        totais[campo] += valor
+                finally:
+                    conn.close()
+            except sqlite3.OperationalError:
+                continue
+
+        with self._cond:
+            if any(self.totais[campo] != valor for campo, valor in totais.items()):
+                self.totais.update(totais)
+                self.versao += 1
+                self._cond.notify_all()
+
+    def iniciar_recarga(self, arquivos, intervalo=INTERVALO_RECARGA):
+        """Thread que chama recarregar_envios(*arquivos()) a cada intervalo segundos"""
+        def recarregar():
+            while True:
+                time.sleep(intervalo)
+                self.recarregar_envios(*arquivos())
+
+        threading.Thread(target=recarregar, name='recarga-dashboard', daemon=True).start()
+
+    def registrar(self, evento_tipo, tracking_id, primeiro=False, humano=True, duplicado=False):
+        """Conta um evento; primeiro=True quando é a primeira abertura/clique do email"""
+        campo_evento = {'abertura': 'aberturas', 'clique': 'cliques'}
+        campo_unico = {'abertura': 'emails_abertos', 'clique': 'emails_clicados'}
+
+        with self._cond:
+            if duplicado:
+                # Hit repetido (não gravado): só o contador separado
+                self.totais['duplicados'] += 1
+                self.versao += 1
+                self._cond.notify_all()
+                return
+            if not humano:
+                # Proxy/prefetch/scanner/bot: só o contador separado
+                self.totais['automaticos'] += 1
+                self.versao += 1
+                self._cond.notify_all()
+                return
+            if evento_tipo in campo_evento:
+                self.totais[campo_evento[evento_tipo]] += 1
+            if primeiro and evento_tipo in campo_unico:
+                self.totais[campo_unico[evento_tipo]] += 1
+            self.recentes.appendleft({
+                'hora': datetime.now().strftime('%H:%M:%S'),
+                'tipo': evento_tipo,
+                'tracking_id': tracking_id,
+            })
+            self.versao += 1
+            self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            return self._snapshot()
+
+    def _snapshot(self):
+        enviados = self.totais['enviados']
+        dados = dict(self.totais)
+        dados['taxa_abertura'] = round(self.totais['emails_abertos'] * 100.0 / enviados, 1) if enviados else 0
+        dados['taxa_clique'] = round(self.totais['emails_clicados'] * 100.0 / enviados, 1) if enviados else 0
+        dados['recentes'] = list(self.recentes)
+        dados['versao'] = self.versao
+        dados['iniciado_em'] = self.iniciado_em
+        return dados
+
+    def aguardar_mudanca(self, versao_vista, timeout):
+        """Bloqueia até a versão mudar (ou timeout); retorna snapshot ou None"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.versao != versao_vista, timeout):
+                return None
+            return self._snapshot()
+
+    def stream_sse(self, heartbeat=15.0):
+        """Gerador de mensagens text/event-stream (heartbeat mantém proxies abertos)"""
+        dados = self.snapshot()
+        yield f"retry: 3000\ndata: {json.dumps(dados)}\n\n"
+        versao = dados['versao']
+
+        while True:
+            dados = self.aguardar_mudanca(versao, heartbeat)
+            if dados is None:
+                yield ": ping\n\n"
+                continue
+            versao = dados['versao']
+            yield f"data: {json.dumps(dados)}\n\n"
+
+
+HTML_DASHBOARD_AO_VIVO = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>Dashboard Ao Vivo - Email Marketing Analytics</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }
+        .container { max-width: 1200px; margin: 0 auto; }
+        .card { background: white; padding: 20px; margin: 20px 0; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+        .metric { display: inline-block; text-align: center; margin: 10px 20px; }
+        .metric-value { font-size: 2.5em; font-weight: bold; color: #2196F3; }
+        .metric-label { font-size: 0.9em; color: #666; }
+        .table { width: 100%; border-collapse: collapse; margin-top: 15px; }
+        .table th, .table td { padding: 10px; text-align: left; border-bottom: 1px solid #ddd; }
+        .table th { background-color: #f8f9fa; }
+        h1, h2 { color: #333; }
+        .update-time { color: #666; font-size: 0.9em; }
+        .offline { color: #dc3545; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>Email Marketing Analytics - Ao Vivo</h1>
+        <p class="update-time">Status: <span id="status">conectando...</span></p>
+
+        <div class="card">
+            <h2>Métricas Principais</h2>
+            <div class="metric"><div class="metric-value" id="enviados">-</div><div class="metric-label">Emails Enviados</div></div>
+            <div class="metric"><div class="metric-value" id="emails_abertos">-</div><div class="metric-label">Abertos (<span id="taxa_abertura">0</span>%)</div></div>
+            <div class="metric"><div class="metric-value" id="emails_clicados">-</div><div class="metric-label">Clicaram (<span id="taxa_clique">0</span>%)</div></div>
+            <div class="metric"><div class="metric-value" id="respostas">-</div><div class="metric-label">Respostas</div></div>
+        </div>
+
+        <div class="card">
+            <h2>Eventos Brutos</h2>
+            <div class="metric"><div class="metric-value" id="aberturas">-</div><div class="metric-label">Aberturas</div></div>
+            <div class="metric"><div class="metric-value" id="cliques">-</div><div class="metric-label">Cliques</div></div>
+            <div class="metric"><div class="metric-value" id="automaticos">-</div><div class="metric-label">Bots/Proxies</div></div>
+            <div class="metric"><div class="metric-value" id="duplicados">-</div><div class="metric-label">Hits Repetidos</div></div>
+        </div>
+
+        <div class="card">
+            <h2>Últimos Eventos</h2>
+            <table class="table">
+                <thead><tr><th>Hora</th><th>Evento</th><th>Tracking ID</th></tr></thead>
+                <tbody id="recentes"></tbody>
+            </table>
+        </div>
+    </div>
+    <script>
+    var indicador = document.getElementById('status');
+    // Repassa o ?token= da página para o stream
+    var fonte = new EventSource('stream' + location.search);
+    fonte.onopen = function () { indicador.textContent = 'conectado'; indicador.className = ''; };
+    fonte.onerror = function () { indicador.textContent = 'reconectando...'; indicador.className = 'offline'; };
+    fonte.onmessage = function (e) {
+        var d = JSON.parse(e.data);
+        ['enviados', 'emails_abertos', 'emails_clicados', 'respostas', 'aberturas',
+         'cliques', 'automaticos', 'duplicados', 'taxa_abertura', 'taxa_clique'].forEach(function (k) {
+            document.getElementById(k).textContent = d[k];
+        });
+        var corpo = document.getElementById('recentes');
+        corpo.replaceChildren();
+        d.recentes.forEach(function (ev) {
+            var tr = corpo.insertRow();
+            [ev.hora, ev.tipo, ev.tracking_id].forEach(function (v) { tr.insertCell().textContent = v; });
+        });
+        indicador.textContent = 'atualizado ' + new Date().toLocaleTimeString();
+    };
+    </script>
+</body>
+</html>
+"""
+
+
+def registrar_rotas(app, contadores, token, prefixo='/dashboard'):
+    """
+    Expõe /dashboard/ (página), /dashboard/stream (SSE) e /dashboard/metricas.json
+    no app Flask, só com token (DASHBOARD_TOKEN): o servidor de tracking é
+    público e os tracking IDs recentes poderiam ser reenviados ao /pixel/.
+    Sem token as rotas não existem. O token vai em ?token= (o EventSource
+    não manda cabeçalhos) ou em Authorization: Bearer.
+    """
+    if not token:
+        return
+    import hmac
+    from functools import wraps
+    from flask import Response, abort, request
+
+    def autorizado(rota):
+        @wraps(rota)
+        def verificar(*args, **kwargs):
+            cabecalho = request.headers.get('Authorization', '')
+            recebido = request.args.get('token') or (cabecalho[7:] if cabecalho.startswith('Bearer ') else '')
+            if not hmac.compare_digest(recebido.encode(), token.encode()):
+                abort(403)
+            return rota(*args, **kwargs)
+        return verificar
+
+    @app.route(f"{prefixo}/")
+    @autorizado
+    def dashboard_ao_vivo():
+        return Response(HTML_DASHBOARD_AO_VIVO, mimetype='text/html')
+
+    @app.route(f"{prefixo}/stream")
+    @autorizado
+    def dashboard_stream():
+        return Response(
+            contadores.stream_sse(),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    @app.route(f"{prefixo}/metricas.json")
+    @autorizado
+    def dashboard_metricas():
+        return Response(json.dumps(contadores.snapshot()), mimetype='application/json')
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Renderizador de Dashboard em Streaming
+Escreve o dashboard direto no arquivo, em blocos, a partir das linhas do cursor.
+A tabela por empresa é paginada em seções <template> (inertes até serem
+exibidas), então 100k+ linhas não viram uma string gigante nem um DOM gigante.
+"""
+
+from datetime import datetime
+from html import escape
+
+import banco_dados
+
+CSS_DASHBOARD = """
+                body { font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }
+                .container { max-width: 1200px; margin: 0 auto; }
+                .card { background: white; padding: 20px; margin: 20px 0; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+                .metric { display: inline-block; text-align: center; margin: 10px 20px; }
+                .metric-value { font-size: 2.5em; font-weight: bold; color: #2196F3; }
+                .metric-label { font-size: 0.9em; color: #666; }
+                .table { width: 100%; border-collapse: collapse; margin-top: 15px; }
+                .table th, .table td { padding: 10px; text-align: left; border-bottom: 1px solid #ddd; }
+                .table th { background-color: #f8f9fa; }
+                .status-enviado { color: #28a745; }
+                .status-aberto { color: #007bff; }
+                .status-clicado { color: #ffc107; }
+                .status-respondido { color: #dc3545; }
+                .paginacao { margin-top: 10px; }
+                .paginacao button { margin: 0 4px; }
+                h1, h2 { color: #333; }
+                .update-time { color: #666; font-size: 0.9em; }
+"""
+
+# Troca de página: clona a seção <template> da página pedida para o <tbody>
+JS_PAGINACAO = """
+        <script>
+        function mostrarPagina(n) {
+            var paginas = document.querySelectorAll('template.pagina-empresas');
+            if (!paginas.length) return;
+            n = Math.max(0, Math.min(n, paginas.length - 1));
+            var corpo = document.getElementById('corpo-empresas');
+            corpo.replaceChildren(paginas[n].content.cloneNode(true));
+            corpo.dataset.pagina = n;
+            document.getElementById('indicador-pagina').textContent = (n + 1) + ' / ' + paginas.length;
+        }
+        function mudarPagina(delta) {
+            var corpo = document.getElementById('corpo-empresas');
+            mostrarPagina(parseInt(corpo.dataset.pagina || '0', 10) + delta);
+        }
+        mostrarPagina(0);
+        </script>
+"""
+
+QUERY_EMPRESAS = '''
+    SELECT empresa_nome, email_destino, provedor_tipo, status_entrega,
+           total_aberturas, total_cliques,
+           CASE WHEN respondeu = 1 THEN 'Sim' ELSE 'Não' END,
+           enviado_em
+    FROM email_campaigns
+    ORDER BY empresa_nome, id
+'''
+
+
+def _celulas(valores):
+    return ''.join(f"<td>{escape('N/A' if v is None else str(v))}</td>" for v in valores)
+
+
+class DashboardStreaming:
+    """Gera dashboard_analytics.html sem montar a página inteira em memória"""
+
+    def __init__(self, db_file, tamanho_pagina=500, tamanho_lote=2000):
+        self.db_file = db_file
+        self.tamanho_pagina = tamanho_pagina
+        self.tamanho_lote = tamanho_lote
+
+    def renderizar(self, rollups, caminho_saida='dashboard_analytics.html', incluir_empresas=True):
+        """Escreve o dashboard no arquivo; retorna o número de empresas listadas"""
+        with open(caminho_saida, 'w', encoding='utf-8', buffering=1 << 16) as f:
+            self._escrever_cabecalho(f)
+            self._escrever_metricas(f, rollups['geral'])
+            self._escrever_provedores(f, rollups['por_provedor'])
+            self._escrever_top(f, rollups['top_engajamento'])
+
+            total_empresas = 0
+            if incluir_empresas:
+                total_empresas = self._escrever_empresas(f)
+
+            f.write("    </div>\n")
+            if incluir_empresas:
+                f.write(JS_PAGINACAO)
+            f.write("</body>\n</html>\n")
+
+        return total_empresas
+
+    def _escrever_cabecalho(self, f):
+        f.write(f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>Dashboard - Email Marketing Analytics</title>
+    <style>{CSS_DASHBOARD}    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>Email Marketing Analytics Dashboard</h1>
+        <p class="update-time">Última atualização: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}</p>
+""")
+
+    def _escrever_metricas(self, f, geral):
+        total = geral['total_enviados']
+
+        def taxa(valor):
+            return (valor / total * 100) if total > 0 else 0
+
+        f.write('        <div class="card">\n            <h2>Métricas Principais</h2>\n')
+        for valor, rotulo in (
+            (total, "Emails Enviados"),
+            (geral['total_abertos'], f"Abertos ({taxa(geral['total_abertos']):.1f}%)"),
+            (geral['total_cliques'], f"Cliques ({taxa(geral['total_cliques']):.1f}%)"),
+            (geral['total_respostas'], f"Respostas ({taxa(geral['total_respostas']):.1f}%)"),
+            (geral.get('aberturas_automaticas', 0) + geral.get('cliques_automaticos', 0),
+             "Eventos de Bots/Proxies (fora das taxas)"),
+        ):
+            f.write(f'            <div class="metric"><div class="metric-value">{valor}</div>'
+                    f'<div class="metric-label">{rotulo}</div></div>\n')
+        f.write('        </div>\n')
+
+    def _abrir_tabela(self, f, titulo, colunas, corpo_id=None):
+        cabecalho = ''.join(f"<th>{c}</th>" for c in colunas)
+        corpo = f' id="{corpo_id}"' if corpo_id else ''
+        f.write(f'        <div class="card">\n            <h2>{titulo}</h2>\n'
+                f'            <table class="table">\n                <thead><tr>{cabecalho}</tr></thead>\n'
+                f'                <tbody{corpo}>\n')
+
+    def _escrever_provedores(self, f, por_provedor):
+        self._abrir_tabela(f, "Performance por Provedor",
+                           ["Provedor", "Enviados", "Abertos", "Taxa Abertura", "Cliques", "Taxa Clique"])
+        for provedor, enviados, abertos, taxa_abertura, cliques, taxa_clique in por_provedor:
+            f.write(f"                    <tr>{_celulas((provedor, enviados, abertos))}"
+                    f"<td>{taxa_abertura}%</td><td>{cliques}</td><td>{taxa_clique}%</td></tr>\n")
+        f.write("                </tbody>\n            </table>\n        </div>\n")
+
+    def _escrever_top(self, f, top_engajamento):
+        self._abrir_tabela(f, "Top 10 Empresas Mais Engajadas",
+                           ["Empresa", "Email", "Aberturas", "Cliques", "Respondeu", "Primeira Abertura"])
+        for linha in top_engajamento[:10]:
+            f.write(f"                    <tr>{_celulas(linha)}</tr>\n")
+        f.write("                </tbody>\n            </table>\n        </div>\n")
+
+    def _escrever_empresas(self, f):
+        """Tabela completa por empresa, uma seção <template> por página"""
+        self._abrir_tabela(f, "Todas as Empresas",
+                           ["Empresa", "Email", "Provedor", "Status", "Aberturas", "Cliques",
+                            "Respondeu", "Enviado em"],
+                           corpo_id="corpo-empresas")
+        f.write("                </tbody>\n            </table>\n")
+        f.write('            <div class="paginacao">'
+                '<button onclick="mudarPagina(-1)">◀</button>'
+                '<span id="indicador-pagina"></span>'
+                '<button onclick="mudarPagina(1)">▶</button></div>\n')
+
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            cursor = conn.execute(QUERY_EMPRESAS)
+            total = 0
+            na_pagina = 0
+            while True:
+                lote = cursor.fetchmany(self.tamanho_lote)
+                if not lote:
+                    break
+                partes = []
+                for linha in lote:
+                    if na_pagina == 0:
+                        partes.append('            <template class="pagina-empresas">\n')
+                    partes.append(f"<tr>{_celulas(linha)}</tr>\n")
+                    na_pagina += 1
+                    if na_pagina == self.tamanho_pagina:
+                        partes.append('            </template>\n')
+                        na_pagina = 0
+                f.write(''.join(partes))
+                total += len(lote)
+            if na_pagina:
+                f.write('            </template>\n')
+        finally:
+            conn.close()
+
+        f.write("        </div>\n")
+        return total
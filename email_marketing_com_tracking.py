@@ -4,20 +4,16 @@ Sistema de Email Marketing com Tracking Completo
 Versão integrada com monitoramento de entregas, aberturas e cliques
 """
 
-import pandas as pd
-import smtplib
 import time
 import json
 import os
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import random
 from sistema_monitoramento_analytics import EmailAnalytics
 
 class EmailMarketingComTracking:
-    def __init__(self):
+    def __init__(self, campanha=None, intervalo_descarga=None, tamanho_lote=None):
         # Configurações básicas
         for key in list(os.environ.keys()):
             if key.startswith(('EMAIL_', 'SMTP_')):
@@ -30,40 +26,33 @@ class EmailMarketingComTracking:
         self.smtp_server = 'smtp.gmail.com'
         self.smtp_port = 587
         
-        # Sistema de analytics
-        self.analytics = EmailAnalytics()
+        # Sistema de analytics (campanha nomeada: grava no shard dela; pendentes
+        # gravados antes do SMTP, confirmações em lote a cada intervalo_descarga
+        # segundos ou tamanho_lote operações)
+        self.analytics = EmailAnalytics(campanha, intervalo_descarga, tamanho_lote)
         
         # Logs tradicionais + analytics
         self.sent_log = "emails_enviados_empresas.json"
         self.failed_log = "emails_falharam.json"
         
     def classificar_provedor(self, email):
-        """Classifica provedor para analytics"""
-        domain = email.split('@')[1].lower()
-        
-        if domain == 'gmail.com':
-            return 'gmail'
-        elif domain in ['hotmail.com', 'outlook.com', 'live.com', 'msn.com']:
-            return 'outlook'
-        elif domain in ['uol.com.br', 'yahoo.com.br']:
-            return 'outros'
-        elif domain.endswith('.gov.br'):
-            return 'governo'
-        elif domain.endswith('.edu.br'):
-            return 'educacional'
-        else:
-            return 'corporativo'
+        """Classifica provedor para analytics (mesma regra do agendador de horários)"""
+        from agendamento_envios import classificar_provedor
+        return classificar_provedor(email)
     
-    def send_tracked_email(self, recipient, empresa_nome, razao_social, subject_template, body_template):
+    def send_tracked_email(self, recipient, empresa_nome, razao_social, subject_template, body_template,
+                           prioridade_email=None):
         """Envia email com tracking completo"""
+        import smtplib
         
         provedor_tipo = self.classificar_provedor(recipient)
+        tracking_id = None
         
         try:
             # Criar email com tracking
             msg, tracking_id = self.analytics.create_tracked_email(
                 recipient, empresa_nome, razao_social, 
-                subject_template, body_template, provedor_tipo
+                subject_template, body_template, provedor_tipo, prioridade_email
             )
             
             # Enviar email
@@ -71,6 +60,7 @@ class EmailMarketingComTracking:
                 server.starttls()
                 server.login(self.email, self.password)
                 server.send_message(msg)
+            self.analytics.confirmar_envio(tracking_id, provedor_tipo)
             
             print(f"Email enviado com tracking: {empresa_nome} (ID: {tracking_id})")
             
@@ -81,6 +71,8 @@ class EmailMarketingComTracking:
             
         except Exception as e:
             print(f"Erro ao enviar para {empresa_nome}: {e}")
+            if tracking_id:
+                self.analytics.registrar_falha_envio(tracking_id)
             self.save_failed_email(razao_social, recipient, str(e))
             return False, None
     
@@ -122,6 +114,7 @@ class EmailMarketingComTracking:
     def executar_campanha_com_tracking(self, csv_file, subject_template, body_template, 
                                      emails_per_day=50, delay_range=(300, 600)):
         """Executa campanha completa com tracking"""
+        import pandas as pd
         
         # Carregar dados
         df = pd.read_csv(csv_file, encoding='utf-8')
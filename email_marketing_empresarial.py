@@ -5,19 +5,21 @@ Desenvolvido para campanhas B2B com personalização automática
 Autor: Lucas Rosati
 """
 
-import pandas as pd
-import smtplib
+from __future__ import annotations
+
 import time
 import random
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
 import logging
 import json
 import os
 from datetime import datetime, timedelta
-from typing import List, Dict, Tuple, Optional
+from typing import TYPE_CHECKING, List, Dict, Tuple, Optional
+
+if TYPE_CHECKING:
+    # pandas, smtplib e MIME são importados sob demanda (inicialização rápida da CLI)
+    import pandas as pd
+    from email.mime.multipart import MIMEMultipart
+    from plano_envio import PlanoEnvio
 
 class EmailMarketingEmpresarial:
     def __init__(self, smtp_server: str, smtp_port: int, email: str, password: str):
@@ -27,6 +29,11 @@ class EmailMarketingEmpresarial:
         self.password = password
         self.sent_log = "emails_enviados_empresas.json"
         self.failed_log = "emails_falharam.json"
+        self.plan_file = "plano_envio.bin"
+        self.validacao_emails = {}
+        self.analytics_db = "email_analytics.db"
+        self.emails_suprimidos = set()
+        self.emails_reenvio = set()
         self.setup_logging()
         
     def setup_logging(self):
@@ -43,6 +50,8 @@ class EmailMarketingEmpresarial:
     
     def load_empresas_csv(self, file_path: str) -> pd.DataFrame:
         """Carrega dados das empresas do CSV"""
+        import pandas as pd
+        
         try:
             df = pd.read_csv(file_path, encoding='utf-8')
             
@@ -68,23 +77,60 @@ class EmailMarketingEmpresarial:
         Retorna o melhor email disponível e sua prioridade
         Retorna: (email, prioridade) onde prioridade: 1=Email1, 2=Email2, 3=Email3
         """
-        emails_to_check = [
-            (row.get('Email1'), 1),
-            (row.get('Email2'), 2), 
-            (row.get('Email3'), 3)
-        ]
-        
-        for email, priority in emails_to_check:
-            if pd.notna(email) and email and '@' in str(email) and '.' in str(email):
+        return self.melhor_email((row.get('Email1'), row.get('Email2'), row.get('Email3')))
+    
+    def melhor_email(self, emails: Tuple) -> Tuple[Optional[str], int]:
+        """get_best_email sobre os valores (Email1, Email2, Email3), sem montar a linha do pandas"""
+        for priority, email in enumerate(emails, 1):
+            # NaN/None do CSV não são str
+            if isinstance(email, str) and '@' in email and '.' in email:
+                # Resultado da validação em lote (se executada): pula inválidos
+                # e usa o endereço já corrigido ("gmial.com" → "gmail.com")
+                validacao = self.validacao_emails.get(email)
+                if validacao is not None:
+                    if validacao['valido'] and validacao['email'] not in self.emails_suprimidos:
+                        return validacao['email'], priority
+                    continue
+                
                 # Validação básica de email
                 email_clean = str(email).strip().lower()
+                if email_clean in self.emails_suprimidos:
+                    continue
                 if len(email_clean) > 5 and email_clean.count('@') == 1:
                     return email_clean, priority
         
         return None, 0
     
+    def validar_emails(self, df: pd.DataFrame) -> Dict:
+        """Valida de uma vez todos os emails do DataFrame (sintaxe, domínio e MX)"""
+        from validacao_emails import ValidadorEmails, carregar_descartaveis
+        
+        colunas = [c for c in ('Email1', 'Email2', 'Email3') if c in df.columns]
+        emails = {e for c in colunas for e in df[c].dropna() if isinstance(e, str) and e.strip()}
+        
+        carregar_descartaveis()
+        validador = ValidadorEmails.padrao()
+        self.validacao_emails = validador.validar_lote(emails)
+        
+        resumo = validador.resumo(self.validacao_emails)
+        self.logger.info(f"🔎 Validação de {len(emails)} emails: {resumo}")
+        return resumo
+    
+    def carregar_supressao(self):
+        """Hard bounces/reclamações (suprimidos) e soft bounces a reenviar, do banco de analytics"""
+        if not os.path.exists(self.analytics_db):
+            return
+        from processamento_bounces import ListaSupressao
+        
+        self.emails_suprimidos, self.emails_reenvio = ListaSupressao(self.analytics_db).carregar()
+        if self.emails_suprimidos or self.emails_reenvio:
+            self.logger.info(f"🚫 {len(self.emails_suprimidos)} emails suprimidos | "
+                             f"🔁 {len(self.emails_reenvio)} soft bounces para reenvio")
+    
     def get_nome_empresa(self, row: pd.Series) -> str:
         """Extrai o nome da empresa, priorizando NomeFantasia sobre RazaoSocial"""
+        import pandas as pd
+        
         nome_fantasia = row.get('NomeFantasia')
         razao_social = row.get('RazaoSocial')
         
@@ -99,21 +145,14 @@ class EmailMarketingEmpresarial:
         return nome_clean
     
     def clean_company_name(self, nome: str) -> str:
-        """Limpa nome da empresa removendo sufixos desnecessários"""
-        # Lista de sufixos para remover
-        sufixes_remove = [
-            ' LTDA', ' LTDA.', ' S.A.', ' S/A', ' SA', ' S.A', 
-            ' EIRELI', ' ME', ' EPP', ' MICROEMPRESA', ' - ME',
-            ' - EPP', ' - EIRELI', ' LIMITADA'
-        ]
-        
-        nome_upper = nome.upper()
-        for suffix in sufixes_remove:
-            if nome_upper.endswith(suffix):
-                nome = nome[:len(nome)-len(suffix)]
-                break
-        
-        return nome.strip()
+        """Limpa nome da empresa removendo sufixos desnecessários (inclusive repetidos: "LTDA - ME")"""
+        from normalizacao_nomes import normalizar_nome
+        return normalizar_nome(nome)
+    
+    def get_nomes_empresas(self, df: pd.DataFrame) -> pd.Series:
+        """Versão vetorizada de get_nome_empresa para o DataFrame inteiro"""
+        from normalizacao_nomes import nomes_empresas
+        return nomes_empresas(df)
     
     def load_sent_emails(self) -> Dict:
         """Carrega histórico de emails enviados"""
@@ -155,6 +194,10 @@ class EmailMarketingEmpresarial:
                                 body_template: str, is_html: bool = False, 
                                 attachment_path: str = None) -> MIMEMultipart:
         """Cria email personalizado para a empresa"""
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.base import MIMEBase
+        from email import encoders
         
         # Personaliza assunto
         subject = subject_template.format(
@@ -203,6 +246,8 @@ class EmailMarketingEmpresarial:
                          subject_template: str, body_template: str, 
                          is_html: bool = False, attachment_path: str = None) -> bool:
         """Envia um email individual personalizado"""
+        import smtplib
+        
         try:
             msg = self.create_personalized_email(
                 recipient, nome_empresa, razao_social, 
@@ -250,11 +295,58 @@ class EmailMarketingEmpresarial:
         self.logger.info(f"⏰ Aguardando horário comercial. Próximo envio: {next_start.strftime('%d/%m/%Y %H:%M')} ({hours:.1f}h)")
         time.sleep(wait_seconds)
     
+    def wait_until(self, horario: datetime):
+        """Aguarda até o horário agendado (sem espera se já passou)"""
+        wait_seconds = (horario - datetime.now()).total_seconds()
+        if wait_seconds > 0:
+            self.logger.info(f"🕐 Próximo envio agendado: {horario.strftime('%d/%m/%Y %H:%M')} ({wait_seconds/60:.0f} min)")
+            time.sleep(wait_seconds)
+    
+    def montar_plano(self, df: pd.DataFrame, sent_emails: Dict) -> PlanoEnvio:
+        """Empresas não contatadas (ou com soft bounce aguardando reenvio) em um PlanoEnvio"""
+        from plano_envio import PlanoEnvio
+        
+        # Nomes limpos de uma vez só (vetorizado), em vez de linha a linha
+        nomes_empresas = self.get_nomes_empresas(df)
+        colunas_email = [df[c] if c in df.columns else [None] * len(df) for c in ('Email1', 'Email2', 'Email3')]
+        
+        plano = PlanoEnvio()
+        for index, razao_social, nome_empresa, *emails in zip(df.index, df['RazaoSocial'], nomes_empresas,
+                                                               *colunas_email):
+            if razao_social not in sent_emails or sent_emails[razao_social].get('email') in self.emails_reenvio:
+                email, priority = self.melhor_email(emails)
+                if email:
+                    plano.adicionar(index, razao_social, nome_empresa, email, priority)
+        return plano
+    
+    def planejar_horarios(self, plano: PlanoEnvio, start_time: str, end_time: str,
+                          emails_per_day: int, delay_range: tuple, warmup_schedule: List[int],
+                          otimizar: bool = True) -> PlanoEnvio:
+        """
+        Plano com o horário de cada envio: janela comercial, limite diário e
+        aquecimento ficam todos aqui. Com otimizar, cada empresa vai para a hora
+        de maior engajamento do seu domínio/provedor; senão, as horas
+        são preenchidas em ordem (Email1 antes de Email3, depois a ordem do CSV)
+        """
+        from agendamento_envios import AgendadorEnvios, HistoricoEngajamento
+        
+        historico = HistoricoEngajamento.carregar_padrao(self.analytics_db) if otimizar else HistoricoEngajamento()
+        agendador = AgendadorEnvios(
+            historico, start_time, end_time,
+            limites_diarios=warmup_schedule, limite_padrao=emails_per_day,
+            # Uma hora não comporta mais envios do que o delay médio permite
+            capacidade_hora=max(1, int(3600 // (sum(delay_range) / 2)))
+        )
+        if otimizar:
+            self.logger.info("🕐 Envio otimizado: horários pelo histórico de aberturas e respostas")
+        return plano.agendar(agendador)
+    
     def send_bulk_emails_empresas(self, csv_file: str, subject_template: str, 
                                 body_template: str, emails_per_day: int = 80,
                                 delay_range: tuple = (60, 180), is_html: bool = False,
                                 start_time: str = "09:00", end_time: str = "17:00",
-                                enable_warmup: bool = True, attachment_path: str = None):
+                                enable_warmup: bool = True, attachment_path: str = None,
+                                validate_emails: bool = True, optimize_send_time: bool = True):
         """
         Envia emails para todas as empresas do CSV
         
@@ -269,82 +361,41 @@ class EmailMarketingEmpresarial:
             end_time: Horário de fim dos envios (HH:MM)
             enable_warmup: Se deve usar aquecimento gradual
             attachment_path: Caminho para arquivo anexo (PDF, DOC, etc.)
+            validate_emails: Se deve validar sintaxe/domínio/MX antes de enviar
+            optimize_send_time: Se deve agendar cada empresa na hora de maior engajamento
+                histórico do domínio/provedor (senão, horas preenchidas na ordem do CSV)
         """
         
         df = self.load_empresas_csv(csv_file)
         sent_emails = self.load_sent_emails()
         
+        self.carregar_supressao()
+        if validate_emails:
+            self.validar_emails(df)
+        
         # Cronograma de aquecimento
         warmup_schedule = [5, 10, 15, 25, 35, 50, 70] if enable_warmup else []
         
-        # Filtra empresas não contatadas
-        remaining_companies = []
-        for index, row in df.iterrows():
-            razao_social = row['RazaoSocial']
-            if razao_social not in sent_emails:
-                email, priority = self.get_best_email(row)
-                if email:
-                    remaining_companies.append((index, row, email, priority))
+        # Plano compacto (só os campos do envio); o DataFrame pode ser liberado
+        plano = self.montar_plano(df, sent_emails)
+        del df
         
-        if not remaining_companies:
+        if not len(plano):
             self.logger.info("🎉 Todos os emails já foram enviados!")
             return
         
-        self.logger.info(f"📧 Iniciando campanha para {len(remaining_companies)} empresas")
+        self.logger.info(f"📧 Iniciando campanha para {len(plano)} empresas")
         if enable_warmup:
             self.logger.info("🔥 Modo aquecimento ativado - velocidade gradual")
         
-        sent_today = 0
-        last_reset = datetime.now().date()
-        campaign_day = 1  # Contador de dias da campanha
+        # O plano é a única fonte de horários: janela comercial, limite diário e
+        # aquecimento já estão nele, o loop só espera cada horário chegar
+        plano = self.planejar_horarios(plano, start_time, end_time, emails_per_day,
+                                       delay_range, warmup_schedule, optimize_send_time)
+        plano.salvar(self.plan_file)
         
-        for index, row, email, priority in remaining_companies:
-            razao_social = row['RazaoSocial']
-            nome_empresa = self.get_nome_empresa(row)
-            
-            # Verifica horário comercial
-            if not self.is_business_hours(start_time, end_time):
-                self.wait_until_business_hours(start_time)
-            
-            # Reset contador diário
-            current_date = datetime.now().date()
-            if current_date > last_reset:
-                sent_today = 0
-                last_reset = current_date
-                campaign_day += 1
-                self.logger.info(f"📅 Novo dia: {current_date} (Dia {campaign_day} da campanha)")
-            
-            # Determina limite do dia (aquecimento ou normal)
-            if enable_warmup and campaign_day <= len(warmup_schedule):
-                daily_limit = warmup_schedule[campaign_day - 1]
-                self.logger.info(f"🔥 Aquecimento dia {campaign_day}: {daily_limit} emails")
-            else:
-                daily_limit = emails_per_day
-            
-            # Verifica limite diário
-            if sent_today >= daily_limit:
-                tomorrow = datetime.combine(
-                    datetime.now().date() + timedelta(days=1),
-                    datetime.strptime(start_time, "%H:%M").time()
-                )
-                wait_seconds = (tomorrow - datetime.now()).total_seconds()
-                
-                if enable_warmup and campaign_day <= len(warmup_schedule):
-                    self.logger.info(f"🔥 Limite de aquecimento atingido ({daily_limit} emails). Próximo dia: {daily_limit} → {warmup_schedule[min(campaign_day, len(warmup_schedule)-1)]}")
-                else:
-                    self.logger.info(f"🚫 Limite diário atingido ({daily_limit} emails)")
-                
-                self.logger.info(f"⏰ Aguardando até amanhã ({wait_seconds/3600:.1f}h)")
-                time.sleep(wait_seconds)
-                sent_today = 0
-            
-            # Delay maior durante aquecimento
-            if enable_warmup and campaign_day <= 3:  # Primeiros 3 dias
-                warmup_delay = (delay_range[0] * 2, delay_range[1] * 2)  # Delay 2x maior
-                current_delay_range = warmup_delay
-                self.logger.info(f"🔥 Modo aquecimento: delay extra ({current_delay_range[0]}-{current_delay_range[1]}s)")
-            else:
-                current_delay_range = delay_range
+        for index, razao_social, nome_empresa, email, priority, horario in plano:
+            self.wait_until(horario)
             
             # Envia o email
             self.logger.info(f"📤 Enviando para: {nome_empresa} | Email{priority}: {email}")
@@ -356,10 +407,12 @@ class EmailMarketingEmpresarial:
             
             if success:
                 self.save_sent_email(razao_social, email, priority)
-                sent_today += 1
+                if email in self.emails_reenvio:
+                    from processamento_bounces import ListaSupressao
+                    ListaSupressao(self.analytics_db).marcar_reenviado(email)
                 
-                # Delay aleatório (maior durante aquecimento)
-                delay = random.randint(current_delay_range[0], current_delay_range[1])
+                # Delay aleatório (a capacidade de cada hora do plano já conta com ele)
+                delay = random.randint(delay_range[0], delay_range[1])
                 self.logger.info(f"⏳ Aguardando {delay}s antes do próximo...")
                 time.sleep(delay)
             else:
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Enriquecimento de Dispositivo e Localização
+Preenche dispositivo_abertura, localizacao_abertura e user_agent de
+email_campaigns com a primeira abertura humana, sem nenhuma chamada de rede:
+
+- user agent → "tipo · sistema · cliente" (ex.: "mobile · iOS · Apple Mail"),
+  por listas ordenadas de regex compiladas uma vez, com LRU: poucos user
+  agents distintos se repetem em milhares de aberturas;
+- IP → "Cidade, Estado, País" num arquivo GeoIP local mapeado em memória:
+  o formato MaxMind (.mmdb) quando o pacote maxminddb está instalado, ou o
+  formato compacto próprio gerado por compilar_geoip() a partir do CSV
+  gratuito da DB-IP (IP to City Lite), consultado por busca binária direto
+  no mmap, sem carregar o arquivo.
+
+Roda na gravação de cada abertura (servidor de tracking) e como backfill em
+lote sobre os tracking_events já gravados.
+"""
+
+import csv
+import ipaddress
+import mmap
+import os
+import re
+import socket
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+
+import banco_dados
+
+ARQUIVO_GEOIP = 'geoip.bin'
+MAGICO_GEOIP = b'GEOIPALG1\n'
+# Ordem dos bytes da máquina que gerou ('l'/'b'), faixas IPv4, faixas IPv6, locais, bytes de texto
+CABECALHO_GEOIP = struct.Struct('<cIIII')
+
+TAMANHO_CACHE = 65536
+TAMANHO_LOTE = 20000
+
+# (valor, padrão) por campo; vale o primeiro da lista que casar
+TIPOS_DISPOSITIVO = [
+    ('tablet', r'iPad|Tablet|Kindle|Silk/|Android(?!.*Mobile)'),
+    ('mobile', r'iPhone|iPod|Mobile|Windows Phone|BlackBerry|Opera Mini'),
+]
+SISTEMAS = [
+    ('iOS', r'iPhone|iPad|iPod|CPU (?:iPhone )?OS \d'),
+    ('Android', r'Android'),
+    ('Windows', r'Windows'),
+    ('macOS', r'Macintosh|Mac OS X'),
+    ('ChromeOS', r'CrOS'),
+    ('Linux', r'Linux|X11'),
+]
+CLIENTES = [
+    ('Outlook', r'Microsoft Outlook|MSOffice|ms-office|Outlook-(?:iOS|Android)'),
+    ('Thunderbird', r'Thunderbird'),
+    ('Gmail', r'\bGSA/|Gmail'),
+    ('Yahoo Mail', r'YahooMobile|Yahoo Mail'),
+    ('Samsung Email', r'SamsungBrowser.*Email|com\.samsung\.android\.email'),
+    ('Edge', r'Edg(?:e|A|iOS)?/'),
+    ('Opera', r'OPR/|Opera'),
+    ('Samsung Internet', r'SamsungBrowser'),
+    ('Chrome', r'Chrome/|CriOS/'),
+    ('Firefox', r'Firefox/|FxiOS/'),
+    ('Safari', r'Version/[\d.]+.*Safari/'),
+    # WebKit da Apple sem "Safari/" no fim: o Mail do iPhone/Mac
+    ('Apple Mail', r'AppleWebKit/[\d.]+ \(KHTML, like Gecko\)(?: Mobile/\w+)?$'),
+]
+
+
+def _compilar(lista):
+    return [(valor, re.compile(padrao)) for valor, padrao in lista]
+
+
+def _primeiro(regras, texto, padrao=None):
+    for valor, regex in regras:
+        if regex.search(texto):
+            return valor
+    return padrao
+
+
+def formatar_localizacao(cidade, estado, pais):
+    return ', '.join(parte for parte in (cidade, estado, pais) if parte) or None
+
+
+def _chave_ip(ip_address):
+    """(versão, bytes big-endian) do IP (X-Forwarded-For: o primeiro); None se inválido"""
+    ip_address = ip_address.split(',', 1)[0].strip()
+    try:
+        return 4, socket.inet_pton(socket.AF_INET, ip_address)
+    except OSError:
+        pass
+    try:
+        return 6, ipaddress.IPv6Address(ip_address).packed
+    except ValueError:
+        return None
+
+
+def compilar_geoip(csv_path, destino=ARQUIVO_GEOIP):
+    """
+    Gera o arquivo GeoIP compacto a partir de um CSV de faixas: o da DB-IP
+    (ip_inicio, ip_fim, continente, país, estado, cidade, lat, lon) ou
+    simplesmente ip_inicio, ip_fim, país, estado, cidade. Retorna faixas gravadas.
+    """
+    faixas = {4: [], 6: []}
+    locais, indices = [], {}
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for linha in csv.reader(f):
+            if len(linha) >= 8:
+                inicio, fim, _, pais, estado, cidade = linha[:6]
+            elif len(linha) >= 5:
+                inicio, fim, pais, estado, cidade = linha[:5]
+            else:
+                continue
+            try:
+                inicio, fim = ipaddress.ip_address(inicio.strip()), ipaddress.ip_address(fim.strip())
+            except ValueError:
+                # Cabeçalho ou linha inválida
+                continue
+            local = formatar_localizacao(cidade.strip(), estado.strip(), pais.strip()) or ''
+            indice = indices.get(local)
+            if indice is None:
+                indice = indices[local] = len(locais)
+                locais.append(local)
+            faixas[inicio.version].append((int(inicio), int(fim), indice))
+
+    for lista in faixas.values():
+        lista.sort()
+    textos = bytearray()
+    fins = array('I')
+    for local in locais:
+        textos += local.encode('utf-8')
+        fins.append(len(textos))
+
+    with open(destino + '.tmp', 'wb') as f:
+        f.write(MAGICO_GEOIP)
+        f.write(CABECALHO_GEOIP.pack(sys.byteorder[:1].encode(), len(faixas[4]), len(faixas[6]),
+                                     len(locais), len(textos)))
+        # IPv4 em arrays nativos (a busca binária indexa o mmap direto); IPv6 em bytes big-endian
+        for coluna in range(3):
+            f.write(array('I', (faixa[coluna] for faixa in faixas[4])).tobytes())
+        for coluna in range(2):
+            f.write(b''.join(faixa[coluna].to_bytes(16, 'big') for faixa in faixas[6]))
+        f.write(array('I', (faixa[2] for faixa in faixas[6])).tobytes())
+        f.write(fins.tobytes())
+        f.write(textos)
+    os.replace(destino + '.tmp', destino)
+    return len(faixas[4]) + len(faixas[6])
+
+
+class _ChavesIPv6:
+    """Sequência de chaves de 16 bytes dentro do mmap (para o bisect)"""
+
+    __slots__ = ('dados', 'inicio', 'n')
+
+    def __init__(self, dados, inicio, n):
+        self.dados, self.inicio, self.n = dados, inicio, n
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        posicao = self.inicio + 16 * i
+        return self.dados[posicao:posicao + 16]
+
+
+class GeoIPCompacto:
+    """Consulta o arquivo de compilar_geoip() mapeado em memória"""
+
+    def __init__(self, caminho):
+        with open(caminho, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGICO_GEOIP)] != MAGICO_GEOIP:
+            raise ValueError(f"Arquivo não é um GeoIP compilado: {caminho}")
+        ordem, n4, n6, n_locais, _ = CABECALHO_GEOIP.unpack_from(self._mmap, len(MAGICO_GEOIP))
+        dados = memoryview(self._mmap)
+        posicao = len(MAGICO_GEOIP) + CABECALHO_GEOIP.size
+
+        def inteiros(n):
+            nonlocal posicao
+            bloco = dados[posicao:posicao + 4 * n]
+            posicao += 4 * n
+            if ordem == sys.byteorder[:1].encode():
+                return bloco.cast('I')
+            # Gerado em máquina de outra ordem de bytes: copia invertendo
+            valores = array('I')
+            valores.frombytes(bloco)
+            valores.byteswap()
+            return valores
+
+        self._v4 = (inteiros(n4), inteiros(n4), inteiros(n4))
+        self._inicios6 = _ChavesIPv6(self._mmap, posicao, n6)
+        self._fins6 = _ChavesIPv6(self._mmap, posicao + 16 * n6, n6)
+        posicao += 32 * n6
+        self._locais6 = inteiros(n6)
+        self._fins_texto = inteiros(n_locais)
+        self._textos = posicao
+
+    def localizar(self, versao, chave):
+        """Texto do local da faixa que contém o IP, ou None"""
+        if versao == 4:
+            inicios, fins, locais = self._v4
+            valor = int.from_bytes(chave, 'big')
+        else:
+            inicios, fins, locais = self._inicios6, self._fins6, self._locais6
+            valor = chave
+        posicao = bisect_right(inicios, valor) - 1
+        if posicao < 0 or valor > fins[posicao]:
+            return None
+        indice = locais[posicao]
+        inicio = self._fins_texto[indice - 1] if indice else 0
+        texto = self._mmap[self._textos + inicio:self._textos + self._fins_texto[indice]]
+        return texto.decode('utf-8') or None
+
+
+class GeoIPMaxMind:
+    """Arquivo .mmdb (GeoLite2/GeoIP2 City) via maxminddb, também mapeado em memória"""
+
+    def __init__(self, caminho):
+        try:
+            import maxminddb
+        except ImportError:
+            raise ImportError("Arquivos .mmdb requerem maxminddb: pip install maxminddb "
+                              "(ou gere o formato compacto com compilar_geoip)")
+        self._leitor = maxminddb.open_database(caminho, maxminddb.MODE_MMAP)
+
+    @staticmethod
+    def _nome(registro):
+        nomes = (registro or {}).get('names') or {}
+        return nomes.get('pt-BR') or nomes.get('en')
+
+    def localizar(self, versao, chave):
+        registro = self._leitor.get(ipaddress.ip_address(chave))
+        if not registro:
+            return None
+        subdivisoes = registro.get('subdivisions') or [{}]
+        return formatar_localizacao(self._nome(registro.get('city')),
+                                    subdivisoes[0].get('iso_code') or self._nome(subdivisoes[0]),
+                                    (registro.get('country') or {}).get('iso_code'))
+
+
+def abrir_geoip(caminho=None):
+    """Leitor do arquivo GeoIP (GEOIP_FILE ou geoip.bin); None se não houver arquivo"""
+    caminho = caminho or os.getenv('GEOIP_FILE') or ARQUIVO_GEOIP
+    if not os.path.exists(caminho):
+        return None
+    if caminho.endswith('.mmdb'):
+        return GeoIPMaxMind(caminho)
+    return GeoIPCompacto(caminho)
+
+
+class EnriquecedorEventos:
+    """Dispositivo e localização de aberturas, com LRU para user agents e IPs"""
+
+    def __init__(self, geoip=None, tamanho_cache=TAMANHO_CACHE):
+        self.geoip = geoip
+        self._tipos = _compilar(TIPOS_DISPOSITIVO)
+        self._sistemas = _compilar(SISTEMAS)
+        self._clientes = _compilar(CLIENTES)
+        self.dispositivo = lru_cache(maxsize=tamanho_cache)(self._dispositivo)
+        self.localizacao = lru_cache(maxsize=tamanho_cache)(self._localizacao)
+
+    @classmethod
+    def padrao(cls):
+        """Com o arquivo GeoIP do ambiente, se existir (sem ele só o dispositivo é preenchido)"""
+        return cls(abrir_geoip())
+
+    def _dispositivo(self, user_agent):
+        if not user_agent:
+            return None
+        return ' · '.join(parte for parte in (
+            _primeiro(self._tipos, user_agent, 'desktop'),
+            _primeiro(self._sistemas, user_agent),
+            _primeiro(self._clientes, user_agent),
+        ) if parte)
+
+    def _localizacao(self, ip_address):
+        if not ip_address or self.geoip is None:
+            return None
+        chave = _chave_ip(ip_address)
+        return self.geoip.localizar(*chave) if chave else None
+
+    def enriquecer(self, ip_address, user_agent):
+        """(dispositivo, localização) de um evento"""
+        return self.dispositivo(user_agent or ''), self.localizacao(ip_address or '')
+
+    def backfill(self, db_file, tamanho_lote=TAMANHO_LOTE):
+        """
+        Preenche os envios ainda sem dispositivo/localização com a primeira
+        abertura humana de cada um, lendo tracking_events em ordem de id.
+        Retorna (eventos lidos, envios atualizados).
+        """
+        conn = banco_dados.conectar(db_file)
+        try:
+            # tracking_id → id: a atualização vai pela chave primária, não pelo índice do texto
+            pendentes = dict(conn.execute('''
+                SELECT tracking_id, id FROM email_campaigns
+                WHERE aberto = 1 AND (dispositivo_abertura IS NULL OR localizacao_abertura IS NULL)
+            '''))
+            lidos = atualizados = 0
+            ultimo_id = 0
+            while pendentes:
+                lote = conn.execute('''
+                    SELECT id, tracking_id, ip_address, user_agent FROM tracking_events
+                    WHERE id > ? AND evento_tipo = 'abertura' AND COALESCE(classificacao, 'humano') = 'humano'
+                    ORDER BY id LIMIT ?
+                ''', (ultimo_id, tamanho_lote)).fetchall()
+                if not lote:
+                    break
+                ultimo_id = lote[-1][0]
+                lidos += len(lote)
+
+                atualizacoes = []
+                for _, tracking_id, ip_address, user_agent in lote:
+                    # A primeira abertura (menor id) vale; as seguintes não mudam nada
+                    envio = pendentes.pop(tracking_id, None)
+                    if envio is not None:
+                        atualizacoes.append((*self.enriquecer(ip_address, user_agent), user_agent, envio))
+                if atualizacoes:
+                    conn.executemany('''
+                        UPDATE email_campaigns SET
+                            dispositivo_abertura = COALESCE(dispositivo_abertura, ?),
+                            localizacao_abertura = COALESCE(localizacao_abertura, ?),
+                            user_agent = COALESCE(user_agent, ?)
+                        WHERE id = ?
+                    ''', atualizacoes)
+                    conn.commit()
+                    atualizados += len(atualizacoes)
+        finally:
+            conn.close()
+        return lidos, atualizados
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Escuta de Respostas via IMAP IDLE
+Mantém uma sessão IMAP em IDLE na caixa de entrada: o servidor avisa
+(* N EXISTS) quando chega mensagem e só então a sincronização incremental
+roda, atualizando respondeu/data_resposta em segundos.
+
+A sincronização guarda por pasta o UIDVALIDITY e o último UID visto
+(tabela imap_sincronizacao), então cada rodada pede só UIDs novos e baixa
+só os cabeçalhos necessários, em vez de refazer a busca da última semana
+com o RFC822 inteiro de cada mensagem. A resposta é casada pelo
+In-Reply-To/References com o Message-ID do envio (que carrega o
+tracking_id) e, sem ele, pelo endereço do remetente. Junto dos cabeçalhos
+vem só o começo do corpo (LIMITE_CORPO bytes), o bastante para classificar
+a resposta (REMOVER, ausência, interesse...) e gravar a classe.
+
+O IDLE é renovado a cada INTERVALO_IDLE (servidores derrubam sessões IDLE
+depois de 30 minutos) e a conexão é refeita com espera exponencial quando
+cai. Sem a capacidade IDLE, a escuta consulta a caixa a cada INTERVALO_POLL.
+"""
+
+import imaplib
+import re
+import threading
+from datetime import datetime, timedelta
+from email.parser import BytesParser
+from email.policy import compat32
+from email.utils import getaddresses, parsedate_to_datetime
+
+import banco_dados
+from armazenamento_shards import ultimos_envios
+from classificacao_respostas import CLASSES_HUMANAS, LIMITE_CORPO, REMOVER, ClassificadorRespostas
+
+# RFC 2177: renovar o IDLE antes dos 30 minutos de inatividade do servidor
+INTERVALO_IDLE = 25 * 60
+# Sem resposta do servidor por esse tempo além do IDLE: conexão morta
+MARGEM_TIMEOUT = 60
+INTERVALO_POLL = 60
+ESPERA_RECONEXAO_MAXIMA = 300
+
+# Primeira sincronização de uma pasta (ou UIDVALIDITY mudou): última semana
+DIAS_JANELA_INICIAL = 7
+
+CABECALHOS = ('FROM DATE SUBJECT IN-REPLY-TO REFERENCES MIME-VERSION CONTENT-TYPE CONTENT-TRANSFER-ENCODING '
+              'AUTO-SUBMITTED X-AUTOREPLY X-AUTORESPOND PRECEDENCE')
+RE_INICIO_FETCH = re.compile(rb'^\d+ \(')
+RE_EXISTS = re.compile(rb'^\* \d+ EXISTS', re.I)
+REMETENTES_SISTEMA = ('mailer-daemon@', 'postmaster@')
+
+
+def _data_resposta(cabecalho):
+    """Date da mensagem em horário local (como datetime.now()); sem Date, agora"""
+    try:
+        data = parsedate_to_datetime(cabecalho)
+    except (TypeError, ValueError):
+        return datetime.now()
+    if data.tzinfo is not None:
+        data = data.astimezone().replace(tzinfo=None)
+    return data
+
+
+class SincronizacaoRespostas:
+    """Busca incremental (por UID) de respostas e gravação em email_campaigns"""
+
+    def __init__(self, db_file, dominio_tracking, roteador=None, tamanho_lote=200):
+        self.db_file = db_file
+        self.tamanho_lote = tamanho_lote
+        # ArmazenamentoShards: respostas de campanhas vão para o shard de cada uma
+        self.roteador = roteador
+        self.re_message_id = re.compile(r'<([0-9A-Za-z_-]+)@' + re.escape(dominio_tracking) + '>')
+        self.classificador = ClassificadorRespostas()
+        self._parser = BytesParser(policy=compat32)
+        self.setup_database()
+
+    def setup_database(self):
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS imap_sincronizacao (
+                    pasta TEXT PRIMARY KEY,
+                    uidvalidity INTEGER,
+                    ultimo_uid INTEGER
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+        for arquivo in self._arquivos():
+            conn = banco_dados.conectar(arquivo)
+            try:
+                # Respostas sem Message-ID nosso são casadas pelo remetente
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_campaigns_email_destino ON email_campaigns (email_destino)")
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _arquivos(self):
+        return [arquivo for _, arquivo in self.roteador.arquivos()] if self.roteador else [self.db_file]
+
+    def _supressao(self):
+        from processamento_bounces import ListaSupressao
+        return ListaSupressao(self.db_file)
+
+    def _estado(self, pasta):
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            return conn.execute("SELECT uidvalidity, ultimo_uid FROM imap_sincronizacao WHERE pasta = ?",
+                                (pasta,)).fetchone()
+        finally:
+            conn.close()
+
+    def _salvar_estado(self, pasta, uidvalidity, ultimo_uid):
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            conn.execute('''
+                INSERT INTO imap_sincronizacao (pasta, uidvalidity, ultimo_uid) VALUES (?, ?, ?)
+                ON CONFLICT (pasta) DO UPDATE SET uidvalidity = excluded.uidvalidity, ultimo_uid = excluded.ultimo_uid
+            ''', (pasta, uidvalidity, ultimo_uid))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def sincronizar(self, imap, pasta='INBOX'):
+        """
+        Processa as mensagens novas da pasta (imap autenticado); retorna totais
+
+        A pasta fica selecionada, pronta para o IDLE. Totais: mensagens,
+        respostas (envios marcados), sem_envio e classes (contagem por classe).
+        """
+        imap.select(pasta)
+        # O EXISTS do SELECT já está coberto por esta rodada; um novo indica mensagem chegando
+        imap.untagged_responses.pop('EXISTS', None)
+        _, dados = imap.response('UIDVALIDITY')
+        uidvalidity = int(dados[0]) if dados and dados[0] else 0
+
+        estado = self._estado(pasta)
+        if estado and estado[0] == uidvalidity:
+            ultimo = estado[1]
+            criterio = f'UID {ultimo + 1}:*'
+        else:
+            ultimo = 0
+            desde = datetime.now() - timedelta(days=DIAS_JANELA_INICIAL)
+            criterio = f'SINCE "{desde.strftime("%d-%b-%Y")}"'
+        _, dados = imap.uid('SEARCH', None, criterio)
+        # "n:*" sempre devolve a última mensagem, mesmo já vista
+        uids = [uid for uid in (int(u) for u in (dados[0] or b'').split()) if uid > ultimo]
+
+        totais = {'mensagens': 0, 'respostas': 0, 'sem_envio': 0, 'classes': {}}
+        itens = f'(BODY.PEEK[HEADER.FIELDS ({CABECALHOS})] BODY.PEEK[TEXT]<0.{LIMITE_CORPO}>)'
+        for i in range(0, len(uids), self.tamanho_lote):
+            lote = uids[i:i + self.tamanho_lote]
+            _, resposta = imap.uid('FETCH', ','.join(map(str, lote)), itens)
+            respostas = []
+            for dados in self._mensagens(resposta):
+                totais['mensagens'] += 1
+                resposta_envio = self._analisar(dados)
+                if resposta_envio:
+                    classe = resposta_envio[3]
+                    totais['classes'][classe] = totais['classes'].get(classe, 0) + 1
+                    respostas.append(resposta_envio)
+            marcadas = self._gravar(respostas)
+            totais['respostas'] += marcadas
+            totais['sem_envio'] += max(0, len(respostas) - marcadas)
+            # Estado salvo depois da gravação: se cair no meio, o lote é refeito
+            # (a gravação é idempotente)
+            self._salvar_estado(pasta, uidvalidity, max(lote))
+        if not uids and (not estado or estado[0] != uidvalidity):
+            self._salvar_estado(pasta, uidvalidity, ultimo)
+        return totais
+
+    @staticmethod
+    def _mensagens(resposta):
+        """Cabeçalhos + começo do corpo de cada mensagem de um UID FETCH (dois literais por mensagem)"""
+        atual = None
+        for item in resposta:
+            if not isinstance(item, tuple):
+                continue
+            if RE_INICIO_FETCH.match(item[0]):
+                if atual is not None:
+                    yield atual
+                atual = item[1]
+            elif atual is not None:
+                atual += item[1]
+        if atual is not None:
+            yield atual
+
+    def _analisar(self, dados):
+        """(tracking_ids citados, remetente, data, classe) ou None para bounces e avisos de sistema"""
+        mensagem = self._parser.parsebytes(dados)
+        if (mensagem.get('Content-Type') or '').lower().startswith('multipart/report'):
+            # DSN/ARF: ficam com o processamento de bounces
+            return None
+        remetentes = getaddresses([mensagem.get('From') or ''])
+        remetente = remetentes[0][1].lower() if remetentes else ''
+        if not remetente or remetente.startswith(REMETENTES_SISTEMA):
+            return None
+        citados = self.re_message_id.findall(f"{mensagem.get('In-Reply-To') or ''} "
+                                             f"{mensagem.get('References') or ''}")
+        return citados, remetente, _data_resposta(mensagem.get('Date')), self.classificador.classificar(mensagem)
+
+    def _gravar(self, respostas):
+        """
+        Grava classe (e respondeu/data_resposta, se humana) nos envios
+        respondidos, com uma transação por banco; quem pediu REMOVER vai para
+        a supressão. Retorna respostas casadas com um envio.
+        """
+        por_tracking, por_id = {}, {}
+        remover = set()
+        # Sem Message-ID: um envio só, o mais recente para o endereço entre todos os shards
+        por_endereco = ultimos_envios(self._arquivos(), [r[1] for r in respostas if not r[0]])
+        for citados, remetente, data, classe in respostas:
+            humana = classe in CLASSES_HUMANAS
+            linha = (int(humana), humana, data, humana, classe)
+            if classe == REMOVER:
+                remover.add(remetente)
+            if citados:
+                # Resposta a um dos nossos: o Message-ID diz exatamente qual envio
+                destino = self.roteador.shard_de(citados[-1]) if self.roteador else self.db_file
+                por_tracking.setdefault(destino, []).append(linha + (citados[-1],))
+            elif remetente in por_endereco:
+                destino, id_envio = por_endereco[remetente]
+                por_id.setdefault(destino, []).append(linha + (id_envio,))
+
+        # Automáticas (ausência, auto-resposta) não contam como resposta nem
+        # apagam a classe de uma resposta humana anterior
+        atualizacao = '''
+            UPDATE email_campaigns SET
+                respondeu = MAX(respondeu, ?),
+                data_resposta = CASE WHEN ? THEN COALESCE(data_resposta, ?) ELSE data_resposta END,
+                classe_resposta = CASE WHEN ? OR classe_resposta IS NULL THEN ? ELSE classe_resposta END
+        '''
+        casadas = 0
+        for arquivo in set(por_tracking) | set(por_id):
+            conn = banco_dados.conectar(arquivo)
+            try:
+                cursor = conn.cursor()
+                if por_tracking.get(arquivo):
+                    cursor.executemany(atualizacao + " WHERE tracking_id = ?", por_tracking[arquivo])
+                    casadas += cursor.rowcount
+                    # O endereço do envio também sai da lista (a resposta pode vir de outro alias)
+                    pedidos = [linha[-1] for linha in por_tracking[arquivo] if linha[4] == REMOVER]
+                    if pedidos:
+                        remover.update(email.lower() for email, in cursor.execute(
+                            f"SELECT email_destino FROM email_campaigns WHERE tracking_id IN "
+                            f"({','.join('?' * len(pedidos))})", pedidos) if email)
+                if por_id.get(arquivo):
+                    cursor.executemany(atualizacao + " WHERE id = ?", por_id[arquivo])
+                    casadas += cursor.rowcount
+                conn.commit()
+            finally:
+                conn.close()
+
+        if remover:
+            conn = banco_dados.conectar(self.db_file)
+            try:
+                self._supressao().registrar(conn, [{'email': email, 'tipo': REMOVER, 'status': None,
+                                                    'diagnostico': 'Pediu REMOVER por resposta'}
+                                                   for email in remover])
+                conn.commit()
+            finally:
+                conn.close()
+        return casadas
+
+
+class EscutaRespostas:
+    """Laço IDLE → sincronização, com renovação do IDLE e reconexão"""
+
+    def __init__(self, conectar, sincronizacao, pasta='INBOX', intervalo_idle=INTERVALO_IDLE,
+                 intervalo_poll=INTERVALO_POLL):
+        # conectar(): devolve um imaplib.IMAP4 já autenticado (Gmail ou servidor local)
+        self.conectar = conectar
+        self.sincronizacao = sincronizacao
+        self.pasta = pasta
+        self.intervalo_idle = intervalo_idle
+        self.intervalo_poll = intervalo_poll
+        self.parar = threading.Event()
+        self._terminar_idle = None
+
+    def interromper(self):
+        """Encerra a escuta (de outra thread), saindo do IDLE em andamento"""
+        self.parar.set()
+        terminar = self._terminar_idle
+        if terminar:
+            terminar()
+
+    def executar(self, ao_sincronizar=None):
+        """Escuta até interromper() (ou Ctrl+C); ao_sincronizar(totais) após cada rodada com mensagens"""
+        espera = 1
+        while not self.parar.is_set():
+            imap = None
+            try:
+                imap = self.conectar()
+                espera = 1
+                self._escutar(imap, ao_sincronizar)
+            except (imaplib.IMAP4.abort, imaplib.IMAP4.error, OSError) as e:
+                if self.parar.is_set():
+                    break
+                print(f"⚠️ Conexão IMAP perdida ({e}); reconectando em {espera}s")
+                self.parar.wait(espera)
+                espera = min(espera * 2, ESPERA_RECONEXAO_MAXIMA)
+            finally:
+                if imap is not None:
+                    try:
+                        imap.logout()
+                    except (imaplib.IMAP4.error, OSError):
+                        pass
+
+    def _escutar(self, imap, ao_sincronizar):
+        idle = 'IDLE' in imap.capabilities
+        while not self.parar.is_set():
+            totais = self.sincronizacao.sincronizar(imap, self.pasta)
+            if totais['mensagens'] and ao_sincronizar:
+                ao_sincronizar(totais)
+            if 'EXISTS' in imap.untagged_responses:
+                # Chegou mensagem durante a sincronização: roda de novo antes do IDLE
+                continue
+            if idle:
+                self._idle(imap)
+            else:
+                self.parar.wait(self.intervalo_poll)
+                imap.noop()
+
+    def _idle(self, imap):
+        """Um ciclo de IDLE: volta quando chega mensagem, o intervalo vence ou a escuta é interrompida"""
+        tag = imap._new_tag()
+        imap.send(tag + b' IDLE\r\n')
+        linha = imap.readline()
+        if not linha.startswith(b'+'):
+            raise imaplib.IMAP4.error(f"IDLE recusado: {linha.strip().decode(errors='replace')}")
+
+        trava = threading.Lock()
+        enviado = []
+
+        def terminar():
+            with trava:
+                if not enviado:
+                    enviado.append(True)
+                    try:
+                        imap.send(b'DONE\r\n')
+                    except OSError:
+                        # Conexão já caiu: o readline abaixo falha e a escuta reconecta
+                        pass
+
+        # DONE vem de outra thread (renovação ou interromper) enquanto esta espera no readline
+        timer = threading.Timer(self.intervalo_idle, terminar)
+        timer.daemon = True
+        timer.start()
+        self._terminar_idle = terminar
+        if self.parar.is_set():
+            terminar()
+        imap.sock.settimeout(self.intervalo_idle + MARGEM_TIMEOUT)
+        try:
+            while True:
+                linha = imap.readline()
+                if not linha:
+                    raise imaplib.IMAP4.abort("conexão encerrada pelo servidor")
+                if linha.startswith(tag):
+                    if not linha[len(tag):].lstrip().upper().startswith(b'OK'):
+                        raise imaplib.IMAP4.error(f"IDLE terminou com erro: {linha.strip().decode(errors='replace')}")
+                    return
+                if RE_EXISTS.match(linha):
+                    terminar()
+                elif linha.upper().startswith(b'* BYE'):
+                    raise imaplib.IMAP4.abort(linha.strip().decode(errors='replace'))
+        finally:
+            self._terminar_idle = None
+            timer.cancel()
+            imap.sock.settimeout(None)
+
+
+def conectar_gmail(usuario, senha, host='imap.gmail.com', porta=993, ssl=True):
+    """Fábrica de conexões para EscutaRespostas (ssl=False para um servidor IMAP local)"""
+    def conectar():
+        imap = imaplib.IMAP4_SSL(host, porta) if ssl else imaplib.IMAP4(host, porta)
+        imap.login(usuario, senha)
+        return imap
+    return conectar
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Exportação em Streaming
+Pagina email_campaigns e tracking_events por id (keyset) e grava cada lote
+direto no destino: Excel em modo write-only, CSV ou Parquet. A memória fica
+limitada ao tamanho do lote, independente do tamanho do banco. Com um
+ArquivoEventos, os eventos já arquivados em Parquet também são exportados.
+"""
+
+import csv
+import os
+
+import banco_dados
+
+TABELAS_EXPORTACAO = {
+    'email_campaigns': 'Emails',
+    'tracking_events': 'Eventos',
+}
+
+# Limite de linhas por aba do Excel (1.048.576 menos o cabeçalho)
+MAX_LINHAS_EXCEL = 1048575
+
+
+def importar_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet requer pyarrow: pip install pyarrow")
+    return pa, pq
+
+
+def esquema_parquet(colunas):
+    """Schema pyarrow de [(nome, tipo declarado)]: INTEGER/BOOLEAN viram int64, o resto texto"""
+    pa, _ = importar_pyarrow()
+    return pa.schema([
+        (nome, pa.int64() if tipo in ('INTEGER', 'BOOLEAN') else pa.string())
+        for nome, tipo in colunas
+    ])
+
+
+def tabela_parquet(schema, lote):
+    """pyarrow.Table de um lote de linhas do SQLite (tuplas na ordem do schema)"""
+    pa, _ = importar_pyarrow()
+    arrays = []
+    for campo, valores in zip(schema, zip(*lote)):
+        try:
+            arrays.append(pa.array(valores, type=campo.type))
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            # Afinidade de tipo do SQLite: coluna TEXT com números, timestamps como datetime...
+            arrays.append(pa.array([v if v is None else str(v) for v in valores], type=campo.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class ExportadorStreaming:
+    """Exporta as tabelas de analytics em lotes, sem DataFrames"""
+
+    def __init__(self, db_file, tamanho_lote=5000, arquivo_eventos=None):
+        self.db_file = db_file
+        self.tamanho_lote = tamanho_lote
+        # ArquivoEventos: com ele, os eventos arquivados em Parquet entram antes dos do banco
+        self.arquivo_eventos = arquivo_eventos
+
+    def colunas(self, conn, tabela):
+        """Lista de (nome, tipo declarado) da tabela"""
+        return [(linha[1], (linha[2] or '').upper()) for linha in conn.execute(f"PRAGMA table_info({tabela})")]
+
+    def paginar(self, conn, tabela):
+        """Gera lotes de linhas ordenadas por id, usando WHERE id > ultimo_id"""
+        ultimo_id = 0
+        while True:
+            lote = conn.execute(
+                f"SELECT * FROM {tabela} WHERE id > ? ORDER BY id LIMIT ?",
+                (ultimo_id, self.tamanho_lote)
+            ).fetchall()
+            if not lote:
+                break
+            yield lote
+            ultimo_id = lote[-1][0]
+
+    def lotes(self, conn, tabela):
+        """Lotes da tabela; tracking_events inclui os arquivados quando há arquivo_eventos"""
+        if tabela == 'tracking_events' and self.arquivo_eventos is not None:
+            colunas = [nome for nome, _ in self.colunas(conn, tabela)]
+            yield from self.arquivo_eventos.lotes(self.db_file, colunas, self.tamanho_lote)
+        yield from self.paginar(conn, tabela)
+
+    def exportar_excel(self, caminho='analytics_detalhado.xlsx', rollups=None):
+        """Workbook write-only: cada linha vai direto para o XML da aba"""
+        from openpyxl import Workbook
+
+        wb = Workbook(write_only=True)
+        totais = {}
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            for tabela, nome_aba in TABELAS_EXPORTACAO.items():
+                cabecalho = [nome for nome, _ in self.colunas(conn, tabela)]
+                aba, parte, linhas_aba, total = None, 0, MAX_LINHAS_EXCEL, 0
+
+                for lote in self.lotes(conn, tabela):
+                    for linha in lote:
+                        # Abas excedentes: Eventos, Eventos_2, Eventos_3...
+                        if linhas_aba >= MAX_LINHAS_EXCEL:
+                            parte += 1
+                            aba = wb.create_sheet(nome_aba if parte == 1 else f"{nome_aba}_{parte}")
+                            aba.append(cabecalho)
+                            linhas_aba = 0
+                        aba.append(linha)
+                        linhas_aba += 1
+                    total += len(lote)
+
+                if aba is None:
+                    wb.create_sheet(nome_aba).append(cabecalho)
+                totais[tabela] = total
+        finally:
+            conn.close()
+
+        if rollups is not None:
+            geral = rollups['geral']
+            aba = wb.create_sheet('Resumo_Geral')
+            aba.append(list(geral.keys()))
+            aba.append(list(geral.values()))
+
+            aba = wb.create_sheet('Por_Provedor')
+            aba.append(['provedor_tipo', 'enviados', 'abertos', 'taxa_abertura', 'cliques', 'taxa_clique'])
+            for linha in rollups['por_provedor']:
+                aba.append(list(linha))
+
+        wb.save(caminho)
+        return totais
+
+    def exportar_csv(self, diretorio='analytics_export'):
+        """Um CSV por tabela, escrito lote a lote"""
+        os.makedirs(diretorio, exist_ok=True)
+        totais = {}
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            for tabela in TABELAS_EXPORTACAO:
+                caminho = os.path.join(diretorio, f"{tabela}.csv")
+                total = 0
+                with open(caminho, 'w', newline='', encoding='utf-8', buffering=1 << 20) as f:
+                    writer = csv.writer(f)
+                    writer.writerow([nome for nome, _ in self.colunas(conn, tabela)])
+                    for lote in self.lotes(conn, tabela):
+                        writer.writerows(lote)
+                        total += len(lote)
+                totais[tabela] = total
+        finally:
+            conn.close()
+        return totais
+
+    def exportar_parquet(self, diretorio='analytics_export', compressao='zstd'):
+        """Um Parquet por tabela; cada lote vira um row group"""
+        _, pq = importar_pyarrow()
+
+        os.makedirs(diretorio, exist_ok=True)
+        totais = {}
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            for tabela in TABELAS_EXPORTACAO:
+                schema = esquema_parquet(self.colunas(conn, tabela))
+                caminho = os.path.join(diretorio, f"{tabela}.parquet")
+                total = 0
+                with pq.ParquetWriter(caminho, schema, compression=compressao) as writer:
+                    for lote in self.lotes(conn, tabela):
+                        writer.write_table(tabela_parquet(schema, lote))
+                        total += len(lote)
+                totais[tabela] = total
+        finally:
+            conn.close()
+        return totais
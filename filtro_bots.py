@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Filtro de Bots e Pré-carregamentos
+Classifica cada abertura/clique antes da gravação: proxies de imagem (Gmail,
+Yahoo), pré-carregamento do Apple Mail Privacy Protection, scanners de
+segurança que seguem links e bots/pré-visualizadores de link. Só eventos
+'humano' contam em aberto/primeiro_abertura/total_aberturas; os demais vão
+para aberturas_automaticas/cliques_automaticos.
+
+Os padrões de user agent viram uma única regex e as faixas de IP intervalos
+inteiros ordenados (busca binária), tudo montado na inicialização; a
+classificação por user agent fica num LRU.
+"""
+
+import ipaddress
+import os
+import re
+import time
+import heapq
+from bisect import bisect_right
+from functools import lru_cache
+
+import banco_dados
+
+HUMANO = 'humano'
+
+# (classe, padrão) - sem distinção de maiúsculas; a primeira que casar vence
+PADROES_USER_AGENT = [
+    ('proxy', r'GoogleImageProxy|ggpht\.com|YahooMailProxy|via Yahoo'),
+    ('scanner', r'Barracuda|Proofpoint|Mimecast|MessageLabs|Symantec|Trend ?Micro|Forcepoint|IronPort'
+                r'|SafeLinks|Sophos|Fortinet|Zscaler|Cloudmark|Microsoft Office Protocol Discovery'),
+    # "bot" só como token de crawler (Googlebot/2.1, "compatible; SemrushBot", bot no início do UA
+    # ou seguido da URL de contato): aparelhos como "CUBOT X19" continuam humanos
+    ('bot', r'bot[\w-]*/\d|compatible; *[\w .-]*bot\b|^[\w.-]*bot\b|bot\b[;)]? *\(?\+?https?://'
+            r'|crawler|spider|curl/|wget/|python-requests|python-urllib|aiohttp|Go-http-client|Java/'
+            r'|okhttp|HeadlessChrome|PhantomJS|libwww|Scrapy|facebookexternalhit|WhatsApp|Slack'
+            r'|SkypeUriPreview|Discord|preview'),
+]
+
+# Faixas aproximadas de partida; amplie com BOT_IP_RANGES_FILE ("classe cidr" por linha)
+REDES_AUTOMATICAS = [
+    ('prefetch', '17.0.0.0/8'),          # Apple (Mail Privacy Protection)
+    ('proxy', '66.249.80.0/20'),         # Google Image Proxy
+    ('proxy', '66.102.0.0/20'),
+    ('proxy', '64.233.160.0/19'),
+    ('proxy', '72.14.192.0/18'),
+    ('scanner', '40.92.0.0/15'),         # Microsoft Defender / Safe Links
+    ('scanner', '40.107.0.0/16'),
+    ('scanner', '52.100.0.0/14'),
+    ('scanner', '104.47.0.0/17'),
+    ('scanner', '148.163.128.0/19'),     # Proofpoint
+    ('scanner', '67.231.144.0/20'),
+    ('scanner', '205.139.110.0/24'),     # Mimecast
+    ('scanner', '207.211.30.0/24'),
+]
+
+# Clique antes disso (desde o envio) é de scanner: ninguém lê e clica em 2s
+JANELA_SCANNER_SEGUNDOS = 2.0
+
+COLUNAS_CAMPANHA = {
+    'aberturas_automaticas': 'INTEGER DEFAULT 0',
+    'cliques_automaticos': 'INTEGER DEFAULT 0',
+}
+
+
+def carregar_redes(caminho=None):
+    """REDES_AUTOMATICAS + linhas "classe cidr" de BOT_IP_RANGES_FILE"""
+    redes = list(REDES_AUTOMATICAS)
+    caminho = caminho or os.getenv('BOT_IP_RANGES_FILE')
+    if caminho and os.path.exists(caminho):
+        with open(caminho, 'r', encoding='utf-8') as f:
+            for linha in f:
+                partes = linha.split()
+                if len(partes) == 2 and not linha.startswith('#'):
+                    redes.append((partes[0], partes[1]))
+    return redes
+
+
+def preparar_banco(db_file):
+    """Coluna classificacao em tracking_events e contadores automáticos em email_campaigns"""
+    conn = banco_dados.conectar(db_file)
+    try:
+        existentes = {linha[1] for linha in conn.execute("PRAGMA table_info(email_campaigns)")}
+        if not existentes:
+            return
+        for coluna, tipo in COLUNAS_CAMPANHA.items():
+            if coluna not in existentes:
+                conn.execute(f"ALTER TABLE email_campaigns ADD COLUMN {coluna} {tipo}")
+        if 'classificacao' not in {linha[1] for linha in conn.execute("PRAGMA table_info(tracking_events)")}:
+            conn.execute("ALTER TABLE tracking_events ADD COLUMN classificacao TEXT")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def segmentos_disjuntos(intervalos):
+    """
+    [(inicio, fim, classe)] que podem se sobrepor (BOT_IP_RANGES_FILE pode
+    repetir ou aninhar faixas) → segmentos disjuntos ordenados, cada um com a
+    classe da faixa mais específica (menor) que o cobre; em empate, a listada
+    antes. Segmentos vizinhos com a mesma classe são unidos.
+    """
+    ordenados = sorted((inicio, fim - inicio, ordem, fim, classe)
+                       for ordem, (inicio, fim, classe) in enumerate(intervalos))
+    pontos = sorted({inicio for inicio, _, _ in intervalos} | {fim + 1 for _, fim, _ in intervalos})
+    segmentos = []
+    ativos = []
+    proximo = 0
+    for ponto, seguinte in zip(pontos, pontos[1:]):
+        while proximo < len(ordenados) and ordenados[proximo][0] <= ponto:
+            _, tamanho, ordem, fim, classe = ordenados[proximo]
+            heapq.heappush(ativos, (tamanho, ordem, fim, classe))
+            proximo += 1
+        # Faixas já encerradas saem quando chegam ao topo
+        while ativos and ativos[0][2] < ponto:
+            heapq.heappop(ativos)
+        if not ativos:
+            continue
+        classe = ativos[0][3]
+        if segmentos and segmentos[-1][1] == ponto - 1 and segmentos[-1][2] == classe:
+            segmentos[-1] = (segmentos[-1][0], seguinte - 1, classe)
+        else:
+            segmentos.append((ponto, seguinte - 1, classe))
+    return segmentos
+
+
+class ClassificadorEventos:
+    """Rotula eventos como humano, proxy, prefetch, scanner ou bot"""
+
+    def __init__(self, padroes=None, redes=None, janela_scanner=JANELA_SCANNER_SEGUNDOS, tamanho_cache=4096):
+        padroes = padroes or PADROES_USER_AGENT
+        self._regex = re.compile('|'.join(f"(?P<{classe}>{padrao})" for classe, padrao in padroes), re.I)
+        self.janela_scanner = janela_scanner
+
+        # Intervalos [inicio, fim] disjuntos por versão de IP, ordenados pelo início
+        # (sobrepostos são divididos: a busca binária só olha o anterior mais próximo)
+        intervalos = {4: [], 6: []}
+        for classe, cidr in (redes if redes is not None else carregar_redes()):
+            rede = ipaddress.ip_network(cidr, strict=False)
+            intervalos[rede.version].append((int(rede.network_address), int(rede.broadcast_address), classe))
+        self._inicios = {}
+        self._intervalos = {}
+        for versao, lista in intervalos.items():
+            lista = segmentos_disjuntos(lista)
+            self._intervalos[versao] = lista
+            self._inicios[versao] = [inicio for inicio, _, _ in lista]
+
+        self.classificar_user_agent = lru_cache(maxsize=tamanho_cache)(self._classificar_user_agent)
+
+    def _classificar_user_agent(self, user_agent):
+        if not user_agent:
+            return 'bot'
+        m = self._regex.search(user_agent)
+        return m.lastgroup if m else None
+
+    def classificar_ip(self, ip_address):
+        """Classe da faixa que contém o IP (X-Forwarded-For: usa o primeiro)"""
+        if not ip_address:
+            return None
+        try:
+            ip = ipaddress.ip_address(ip_address.split(',')[0].strip())
+        except ValueError:
+            return None
+        valor = int(ip)
+        posicao = bisect_right(self._inicios[ip.version], valor) - 1
+        if posicao >= 0:
+            _, fim, classe = self._intervalos[ip.version][posicao]
+            if valor <= fim:
+                return classe
+        return None
+
+    def classificar(self, evento_tipo, tracking_id, ip_address=None, user_agent=None, agora=None):
+        """Rótulo do evento: user agent → faixa de IP → tempo desde o envio"""
+        classe = self.classificar_user_agent(user_agent or '') or self.classificar_ip(ip_address)
+        if classe:
+            return classe
+
+        if evento_tipo == 'clique' and self.janela_scanner:
+            enviado_em = _enviado_em(tracking_id)
+            if enviado_em is not None and (agora or time.time()) - enviado_em < self.janela_scanner:
+                return 'scanner'
+        return HUMANO
+
+
+@lru_cache(maxsize=65536)
+def _enviado_em(tracking_id):
+    """Instante do envio (epoch) embutido no tracking_id; None para IDs antigos"""
+    from tracking_ids import decodificar
+
+    campos = decodificar(tracking_id)
+    return campos['criado_em'].timestamp() if campos else None
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Funil e Coortes
+Funil enviado → aberto → clicado → respondido por coorte (dia do envio),
+provedor, modelo de assunto, prioridade do email (Email1/2/3) e campanha,
+mais as distribuições de tempo até a abertura, o clique e a resposta.
+
+Os dados vêm de extratos colunares (arrays numpy) de email_campaigns e
+tracking_events; agrupar, contar e tirar percentis são operações
+vetorizadas sobre esses arrays, sem GROUP BY no SQLite a cada relatório:
+
+- envios: uma linha por email enviado, com os instantes da primeira abertura,
+  do primeiro clique e da resposta já consolidados pelo tracking (valem
+  mesmo depois do arquivamento dos eventos brutos);
+- eventos: tracking_events lidos em ordem de id; a atualização lê só os ids
+  novos, e cada evento aponta para a posição do seu envio no extrato.
+
+Um clique ou uma resposta provam a abertura (imagens bloqueadas não carregam
+o pixel), então cada etapa do funil conta quem chegou nela ou além.
+"""
+
+import os
+from datetime import date, timedelta
+from itertools import chain, repeat
+
+import numpy as np
+
+import banco_dados
+from registro_envios import SQL_ENVIADOS
+
+DIMENSOES = ('coorte', 'provedor', 'modelo', 'prioridade', 'campanha')
+ETAPAS = ('enviados', 'abertos', 'clicados', 'respondidos')
+# Etapa da distribuição → coluna do extrato de envios com o instante
+TEMPOS = {'abertura': 'aberto_em', 'clique': 'clique_em', 'resposta': 'resposta_em'}
+# Limites (em horas) das faixas do histograma; a última faixa acumula o que vier depois
+FAIXAS_HORAS = (1, 2, 4, 8, 12, 24, 48, 72, 168)
+PERCENTIS = (50, 90)
+
+# Extratos de eventos salvos entre execuções (um .npz por banco)
+DIRETORIO_EXTRATOS = 'extratos_funil'
+TAMANHO_LOTE = 500000
+
+_EPOCA = date(1970, 1, 1)
+_SEGUNDOS = "COALESCE(CAST(strftime('%s', {0}) AS INTEGER), -1)"
+# Colunas inteiras do extrato de envios, na ordem do SELECT
+_COLUNAS_ENVIOS = ('id', 'enviado_em', 'aberto_em', 'clique_em', 'resposta_em',
+                   'aberto', 'clicou', 'respondeu', 'prioridade')
+_SQL_ENVIOS = f'''
+    SELECT id, {_SEGUNDOS.format('enviado_em')}, {_SEGUNDOS.format('primeiro_abertura')},
+           {_SEGUNDOS.format('primeiro_clique')}, {_SEGUNDOS.format('data_resposta')},
+           COALESCE(aberto, 0), COALESCE(clicou_link, 0), COALESCE(respondeu, 0),
+           COALESCE(prioridade_email, 0)
+    FROM email_campaigns
+    WHERE {SQL_ENVIADOS} AND enviado_em IS NOT NULL
+    ORDER BY id
+'''
+_SQL_ROTULOS = f'''
+    SELECT provedor_tipo, COALESCE(modelo_assunto, assunto), campanha
+    FROM email_campaigns
+    WHERE {SQL_ENVIADOS} AND enviado_em IS NOT NULL
+    ORDER BY id
+'''
+_SQL_EVENTOS = f'''
+    SELECT id, tracking_id, evento_tipo = 'clique', COALESCE(classificacao, 'humano') = 'humano',
+           {_SEGUNDOS.format('timestamp')}
+    FROM tracking_events
+    WHERE id > ? AND evento_tipo IN ('abertura', 'clique')
+    ORDER BY id
+'''
+# Colunas do extrato de eventos; envio é o id do envio em email_campaigns
+_COLUNAS_EVENTOS = (('envio', np.int64), ('clique', bool), ('humano', bool), ('instante', np.int64))
+
+
+def _inteiros(cursor, colunas):
+    """Resultado inteiro do cursor como matriz (linhas x colunas), sem tuplas intermediárias no numpy"""
+    valores = np.fromiter(chain.from_iterable(cursor), dtype=np.int64)
+    return valores.reshape(-1, colunas)
+
+
+def _codificar(valores, categorias, indices):
+    """Códigos inteiros de rótulos de texto (categorias/indices crescem entre chamadas)"""
+    for valor in set(valores).difference(indices):
+        indices[valor] = len(categorias)
+        categorias.append(valor)
+    return np.fromiter(map(indices.__getitem__, valores), dtype=np.int32, count=len(valores))
+
+
+def _percentis(valores, grupos, n_grupos, percentis):
+    """Percentis de valores por grupo: ordena uma vez por (grupo, valor) e indexa"""
+    ordem = np.lexsort((valores, grupos))
+    ordenados = valores[ordem]
+    contagens = np.bincount(grupos, minlength=n_grupos)
+    inicios = np.concatenate(([0], np.cumsum(contagens)[:-1]))
+    resultado = np.full((n_grupos, len(percentis)), np.nan)
+    com_dados = contagens > 0
+    for j, p in enumerate(percentis):
+        posicao = inicios + np.floor((contagens - 1).clip(0) * p / 100).astype(np.int64)
+        resultado[com_dados, j] = ordenados[posicao[com_dados]]
+    return resultado
+
+
+def _histograma(horas, grupos, n_grupos, faixas_horas):
+    """Contagem por grupo em cada faixa de horas (matriz grupos x faixas)"""
+    n_faixas = len(faixas_horas) + 1
+    faixa = np.searchsorted(np.asarray(faixas_horas, dtype=np.float64), horas, side='right')
+    return np.bincount(grupos * n_faixas + faixa, minlength=n_grupos * n_faixas).reshape(n_grupos, n_faixas)
+
+
+def _nomes_faixas(faixas_horas):
+    return [f'ate_{limite:g}h' for limite in faixas_horas] + [f'mais_{faixas_horas[-1]:g}h']
+
+
+class _Banco:
+    """
+    Extrato de um banco: envios (relidos quando o arquivo muda) e eventos
+    (só os ids novos, acrescentados ao extrato salvo em diretorio)
+    """
+
+    def __init__(self, nome, db_file, diretorio=None):
+        self.nome = nome
+        self.db_file = db_file
+        self.assinatura = None
+        self.envios = None
+        self.rotulos = None
+        self.ultimo_evento = 0
+        self.eventos = {coluna: np.empty(0, dtype=tipo) for coluna, tipo in _COLUNAS_EVENTOS}
+        self.caminho = None
+        if diretorio:
+            self.caminho = os.path.join(diretorio, os.path.splitext(os.path.basename(db_file))[0] + '.npz')
+            if os.path.exists(self.caminho):
+                with np.load(self.caminho) as extrato:
+                    self.ultimo_evento = int(extrato['ultimo_evento'])
+                    self.eventos = {coluna: extrato[coluna] for coluna, _ in _COLUNAS_EVENTOS}
+
+    def _assinatura(self):
+        assinatura = []
+        for caminho in (self.db_file, self.db_file + '-wal'):
+            try:
+                st = os.stat(caminho)
+                assinatura.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                assinatura.append(None)
+        return tuple(assinatura)
+
+    def atualizar(self, tamanho_lote=TAMANHO_LOTE):
+        """Relê o banco se mudou; retorna True se algo mudou"""
+        assinatura = self._assinatura()
+        if assinatura == self.assinatura:
+            return False
+        if self.assinatura is None:
+            # Bancos de antes de modelo_assunto/prioridade_email ganham as colunas
+            from armazenamento_shards import criar_schema
+            criar_schema(self.db_file)
+            assinatura = self._assinatura()
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            self.envios = _inteiros(conn.execute(_SQL_ENVIOS), len(_COLUNAS_ENVIOS))
+            self.rotulos = conn.execute(_SQL_ROTULOS).fetchall()
+            # Extrato de outro banco com o mesmo nome (recriado): começa de novo
+            sequencia = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tracking_events'").fetchone()
+            if self.ultimo_evento > (sequencia[0] if sequencia else 0):
+                self.ultimo_evento = 0
+                self.eventos = {coluna: np.empty(0, dtype=tipo) for coluna, _ in _COLUNAS_EVENTOS}
+            novos = self._ler_eventos(conn, tamanho_lote)
+        finally:
+            conn.close()
+        if novos:
+            self.eventos = {coluna: np.concatenate([self.eventos[coluna]] + [lote[coluna] for lote in novos])
+                            for coluna, _ in _COLUNAS_EVENTOS}
+            self._salvar()
+        self.assinatura = assinatura
+        return True
+
+    def _ler_eventos(self, conn, tamanho_lote):
+        """Eventos com id acima do último extraído, em lotes; tracking_id vira o id do envio (estável)"""
+        cursor = conn.execute(_SQL_EVENTOS, (self.ultimo_evento,))
+        ids_envio = None
+        lotes = []
+        while True:
+            linhas = cursor.fetchmany(tamanho_lote)
+            if not linhas:
+                break
+            if ids_envio is None:
+                # Todos os envios, pendentes inclusive: o evento volta a valer quando o envio for confirmado
+                ids_envio = dict(conn.execute("SELECT tracking_id, id FROM email_campaigns"))
+            ids, tracking_ids, cliques, humanos, instantes = zip(*linhas)
+            lotes.append({
+                'envio': np.fromiter(map(ids_envio.get, tracking_ids, repeat(0)), dtype=np.int64,
+                                     count=len(linhas)),
+                'clique': np.array(cliques, dtype=bool),
+                'humano': np.array(humanos, dtype=bool),
+                'instante': np.array(instantes, dtype=np.int64),
+            })
+            self.ultimo_evento = ids[-1]
+        return lotes
+
+    def _salvar(self):
+        if not self.caminho:
+            return
+        os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+        temporario = self.caminho + '.tmp'
+        with open(temporario, 'wb') as f:
+            np.savez(f, ultimo_evento=np.array(self.ultimo_evento), **self.eventos)
+        os.replace(temporario, self.caminho)
+
+
+class FunilCoortes:
+    """Funil e distribuições de tempo sobre os extratos colunares de um ou mais bancos"""
+
+    def __init__(self, arquivos, diretorio=DIRETORIO_EXTRATOS):
+        """
+        arquivos = [(nome_campanha, db_file)] como em ArmazenamentoShards.arquivos();
+        diretorio=None mantém os extratos só em memória.
+        """
+        self._bancos = [_Banco(nome, db_file, diretorio) for nome, db_file in arquivos]
+        self._categorias = {'provedor': [], 'modelo': [], 'campanha': []}
+        self._indices = {dimensao: {} for dimensao in self._categorias}
+        self.envios = {}
+        self.eventos = {}
+
+    def atualizar(self):
+        """Atualiza os extratos (incremental nos eventos); retorna o total de envios e de eventos"""
+        if any([banco.atualizar() for banco in self._bancos]) or not self.envios:
+            self._montar()
+        return len(self.envios['id']), len(self.eventos['envio'])
+
+    def _montar(self):
+        """Concatena os bancos em arrays únicos e liga cada evento à posição do seu envio"""
+        partes = [np.empty((0, len(_COLUNAS_ENVIOS)), np.int64)]
+        rotulos = {dimensao: [np.empty(0, np.int32)] for dimensao in self._categorias}
+        eventos = {coluna: [] for coluna, _ in _COLUNAS_EVENTOS}
+        deslocamento = 0
+        for banco in self._bancos:
+            envios = banco.envios if banco.envios is not None else np.empty((0, len(_COLUNAS_ENVIOS)), np.int64)
+            partes.append(envios)
+            provedores, modelos, campanhas = zip(*banco.rotulos) if banco.rotulos else ((), (), ())
+            rotulos['provedor'].append(_codificar(provedores, self._categorias['provedor'],
+                                                  self._indices['provedor']))
+            rotulos['modelo'].append(_codificar(modelos, self._categorias['modelo'], self._indices['modelo']))
+            # Bancos antigos não têm a coluna campanha preenchida: vale o nome do shard
+            rotulos['campanha'].append(_codificar([campanha or banco.nome for campanha in campanhas],
+                                                  self._categorias['campanha'], self._indices['campanha']))
+            if len(envios):
+                # id do envio → posição no extrato por tabela direta (ids são densos); eventos de
+                # envios fora do extrato (pendentes, falhas) ficam com -1 e saem
+                posicao_do_id = np.full(int(max(envios[-1, 0], banco.eventos['envio'].max(initial=0))) + 1, -1,
+                                        dtype=np.int64)
+                posicao_do_id[envios[:, 0]] = np.arange(deslocamento, deslocamento + len(envios))
+                posicoes = posicao_do_id[banco.eventos['envio']]
+                validos = posicoes >= 0
+                eventos['envio'].append(posicoes[validos])
+                for coluna, _ in _COLUNAS_EVENTOS[1:]:
+                    eventos[coluna].append(banco.eventos[coluna][validos])
+            deslocamento += len(envios)
+
+        matriz = np.concatenate(partes)
+        self.envios = {coluna: matriz[:, i] for i, coluna in enumerate(_COLUNAS_ENVIOS)}
+        self.envios['coorte'] = (self.envios['enviado_em'] // 86400).astype(np.int32)
+        self.envios['prioridade'] = self.envios['prioridade'].astype(np.int32)
+        for dimensao, codigos in rotulos.items():
+            self.envios[dimensao] = np.concatenate(codigos)
+        # Etapas acumuladas: quem clicou ou respondeu também abriu
+        self.envios['etapa_respondidos'] = self.envios['respondeu'] == 1
+        self.envios['etapa_clicados'] = self.envios['clicou'] == 1
+        self.envios['etapa_abertos'] = ((self.envios['aberto'] == 1) | self.envios['etapa_clicados']
+                                        | self.envios['etapa_respondidos'])
+
+        self.eventos = {coluna: np.concatenate(eventos[coluna]) if eventos[coluna] else np.empty(0, dtype=tipo)
+                        for coluna, tipo in _COLUNAS_EVENTOS}
+        self.eventos['tipo'] = self.eventos['clique'] + 2 * ~self.eventos['humano']
+        desde_envio = self.eventos['instante'] - self.envios['enviado_em'][self.eventos['envio']]
+        self.eventos['horas'] = desde_envio.clip(0) / 3600
+
+    def _rotulo(self, dimensao, codigo):
+        if dimensao == 'coorte':
+            return (_EPOCA + timedelta(days=int(codigo))).isoformat()
+        if dimensao == 'prioridade':
+            return int(codigo) or None
+        return self._categorias[dimensao][codigo]
+
+    def _agrupar(self, por, desde=None, ate=None):
+        """(filtro de envios, grupo de cada envio filtrado, chaves dos grupos)"""
+        for dimensao in por:
+            if dimensao not in DIMENSOES:
+                raise ValueError(f"Dimensão desconhecida: {dimensao} (use {', '.join(DIMENSOES)})")
+        filtro = np.ones(len(self.envios['id']), dtype=bool)
+        if desde is not None:
+            filtro &= self.envios['coorte'] >= (desde - _EPOCA).days
+        if ate is not None:
+            filtro &= self.envios['coorte'] <= (ate - _EPOCA).days
+        if not por:
+            return filtro, np.zeros(int(filtro.sum()), dtype=np.int64), np.zeros((1, 0), dtype=np.int64)
+        colunas = [self.envios[dimensao][filtro].astype(np.int64) for dimensao in por]
+        minimos = [coluna.min() if len(coluna) else 0 for coluna in colunas]
+        tamanhos = [int(coluna.max() - minimo) + 1 if len(coluna) else 1 for coluna, minimo in zip(colunas, minimos)]
+        chave = np.ravel_multi_index([coluna - minimo for coluna, minimo in zip(colunas, minimos)], tamanhos)
+        unicas, grupos = np.unique(chave, return_inverse=True)
+        chaves = np.column_stack(np.unravel_index(unicas, tamanhos)) + np.array(minimos, dtype=np.int64)
+        return filtro, grupos.reshape(-1), chaves
+
+    def funil(self, por=('coorte',), desde=None, ate=None):
+        """
+        Funil por grupo: (colunas, linhas), uma linha por combinação das
+        dimensões em por, com as etapas, as taxas (% dos enviados e % da etapa
+        anterior) e os eventos humanos e automáticos registrados. desde/ate
+        (datetime.date) limitam as coortes.
+        """
+        por = tuple(por)
+        filtro, grupos, chaves = self._agrupar(por, desde, ate)
+        n = len(chaves)
+        contagens = [np.bincount(grupos, minlength=n)]
+        for etapa in ETAPAS[1:]:
+            contagens.append(np.bincount(grupos, weights=self.envios[f'etapa_{etapa}'][filtro], minlength=n))
+
+        # Eventos: grupo do envio de cada um (-1 para envios fora do filtro)
+        grupo_envio = np.full(len(filtro), -1, dtype=np.int64)
+        grupo_envio[filtro] = grupos
+        grupo_evento = grupo_envio[self.eventos['envio']]
+        # Tipo de cada evento: 0 abertura humana, 1 clique humano, 2 ou 3 automático
+        tipo = self.eventos['tipo']
+        dentro = grupo_evento >= 0
+        if not dentro.all():
+            grupo_evento, tipo = grupo_evento[dentro], tipo[dentro]
+        por_tipo = np.bincount(grupo_evento * 4 + tipo, minlength=4 * n).reshape(n, 4)
+        aberturas, cliques, automaticos = por_tipo[:, 0], por_tipo[:, 1], por_tipo[:, 2] + por_tipo[:, 3]
+
+        enviados = contagens[0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            taxas = [np.round(100 * contagem / enviados, 2) for contagem in contagens[1:]]
+            conversoes = [np.round(100 * depois / antes, 2) for antes, depois in zip(contagens, contagens[1:])]
+
+        colunas = list(por) + list(ETAPAS) + [f'taxa_{etapa}' for etapa in ETAPAS[1:]] \
+            + [f'conversao_{etapa}' for etapa in ETAPAS[1:]] + ['aberturas', 'cliques', 'automaticos']
+        valores = np.column_stack(contagens + taxas + conversoes + [aberturas, cliques, automaticos])
+        linhas = []
+        for chave, linha in zip(chaves.tolist(), valores.tolist()):
+            rotulos = [self._rotulo(dimensao, codigo) for dimensao, codigo in zip(por, chave)]
+            contagem = [int(valor) for valor in linha[:len(ETAPAS)]]
+            percentuais = [None if valor != valor else valor for valor in linha[len(ETAPAS):-3]]
+            linhas.append(tuple(rotulos + contagem + percentuais + [int(valor) for valor in linha[-3:]]))
+        return colunas, linhas
+
+    def distribuicao(self, etapa='abertura', por=(), desde=None, ate=None, faixas_horas=FAIXAS_HORAS,
+                     percentis=PERCENTIS):
+        """
+        Tempo do envio até a primeira abertura, o primeiro clique ou a
+        resposta: (colunas, linhas) com total, percentis em horas e o
+        histograma nas faixas_horas ('ate_1h', ..., 'mais_168h').
+        """
+        if etapa not in TEMPOS:
+            raise ValueError(f"Etapa desconhecida: {etapa} (use {', '.join(TEMPOS)})")
+        por = tuple(por)
+        filtro, grupos, chaves = self._agrupar(por, desde, ate)
+        n = len(chaves)
+        instantes = self.envios[TEMPOS[etapa]][filtro]
+        ocorreu = instantes >= 0
+        horas = (instantes[ocorreu] - self.envios['enviado_em'][filtro][ocorreu]).clip(0) / 3600
+        grupos = grupos[ocorreu]
+
+        histograma = _histograma(horas, grupos, n, faixas_horas)
+        totais = np.bincount(grupos, minlength=n)
+        valores_percentis = _percentis(horas, grupos, n, percentis)
+
+        colunas = list(por) + ['total'] + [f'p{p:g}_horas' for p in percentis] + _nomes_faixas(faixas_horas)
+        linhas = []
+        for chave, total, valores, contagens in zip(chaves.tolist(), totais.tolist(),
+                                                    valores_percentis.tolist(), histograma.tolist()):
+            rotulos = [self._rotulo(dimensao, codigo) for dimensao, codigo in zip(por, chave)]
+            valores = [None if valor != valor else round(valor, 2) for valor in valores]
+            linhas.append(tuple(rotulos + [total] + valores + contagens))
+        return colunas, linhas
+
+    def distribuicao_aberturas(self, por=(), desde=None, ate=None, faixas_horas=FAIXAS_HORAS):
+        """Histograma de todas as aberturas humanas (reaberturas incluídas) por horas desde o envio"""
+        por = tuple(por)
+        filtro, grupos, chaves = self._agrupar(por, desde, ate)
+        n = len(chaves)
+        grupo_envio = np.full(len(filtro), -1, dtype=np.int64)
+        grupo_envio[filtro] = grupos
+        grupo_evento = grupo_envio[self.eventos['envio']]
+        selecionados = (self.eventos['tipo'] == 0) & (grupo_evento >= 0)
+        histograma = _histograma(self.eventos['horas'][selecionados], grupo_evento[selecionados], n, faixas_horas)
+        colunas = list(por) + _nomes_faixas(faixas_horas)
+        linhas = [tuple([self._rotulo(dimensao, codigo) for dimensao, codigo in zip(por, chave)] + contagens)
+                  for chave, contagens in zip(chaves.tolist(), histograma.tolist())]
+        return colunas, linhas
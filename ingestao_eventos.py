@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Ingestão de Eventos em Vários Nós
+Vários servidores de tracking atrás de um balanceador não podem escrever no
+mesmo arquivo SQLite. Com TRACKING_LOG_DIR definido, cada instância só
+acrescenta os eventos (já classificados) ao seu log local, em segmentos
+JSONL numerados:
+
+    logs_eventos/<nó>/00000001.jsonl, 00000002.jsonl, ...
+
+A escrita vai para o buffer do arquivo e o flush + fsync é feito em lote
+(a cada INTERVALO_FSYNC segundos ou EVENTOS_POR_FSYNC eventos), não a cada
+requisição. Um segmento cheio é fechado e o nó nunca volta a ele; ao
+reiniciar, o nó abre um segmento novo depois do último.
+
+O AgregadorLogs acompanha os diretórios dos nós e aplica os eventos ao banco
+de analytics (no shard de cada tracking_id) com a mesma gravação do modo
+direto. Cada evento leva um evento_id único (tracking_ids) e entra com
+INSERT OR IGNORE: email_campaigns só é atualizado quando o evento é novo,
+então reler um trecho (queda antes de salvar a posição, log copiado duas
+vezes) não conta nada em dobro. A posição de leitura de cada nó fica na
+tabela posicoes_logs; só linhas completas (com o '\\n') são consumidas.
+
+Uma abertura costuma gerar vários hits do pixel (cliente + re-render, clique
+duplo no link). A JanelaDeduplicacao deixa passar só o primeiro hit de cada
+(tracking_id, tipo, impressão do cliente) dentro de JANELA_DEDUP_SEGUNDOS; os
+repetidos não tocam banco nem log e ficam só nos contadores em memória.
+"""
+
+import atexit
+import glob
+import json
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import banco_dados
+from filtro_bots import HUMANO
+from tracking_ids import gerar_tracking_id, no_padrao
+
+DIRETORIO_LOGS = 'logs_eventos'
+TAMANHO_SEGMENTO = 64 * 1024 * 1024
+INTERVALO_FSYNC = 0.2
+EVENTOS_POR_FSYNC = 1000
+# Eventos aplicados por transação no agregador
+TAMANHO_LOTE = 5000
+EXTENSAO_SEGMENTO = '.jsonl'
+# Hits iguais dentro da janela contam uma vez; chaves guardadas no máximo
+JANELA_DEDUP_SEGUNDOS = 30
+MAX_CHAVES_DEDUP = 200000
+
+# json.dumps com separators cria um encoder a cada chamada
+_codificar = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+
+def gravar_evento(conn, evento_tipo, tracking_id, instante, ip_address, user_agent, classificacao,
+                  dados_extras=None, enriquecedor=None, evento_id=None):
+    """
+    Grava uma abertura/clique: o evento em tracking_events e os contadores
+    de email_campaigns (humano → aberto/clicou, senão os automáticos).
+    Com evento_id já gravado nada muda. Retorna (total humano do email
+    depois da gravação, campanha, provedor, enviado_em) ou None.
+    """
+    cursor = conn.execute('''
+        INSERT OR IGNORE INTO tracking_events
+        (tracking_id, evento_tipo, timestamp, ip_address, user_agent, dados_extras, classificacao, evento_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (tracking_id, evento_tipo, instante, ip_address, user_agent, dados_extras, classificacao, evento_id))
+    if not cursor.rowcount:
+        return None
+
+    if classificacao != HUMANO:
+        # Proxy/prefetch/scanner/bot não contam como abertura nem clique
+        coluna = 'aberturas_automaticas' if evento_tipo == 'abertura' else 'cliques_automaticos'
+        conn.execute(f"UPDATE email_campaigns SET {coluna} = {coluna} + 1 WHERE tracking_id = ?", (tracking_id,))
+        return None
+
+    if evento_tipo == 'abertura':
+        dispositivo, localizacao = enriquecedor.enriquecer(ip_address, user_agent) if enriquecedor else (None, None)
+        conn.execute('''
+            UPDATE email_campaigns
+            SET aberto = 1,
+                primeiro_abertura = COALESCE(primeiro_abertura, ?),
+                total_aberturas = total_aberturas + 1,
+                dispositivo_abertura = COALESCE(dispositivo_abertura, ?),
+                localizacao_abertura = COALESCE(localizacao_abertura, ?),
+                user_agent = COALESCE(user_agent, ?)
+            WHERE tracking_id = ?
+        ''', (instante, dispositivo, localizacao, user_agent, tracking_id))
+        total = 'total_aberturas'
+    else:
+        conn.execute('''
+            UPDATE email_campaigns
+            SET clicou_link = 1,
+                primeiro_clique = COALESCE(primeiro_clique, ?),
+                total_cliques = total_cliques + 1
+            WHERE tracking_id = ?
+        ''', (instante, tracking_id))
+        total = 'total_cliques'
+    return conn.execute(f'''
+        SELECT {total}, campanha, provedor_tipo, enviado_em FROM email_campaigns WHERE tracking_id = ?
+    ''', (tracking_id,)).fetchone()
+
+
+class JanelaDeduplicacao:
+    """Primeiro hit de cada chave na janela (TTL) com número de chaves limitado (LRU)"""
+
+    def __init__(self, janela=JANELA_DEDUP_SEGUNDOS, max_chaves=MAX_CHAVES_DEDUP):
+        self.janela = janela
+        self.max_chaves = max_chaves
+        # chave → instante do primeiro hit; todas têm o mesmo TTL, então a
+        # ordem de chegada é a de expiração e basta olhar o começo
+        self._vistos = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {'abertura': 0, 'clique': 0}
+        self.duplicados = {'abertura': 0, 'clique': 0}
+
+    def novo(self, evento_tipo, tracking_id, ip_address=None, user_agent=None, dados_extras=None, agora=None):
+        """
+        True no primeiro hit de (tracking_id, tipo, IP + user agent + URL) na
+        janela; os repetidos só somam em hits/duplicados. janela <= 0 desliga.
+        """
+        agora = time.monotonic() if agora is None else agora
+        chave = (tracking_id, evento_tipo, hash((ip_address, user_agent, dados_extras)))
+        with self._lock:
+            self.hits[evento_tipo] = self.hits.get(evento_tipo, 0) + 1
+            if self.janela <= 0:
+                return True
+            vistos = self._vistos
+            limite = agora - self.janela
+            while vistos and next(iter(vistos.values())) <= limite:
+                vistos.popitem(last=False)
+            if chave in vistos:
+                self.duplicados[evento_tipo] = self.duplicados.get(evento_tipo, 0) + 1
+                return False
+            vistos[chave] = agora
+            if len(vistos) > self.max_chaves:
+                # Pico acima do limite: a chave mais antiga sai antes do TTL
+                vistos.popitem(last=False)
+            return True
+
+    def __len__(self):
+        return len(self._vistos)
+
+
+def _segmentos(diretorio_no):
+    """[(número, caminho)] dos segmentos de um nó, em ordem"""
+    segmentos = []
+    for caminho in glob.glob(os.path.join(glob.escape(diretorio_no), '*' + EXTENSAO_SEGMENTO)):
+        nome = os.path.basename(caminho)[:-len(EXTENSAO_SEGMENTO)]
+        if nome.isdigit():
+            segmentos.append((int(nome), caminho))
+    return sorted(segmentos)
+
+
+def _nome_segmento(diretorio_no, numero):
+    return os.path.join(diretorio_no, f"{numero:08d}{EXTENSAO_SEGMENTO}")
+
+
+class LogEventos:
+    """Log local de um nó: append em segmentos JSONL com fsync em lote"""
+
+    def __init__(self, diretorio=DIRETORIO_LOGS, no=None, tamanho_segmento=TAMANHO_SEGMENTO,
+                 intervalo_fsync=INTERVALO_FSYNC, eventos_por_fsync=EVENTOS_POR_FSYNC):
+        # Nome do nó: TRACKING_NODE_NAME; senão hostname + PID (instâncias locais não colidem)
+        self.no = no or os.getenv('TRACKING_NODE_NAME') or f"{socket.gethostname()}-{os.getpid()}"
+        # Os evento_id saem de tracking_ids: sem TRACKING_NODE_ID em vários nós, falha já aqui
+        no_padrao()
+        self.diretorio = os.path.join(diretorio, self.no)
+        self.tamanho_segmento = tamanho_segmento
+        self.intervalo_fsync = intervalo_fsync
+        self.eventos_por_fsync = max(1, eventos_por_fsync)
+        self._lock = threading.Lock()
+        self._timer = None
+        self._pendentes = 0
+        os.makedirs(self.diretorio, exist_ok=True)
+        existentes = _segmentos(self.diretorio)
+        # Reinício: segmento novo (o anterior pode ter terminado numa linha cortada)
+        self._abrir((existentes[-1][0] if existentes else 0) + 1)
+        atexit.register(self.fechar)
+
+    def _abrir(self, numero):
+        self.segmento = numero
+        self._arquivo = open(_nome_segmento(self.diretorio, numero), 'ab')
+        self._tamanho = self._arquivo.tell()
+
+    def registrar(self, evento_tipo, tracking_id, ip_address=None, user_agent=None, classificacao=HUMANO,
+                  dados_extras=None, instante=None, evento_id=None):
+        """Acrescenta o evento ao log; retorna o evento_id"""
+        evento_id = evento_id or gerar_tracking_id()
+        linha = (_codificar({
+            'id': evento_id,
+            'tipo': evento_tipo,
+            'tracking_id': tracking_id,
+            'instante': (instante or datetime.now()).isoformat(sep=' '),
+            'ip': ip_address,
+            'user_agent': user_agent,
+            'classificacao': classificacao,
+            'dados_extras': dados_extras,
+        }) + '\n').encode('utf-8')
+        with self._lock:
+            self._arquivo.write(linha)
+            self._tamanho += len(linha)
+            self._pendentes += 1
+            if self._pendentes >= self.eventos_por_fsync or self._tamanho >= self.tamanho_segmento:
+                self._sincronizar()
+                if self._tamanho >= self.tamanho_segmento:
+                    self._arquivo.close()
+                    self._abrir(self.segmento + 1)
+            elif self._timer is None:
+                self._timer = threading.Timer(self.intervalo_fsync, self.sincronizar)
+                self._timer.daemon = True
+                self._timer.start()
+        return evento_id
+
+    def _sincronizar(self):
+        """flush + fsync do segmento atual (com o lock)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pendentes and not self._arquivo.closed:
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+            self._pendentes = 0
+
+    def sincronizar(self):
+        with self._lock:
+            self._sincronizar()
+
+    def fechar(self):
+        with self._lock:
+            self._sincronizar()
+            self._arquivo.close()
+
+
+class AgregadorLogs:
+    """Aplica os logs dos nós ao banco de analytics, sem duplicar eventos"""
+
+    def __init__(self, db_file='email_analytics.db', diretorio=DIRETORIO_LOGS, shards=None, enriquecedor=None,
+                 series=None, tamanho_lote=TAMANHO_LOTE, apagar_consumidos=False):
+        """
+        shards roteia tracking_id → banco (padrão: ArmazenamentoShards do db_file);
+        series recebe as primeiras aberturas/cliques; com apagar_consumidos, os
+        segmentos já aplicados (e fechados pelo nó) são removidos.
+        """
+        if shards is None:
+            from armazenamento_shards import ArmazenamentoShards
+            shards = ArmazenamentoShards(db_legado=db_file)
+        self.db_file = db_file
+        self.diretorio = diretorio
+        self.shards = shards
+        self.enriquecedor = enriquecedor
+        self.series = series
+        self.tamanho_lote = tamanho_lote
+        self.apagar_consumidos = apagar_consumidos
+        self._migrados = set()
+        self.totais = {'lidos': 0, 'aplicados': 0, 'duplicados': 0, 'invalidos': 0}
+        self.setup_database()
+
+    def setup_database(self):
+        from armazenamento_shards import criar_schema
+
+        criar_schema(self.db_file)
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS posicoes_logs (
+                    no TEXT PRIMARY KEY,
+                    segmento INTEGER,
+                    posicao INTEGER,
+                    atualizado_em TIMESTAMP
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _posicoes(self):
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            return {no: (segmento, posicao)
+                    for no, segmento, posicao in conn.execute("SELECT no, segmento, posicao FROM posicoes_logs")}
+        finally:
+            conn.close()
+
+    def _salvar_posicao(self, no, segmento, posicao):
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            conn.execute('''
+                INSERT INTO posicoes_logs (no, segmento, posicao, atualizado_em) VALUES (?, ?, ?, ?)
+                ON CONFLICT (no) DO UPDATE SET
+                    segmento = excluded.segmento, posicao = excluded.posicao, atualizado_em = excluded.atualizado_em
+            ''', (no, segmento, posicao, datetime.now()))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def processar(self):
+        """Uma passada por todos os nós; retorna os eventos aplicados (novos)"""
+        aplicados = self.totais['aplicados']
+        posicoes = self._posicoes()
+        for diretorio_no in sorted(glob.glob(os.path.join(glob.escape(self.diretorio), '*'))):
+            if os.path.isdir(diretorio_no):
+                no = os.path.basename(diretorio_no)
+                self._processar_no(no, diretorio_no, *posicoes.get(no, (0, 0)))
+        return self.totais['aplicados'] - aplicados
+
+    def _processar_no(self, no, diretorio_no, segmento_atual, posicao):
+        segmentos = _segmentos(diretorio_no)
+        for i, (numero, caminho) in enumerate(segmentos):
+            fechado = i < len(segmentos) - 1
+            if numero < segmento_atual:
+                # Já consumido numa passada anterior
+                if fechado and self.apagar_consumidos:
+                    os.remove(caminho)
+                continue
+            if numero != segmento_atual:
+                segmento_atual, posicao = numero, 0
+            with open(caminho, 'rb') as f:
+                f.seek(posicao)
+                while True:
+                    bloco = f.read(1 << 20)
+                    # Só linhas completas: a última pode estar no meio da escrita
+                    fim = bloco.rfind(b'\n') + 1
+                    if not fim:
+                        break
+                    self._aplicar_bloco(bloco[:fim].decode('utf-8', 'replace'))
+                    posicao += fim
+                    f.seek(posicao)
+                    self._salvar_posicao(no, numero, posicao)
+            if fechado and self.apagar_consumidos and posicao >= os.path.getsize(caminho):
+                os.remove(caminho)
+
+    def _aplicar_bloco(self, bloco):
+        linhas = bloco.splitlines()
+        try:
+            # Um json.loads por bloco; com alguma linha corrompida, linha a linha
+            registros = json.loads(f"[{','.join(linhas)}]")
+        except ValueError:
+            registros = []
+            for linha in linhas:
+                try:
+                    registros.append(json.loads(linha))
+                except ValueError:
+                    self.totais['invalidos'] += 1
+        eventos = []
+        for evento in registros:
+            try:
+                eventos.append((evento['id'], evento['tipo'], evento['tracking_id'], evento['instante'],
+                                evento.get('ip'), evento.get('user_agent'), evento.get('classificacao') or HUMANO,
+                                evento.get('dados_extras')))
+            except (TypeError, KeyError):
+                self.totais['invalidos'] += 1
+        self.totais['lidos'] += len(linhas)
+        for inicio in range(0, len(eventos), self.tamanho_lote):
+            self.aplicar(eventos[inicio:inicio + self.tamanho_lote])
+
+    def aplicar(self, eventos):
+        """Grava [(id, tipo, tracking_id, instante, ip, user_agent, classificação, dados_extras)] por banco"""
+        por_banco = {}
+        for evento in eventos:
+            por_banco.setdefault(self.shards.shard_de(evento[2]), []).append(evento)
+
+        primeiros = []
+        for db_file, lote in por_banco.items():
+            if db_file not in self._migrados:
+                from armazenamento_shards import criar_schema
+                criar_schema(db_file)
+                self._migrados.add(db_file)
+            conn = banco_dados.conectar(db_file)
+            try:
+                with conn:
+                    for evento_id, tipo, tracking_id, instante, ip, user_agent, classificacao, extras in lote:
+                        antes = conn.total_changes
+                        linha = gravar_evento(conn, tipo, tracking_id, instante, ip, user_agent, classificacao,
+                                              extras, self.enriquecedor, evento_id)
+                        if conn.total_changes == antes:
+                            self.totais['duplicados'] += 1
+                            continue
+                        self.totais['aplicados'] += 1
+                        if linha and linha[0] == 1:
+                            primeiros.append((tipo, instante, linha))
+            finally:
+                conn.close()
+
+        if self.series is not None:
+            for tipo, instante, (_, campanha, provedor, enviado_em) in primeiros:
+                self.series.registrar('aberturas' if tipo == 'abertura' else 'cliques', campanha, provedor,
+                                      datetime.fromisoformat(instante), enviado_em=enviado_em)
+
+    def executar(self, intervalo=1.0):
+        """Acompanha os logs até Ctrl+C, aplicando o que chegar a cada intervalo segundos"""
+        print(f"🔀 Agregando logs de {self.diretorio}/ em {self.db_file} (Ctrl+C para parar)")
+        try:
+            while True:
+                if self.processar():
+                    print(f"   {self.totais['aplicados']:,} eventos aplicados, "
+                          f"{self.totais['duplicados']:,} duplicados ignorados")
+                time.sleep(intervalo)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.series is not None:
+                self.series.descarregar()
+        return self.totais
@@ -148,4 +148,5 @@ def main():
         print("\n❌ Campanha cancelada.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    from perfilamento import executar_com_perfil
+    executar_com_perfil("iniciar_campanha", main)
\ No newline at end of file
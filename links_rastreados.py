@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Links Rastreados Assinados
+Cada URL de destino da campanha é registrada uma vez na tabela links e ganha
+um código curto. O link de clique leva só tracking_id, código e uma
+assinatura HMAC(tracking_id + código): o servidor confere a assinatura e
+resolve o destino pela tabela em memória, carregada na inicialização.
+Tokens forjados são recusados sem consultar o banco e não existe mais
+redirecionamento para uma ?url= arbitrária.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from datetime import datetime
+
+import banco_dados
+from tracking_ids import codificar_id, decodificar_id
+
+ARQUIVO_SEGREDO = 'tracking_secret.key'
+BYTES_ASSINATURA = 12  # 96 bits → 16 caracteres base64url
+
+
+def carregar_segredo(caminho=ARQUIVO_SEGREDO):
+    """TRACKING_SECRET do ambiente; senão um segredo gerado uma vez e salvo em arquivo"""
+    segredo = os.getenv('TRACKING_SECRET')
+    if segredo:
+        return segredo.encode()
+    if not os.path.exists(caminho):
+        # O_EXCL: se dois processos criarem ao mesmo tempo, só um grava
+        try:
+            fd = os.open(caminho, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(secrets.token_hex(32))
+        except FileExistsError:
+            pass
+    with open(caminho, 'r') as f:
+        return f.read().strip().encode()
+
+
+class RegistroLinks:
+    """Tabela links (id ↔ url) com cópia em memória e assinatura dos links de clique"""
+
+    def __init__(self, db_file, segredo=None):
+        self.db_file = db_file
+        self.segredo = segredo or carregar_segredo()
+        self._por_id = {}
+        self._por_url = {}
+        self._ultimo_id = 0
+        self._lock = threading.Lock()
+        self.setup_database()
+        self.carregar()
+
+    def setup_database(self):
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS links (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT UNIQUE,
+                    criado_em TIMESTAMP
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def carregar(self):
+        """Lê os links novos desde a última carga (na inicialização: todos)"""
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            linhas = conn.execute("SELECT id, url FROM links WHERE id > ? ORDER BY id", (self._ultimo_id,)).fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            for link_id, url in linhas:
+                self._por_id[link_id] = url
+                self._por_url[url] = link_id
+                self._ultimo_id = max(self._ultimo_id, link_id)
+        return len(linhas)
+
+    def internar(self, url):
+        """Id curto da URL, criando o registro na primeira vez"""
+        link_id = self._por_url.get(url)
+        if link_id is not None:
+            return link_id
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            conn.execute("INSERT OR IGNORE INTO links (url, criado_em) VALUES (?, ?)", (url, datetime.now()))
+            conn.commit()
+            link_id = conn.execute("SELECT id FROM links WHERE url = ?", (url,)).fetchone()[0]
+        finally:
+            conn.close()
+        with self._lock:
+            self._por_id[link_id] = url
+            self._por_url[url] = link_id
+        return link_id
+
+    def assinar(self, tracking_id, link_id):
+        digest = hmac.new(self.segredo, f"{tracking_id}:{link_id}".encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:BYTES_ASSINATURA]).decode()
+
+    def url_clique(self, base_url, tracking_id, url):
+        """Link de clique assinado: {base_url}/click/{tracking_id}/{codigo}/{assinatura}"""
+        link_id = self.internar(url)
+        return f"{base_url}/click/{tracking_id}/{codificar_id(link_id)}/{self.assinar(tracking_id, link_id)}"
+
+    def resolver(self, tracking_id, codigo, assinatura):
+        """URL de destino, ou None se a assinatura não confere ou o link não existe"""
+        try:
+            link_id = decodificar_id(codigo)
+        except KeyError:
+            return None
+        if not hmac.compare_digest(self.assinar(tracking_id, link_id).encode(), assinatura.encode()):
+            return None
+        url = self._por_id.get(link_id)
+        if url is None:
+            # Assinatura válida de um link criado depois da carga: busca só os novos
+            self.carregar()
+            url = self._por_id.get(link_id)
+        return url
+
+    def url_conhecida(self, url):
+        """Se a URL está registrada (usado para os links antigos com ?url=)"""
+        return url in self._por_url
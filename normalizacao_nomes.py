@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Normalização de Nomes de Empresas
+Remove sufixos societários (LTDA, S.A., EIRELI, ME, EPP...) com uma única
+regex pré-compilada, inclusive sufixos repetidos ("LTDA - ME"), e opera sobre
+uma Series inteira: cada nome distinto é limpo uma só vez (memoização).
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+# Sufixos da versão original de clean_company_name, na mesma ordem
+SUFIXOS_LEGADO = [
+    ' LTDA', ' LTDA.', ' S.A.', ' S/A', ' SA', ' S.A',
+    ' EIRELI', ' ME', ' EPP', ' MICROEMPRESA', ' - ME',
+    ' - EPP', ' - EIRELI', ' LIMITADA'
+]
+
+# As regexes trabalham sobre o nome invertido e ancoradas no início (\A):
+# o casamento só é tentado na posição 0 e percorre apenas o sufixo, em vez de
+# varrer o nome inteiro procurando um fim (funciona como um trie de sufixos)
+
+# Equivalente ao laço original: ' - ME', ' - EPP' e ' - EIRELI' nunca
+# venciam (' ME', ' EPP' e ' EIRELI' vêm antes na lista e também casam), e
+# entre os demais no máximo um casa no fim do nome
+_SUFIXOS_ALCANCAVEIS = [s for s in SUFIXOS_LEGADO if not s.startswith(' - ')]
+REGEX_LEGADO = re.compile(
+    r'\A(?:' + '|'.join(re.escape(s[::-1]) for s in sorted(_SUFIXOS_ALCANCAVEIS, key=len, reverse=True)) + ')',
+    re.IGNORECASE
+)
+
+# Versão completa: qualquer sequência de sufixos separados por espaço, hífen,
+# travessão ou vírgula ("LTDA - ME", "Eireli-EPP", "S.A. LTDA"), já invertidos
+_SUFIXOS_INVERTIDOS = r'(?:ASERPMEORCIM|ADATIMIL|ILERIE|\.?ADTL|\.?A\.S|A/S|AS|PPE|EM)'
+_SEPARADOR = r'(?:\s*[-–—,]\s*|\s+)'
+REGEX_SUFIXOS = re.compile(rf'\A[\s.,\-–—]*(?:{_SUFIXOS_INVERTIDOS}{_SEPARADOR})+', re.IGNORECASE)
+
+
+def limpar_nome_legado(nome):
+    """Implementação original (laço com upper/endswith), mantida como referência"""
+    nome_upper = nome.upper()
+    for suffix in SUFIXOS_LEGADO:
+        if nome_upper.endswith(suffix):
+            nome = nome[:len(nome)-len(suffix)]
+            break
+    return nome.strip()
+
+
+@lru_cache(maxsize=1 << 16)
+def normalizar_nome(nome, legado=False):
+    """Limpa um nome (memoizado); legado=True reproduz o resultado original"""
+    if legado:
+        return REGEX_LEGADO.sub('', nome[::-1], count=1)[::-1].strip()
+    nome = unicodedata.normalize('NFC', nome).strip()
+    return REGEX_SUFIXOS.sub('', nome[::-1], count=1)[::-1].strip()
+
+
+def normalizar_serie(serie, legado=False):
+    """
+    Limpa uma Series de nomes de uma vez
+
+    Fatoriza a série (cada nome distinto aparece uma vez), aplica a regex
+    vetorizada só nos valores únicos e expande de volta. Valores nulos
+    continuam nulos.
+    """
+    import numpy as np
+    import pandas as pd
+
+    codigos, unicos = pd.factorize(serie)
+    unicos = pd.Series(unicos, dtype=object).astype(str)
+
+    if legado:
+        invertidos = unicos.str[::-1].str.replace(REGEX_LEGADO, '', n=1, regex=True)
+    else:
+        invertidos = unicos.str.normalize('NFC').str.strip().str[::-1].str.replace(REGEX_SUFIXOS, '', n=1, regex=True)
+    limpos = invertidos.str[::-1].str.strip().to_numpy(dtype=object)
+
+    resultado = np.empty(len(codigos), dtype=object)
+    validos = codigos >= 0
+    resultado[validos] = limpos[codigos[validos]]
+    resultado[~validos] = None
+    return pd.Series(resultado, index=serie.index, name=serie.name)
+
+
+def nomes_empresas(df, legado=False):
+    """NomeFantasia (se preenchido) ou RazaoSocial, já sem sufixos, para o DataFrame inteiro"""
+    import pandas as pd
+
+    razao = df['RazaoSocial'].astype(str).str.strip()
+    if 'NomeFantasia' in df.columns:
+        fantasia = df['NomeFantasia']
+        fantasia = fantasia.where(fantasia.notna(), '').astype(str).str.strip()
+        nomes = fantasia.where(fantasia != '', razao)
+    else:
+        nomes = razao
+    return normalizar_serie(pd.Series(nomes, index=df.index), legado=legado)
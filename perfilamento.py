@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Perfilamento de Execução
+Wrappers de cProfile, tracemalloc e amostragem para os pontos de entrada.
+Ativado pela variável PROFILE_MODE ou pela flag --profile, sem editar código.
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from datetime import datetime
+
+MODOS_VALIDOS = ('cprofile', 'tracemalloc', 'sampling')
+
+
+def extrair_modos_perfil(argv=None):
+    """
+    Lê os modos de perfilamento da linha de comando ou do ambiente
+
+    Aceita --profile (equivale a cprofile), --profile=modo ou --profile modo,
+    com vários modos separados por vírgula. A flag é removida de argv e
+    propagada para PROFILE_MODE, para que subprocessos (ex.: reloader do
+    Flask) também sejam perfilados.
+    """
+    argv = sys.argv if argv is None else argv
+    valor = None
+
+    for i, arg in enumerate(argv[1:], 1):
+        if arg == '--profile':
+            proximo = argv[i + 1] if i + 1 < len(argv) else ''
+            if proximo and all(m in MODOS_VALIDOS for m in proximo.split(',')):
+                valor = proximo
+                del argv[i:i + 2]
+            else:
+                valor = 'cprofile'
+                del argv[i]
+            break
+        if arg.startswith('--profile='):
+            valor = arg.split('=', 1)[1]
+            del argv[i]
+            break
+
+    if valor is not None:
+        os.environ['PROFILE_MODE'] = valor
+    else:
+        valor = os.getenv('PROFILE_MODE', '')
+
+    modos = [m.strip().lower() for m in valor.split(',') if m.strip()]
+    invalidos = [m for m in modos if m not in MODOS_VALIDOS]
+    if invalidos:
+        raise ValueError(f"Modo de perfil inválido: {', '.join(invalidos)} (use {', '.join(MODOS_VALIDOS)})")
+    return modos
+
+
+class AmostradorPilha:
+    """Amostrador estatístico: registra a pilha da thread alvo a cada intervalo"""
+
+    def __init__(self, thread_id, intervalo=0.005):
+        self.thread_id = thread_id
+        self.intervalo = intervalo
+        self.amostras = Counter()
+        self.total = 0
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='amostrador-perfil', daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+
+    def _loop(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            pilha = []
+            while frame is not None:
+                codigo = frame.f_code
+                pilha.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+
+            # Formato "folded" (raiz primeiro), compatível com flamegraph.pl/speedscope
+            self.amostras[';'.join(reversed(pilha))] += 1
+            self.total += 1
+
+    def salvar(self, caminho, top_n):
+        with open(caminho, 'w', encoding='utf-8') as f:
+            for pilha, contagem in self.amostras.most_common():
+                f.write(f"{pilha} {contagem}\n")
+
+        resumo = Counter()
+        for pilha, contagem in self.amostras.items():
+            resumo[pilha.rsplit(';', 1)[-1]] += contagem
+
+        linhas = [f"Amostras: {self.total} (intervalo {self.intervalo * 1000:.1f}ms)", '']
+        for funcao, contagem in resumo.most_common(top_n):
+            linhas.append(f"{contagem * 100.0 / max(self.total, 1):6.2f}%  {contagem:8d}  {funcao}")
+        return '\n'.join(linhas)
+
+
+class PerfilExecucao:
+    """Context manager que ativa os modos pedidos e grava os artefatos ao sair"""
+
+    def __init__(self, nome, modos, diretorio=None, top_n=None, intervalo=None):
+        self.nome = nome
+        self.modos = list(modos)
+        self.diretorio = diretorio or os.getenv('PROFILE_DIR', 'profiles')
+        self.top_n = top_n or int(os.getenv('PROFILE_TOP', 30))
+        self.intervalo = intervalo or float(os.getenv('PROFILE_INTERVAL', 0.005))
+        self.base = None
+        self.artefatos = []
+        self._profiler = None
+        self._amostrador = None
+        self._inicio = None
+
+    def __enter__(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        carimbo = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.base = os.path.join(self.diretorio, f"{self.nome}_{carimbo}_{os.getpid()}")
+
+        if 'tracemalloc' in self.modos:
+            import tracemalloc
+            tracemalloc.start(int(os.getenv('PROFILE_TRACEBACK', 1)))
+
+        if 'sampling' in self.modos:
+            self._amostrador = AmostradorPilha(threading.get_ident(), self.intervalo)
+            self._amostrador.iniciar()
+
+        if 'cprofile' in self.modos:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duracao = time.perf_counter() - self._inicio
+        relatorio = [f"Perfil: {self.nome} | modos: {', '.join(self.modos)} | duração: {duracao:.3f}s"]
+
+        if self._profiler is not None:
+            self._profiler.disable()
+            relatorio.append(self._salvar_cprofile())
+
+        if self._amostrador is not None:
+            self._amostrador.parar()
+            caminho = f"{self.base}_amostras.folded"
+            relatorio.append(self._amostrador.salvar(caminho, self.top_n))
+            self.artefatos.append(caminho)
+
+        if 'tracemalloc' in self.modos:
+            relatorio.append(self._salvar_tracemalloc())
+
+        caminho = f"{self.base}_resumo.txt"
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write('\n\n'.join(relatorio) + '\n')
+        self.artefatos.append(caminho)
+
+        print(f"📈 Perfil salvo: {', '.join(self.artefatos)}", file=sys.stderr)
+        return False
+
+    def _salvar_cprofile(self):
+        import io
+        import pstats
+
+        caminho = f"{self.base}.prof"
+        self._profiler.dump_stats(caminho)
+        self.artefatos.append(caminho)
+
+        saida = io.StringIO()
+        stats = pstats.Stats(self._profiler, stream=saida)
+        stats.sort_stats('cumulative').print_stats(self.top_n)
+        return saida.getvalue()
+
+    def _salvar_tracemalloc(self):
+        import tracemalloc
+
+        snapshot = tracemalloc.take_snapshot()
+        atual, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        caminho = f"{self.base}.tracemalloc"
+        snapshot.dump(caminho)
+        self.artefatos.append(caminho)
+
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        linhas = [f"Memória atual: {atual / 1024:.1f}KiB | pico: {pico / 1024:.1f}KiB",
+                  f"Top {self.top_n} alocações por linha:"]
+        for i, estat in enumerate(snapshot.statistics('lineno')[:self.top_n], 1):
+            quadro = estat.traceback[0]
+            linhas.append(f"{i:3d}. {quadro.filename}:{quadro.lineno} "
+                          f"{estat.size / 1024:.1f}KiB em {estat.count} blocos")
+        return '\n'.join(linhas)
+
+
+def executar_com_perfil(nome, funcao, *args, **kwargs):
+    """Executa funcao, perfilando se PROFILE_MODE/--profile estiver definido"""
+    modos = extrair_modos_perfil()
+    if not modos:
+        return funcao(*args, **kwargs)
+
+    with PerfilExecucao(nome, modos):
+        return funcao(*args, **kwargs)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Plano de Envio Compacto
+Guarda só o que o envio usa de cada empresa (índice no CSV, razão social,
+nome limpo, email, prioridade e horário agendado) em arrays colunares: os
+textos ficam concatenados em UTF-8 num bytearray com um array de offsets,
+os números em array('q')/array('b'). Um plano de 5 milhões de empresas
+ocupa algumas centenas de MB, contra kilobytes por empresa quando cada item
+carregava a linha inteira do pandas.
+
+Planos agendados ficam em ordem de horário, então o recorte de um dia é uma
+busca binária; salvar/carregar grava os arrays crus em disco.
+"""
+
+import struct
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+Envio = namedtuple('Envio', 'indice razao_social nome_empresa email prioridade horario')
+
+MAGICO = b'PLANOENV1\n'
+CAMPOS_TEXTO = ('razoes', 'nomes', 'emails')
+CAMPOS_NUMERICOS = (('indices', 'q'), ('prioridades', 'b'), ('horarios', 'q'))
+
+
+class ColunaTexto:
+    """Strings UTF-8 concatenadas; fins[i] é o offset do fim da i-ésima"""
+
+    __slots__ = ('dados', 'fins')
+
+    def __init__(self, dados=None, fins=None):
+        self.dados = dados if dados is not None else bytearray()
+        self.fins = fins if fins is not None else array('q')
+
+    def append(self, texto):
+        self.dados += texto.encode('utf-8')
+        self.fins.append(len(self.dados))
+
+    def __len__(self):
+        return len(self.fins)
+
+    def __getitem__(self, i):
+        inicio = self.fins[i - 1] if i else 0
+        return self.dados[inicio:self.fins[i]].decode('utf-8')
+
+    def __iter__(self):
+        dados = self.dados
+        inicio = 0
+        for fim in self.fins:
+            yield dados[inicio:fim].decode('utf-8')
+            inicio = fim
+
+    def selecionar(self, posicoes):
+        """Nova coluna com as strings nas posições dadas (na ordem dada)"""
+        nova = ColunaTexto()
+        dados, fins = self.dados, self.fins
+        for i in posicoes:
+            nova.dados += dados[fins[i - 1] if i else 0:fins[i]]
+            nova.fins.append(len(nova.dados))
+        return nova
+
+    def fatia(self, inicio, fim):
+        base = self.fins[inicio - 1] if inicio else 0
+        topo = self.fins[fim - 1] if fim > inicio else base
+        return ColunaTexto(self.dados[base:topo], array('q', (f - base for f in self.fins[inicio:fim])))
+
+
+class PlanoEnvio:
+    """Empresas a enviar, em arrays colunares (horário 0 = ainda sem agendamento)"""
+
+    __slots__ = ('indices', 'prioridades', 'horarios', 'razoes', 'nomes', 'emails')
+
+    def __init__(self):
+        self.indices = array('q')
+        self.prioridades = array('b')
+        self.horarios = array('q')
+        self.razoes = ColunaTexto()
+        self.nomes = ColunaTexto()
+        self.emails = ColunaTexto()
+
+    def adicionar(self, indice, razao_social, nome_empresa, email, prioridade, horario=None):
+        self.indices.append(indice)
+        self.prioridades.append(prioridade)
+        self.horarios.append(int(horario.timestamp()) if horario else 0)
+        self.razoes.append(razao_social)
+        self.nomes.append(nome_empresa)
+        self.emails.append(email)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def _envio(self, i):
+        horario = self.horarios[i]
+        return Envio(self.indices[i], self.razoes[i], self.nomes[i], self.emails[i], self.prioridades[i],
+                     datetime.fromtimestamp(horario) if horario else None)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            inicio, fim, passo = i.indices(len(self))
+            if passo != 1:
+                return self.selecionar(range(inicio, fim, passo))
+            return self._fatia(inicio, fim)
+        if i < 0:
+            i += len(self)
+        return self._envio(i)
+
+    def __iter__(self):
+        for indice, razao, nome, email, prioridade, horario in zip(
+                self.indices, self.razoes, self.nomes, self.emails, self.prioridades, self.horarios):
+            yield Envio(indice, razao, nome, email, prioridade, datetime.fromtimestamp(horario) if horario else None)
+
+    def _fatia(self, inicio, fim):
+        plano = PlanoEnvio()
+        plano.indices = self.indices[inicio:fim]
+        plano.prioridades = self.prioridades[inicio:fim]
+        plano.horarios = self.horarios[inicio:fim]
+        for campo in CAMPOS_TEXTO:
+            setattr(plano, campo, getattr(self, campo).fatia(inicio, fim))
+        return plano
+
+    def selecionar(self, posicoes, horarios=None):
+        """Novo plano com as posições dadas, na ordem dada (e horários novos, se passados)"""
+        posicoes = array('q', posicoes)
+        plano = PlanoEnvio()
+        plano.indices = array('q', (self.indices[i] for i in posicoes))
+        plano.prioridades = array('b', (self.prioridades[i] for i in posicoes))
+        plano.horarios = array('q', horarios) if horarios is not None \
+            else array('q', (self.horarios[i] for i in posicoes))
+        for campo in CAMPOS_TEXTO:
+            setattr(plano, campo, getattr(self, campo).selecionar(posicoes))
+        return plano
+
+    def agendar(self, agendador, agora=None):
+        """Plano reordenado pelos horários do AgendadorEnvios (todas as empresas)"""
+        posicoes, horarios = array('q'), array('q')
+        for horario, posicao in agendador.planejar(zip(self.emails, self.prioridades), agora):
+            posicoes.append(posicao)
+            horarios.append(int(horario.timestamp()))
+        return self.selecionar(posicoes, horarios)
+
+    def dia(self, data):
+        """Recorte do plano agendado para a data (busca binária nos horários)"""
+        inicio = int(datetime.combine(data, datetime.min.time()).timestamp())
+        fim = int(datetime.combine(data + timedelta(days=1), datetime.min.time()).timestamp())
+        return self._fatia(bisect_left(self.horarios, inicio), bisect_left(self.horarios, fim))
+
+    def por_dia(self):
+        """(data, recorte) para cada dia com envios, em ordem"""
+        i = 0
+        while i < len(self):
+            horario = self.horarios[i]
+            if not horario:
+                # Parte sem agendamento: um bloco só, sem data
+                yield None, self._fatia(i, len(self))
+                return
+            data = datetime.fromtimestamp(horario).date()
+            fim = bisect_left(self.horarios, int(datetime.combine(data + timedelta(days=1),
+                                                                  datetime.min.time()).timestamp()), i)
+            yield data, self._fatia(i, fim)
+            i = fim
+
+    def tamanho_bytes(self):
+        """Memória dos buffers (sem o overhead fixo dos objetos)"""
+        total = sum(getattr(self, campo).itemsize * len(getattr(self, campo)) for campo, _ in CAMPOS_NUMERICOS)
+        for campo in CAMPOS_TEXTO:
+            coluna = getattr(self, campo)
+            total += len(coluna.dados) + coluna.fins.itemsize * len(coluna.fins)
+        return total
+
+    def salvar(self, caminho):
+        """Grava os arrays crus: cabeçalho + (tamanho, bytes) de cada buffer"""
+        with open(caminho, 'wb') as f:
+            f.write(MAGICO)
+            f.write(struct.pack('<q', len(self)))
+            buffers = [getattr(self, campo) for campo, _ in CAMPOS_NUMERICOS]
+            for campo in CAMPOS_TEXTO:
+                coluna = getattr(self, campo)
+                buffers.extend((coluna.fins, coluna.dados))
+            for buffer in buffers:
+                f.write(struct.pack('<q', len(buffer) * getattr(buffer, 'itemsize', 1)))
+                f.write(buffer)
+
+    @classmethod
+    def carregar(cls, caminho):
+        with open(caminho, 'rb') as f:
+            if f.read(len(MAGICO)) != MAGICO:
+                raise ValueError(f"Arquivo não é um plano de envio: {caminho}")
+            f.read(8)
+
+            def ler(tipo=None):
+                tamanho, = struct.unpack('<q', f.read(8))
+                dados = f.read(tamanho)
+                if tipo is None:
+                    return bytearray(dados)
+                return array(tipo, dados)
+
+            plano = cls()
+            for campo, tipo in CAMPOS_NUMERICOS:
+                setattr(plano, campo, ler(tipo))
+            for campo in CAMPOS_TEXTO:
+                fins = ler('q')
+                setattr(plano, campo, ColunaTexto(ler(), fins))
+        return plano
@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+"""
+Processamento de Bounces
+Lê relatórios de entrega (DSN, RFC 3464) e reclamações de spam (ARF, RFC 5965)
+de um maildir local ou via IMAP, classifica cada destinatário em bounce
+definitivo (hard), temporário (soft) ou reclamação, e atualiza
+email_campaigns e a lista de supressão em lote, numa única transação.
+
+Reprocessar não conta de novo: cada ocorrência tem uma chave (tracking_id
+ou Message-ID do relatório, mais o destinatário) guardada em
+bounces_processados, e o IMAP guarda por pasta o UIDVALIDITY e o último UID
+lido (bounces_sincronizacao). Mensagens do maildir só vão para cur/ depois
+que o lote delas foi gravado.
+
+O caminho rápido trabalha direto nos bytes com regex pré-compiladas; só
+mensagens fora do padrão (partes em base64, por exemplo) passam pelo parser
+completo do pacote email.
+"""
+
+import base64
+import hashlib
+import os
+import re
+from datetime import datetime, timedelta
+
+import banco_dados
+from armazenamento_shards import ultimos_envios
+
+# 5.x.x que na prática são temporários: caixa cheia, mensagem grande demais,
+# prazo de entrega expirado
+STATUS_SOFT_5XX = {'5.2.2', '5.2.3', '5.3.4', '5.4.7'}
+
+# Soft bounces acumulados até o endereço ser suprimido
+LIMITE_SOFT_BOUNCES = 3
+
+# Primeira leitura de uma pasta IMAP (ou UIDVALIDITY mudou): última semana
+DIAS_JANELA_INICIAL = 7
+
+RE_TIPO_RELATORIO = re.compile(rb'report-type\s*=\s*"?(delivery-status|feedback-report)', re.I)
+RE_PARTE_DSN = re.compile(rb'content-type:\s*message/(?:global-)?delivery-status[^\n]*\n(.*?)(?:\n--|\Z)', re.I | re.S)
+RE_PARTE_ARF = re.compile(rb'content-type:\s*message/feedback-report[^\n]*\n(.*?)(?:\n--|\Z)', re.I | re.S)
+RE_CAMPO = re.compile(rb'^([A-Za-z-]+):[ \t]*(.*(?:\r?\n[ \t].*)*)', re.M)
+RE_BLOCO = re.compile(rb'\r?\n[ \t]*\r?\n')
+RE_TRACKING_ID = re.compile(rb'[ \t]*([0-9A-Za-z_-]+)')
+RE_FALHOS = re.compile(rb'^X-Failed-Recipients:[ \t]*(.*(?:\r?\n[ \t].*)*)', re.M | re.I)
+RE_STATUS_TEXTO = re.compile(rb'\b([245])\.(\d{1,3})\.(\d{1,3})\b')
+RE_CODIGO_SMTP = re.compile(rb'\b([45])\d\d[ -]')
+RE_EMAIL = re.compile(rb'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+RE_FIM_CABECALHO = re.compile(rb'\r?\n\r?\n')
+RE_MESSAGE_ID = re.compile(rb'^Message-ID:[ \t]*(<[^>\r\n]+>)', re.M | re.I)
+
+
+def classificar(status, acao=''):
+    """'hard', 'soft' ou None (entregue/retransmitido) a partir de Status e Action"""
+    acao = acao.lower()
+    if acao in ('delivered', 'relayed', 'expanded'):
+        return None
+    if acao == 'delayed':
+        return 'soft'
+    if status.startswith('5'):
+        # 5.7.x: bloqueio por política/reputação; o endereço existe
+        if status in STATUS_SOFT_5XX or status.startswith('5.7.'):
+            return 'soft'
+        return 'hard'
+    if status.startswith('4'):
+        return 'soft'
+    return 'hard' if acao == 'failed' else None
+
+
+def _decodificar(valor):
+    return re.sub(r'\s+', ' ', valor.decode('utf-8', 'replace')).strip()
+
+
+def _endereco(valor):
+    """'rfc822; <joao@x.com>' → 'joao@x.com'"""
+    m = RE_EMAIL.search(valor.rpartition(b';')[2] or valor)
+    return m.group().decode('ascii', 'replace').lower() if m else None
+
+
+def _tracking_id(dados):
+    """Do cabeçalho X-Tracking-ID ou do link de descadastro (find é bem mais rápido que regex)"""
+    for marcador in (b'X-Tracking-ID:', b'/unsubscribe/'):
+        posicao = dados.find(marcador)
+        if posicao >= 0:
+            m = RE_TRACKING_ID.match(dados, posicao + len(marcador))
+            if m:
+                return m.group(1).decode('ascii')
+    return None
+
+
+def _campos(bloco):
+    return {nome.lower(): valor for nome, valor in RE_CAMPO.findall(bloco)}
+
+
+def _status_do_texto(texto):
+    """Status melhor-esforço em bounces sem DSN: código estendido ou SMTP"""
+    m = RE_STATUS_TEXTO.search(texto)
+    if m:
+        return b'.'.join(m.groups()).decode()
+    m = RE_CODIGO_SMTP.search(texto)
+    return f"{m.group(1).decode()}.0.0" if m else '5.0.0'
+
+
+def analisar_mensagem(dados):
+    """
+    Extrai os destinatários afetados de uma mensagem bruta (bytes)
+
+    Retorna lista de dicts com email, tipo ('hard', 'soft' ou 'reclamacao'),
+    status, diagnostico e tracking_id (do cabeçalho X-Tracking-ID ou do link
+    de descadastro na cópia da mensagem original, quando presente).
+    """
+    dados = dados.replace(b'\r\n', b'\n')
+    tipo_relatorio = RE_TIPO_RELATORIO.search(dados)
+    tracking_id = _tracking_id(dados)
+
+    if tipo_relatorio and tipo_relatorio.group(1).lower() == b'feedback-report':
+        parte = RE_PARTE_ARF.search(dados)
+        if not parte:
+            return _analisar_completo(dados)
+        campos = _campos(parte.group(1))
+        if b'feedback-type' not in campos or b'base64' in parte.group(0)[:200].lower():
+            return _analisar_completo(dados)
+        email = _endereco(campos.get(b'original-rcpt-to', b'')) or _endereco(dados.partition(b'\n\n')[2])
+        if not email:
+            return []
+        return [{'email': email, 'tipo': 'reclamacao', 'status': '',
+                 'diagnostico': _decodificar(campos[b'feedback-type']), 'tracking_id': tracking_id}]
+
+    if tipo_relatorio:
+        parte = RE_PARTE_DSN.search(dados)
+        if not parte or b'base64' in parte.group(0)[:200].lower():
+            return _analisar_completo(dados)
+        resultados = []
+        for bloco in RE_BLOCO.split(parte.group(1)):
+            campos = _campos(bloco)
+            destinatario = campos.get(b'final-recipient') or campos.get(b'original-recipient')
+            if not destinatario:
+                continue
+            status = _decodificar(campos.get(b'status', b''))
+            tipo = classificar(status, _decodificar(campos.get(b'action', b'')))
+            email = _endereco(destinatario)
+            if tipo and email:
+                resultados.append({
+                    'email': email, 'tipo': tipo, 'status': status,
+                    'diagnostico': _decodificar(campos.get(b'diagnostic-code', b''))[:500],
+                    'tracking_id': tracking_id
+                })
+        return resultados
+
+    # Bounce sem DSN (Exim, servidores antigos): X-Failed-Recipients + código no texto
+    falhos = RE_FALHOS.search(dados)
+    if not falhos:
+        return []
+    corpo = dados.partition(b'\n\n')[2]
+    status = _status_do_texto(corpo)
+    tipo = classificar(status, 'failed')
+    return [
+        {'email': m.group().decode('ascii', 'replace').lower(), 'tipo': tipo, 'status': status,
+         'diagnostico': '', 'tracking_id': tracking_id}
+        for m in RE_EMAIL.finditer(falhos.group(1))
+    ]
+
+
+def _blocos(parte):
+    """Grupos de campos de uma parte message/*, decodificando base64 se preciso"""
+    import email
+
+    payload = parte.get_payload()
+    if str(parte.get('Content-Transfer-Encoding', '')).lower() == 'base64':
+        texto = ''.join(b.get_payload() for b in payload if isinstance(b.get_payload(), str))
+        bruto = base64.b64decode(texto).replace(b'\r\n', b'\n')
+        return [email.message_from_bytes(b) for b in RE_BLOCO.split(bruto)]
+    return payload if isinstance(payload, list) else [email.message_from_string(str(payload))]
+
+
+def _analisar_completo(dados):
+    """Caminho lento: parser do pacote email (partes codificadas, formatos incomuns)"""
+    import email
+    from email import policy
+
+    msg = email.message_from_bytes(dados, policy=policy.compat32)
+    tracking_id = None
+    resultados = []
+
+    for parte in msg.walk():
+        tipo_conteudo = parte.get_content_type()
+        if tipo_conteudo in ('message/rfc822', 'text/rfc822-headers'):
+            tracking_id = tracking_id or _tracking_id(parte.as_bytes())
+        elif tipo_conteudo == 'message/feedback-report':
+            for bloco in _blocos(parte):
+                destinatario = _endereco(str(bloco.get('Original-Rcpt-To', '')).encode())
+                if destinatario:
+                    resultados.append({'email': destinatario, 'tipo': 'reclamacao', 'status': '',
+                                       'diagnostico': str(bloco.get('Feedback-Type', '')), 'tracking_id': None})
+        elif tipo_conteudo in ('message/delivery-status', 'message/global-delivery-status'):
+            for bloco in _blocos(parte):
+                destinatario = bloco.get('Final-Recipient') or bloco.get('Original-Recipient')
+                if not destinatario:
+                    continue
+                status = str(bloco.get('Status', '')).strip()
+                tipo = classificar(status, str(bloco.get('Action', '')).strip())
+                email_destino = _endereco(str(destinatario).encode())
+                if tipo and email_destino:
+                    resultados.append({'email': email_destino, 'tipo': tipo, 'status': status,
+                                       'diagnostico': str(bloco.get('Diagnostic-Code', ''))[:500],
+                                       'tracking_id': None})
+
+    for resultado in resultados:
+        resultado['tracking_id'] = tracking_id
+    return resultados
+
+
+def _id_mensagem(dados):
+    """Message-ID do relatório (cabeçalho de topo); sem ele, o hash da mensagem"""
+    fim = RE_FIM_CABECALHO.search(dados)
+    m = RE_MESSAGE_ID.search(dados, 0, fim.start() if fim else len(dados))
+    return m.group(1).decode('ascii', 'replace') if m else hashlib.sha1(dados).hexdigest()
+
+
+def ler_maildir(diretorio, pular_lidas=True):
+    """
+    Gera (caminho, bytes) das mensagens de um maildir (new/ e cur/)
+
+    Com pular_lidas, mensagens de cur/ com a flag S (já processadas) ficam de
+    fora. Nada é movido aqui: marcar_lida() vem depois da gravação.
+    """
+    for subpasta in ('new', 'cur'):
+        caminho_pasta = os.path.join(diretorio, subpasta)
+        if not os.path.isdir(caminho_pasta):
+            continue
+        with os.scandir(caminho_pasta) as entradas:
+            for entrada in entradas:
+                if not entrada.is_file() or entrada.name.startswith('.'):
+                    continue
+                # Já processada em uma execução anterior
+                if subpasta == 'cur' and pular_lidas and entrada.name.partition(':2,')[2].count('S'):
+                    continue
+                with open(entrada.path, 'rb') as f:
+                    dados = f.read()
+                yield entrada.path, dados
+
+
+def marcar_lida(caminho):
+    """Move a mensagem para cur/ com a flag S (não é processada de novo)"""
+    pasta, nome = os.path.split(caminho)
+    nome = nome if ':2,' in nome else nome + ':2,'
+    if 'S' not in nome.partition(':2,')[2]:
+        nome += 'S'
+    os.replace(caminho, os.path.join(os.path.dirname(pasta), 'cur', nome))
+
+
+def ler_imap(imap, pasta='INBOX', desde=None, tamanho_lote=200, ultimo_uid=0):
+    """
+    Gera (uid, bytes) dos bounces e reclamações de uma caixa IMAP já autenticada
+
+    Busca mensagens de MAILER-DAEMON/postmaster e relatórios multipart/report
+    (só UIDs acima de ultimo_uid, se passado), baixando em lotes de UIDs (um
+    FETCH por lote, não por mensagem).
+    """
+    imap.select(pasta)
+    criterio = '(OR OR FROM "mailer-daemon" FROM "postmaster" HEADER Content-Type "multipart/report")'
+    if ultimo_uid:
+        criterio = f'(UID {ultimo_uid + 1}:* {criterio})'
+    elif desde:
+        criterio = f'(SINCE "{desde.strftime("%d-%b-%Y")}" {criterio})'
+    _, dados = imap.uid('SEARCH', None, criterio)
+    # "n:*" sempre devolve a última mensagem, mesmo já vista
+    uids = [uid for uid in (dados[0].split() if dados and dados[0] else []) if int(uid) > ultimo_uid]
+
+    for i in range(0, len(uids), tamanho_lote):
+        lote = b','.join(uids[i:i + tamanho_lote]).decode()
+        _, resposta = imap.uid('FETCH', lote, '(BODY.PEEK[])')
+        for item in resposta:
+            if isinstance(item, tuple):
+                uid = re.search(rb'UID (\d+)', item[0])
+                yield (uid.group(1).decode() if uid else None), item[1]
+
+
+class ListaSupressao:
+    """Endereços que não devem mais receber emails e soft bounces aguardando reenvio"""
+
+    def __init__(self, db_file, limite_soft=LIMITE_SOFT_BOUNCES):
+        self.db_file = db_file
+        self.limite_soft = limite_soft
+        self.setup_database()
+
+    def setup_database(self):
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS supressao (
+                    email TEXT PRIMARY KEY,
+                    motivo TEXT,
+                    status_smtp TEXT,
+                    diagnostico TEXT,
+                    soft_bounces INTEGER DEFAULT 0,
+                    suprimido BOOLEAN DEFAULT 0,
+                    reenvio_pendente BOOLEAN DEFAULT 0,
+                    atualizado_em TIMESTAMP
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def registrar(self, conn, ocorrencias):
+        """Upsert em lote, dentro da transação de quem chama (tipo: hard, soft, reclamacao ou remover)"""
+        agora = datetime.now()
+        linhas = []
+        for o in ocorrencias:
+            if o['tipo'] == 'soft':
+                suprimido = int(self.limite_soft <= 1)
+                linhas.append((o['email'], 'soft_bounce', o['status'], o['diagnostico'], 1, suprimido, 1 - suprimido, agora))
+            else:
+                motivo = {'hard': 'hard_bounce', 'reclamacao': 'reclamacao_spam', 'remover': 'descadastro'}[o['tipo']]
+                linhas.append((o['email'], motivo, o['status'], o['diagnostico'], 0, 1, 0, agora))
+
+        # Hard bounce/reclamação sempre suprimem; soft bounce acumula até o limite
+        conn.executemany('''
+            INSERT INTO supressao
+                (email, motivo, status_smtp, diagnostico, soft_bounces, suprimido, reenvio_pendente, atualizado_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(email) DO UPDATE SET
+                soft_bounces = supressao.soft_bounces + excluded.soft_bounces,
+                suprimido = MAX(supressao.suprimido, excluded.suprimido,
+                                supressao.soft_bounces + excluded.soft_bounces >= ?),
+                motivo = CASE WHEN supressao.suprimido AND NOT excluded.suprimido
+                              THEN supressao.motivo ELSE excluded.motivo END,
+                status_smtp = CASE WHEN supressao.suprimido AND NOT excluded.suprimido
+                                   THEN supressao.status_smtp ELSE excluded.status_smtp END,
+                diagnostico = CASE WHEN supressao.suprimido AND NOT excluded.suprimido
+                                   THEN supressao.diagnostico ELSE excluded.diagnostico END,
+                reenvio_pendente = excluded.reenvio_pendente
+                    AND NOT MAX(supressao.suprimido, supressao.soft_bounces + excluded.soft_bounces >= ?),
+                atualizado_em = excluded.atualizado_em
+        ''', [linha + (self.limite_soft, self.limite_soft) for linha in linhas])
+
+    def carregar(self):
+        """(emails suprimidos, emails com reenvio pendente)"""
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            suprimidos, reenvio = set(), set()
+            for email, suprimido, pendente in conn.execute(
+                "SELECT email, suprimido, reenvio_pendente FROM supressao WHERE suprimido = 1 OR reenvio_pendente = 1"
+            ):
+                if suprimido:
+                    suprimidos.add(email)
+                elif pendente:
+                    reenvio.add(email)
+            return suprimidos, reenvio
+        finally:
+            conn.close()
+
+    def marcar_reenviado(self, email):
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            conn.execute("UPDATE supressao SET reenvio_pendente = 0 WHERE email = ?", (email.lower(),))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class ProcessadorBounces:
+    """Analisa mensagens em lote e grava bounces/reclamações com uma transação por lote"""
+
+    def __init__(self, db_file, tamanho_lote=2000, limite_soft=LIMITE_SOFT_BOUNCES, roteador=None):
+        self.db_file = db_file
+        self.tamanho_lote = tamanho_lote
+        self.supressao = ListaSupressao(db_file, limite_soft)
+        # ArmazenamentoShards: envios de campanhas ficam no shard de cada uma
+        self.roteador = roteador
+        self.setup_database()
+
+    def setup_database(self):
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            # Ocorrências já contadas: reprocessar a mesma mensagem não soma soft bounce
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS bounces_processados (
+                    chave TEXT PRIMARY KEY,
+                    processado_em TIMESTAMP
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS bounces_sincronizacao (
+                    pasta TEXT PRIMARY KEY,
+                    uidvalidity INTEGER,
+                    ultimo_uid INTEGER
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+        for arquivo in self._arquivos():
+            conn = banco_dados.conectar(arquivo)
+            try:
+                # Bounces sem X-Tracking-ID são casados pelo endereço
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_campaigns_email_destino ON email_campaigns (email_destino)")
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _arquivos(self):
+        return [arquivo for _, arquivo in self.roteador.arquivos()] if self.roteador else [self.db_file]
+
+    def processar(self, mensagens, ao_gravar=None):
+        """
+        Processa um iterável de (identificador, bytes)
+
+        ao_gravar(identificadores) é chamado depois de cada lote gravado, com
+        as mensagens lidas até ali (inclusive as que não eram bounce): é
+        quando o maildir as marca como lidas e o IMAP avança o último UID.
+
+        Retorna contagem: mensagens, hard, soft, reclamacao, ignoradas
+        (mensagens que não são bounce), repetidas (ocorrências já contadas
+        numa execução anterior) e sem_envio (destinatário sem registro em
+        email_campaigns).
+        """
+        totais = {'mensagens': 0, 'hard': 0, 'soft': 0, 'reclamacao': 0, 'ignoradas': 0, 'repetidas': 0,
+                  'sem_envio': 0}
+        lote, lidas = [], []
+        for identificador, dados in mensagens:
+            totais['mensagens'] += 1
+            lidas.append(identificador)
+            ocorrencias = analisar_mensagem(dados)
+            if not ocorrencias:
+                totais['ignoradas'] += 1
+                continue
+            id_mensagem = _id_mensagem(dados)
+            for o in ocorrencias:
+                # Uma ocorrência por envio e tipo; sem tracking_id, por relatório
+                o['chave'] = f"{o['tracking_id'] or id_mensagem}|{o['email']}|{o['tipo']}"
+            lote.extend(ocorrencias)
+            if len(lote) >= self.tamanho_lote:
+                self._gravar(lote, totais)
+                lote = []
+                if ao_gravar:
+                    ao_gravar(lidas)
+                lidas = []
+        if lote:
+            self._gravar(lote, totais)
+        if lidas and ao_gravar:
+            ao_gravar(lidas)
+        return totais
+
+    def processar_maildir(self, diretorio, marcar_lidas=True):
+        """Com marcar_lidas, cada mensagem vai para cur/ (flag S) depois que o lote dela foi gravado"""
+        ao_gravar = None
+        if marcar_lidas:
+            def ao_gravar(caminhos):
+                for caminho in caminhos:
+                    marcar_lida(caminho)
+        return self.processar(ler_maildir(diretorio, marcar_lidas), ao_gravar)
+
+    def processar_imap(self, imap, pasta='INBOX', desde=None):
+        """
+        Processa só os UIDs da pasta acima do último já gravado; na primeira
+        vez (ou se o UIDVALIDITY mudou) lê desde `desde` (padrão: últimos
+        DIAS_JANELA_INICIAL dias)
+        """
+        imap.select(pasta)
+        _, dados = imap.response('UIDVALIDITY')
+        uidvalidity = int(dados[0]) if dados and dados[0] else 0
+
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            estado = conn.execute("SELECT uidvalidity, ultimo_uid FROM bounces_sincronizacao WHERE pasta = ?",
+                                  (pasta,)).fetchone()
+        finally:
+            conn.close()
+        ultimo = estado[1] if estado and estado[0] == uidvalidity else 0
+        if not ultimo and desde is None:
+            desde = datetime.now() - timedelta(days=DIAS_JANELA_INICIAL)
+
+        def salvar_estado(uids):
+            # Depois da gravação do lote: se cair antes, o lote é relido (e as chaves evitam recontagem)
+            uids = [int(uid) for uid in uids if uid]
+            if not uids:
+                return
+            conn = banco_dados.conectar(self.db_file)
+            try:
+                conn.execute('''
+                    INSERT INTO bounces_sincronizacao (pasta, uidvalidity, ultimo_uid) VALUES (?, ?, ?)
+                    ON CONFLICT (pasta) DO UPDATE SET uidvalidity = excluded.uidvalidity,
+                                                      ultimo_uid = excluded.ultimo_uid
+                ''', (pasta, uidvalidity, max(uids)))
+                conn.commit()
+            finally:
+                conn.close()
+
+        return self.processar(ler_imap(imap, pasta, desde, ultimo_uid=ultimo), salvar_estado)
+
+    def _gravar(self, ocorrencias, totais):
+        # Sem tracking_id: o envio mais recente para o endereço, entre todos os shards
+        por_endereco = ultimos_envios(self._arquivos(), [o['email'] for o in ocorrencias if not o['tracking_id']])
+
+        # Por shard: (atualizações por tracking_id, atualizações por id do envio)
+        por_shard = {}
+        for o in ocorrencias:
+            status_entrega = {'hard': 'bounce_hard', 'soft': 'bounce_soft', 'reclamacao': 'reclamacao_spam'}[o['tipo']]
+            linha = (int(o['tipo'] == 'hard'), int(o['tipo'] == 'reclamacao'), status_entrega)
+            if o['tracking_id']:
+                arquivo = self.roteador.shard_de(o['tracking_id']) if self.roteador else self.db_file
+                por_shard.setdefault(arquivo, ([], []))[0].append(linha + (o['tracking_id'],))
+            elif o['email'] in por_endereco:
+                arquivo, id_envio = por_endereco[o['email']]
+                por_shard.setdefault(arquivo, ([], []))[1].append(linha + (id_envio,))
+
+        # bounce/spam_reclamacao só sobem (0 → 1); um soft bounce depois de um
+        # hard não rebaixa o status de entrega. Reaplicar uma ocorrência não muda nada
+        atualizacao = '''
+            UPDATE email_campaigns
+            SET bounce = MAX(bounce, ?),
+                spam_reclamacao = MAX(spam_reclamacao, ?),
+                status_entrega = CASE WHEN status_entrega = 'bounce_hard' THEN status_entrega ELSE ? END
+        '''
+        afetadas = 0
+        for arquivo, (por_tracking, por_id) in por_shard.items():
+            conn = banco_dados.conectar(arquivo)
+            try:
+                cursor = conn.cursor()
+                if por_tracking:
+                    cursor.executemany(atualizacao + " WHERE tracking_id = ?", por_tracking)
+                    afetadas += cursor.rowcount
+                if por_id:
+                    cursor.executemany(atualizacao + " WHERE id = ?", por_id)
+                    afetadas += cursor.rowcount
+                conn.commit()
+            finally:
+                conn.close()
+        totais['sem_envio'] += len(ocorrencias) - max(afetadas, 0)
+
+        # Chaves e supressão na mesma transação: só ocorrências nunca vistas
+        # contam (um soft bounce relido não soma de novo)
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            agora = datetime.now()
+            novas = []
+            for o in ocorrencias:
+                cursor = conn.execute("INSERT OR IGNORE INTO bounces_processados (chave, processado_em) VALUES (?, ?)",
+                                      (o['chave'], agora))
+                if cursor.rowcount == 1:
+                    novas.append(o)
+                    totais[o['tipo']] += 1
+                else:
+                    totais['repetidas'] += 1
+            self.supressao.registrar(conn, novas)
+            conn.commit()
+        finally:
+            conn.close()
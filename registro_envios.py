@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Registro de Envios em Duas Fases
+O email entra em email_campaigns como 'pendente' antes do SMTP e só vira
+'enviado' (ou 'falhou') depois da resposta do servidor, então falhas não
+deixam linhas fantasmas contadas como enviadas.
+
+A linha pendente é gravada (commit) antes de pendente() retornar, ou seja,
+antes do SMTP: um processo morto depois do aceite não perde o envio, e uma
+abertura que chega no mesmo segundo (prefetch de proxy) já encontra a linha.
+Só as trocas de status (confirmações e falhas) ficam num buffer, gravadas
+quando o lote enche, o intervalo de descarga vence (um timer garante a
+descarga mesmo com o envio parado no delay entre emails) ou junto com o
+INSERT do próximo pendente. Com tamanho_lote=1 cada operação é gravada na hora.
+"""
+
+import atexit
+import sqlite3
+import threading
+from datetime import datetime
+
+import banco_dados
+
+STATUS_PENDENTE = 'pendente'
+STATUS_ENVIADO = 'enviado'
+STATUS_FALHOU = 'falhou'
+
+# Condição SQL das linhas que contam como enviadas (bounces continuam contando)
+SQL_ENVIADOS = f"status_entrega NOT IN ('{STATUS_PENDENTE}', '{STATUS_FALHOU}')"
+
+# Segundos máximos que uma confirmação/falha espera no buffer
+INTERVALO_DESCARGA = 2.0
+# Confirmações/falhas no buffer que disparam a descarga na hora
+TAMANHO_LOTE = 100
+
+
+class RegistroEnvios:
+    """Linhas pendentes gravadas antes do SMTP; confirmações/falhas gravadas em lote"""
+
+    def __init__(self, db_file, campanha=None, intervalo_descarga=INTERVALO_DESCARGA, tamanho_lote=TAMANHO_LOTE):
+        self.db_file = db_file
+        self.campanha = campanha
+        self.intervalo_descarga = intervalo_descarga
+        self.tamanho_lote = max(1, tamanho_lote)
+        self._resultados = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        atexit.register(self.descarregar)
+
+    def pendente(self, tracking_id, empresa_nome, razao_social, email_destino, provedor_tipo, assunto,
+                 modelo_assunto=None, prioridade_email=None):
+        """
+        Email montado e prestes a ir para o SMTP: a linha é gravada na hora
+        (com as trocas de status do buffer na mesma transação). Se o banco
+        não aceitar, a exceção sobe e o email não deve ser enviado.
+        """
+        linha = (tracking_id, empresa_nome, razao_social, email_destino, provedor_tipo, assunto,
+                 datetime.now(), STATUS_PENDENTE, self.campanha, modelo_assunto, prioridade_email)
+        # O timer continua armado (descarga vazia não custa nada): criar e cancelar
+        # uma thread a cada envio custaria mais que o próprio lote
+        atualizar = self._retirar_resultados(parar_timer=False)
+        try:
+            self._gravar([linha], atualizar)
+        except sqlite3.Error:
+            # Banco ocupado, tracking_id repetido...: as trocas de status não se perdem
+            self._devolver_resultados(atualizar)
+            raise
+
+    def confirmar(self, tracking_id, instante=None):
+        """SMTP aceitou a mensagem: enviado_em passa a ser o instante do aceite"""
+        self._acumular(tracking_id, (STATUS_ENVIADO, instante or datetime.now()))
+
+    def falhar(self, tracking_id):
+        self._acumular(tracking_id, (STATUS_FALHOU, None))
+
+    def _acumular(self, tracking_id, valor):
+        with self._lock:
+            self._resultados[tracking_id] = valor
+            cheio = len(self._resultados) >= self.tamanho_lote
+            if not cheio:
+                self._armar_timer()
+        if cheio:
+            self.descarregar()
+
+    def _armar_timer(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.intervalo_descarga, self.descarregar)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _retirar_resultados(self, parar_timer=True):
+        """Esvazia o buffer: [(status, instante, tracking_id)]"""
+        with self._lock:
+            resultados, self._resultados = self._resultados, {}
+            if parar_timer and self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return [(status, instante, tracking_id) for tracking_id, (status, instante) in resultados.items()]
+
+    def _devolver_resultados(self, atualizar):
+        """Gravação falhou: as trocas de status voltam ao buffer para a próxima descarga"""
+        with self._lock:
+            for status, instante, tracking_id in atualizar:
+                self._resultados.setdefault(tracking_id, (status, instante))
+            if self._resultados:
+                self._armar_timer()
+
+    def _gravar(self, inserir, atualizar):
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            conn.executemany('''
+                INSERT INTO email_campaigns
+                (tracking_id, empresa_nome, razao_social, email_destino, provedor_tipo, assunto,
+                 enviado_em, status_entrega, campanha, modelo_assunto, prioridade_email)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', inserir)
+            conn.executemany('''
+                UPDATE email_campaigns
+                SET status_entrega = ?, enviado_em = COALESCE(?, enviado_em)
+                WHERE tracking_id = ? AND status_entrega = ?
+            ''', [(*linha, STATUS_PENDENTE) for linha in atualizar])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def descarregar(self):
+        """Grava as confirmações/falhas do buffer numa transação; retorna operações gravadas"""
+        atualizar = self._retirar_resultados()
+        if not atualizar:
+            return 0
+        try:
+            self._gravar([], atualizar)
+        except sqlite3.Error as e:
+            print(f"⚠️ Status de envios não gravados ({e}); nova tentativa na próxima descarga")
+            self._devolver_resultados(atualizar)
+            return 0
+        return len(atualizar)
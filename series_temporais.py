@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Séries Temporais de Engajamento
+Contadores de envios, aberturas e cliques por campanha e provedor em buckets
+de minuto, de hora e de "horas desde o envio". Cada série é um anel de
+buckets num array('q') em memória; a cada INTERVALO_DESCARGA segundos (e na
+saída do processo) os anéis são somados à tabela serie_eventos com upsert,
+então o processo de envio e o servidor de tracking gravam na mesma série
+sem se sobrescrever.
+
+Aberturas e cliques contam só o primeiro evento humano de cada email: a
+curva de "horas desde o envio" acumulada é a taxa de abertura ao longo do
+tempo e a de hora do dia mostra quando os destinatários abrem.
+"""
+
+import atexit
+import sqlite3
+import threading
+import time
+from array import array
+from datetime import datetime
+
+import banco_dados
+from registro_envios import SQL_ENVIADOS
+
+METRICAS = ('enviados', 'aberturas', 'cliques')
+INDICE_METRICA = {metrica: i for i, metrica in enumerate(METRICAS)}
+N_METRICAS = len(METRICAS)
+
+# granularidade → largura do bucket em segundos; só os minutos ficam em anel,
+# as horas são somadas a partir deles na descarga
+GRANULARIDADES = {'minuto': 60, 'hora': 3600}
+MINUTOS_NO_ANEL = 120
+# Curva desde o envio: uma posição por hora; a última acumula o que vier depois
+HORAS_DESDE_ENVIO = 168
+DESDE_ENVIO = 'desde_envio'
+
+INTERVALO_DESCARGA = 30.0
+RETENCAO_MINUTOS_DIAS = 14
+
+SEM_CAMPANHA = ''
+
+
+class Anel:
+    """Buckets consecutivos de uma série num array circular (métricas intercaladas)"""
+
+    __slots__ = ('largura', 'tamanho', 'valores', 'ultimo', 'ocupados', 'menor', 'transbordo')
+
+    def __init__(self, largura, tamanho):
+        self.largura = largura
+        self.tamanho = tamanho
+        self.valores = array('q', bytes(8 * tamanho * N_METRICAS))
+        self.ultimo = None
+        # Buckets com contagem no anel: avançar e drenar só visitam esses
+        self.ocupados = set()
+        self.menor = None
+        # Buckets que saíram do anel (ou chegaram atrasados) antes da descarga
+        self.transbordo = {}
+
+    def somar(self, instante, indice, quantidade=1):
+        bucket = int(instante // self.largura)
+        if self.ultimo is None or bucket > self.ultimo:
+            if self.ultimo is not None:
+                self._avancar(bucket)
+            self.ultimo = bucket
+        elif bucket <= self.ultimo - self.tamanho:
+            contagens = self.transbordo.setdefault(bucket, [0] * N_METRICAS)
+            contagens[indice] += quantidade
+            return
+        self.valores[(bucket % self.tamanho) * N_METRICAS + indice] += quantidade
+        if bucket not in self.ocupados:
+            self.ocupados.add(bucket)
+            if self.menor is None or bucket < self.menor:
+                self.menor = bucket
+
+    def _avancar(self, bucket):
+        """Move para o transbordo os buckets cujas posições o novo bucket reutiliza"""
+        limite = bucket - self.tamanho
+        if self.menor is None or self.menor > limite:
+            return
+        for antigo in [b for b in self.ocupados if b <= limite]:
+            self.transbordo[antigo] = self._retirar(antigo)
+            self.ocupados.discard(antigo)
+        self.menor = min(self.ocupados) if self.ocupados else None
+
+    def _retirar(self, bucket):
+        posicao = (bucket % self.tamanho) * N_METRICAS
+        contagens = self.valores[posicao:posicao + N_METRICAS].tolist()
+        self.valores[posicao:posicao + N_METRICAS] = array('q', bytes(8 * N_METRICAS))
+        return contagens
+
+    def drenar(self):
+        """[(bucket, [enviados, aberturas, cliques])] ainda não descarregados; zera o anel"""
+        linhas = list(self.transbordo.items())
+        self.transbordo = {}
+        for bucket in self.ocupados:
+            linhas.append((bucket, self._retirar(bucket)))
+        self.ocupados.clear()
+        self.menor = None
+        return linhas
+
+
+def _epoch(valor):
+    """Timestamp do SQLite (texto local) ou datetime → epoch"""
+    if valor is None or isinstance(valor, (int, float)):
+        return valor
+    if isinstance(valor, str):
+        valor = datetime.fromisoformat(valor)
+    return valor.timestamp()
+
+
+class SeriesTemporais:
+    """Anéis por (campanha, provedor, granularidade) descarregados na tabela serie_eventos"""
+
+    def __init__(self, db_file='email_analytics.db', intervalo_descarga=INTERVALO_DESCARGA):
+        self.db_file = db_file
+        self.intervalo_descarga = intervalo_descarga
+        self._aneis = {}
+        self._pendentes = []
+        self._lock = threading.Lock()
+        self._proxima_descarga = time.monotonic() + intervalo_descarga
+        self._proxima_limpeza = 0.0
+        self.setup_database()
+        atexit.register(self.descarregar)
+
+    def setup_database(self):
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS serie_eventos (
+                    granularidade TEXT,
+                    campanha TEXT,
+                    provedor TEXT,
+                    bucket INTEGER,
+                    enviados INTEGER DEFAULT 0,
+                    aberturas INTEGER DEFAULT 0,
+                    cliques INTEGER DEFAULT 0,
+                    PRIMARY KEY (granularidade, campanha, provedor, bucket)
+                ) WITHOUT ROWID
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _anel(self, granularidade, campanha, provedor):
+        chave = (granularidade, campanha, provedor)
+        anel = self._aneis.get(chave)
+        if anel is None:
+            if granularidade == DESDE_ENVIO:
+                anel = Anel(3600, HORAS_DESDE_ENVIO + 1)
+            else:
+                anel = Anel(GRANULARIDADES['minuto'], MINUTOS_NO_ANEL)
+            self._aneis[chave] = anel
+        return anel
+
+    def registrar(self, metrica, campanha, provedor, instante=None, enviado_em=None):
+        """
+        Conta um envio/abertura/clique; instante e enviado_em em epoch ou datetime
+
+        Sem enviado_em o evento fica fora da curva desde o envio (envios
+        passam o próprio instante).
+        """
+        indice = INDICE_METRICA[metrica]
+        instante = time.time() if instante is None else _epoch(instante)
+        campanha = campanha or SEM_CAMPANHA
+        provedor = provedor or 'outro'
+
+        with self._lock:
+            self._anel('minuto', campanha, provedor).somar(instante, indice)
+            if enviado_em is not None:
+                decorrido = min(max(instante - _epoch(enviado_em), 0), HORAS_DESDE_ENVIO * 3600)
+                self._anel(DESDE_ENVIO, campanha, provedor).somar(decorrido, indice)
+            vencida = time.monotonic() >= self._proxima_descarga
+
+        if vencida:
+            self.descarregar()
+
+    def descarregar(self):
+        """Soma os anéis ao banco (upsert) e zera a memória; retorna linhas gravadas"""
+        with self._lock:
+            linhas = self._pendentes
+            self._pendentes = []
+            horas = {}
+            por_hora = GRANULARIDADES['hora'] // GRANULARIDADES['minuto']
+            for (granularidade, campanha, provedor), anel in self._aneis.items():
+                for bucket, contagens in anel.drenar():
+                    linhas.append((granularidade, campanha, provedor, bucket, *contagens))
+                    if granularidade == 'minuto':
+                        soma = horas.setdefault((campanha, provedor, bucket // por_hora), [0] * N_METRICAS)
+                        for i, valor in enumerate(contagens):
+                            soma[i] += valor
+            linhas.extend(('hora', *chave, *contagens) for chave, contagens in horas.items())
+            self._proxima_descarga = time.monotonic() + self.intervalo_descarga
+        if not linhas:
+            return 0
+
+        try:
+            conn = banco_dados.conectar(self.db_file)
+            try:
+                conn.executemany('''
+                    INSERT INTO serie_eventos
+                    (granularidade, campanha, provedor, bucket, enviados, aberturas, cliques)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (granularidade, campanha, provedor, bucket) DO UPDATE SET
+                        enviados = enviados + excluded.enviados,
+                        aberturas = aberturas + excluded.aberturas,
+                        cliques = cliques + excluded.cliques
+                ''', linhas)
+                if time.monotonic() >= self._proxima_limpeza:
+                    # Buckets de minuto só servem para a visão recente
+                    limite = int(time.time() // 60) - RETENCAO_MINUTOS_DIAS * 1440
+                    conn.execute("DELETE FROM serie_eventos WHERE granularidade = 'minuto' AND bucket < ?",
+                                 (limite,))
+                    self._proxima_limpeza = time.monotonic() + 3600
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.OperationalError as e:
+            # Banco ocupado: as contagens voltam para a próxima descarga
+            print(f"⚠️ Séries temporais não gravadas ({e}); nova tentativa na próxima descarga")
+            with self._lock:
+                self._pendentes.extend(linhas)
+            return 0
+        return len(linhas)
+
+    def reconstruir(self, arquivos):
+        """
+        Refaz a série a partir de email_campaigns (enviado_em, primeiro_abertura,
+        primeiro_clique); arquivos = [(nome_campanha, db_file)] como em
+        ArmazenamentoShards.arquivos(). Apaga a série atual antes.
+        """
+        self.descarregar()
+        with self._lock:
+            self._aneis = {}
+            self._pendentes = []
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            conn.execute("DELETE FROM serie_eventos")
+            conn.commit()
+        finally:
+            conn.close()
+
+        total = 0
+        for nome, db_file in arquivos:
+            padrao = SEM_CAMPANHA if nome == 'legado' else nome
+            conn = banco_dados.conectar(db_file)
+            try:
+                cursor = conn.execute(f'''
+                    SELECT campanha, provedor_tipo, enviado_em, primeiro_abertura, primeiro_clique
+                    FROM email_campaigns WHERE enviado_em IS NOT NULL AND {SQL_ENVIADOS}
+                ''')
+                for campanha, provedor, enviado_em, abertura, clique in cursor:
+                    campanha = campanha or padrao
+                    enviado = _epoch(enviado_em)
+                    self.registrar('enviados', campanha, provedor, enviado, enviado)
+                    if abertura:
+                        self.registrar('aberturas', campanha, provedor, abertura, enviado)
+                    if clique:
+                        self.registrar('cliques', campanha, provedor, clique, enviado)
+                    total += 1
+            finally:
+                conn.close()
+        self.descarregar()
+        return total
+
+    def _filtro(self, granularidade, campanha, provedor):
+        condicoes, parametros = ["granularidade = ?"], [granularidade]
+        if campanha is not None:
+            condicoes.append("campanha = ?")
+            parametros.append(campanha)
+        if provedor is not None:
+            condicoes.append("provedor = ?")
+            parametros.append(provedor)
+        return " AND ".join(condicoes), parametros
+
+    def curva_desde_envio(self, campanha=None, provedor=None, horas=48):
+        """
+        Uma linha por hora desde o envio: (hora, aberturas, cliques,
+        taxa_abertura_acumulada, taxa_clique_acumulada), em % dos enviados
+        """
+        self.descarregar()
+        where, parametros = self._filtro(DESDE_ENVIO, campanha, provedor)
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            por_hora = {
+                bucket: (enviados, aberturas, cliques)
+                for bucket, enviados, aberturas, cliques in conn.execute(f'''
+                    SELECT bucket, SUM(enviados), SUM(aberturas), SUM(cliques)
+                    FROM serie_eventos WHERE {where} GROUP BY bucket
+                ''', parametros)
+            }
+        finally:
+            conn.close()
+
+        enviados = sum(valores[0] for valores in por_hora.values())
+        curva = []
+        abertos = clicados = 0
+        for hora in range(min(horas, HORAS_DESDE_ENVIO) + 1):
+            _, aberturas, cliques = por_hora.get(hora, (0, 0, 0))
+            abertos += aberturas
+            clicados += cliques
+            curva.append((
+                hora, aberturas, cliques,
+                round(abertos * 100.0 / enviados, 2) if enviados else 0.0,
+                round(clicados * 100.0 / enviados, 2) if enviados else 0.0,
+            ))
+        return curva
+
+    def curva_hora_do_dia(self, campanha=None, provedor=None):
+        """24 linhas (hora local, enviados, aberturas, cliques, % das aberturas do dia)"""
+        self.descarregar()
+        where, parametros = self._filtro('hora', campanha, provedor)
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            por_hora = {
+                hora: (enviados, aberturas, cliques)
+                for hora, enviados, aberturas, cliques in conn.execute(f'''
+                    SELECT CAST(strftime('%H', bucket * 3600, 'unixepoch', 'localtime') AS INTEGER),
+                           SUM(enviados), SUM(aberturas), SUM(cliques)
+                    FROM (
+                        SELECT bucket, SUM(enviados) AS enviados, SUM(aberturas) AS aberturas,
+                               SUM(cliques) AS cliques
+                        FROM serie_eventos WHERE {where} GROUP BY bucket
+                    )
+                    GROUP BY 1
+                ''', parametros)
+            }
+        finally:
+            conn.close()
+
+        total_aberturas = sum(valores[1] for valores in por_hora.values())
+        curva = []
+        for hora in range(24):
+            enviados, aberturas, cliques = por_hora.get(hora, (0, 0, 0))
+            participacao = round(aberturas * 100.0 / total_aberturas, 2) if total_aberturas else 0.0
+            curva.append((hora, enviados, aberturas, cliques, participacao))
+        return curva
+
+    def serie(self, granularidade='hora', campanha=None, provedor=None, desde=None):
+        """[(inicio do bucket, enviados, aberturas, cliques)] em ordem cronológica"""
+        self.descarregar()
+        largura = GRANULARIDADES[granularidade]
+        where, parametros = self._filtro(granularidade, campanha, provedor)
+        if desde is not None:
+            where += " AND bucket >= ?"
+            parametros.append(int(_epoch(desde) // largura))
+        conn = banco_dados.conectar(self.db_file)
+        try:
+            linhas = conn.execute(f'''
+                SELECT bucket, SUM(enviados), SUM(aberturas), SUM(cliques)
+                FROM serie_eventos WHERE {where} GROUP BY bucket ORDER BY bucket
+            ''', parametros).fetchall()
+        finally:
+            conn.close()
+        return [(datetime.fromtimestamp(bucket * largura), *valores) for bucket, *valores in linhas]
@@ -7,7 +7,6 @@ Executa configuração completa e testes iniciais
 import os
 import sys
 import json
-import pandas as pd
 from datetime import datetime
 import subprocess
 
@@ -98,6 +97,9 @@ PROVIDER={provider}
 
 def test_csv_file():
     """Testa se o arquivo CSV está no formato correto"""
+    # Import tardio: o setup roda antes de instalar as dependências
+    import pandas as pd
+    
     print("\n📄 Verificando arquivo CSV...")
     
     # Busca pelos novos nomes de arquivo
@@ -4,85 +4,124 @@ Sistema de Monitoramento e Analytics
 Tracking completo de entrega, abertura, cliques e respostas
 """
 
-import pandas as pd
 import json
 import os
-import time
-import uuid
-from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import smtplib
+from datetime import datetime
 from dotenv import load_dotenv
-import sqlite3
-import hashlib
+
+import banco_dados
+
+# pandas e as classes MIME são importados sob demanda: o servidor de tracking
+# e os subcomandos rápidos da CLI não devem pagar esse custo na inicialização
 
 class EmailAnalytics:
-    def __init__(self):
+    def __init__(self, campanha=None, intervalo_descarga=None, tamanho_lote=None):
         load_dotenv('.env', override=True)
         self.email = os.getenv('EMAIL_USER')
         self.password = os.getenv('EMAIL_PASS')
         self.tracking_domain = "track.automated-lead-generator.com"  # Pode usar ngrok ou servidor próprio
         self.db_file = "email_analytics.db"
+        # Tabelas globais (links, supressão) ficam sempre no banco principal
+        self.db_principal = self.db_file
+        self._registro_links = None
+        self._classificador = None
+        self._enriquecedor = None
+        self._funil = None
+        self._series = None
+        self._registro_envios = None
+        # Buffer de confirmações de envio (None = padrão de registro_envios; tamanho_lote=1 grava na hora)
+        self.intervalo_descarga = intervalo_descarga
+        self.tamanho_lote = tamanho_lote
+        
+        # Com campanha: envios e eventos dela vão para o shard próprio
+        self.campanha = campanha
+        self.shards = None
+        self.campanha_id = None
+        if campanha:
+            from armazenamento_shards import ArmazenamentoShards
+            self.shards = ArmazenamentoShards(db_legado=self.db_file)
+            self.campanha_id = self.shards.criar_campanha(campanha)
+        
         self.setup_database()
+        if self.shards:
+            self.db_file = self.shards.arquivo(self.campanha_id)
         
     def setup_database(self):
-        """Cria banco de dados para tracking"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        # Tabela principal de emails
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS email_campaigns (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tracking_id TEXT UNIQUE,
-                empresa_nome TEXT,
-                razao_social TEXT,
-                email_destino TEXT,
-                provedor_tipo TEXT,
-                assunto TEXT,
-                enviado_em TIMESTAMP,
-                status_entrega TEXT,
-                aberto BOOLEAN DEFAULT 0,
-                primeiro_abertura TIMESTAMP,
-                total_aberturas INTEGER DEFAULT 0,
-                clicou_link BOOLEAN DEFAULT 0,
-                primeiro_clique TIMESTAMP,
-                total_cliques INTEGER DEFAULT 0,
-                respondeu BOOLEAN DEFAULT 0,
-                data_resposta TIMESTAMP,
-                bounce BOOLEAN DEFAULT 0,
-                spam_reclamacao BOOLEAN DEFAULT 0,
-                dispositivo_abertura TEXT,
-                localizacao_abertura TEXT,
-                user_agent TEXT
-            )
-        ''')
-        
-        # Tabela de eventos de tracking
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tracking_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tracking_id TEXT,
-                evento_tipo TEXT,
-                timestamp TIMESTAMP,
-                ip_address TEXT,
-                user_agent TEXT,
-                dados_extras TEXT,
-                FOREIGN KEY (tracking_id) REFERENCES email_campaigns (tracking_id)
+        """Cria banco de dados para tracking (e migra colunas novas em bancos antigos)"""
+        from armazenamento_shards import criar_schema
+        criar_schema(self.db_file)
+        
+    @property
+    def classificador(self):
+        """Classificador humano/bot, compilado no primeiro evento"""
+        if self._classificador is None:
+            from filtro_bots import ClassificadorEventos
+            self._classificador = ClassificadorEventos()
+        return self._classificador
+    
+    @property
+    def enriquecedor(self):
+        """Dispositivo/localização das aberturas (GeoIP local, se houver o arquivo)"""
+        if self._enriquecedor is None:
+            from enriquecimento_eventos import EnriquecedorEventos
+            self._enriquecedor = EnriquecedorEventos.padrao()
+        return self._enriquecedor
+    
+    @property
+    def funil(self):
+        """Funil e coortes vetorizados do banco da campanha (extratos atualizados a cada acesso)"""
+        if self._funil is None:
+            from funil_coortes import FunilCoortes
+            self._funil = FunilCoortes([(self.campanha or 'legado', self.db_file)])
+        self.descarregar_envios()
+        self._funil.atualizar()
+        return self._funil
+    
+    @property
+    def series(self):
+        """Séries temporais de envios/aberturas/cliques (banco principal, todas as campanhas)"""
+        if self._series is None:
+            from series_temporais import SeriesTemporais
+            self._series = SeriesTemporais(self.db_principal)
+        return self._series
+    
+    @property
+    def registro_envios(self):
+        """Envios pendentes/confirmados gravados em lote no banco da campanha"""
+        if self._registro_envios is None:
+            from registro_envios import RegistroEnvios, INTERVALO_DESCARGA, TAMANHO_LOTE
+            self._registro_envios = RegistroEnvios(
+                self.db_file, self.campanha,
+                INTERVALO_DESCARGA if self.intervalo_descarga is None else self.intervalo_descarga,
+                TAMANHO_LOTE if self.tamanho_lote is None else self.tamanho_lote,
             )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        
-    def gerar_tracking_id(self, email_destino, empresa_nome):
-        """Gera ID único para tracking"""
-        raw_string = f"{email_destino}{empresa_nome}{datetime.now().isoformat()}"
-        return hashlib.md5(raw_string.encode()).hexdigest()[:16]
+        return self._registro_envios
+    
+    def descarregar_envios(self):
+        """Grava o que estiver no buffer de envios (antes de relatórios e no fim da campanha)"""
+        if self._registro_envios is not None:
+            self._registro_envios.descarregar()
+    
+    @property
+    def registro_links(self):
+        """Tabela de links assinados, criada no primeiro email com link"""
+        if self._registro_links is None:
+            from links_rastreados import RegistroLinks
+            self._registro_links = RegistroLinks(self.db_principal)
+        return self._registro_links
+    
+    def gerar_tracking_id(self, email_destino=None, empresa_nome=None):
+        """Gera ID único para tracking (ordenado por tempo, sem colisão entre processos)"""
+        if self.shards:
+            return self.shards.gerar_tracking_id(self.campanha_id)
+        from tracking_ids import gerar_tracking_id
+        return gerar_tracking_id()
     
-    def create_tracked_email(self, recipient, empresa_nome, razao_social, subject_template, body_template, provedor_tipo):
-        """Cria email com tracking completo"""
+    def create_tracked_email(self, recipient, empresa_nome, razao_social, subject_template, body_template, provedor_tipo,
+                             prioridade_email=None):
+        """Cria email com tracking completo (prioridade_email: 1=Email1, 2=Email2... do cadastro)"""
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
         
         tracking_id = self.gerar_tracking_id(recipient, empresa_nome)
         
@@ -92,18 +131,17 @@ class EmailAnalytics:
         
         # URLs de tracking
         pixel_url = f"https://{self.tracking_domain}/pixel/{tracking_id}.png"
-        click_base_url = f"https://{self.tracking_domain}/click/{tracking_id}"
         unsubscribe_url = f"https://{self.tracking_domain}/unsubscribe/{tracking_id}"
         
         # Adicionar tracking pixel (invisível)
         tracking_pixel = f'<img src="{pixel_url}" width="1" height="1" style="display:none;" alt="">'
         
-        # Converter links para tracking
+        # Converter links para tracking (link assinado, sem a URL de destino na query)
         if "linkedin.com" in body:
-            body = body.replace(
-                "[Seu LinkedIn]", 
-                f'<a href="{click_base_url}?url=https://linkedin.com/in/seu-perfil">LinkedIn</a>'
+            click_url = self.registro_links.url_clique(
+                f"https://{self.tracking_domain}", tracking_id, "https://linkedin.com/in/seu-perfil"
             )
+            body = body.replace("[Seu LinkedIn]", f'<a href="{click_url}">LinkedIn</a>')
         
         # Adicionar unsubscribe
         body += f'\n\n---\nPara descadastrar: {unsubscribe_url}'
@@ -125,50 +163,75 @@ class EmailAnalytics:
         msg['Subject'] = subject
         msg['Reply-To'] = self.email
         msg['List-Unsubscribe'] = f"<{unsubscribe_url}>"
+        # Volta na cópia anexada aos bounces (DSN) e reclamações (ARF)
+        msg['X-Tracking-ID'] = tracking_id
+        # Respostas citam o Message-ID (In-Reply-To/References): casamento exato com o envio
+        msg['Message-ID'] = f"<{tracking_id}@{self.tracking_domain}>"
         
         # Adicionar versões texto e HTML
         msg.attach(MIMEText(body, 'plain', 'utf-8'))
         msg.attach(MIMEText(html_body, 'html', 'utf-8'))
         
-        # Salvar no banco
-        self.registrar_email_enviado(tracking_id, empresa_nome, razao_social, recipient, provedor_tipo, subject)
+        # Salvar no banco como pendente: só conta como enviado depois do SMTP
+        self.registro_envios.pendente(tracking_id, empresa_nome, razao_social, recipient, provedor_tipo, subject,
+                                      subject_template, prioridade_email)
         
         return msg, tracking_id
     
-    def registrar_email_enviado(self, tracking_id, empresa_nome, razao_social, email_destino, provedor_tipo, assunto):
-        """Registra email enviado no banco"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO email_campaigns 
-            (tracking_id, empresa_nome, razao_social, email_destino, provedor_tipo, assunto, enviado_em, status_entrega)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (tracking_id, empresa_nome, razao_social, email_destino, provedor_tipo, assunto, datetime.now(), 'enviado'))
-        
-        conn.commit()
-        conn.close()
+    def registrar_email_enviado(self, tracking_id, empresa_nome, razao_social, email_destino, provedor_tipo, assunto,
+                                modelo_assunto=None, prioridade_email=None):
+        """Registra email já enviado (linha gravada na hora, confirmação no próximo lote)"""
+        self.registro_envios.pendente(tracking_id, empresa_nome, razao_social, email_destino, provedor_tipo, assunto,
+                                      modelo_assunto, prioridade_email)
+        self.confirmar_envio(tracking_id, provedor_tipo)
+    
+    def confirmar_envio(self, tracking_id, provedor_tipo):
+        """SMTP aceitou o email criado por create_tracked_email"""
+        agora = datetime.now()
+        self.registro_envios.confirmar(tracking_id, agora)
+        self.series.registrar('enviados', self.campanha, provedor_tipo, agora, agora)
+    
+    def registrar_falha_envio(self, tracking_id):
+        """SMTP recusou ou a conexão caiu: a linha pendente vira 'falhou'"""
+        self.registro_envios.falhar(tracking_id)
     
     def registrar_evento(self, tracking_id, evento_tipo, ip_address=None, user_agent=None, dados_extras=None):
-        """Registra evento de tracking"""
-        conn = sqlite3.connect(self.db_file)
+        """Registra evento de tracking (proxies, scanners e bots não contam como humanos)"""
+        from filtro_bots import HUMANO
+        
+        classificacao = HUMANO
+        if evento_tipo in ('abertura', 'clique'):
+            classificacao = self.classificador.classificar(evento_tipo, tracking_id, ip_address, user_agent)
+        
+        db_file = self.shards.shard_de(tracking_id) if self.shards else self.db_file
+        conn = banco_dados.conectar(db_file)
         cursor = conn.cursor()
         
         cursor.execute('''
             INSERT INTO tracking_events 
-            (tracking_id, evento_tipo, timestamp, ip_address, user_agent, dados_extras)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (tracking_id, evento_tipo, datetime.now(), ip_address, user_agent, json.dumps(dados_extras)))
+            (tracking_id, evento_tipo, timestamp, ip_address, user_agent, dados_extras, classificacao)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (tracking_id, evento_tipo, datetime.now(), ip_address, user_agent, json.dumps(dados_extras), classificacao))
         
         # Atualizar tabela principal
-        if evento_tipo == 'abertura':
+        if classificacao != HUMANO:
+            coluna = 'aberturas_automaticas' if evento_tipo == 'abertura' else 'cliques_automaticos'
+            cursor.execute(f'''
+                UPDATE email_campaigns SET {coluna} = {coluna} + 1 WHERE tracking_id = ?
+            ''', (tracking_id,))
+            
+        elif evento_tipo == 'abertura':
+            dispositivo, localizacao = self.enriquecedor.enriquecer(ip_address, user_agent)
             cursor.execute('''
                 UPDATE email_campaigns 
                 SET aberto = 1, 
                     primeiro_abertura = COALESCE(primeiro_abertura, ?),
-                    total_aberturas = total_aberturas + 1
+                    total_aberturas = total_aberturas + 1,
+                    dispositivo_abertura = COALESCE(dispositivo_abertura, ?),
+                    localizacao_abertura = COALESCE(localizacao_abertura, ?),
+                    user_agent = COALESCE(user_agent, ?)
                 WHERE tracking_id = ?
-            ''', (datetime.now(), tracking_id))
+            ''', (datetime.now(), dispositivo, localizacao, user_agent, tracking_id))
             
         elif evento_tipo == 'clique':
             cursor.execute('''
@@ -179,29 +242,50 @@ class EmailAnalytics:
                 WHERE tracking_id = ?
             ''', (datetime.now(), tracking_id))
         
+        primeiro = None
+        if classificacao == HUMANO and evento_tipo in ('abertura', 'clique'):
+            total = 'total_aberturas' if evento_tipo == 'abertura' else 'total_cliques'
+            cursor.execute(f'''
+                SELECT {total}, campanha, provedor_tipo, enviado_em FROM email_campaigns WHERE tracking_id = ?
+            ''', (tracking_id,))
+            primeiro = cursor.fetchone()
+        
         conn.commit()
         conn.close()
+        
+        if primeiro and primeiro[0] == 1:
+            # Só a primeira abertura/clique humano entra nas curvas de engajamento
+            _, campanha, provedor_tipo, enviado_em = primeiro
+            metrica = 'aberturas' if evento_tipo == 'abertura' else 'cliques'
+            self.series.registrar(metrica, campanha, provedor_tipo, enviado_em=enviado_em)
     
     def gerar_relatorio_completo(self):
         """Gera relatório completo da campanha"""
-        conn = sqlite3.connect(self.db_file)
+        import pandas as pd
+        from registro_envios import SQL_ENVIADOS
+        
+        self.descarregar_envios()
+        conn = banco_dados.conectar(self.db_file)
         
-        # Estatísticas gerais
-        query_geral = '''
+        # Estatísticas gerais (pendentes e falhas de SMTP não contam como enviados)
+        query_geral = f'''
             SELECT 
                 COUNT(*) as total_enviados,
                 COUNT(CASE WHEN aberto = 1 THEN 1 END) as total_abertos,
                 COUNT(CASE WHEN clicou_link = 1 THEN 1 END) as total_cliques,
                 COUNT(CASE WHEN respondeu = 1 THEN 1 END) as total_respostas,
                 COUNT(CASE WHEN bounce = 1 THEN 1 END) as total_bounces,
-                AVG(total_aberturas) as media_aberturas_por_email
+                AVG(total_aberturas) as media_aberturas_por_email,
+                COALESCE(SUM(aberturas_automaticas), 0) as aberturas_automaticas,
+                COALESCE(SUM(cliques_automaticos), 0) as cliques_automaticos
             FROM email_campaigns
+            WHERE {SQL_ENVIADOS}
         '''
         
         stats_geral = pd.read_sql_query(query_geral, conn)
         
         # Por provedor
-        query_provedor = '''
+        query_provedor = f'''
             SELECT 
                 provedor_tipo,
                 COUNT(*) as enviados,
@@ -210,6 +294,7 @@ class EmailAnalytics:
                 COUNT(CASE WHEN clicou_link = 1 THEN 1 END) as cliques,
                 ROUND(COUNT(CASE WHEN clicou_link = 1 THEN 1 END) * 100.0 / COUNT(*), 2) as taxa_clique
             FROM email_campaigns
+            WHERE {SQL_ENVIADOS}
             GROUP BY provedor_tipo
             ORDER BY enviados DESC
         '''
@@ -248,305 +333,292 @@ class EmailAnalytics:
         
         conn.close()
         
+        # Funil por coorte de envio e tempo até cada etapa (extratos colunares)
+        from funil_coortes import TEMPOS
+        funil = self.funil
+        colunas, linhas = funil.funil(('coorte',))
+        funil_coortes = pd.DataFrame(linhas, columns=colunas)
+        tempos = []
+        for etapa in TEMPOS:
+            colunas, linhas = funil.distribuicao(etapa)
+            tempos += [(etapa, *linha) for linha in linhas]
+        tempos = pd.DataFrame(tempos, columns=['etapa', *colunas])
+        
         return {
             'geral': stats_geral,
             'por_provedor': stats_provedor,
             'timeline': timeline,
-            'top_engajamento': top_engajamento
+            'top_engajamento': top_engajamento,
+            'funil': funil_coortes,
+            'tempos': tempos
         }
     
-    def gerar_dashboard_html(self):
-        """Gera dashboard HTML interativo"""
-        relatorio = self.gerar_relatorio_completo()
-        
-        # Calcular métricas principais
-        total = relatorio['geral']['total_enviados'].iloc[0]
-        abertos = relatorio['geral']['total_abertos'].iloc[0]
-        cliques = relatorio['geral']['total_cliques'].iloc[0]
-        respostas = relatorio['geral']['total_respostas'].iloc[0]
-        
-        taxa_abertura = (abertos / total * 100) if total > 0 else 0
-        taxa_clique = (cliques / total * 100) if total > 0 else 0
-        taxa_resposta = (respostas / total * 100) if total > 0 else 0
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Dashboard - Email Marketing Analytics</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }}
-                .container {{ max-width: 1200px; margin: 0 auto; }}
-                .card {{ background: white; padding: 20px; margin: 20px 0; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
-                .metric {{ display: inline-block; text-align: center; margin: 10px 20px; }}
-                .metric-value {{ font-size: 2.5em; font-weight: bold; color: #2196F3; }}
-                .metric-label {{ font-size: 0.9em; color: #666; }}
-                .table {{ width: 100%; border-collapse: collapse; margin-top: 15px; }}
-                .table th, .table td {{ padding: 10px; text-align: left; border-bottom: 1px solid #ddd; }}
-                .table th {{ background-color: #f8f9fa; }}
-                .status-enviado {{ color: #28a745; }}
-                .status-aberto {{ color: #007bff; }}
-                .status-clicado {{ color: #ffc107; }}
-                .status-respondido {{ color: #dc3545; }}
-                h1, h2 {{ color: #333; }}
-                .update-time {{ color: #666; font-size: 0.9em; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Email Marketing Analytics Dashboard</h1>
-                <p class="update-time">Última atualização: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}</p>
-                
-                <div class="card">
-                    <h2>Métricas Principais</h2>
-                    <div class="metric">
-                        <div class="metric-value">{total}</div>
-                        <div class="metric-label">Emails Enviados</div>
-                    </div>
-                    <div class="metric">
-                        <div class="metric-value">{abertos}</div>
-                        <div class="metric-label">Abertos ({taxa_abertura:.1f}%)</div>
-                    </div>
-                    <div class="metric">
-                        <div class="metric-value">{cliques}</div>
-                        <div class="metric-label">Cliques ({taxa_clique:.1f}%)</div>
-                    </div>
-                    <div class="metric">
-                        <div class="metric-value">{respostas}</div>
-                        <div class="metric-label">Respostas ({taxa_resposta:.1f}%)</div>
-                    </div>
-                </div>
-                
-                <div class="card">
-                    <h2>Performance por Provedor</h2>
-                    <table class="table">
-                        <thead>
-                            <tr>
-                                <th>Provedor</th>
-                                <th>Enviados</th>
-                                <th>Abertos</th>
-                                <th>Taxa Abertura</th>
-                                <th>Cliques</th>
-                                <th>Taxa Clique</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-        """
+    def _assinatura_banco(self):
+        """Identifica o estado atual do banco (mtime/tamanho do arquivo e do WAL)"""
+        assinatura = []
+        for caminho in (self.db_file, self.db_file + '-wal'):
+            try:
+                st = os.stat(caminho)
+                assinatura.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                assinatura.append(None)
+        return tuple(assinatura)
+    
+    def calcular_rollups(self):
+        """Agregados leves do dashboard, em cache até o banco mudar"""
+        self.descarregar_envios()
+        assinatura = self._assinatura_banco()
+        cache = getattr(self, '_rollups_cache', None)
+        if cache and cache[0] == assinatura:
+            return cache[1]
         
-        for _, row in relatorio['por_provedor'].iterrows():
-            html_content += f"""
-                            <tr>
-                                <td>{row['provedor_tipo']}</td>
-                                <td>{row['enviados']}</td>
-                                <td>{row['abertos']}</td>
-                                <td>{row['taxa_abertura']}%</td>
-                                <td>{row['cliques']}</td>
-                                <td>{row['taxa_clique']}%</td>
-                            </tr>
-            """
-        
-        html_content += """
-                        </tbody>
-                    </table>
-                </div>
-                
-                <div class="card">
-                    <h2>Top 10 Empresas Mais Engajadas</h2>
-                    <table class="table">
-                        <thead>
-                            <tr>
-                                <th>Empresa</th>
-                                <th>Email</th>
-                                <th>Aberturas</th>
-                                <th>Cliques</th>
-                                <th>Respondeu</th>
-                                <th>Primeira Abertura</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-        """
+        from registro_envios import SQL_ENVIADOS
         
-        for _, row in relatorio['top_engajamento'].head(10).iterrows():
-            html_content += f"""
-                            <tr>
-                                <td>{row['empresa_nome']}</td>
-                                <td>{row['email_destino']}</td>
-                                <td>{row['total_aberturas']}</td>
-                                <td>{row['total_cliques']}</td>
-                                <td>{row['respondeu']}</td>
-                                <td>{row['primeiro_abertura'] or 'N/A'}</td>
-                            </tr>
-            """
-        
-        html_content += """
-                        </tbody>
-                    </table>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        conn = banco_dados.conectar(self.db_file)
+        cursor = conn.cursor()
         
-        # Salvar dashboard
-        with open('dashboard_analytics.html', 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        cursor.execute(f'''
+            SELECT 
+                COUNT(*),
+                COUNT(CASE WHEN aberto = 1 THEN 1 END),
+                COUNT(CASE WHEN clicou_link = 1 THEN 1 END),
+                COUNT(CASE WHEN respondeu = 1 THEN 1 END),
+                COUNT(CASE WHEN bounce = 1 THEN 1 END),
+                COALESCE(SUM(aberturas_automaticas), 0),
+                COALESCE(SUM(cliques_automaticos), 0)
+            FROM email_campaigns
+            WHERE {SQL_ENVIADOS}
+        ''')
+        total, abertos, cliques, respostas, bounces, aberturas_auto, cliques_auto = cursor.fetchone()
         
-        print("Dashboard salvo como: dashboard_analytics.html")
-        return html_content
-    
-    def exportar_dados_detalhados(self):
-        """Exporta todos os dados para Excel"""
-        conn = sqlite3.connect(self.db_file)
+        cursor.execute(f'''
+            SELECT 
+                provedor_tipo,
+                COUNT(*) as enviados,
+                COUNT(CASE WHEN aberto = 1 THEN 1 END) as abertos,
+                ROUND(COUNT(CASE WHEN aberto = 1 THEN 1 END) * 100.0 / COUNT(*), 2),
+                COUNT(CASE WHEN clicou_link = 1 THEN 1 END),
+                ROUND(COUNT(CASE WHEN clicou_link = 1 THEN 1 END) * 100.0 / COUNT(*), 2)
+            FROM email_campaigns
+            WHERE {SQL_ENVIADOS}
+            GROUP BY provedor_tipo
+            ORDER BY enviados DESC
+        ''')
+        por_provedor = cursor.fetchall()
         
-        # Dados principais
-        df_emails = pd.read_sql_query('SELECT * FROM email_campaigns', conn)
-        df_eventos = pd.read_sql_query('SELECT * FROM tracking_events', conn)
+        cursor.execute('''
+            SELECT 
+                empresa_nome,
+                email_destino,
+                total_aberturas,
+                total_cliques,
+                CASE WHEN respondeu = 1 THEN 'Sim' ELSE 'Não' END,
+                primeiro_abertura
+            FROM email_campaigns
+            WHERE aberto = 1
+            ORDER BY total_aberturas DESC, total_cliques DESC
+            LIMIT 10
+        ''')
+        top_engajamento = cursor.fetchall()
         
         conn.close()
         
-        # Salvar em Excel com múltiplas abas
-        with pd.ExcelWriter('analytics_detalhado.xlsx', engine='openpyxl') as writer:
-            df_emails.to_excel(writer, sheet_name='Emails', index=False)
-            df_eventos.to_excel(writer, sheet_name='Eventos', index=False)
-            
-            # Aba de resumo
-            relatorio = self.gerar_relatorio_completo()
-            relatorio['geral'].to_excel(writer, sheet_name='Resumo_Geral', index=False)
-            relatorio['por_provedor'].to_excel(writer, sheet_name='Por_Provedor', index=False)
+        rollups = {
+            'geral': {
+                'total_enviados': total,
+                'total_abertos': abertos,
+                'total_cliques': cliques,
+                'total_respostas': respostas,
+                'total_bounces': bounces,
+                'aberturas_automaticas': aberturas_auto,
+                'cliques_automaticos': cliques_auto
+            },
+            'por_provedor': por_provedor,
+            'top_engajamento': top_engajamento
+        }
+        self._rollups_cache = (assinatura, rollups)
+        return rollups
+    
+    def gerar_dashboard_html(self, output_file='dashboard_analytics.html', incluir_empresas=True, tamanho_pagina=500):
+        """
+        Gera dashboard HTML interativo
+        
+        A página é escrita em streaming direto no arquivo (sem montar a string
+        inteira) e a tabela de empresas é paginada. Retorna o caminho gerado.
+        """
+        from dashboard_streaming import DashboardStreaming
         
-        print("Dados detalhados exportados para: analytics_detalhado.xlsx")
+        renderer = DashboardStreaming(self.db_file, tamanho_pagina=tamanho_pagina)
+        total_empresas = renderer.renderizar(self.calcular_rollups(), output_file, incluir_empresas)
+        
+        print(f"Dashboard salvo como: {output_file} ({total_empresas} empresas)")
+        return output_file
     
-    def monitorar_respostas_gmail(self):
-        """Monitora respostas no Gmail usando IMAP"""
+    def exportar_dados_detalhados(self, formato='excel', destino=None, incluir_arquivados=False):
+        """
+        Exporta todos os dados para Excel (padrão), CSV ou Parquet
+        
+        As tabelas são paginadas e gravadas em streaming; o resumo usa os
+        rollups em cache em vez de refazer o relatório completo. Com
+        incluir_arquivados, os eventos já movidos para Parquet também saem.
+        """
+        from exportacao_streaming import ExportadorStreaming
+        
+        arquivo_eventos = None
+        if incluir_arquivados:
+            from arquivamento_eventos import ArquivoEventos
+            arquivo_eventos = ArquivoEventos()
+        exportador = ExportadorStreaming(self.db_file, arquivo_eventos=arquivo_eventos)
+        
+        if formato == 'excel':
+            destino = destino or 'analytics_detalhado.xlsx'
+            totais = exportador.exportar_excel(destino, self.calcular_rollups())
+        elif formato == 'csv':
+            destino = destino or 'analytics_export'
+            totais = exportador.exportar_csv(destino)
+        elif formato == 'parquet':
+            destino = destino or 'analytics_export'
+            totais = exportador.exportar_parquet(destino)
+        else:
+            raise ValueError(f"Formato de exportação inválido: {formato} (use excel, csv ou parquet)")
+        
+        print(f"Dados detalhados exportados para: {destino} "
+              f"({totais['email_campaigns']} emails, {totais['tracking_events']} eventos)")
+        return destino
+    
+    def arquivar_eventos(self, dias_retencao=None, compactar=True):
+        """Move eventos antigos de todos os bancos (legado e shards) para Parquet"""
+        from armazenamento_shards import DIRETORIO_SHARDS, ArmazenamentoShards
+        from arquivamento_eventos import DIAS_RETENCAO, ArquivoEventos
+        
+        arquivos = [('legado', self.db_principal)]
+        if os.path.isdir(DIRETORIO_SHARDS):
+            shards = self.shards or ArmazenamentoShards(db_legado=self.db_principal)
+            arquivos += shards.arquivos(incluir_legado=False, incluir_arquivadas=True)
+        
+        arquivo = ArquivoEventos(dias_retencao=DIAS_RETENCAO if dias_retencao is None else dias_retencao)
+        totais = arquivo.arquivar(arquivos, compactar=compactar)
+        print(f"🗄️ {totais['eventos']:,} eventos com mais de {arquivo.dias_retencao} dias "
+              f"movidos para {totais['arquivos']} arquivos Parquet em {arquivo.diretorio}/")
+        return totais
+    
+    def enriquecer_aberturas(self, geoip=None, compilar_csv=None):
+        """Backfill de dispositivo/localização a partir dos eventos já gravados (todos os bancos)"""
+        from armazenamento_shards import DIRETORIO_SHARDS, ArmazenamentoShards
+        from enriquecimento_eventos import ARQUIVO_GEOIP, EnriquecedorEventos, abrir_geoip, compilar_geoip
+        
+        if compilar_csv:
+            geoip = geoip or ARQUIVO_GEOIP
+            print(f"🌎 {compilar_geoip(compilar_csv, geoip):,} faixas de IP compiladas em {geoip}")
+        enriquecedor = EnriquecedorEventos(abrir_geoip(geoip))
+        if enriquecedor.geoip is None:
+            print("⚠️ Sem arquivo GeoIP (GEOIP_FILE ou geoip.bin): só o dispositivo será preenchido")
+        
+        arquivos = [self.db_principal]
+        if os.path.isdir(DIRETORIO_SHARDS):
+            shards = self.shards or ArmazenamentoShards(db_legado=self.db_principal)
+            arquivos += [arquivo for _, arquivo in shards.arquivos(incluir_legado=False, incluir_arquivadas=True)]
+        
+        lidos = atualizados = 0
+        for db_file in arquivos:
+            eventos, envios = enriquecedor.backfill(db_file)
+            lidos += eventos
+            atualizados += envios
+        print(f"📱 {atualizados:,} envios enriquecidos a partir de {lidos:,} aberturas")
+        return atualizados
+    
+    def _sincronizacao_respostas(self):
+        from armazenamento_shards import DIRETORIO_SHARDS, ArmazenamentoShards
+        from escuta_respostas import SincronizacaoRespostas
+        
+        # Respostas de qualquer campanha: cada tracking_id é roteado ao seu shard
+        roteador = self.shards
+        if roteador is None and os.path.isdir(DIRETORIO_SHARDS):
+            roteador = ArmazenamentoShards(db_legado=self.db_principal)
+        return SincronizacaoRespostas(self.db_principal, self.tracking_domain, roteador=roteador)
+    
+    def monitorar_respostas_gmail(self, host='imap.gmail.com', porta=993, ssl=True):
+        """Busca as respostas novas desde a última sincronização (só UIDs novos, só cabeçalhos)"""
         import imaplib
-        import email
+        from escuta_respostas import conectar_gmail
         
         try:
-            # Conectar ao Gmail
-            imap = imaplib.IMAP4_SSL('imap.gmail.com')
-            imap.login(self.email, self.password)
-            imap.select('INBOX')
-            
-            # Buscar emails recentes
-            date = (datetime.now() - timedelta(days=7)).strftime("%d-%b-%Y")
-            _, messages = imap.search(None, f'(SINCE "{date}")')
-            
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
+            imap = conectar_gmail(self.email, self.password, host, porta, ssl)()
+            try:
+                totais = self._sincronizacao_respostas().sincronizar(imap)
+                imap.close()
+            finally:
+                imap.logout()
             
-            for msg_id in messages[0].split():
-                _, msg_data = imap.fetch(msg_id, '(RFC822)')
-                email_body = msg_data[0][1]
-                email_message = email.message_from_bytes(email_body)
-                
-                sender = email_message['From']
-                subject = email_message['Subject']
-                
-                # Verificar se é resposta para algum email da campanha
-                cursor.execute('''
-                    UPDATE email_campaigns 
-                    SET respondeu = 1, data_resposta = ?
-                    WHERE email_destino LIKE ? AND respondeu = 0
-                ''', (datetime.now(), f'%{sender}%'))
+            print(f"Verificação de respostas concluída: {totais['mensagens']} mensagens novas, "
+                  f"{totais['respostas']} respostas registradas")
+            for classe, quantidade in sorted(totais['classes'].items(), key=lambda item: -item[1]):
+                print(f"   {classe}: {quantidade}")
+            return totais
             
-            conn.commit()
-            conn.close()
-            imap.close()
-            imap.logout()
-            
-            print("Verificação de respostas concluída")
-            
-        except Exception as e:
+        except (imaplib.IMAP4.error, OSError) as e:
             print(f"Erro ao verificar respostas: {e}")
-
-def create_tracking_server():
-    """Cria servidor simples para tracking (usando Flask)"""
-    server_code = '''
-from flask import Flask, request, send_file, redirect
-import sqlite3
-from datetime import datetime
-import io
-import base64
-
-app = Flask(__name__)
-
-# Pixel transparente 1x1
-PIXEL_DATA = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==")
-
-@app.route("/pixel/<tracking_id>.png")
-def track_open(tracking_id):
-    # Registrar abertura
-    conn = sqlite3.connect("email_analytics.db")
-    cursor = conn.cursor()
     
-    ip_address = request.environ.get("HTTP_X_FORWARDED_FOR", request.remote_addr)
-    user_agent = request.headers.get("User-Agent", "")
-    
-    cursor.execute("""
-        INSERT INTO tracking_events 
-        (tracking_id, evento_tipo, timestamp, ip_address, user_agent)
-        VALUES (?, ?, ?, ?, ?)
-    """, (tracking_id, "abertura", datetime.now(), ip_address, user_agent))
-    
-    cursor.execute("""
-        UPDATE email_campaigns 
-        SET aberto = 1, 
-            primeiro_abertura = COALESCE(primeiro_abertura, ?),
-            total_aberturas = total_aberturas + 1
-        WHERE tracking_id = ?
-    """, (datetime.now(), tracking_id))
-    
-    conn.commit()
-    conn.close()
-    
-    return send_file(io.BytesIO(PIXEL_DATA), mimetype="image/png")
+    def escutar_respostas(self, host='imap.gmail.com', porta=993, ssl=True):
+        """Fica em IMAP IDLE registrando respostas assim que chegam (Ctrl+C encerra)"""
+        from escuta_respostas import EscutaRespostas, conectar_gmail
+        
+        escuta = EscutaRespostas(conectar_gmail(self.email, self.password, host, porta, ssl),
+                                 self._sincronizacao_respostas())
+        print(f"👂 Escutando respostas em {host}:{porta} (IMAP IDLE)...")
+        try:
+            escuta.executar(lambda totais: print(
+                f"📬 {totais['mensagens']} mensagens novas, {totais['respostas']} respostas registradas"
+                + ''.join(f", {quantidade} {classe}" for classe, quantidade in totais['classes'].items())))
+        except KeyboardInterrupt:
+            escuta.interromper()
+            print("\nEscuta encerrada")
+        return escuta
 
-@app.route("/click/<tracking_id>")
-def track_click(tracking_id):
-    url = request.args.get("url", "https://linkedin.com")
-    
-    # Registrar clique
-    conn = sqlite3.connect("email_analytics.db")
-    cursor = conn.cursor()
-    
-    ip_address = request.environ.get("HTTP_X_FORWARDED_FOR", request.remote_addr)
-    user_agent = request.headers.get("User-Agent", "")
-    
-    cursor.execute("""
-        INSERT INTO tracking_events 
-        (tracking_id, evento_tipo, timestamp, ip_address, user_agent, dados_extras)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (tracking_id, "clique", datetime.now(), ip_address, user_agent, url))
-    
-    cursor.execute("""
-        UPDATE email_campaigns 
-        SET clicou_link = 1,
-            primeiro_clique = COALESCE(primeiro_clique, ?),
-            total_cliques = total_cliques + 1
-        WHERE tracking_id = ?
-    """, (datetime.now(), tracking_id))
-    
-    conn.commit()
-    conn.close()
-    
-    return redirect(url)
+    def processar_bounces(self, maildir=None):
+        """Processa bounces e reclamações de spam (maildir local ou caixa IMAP)"""
+        from armazenamento_shards import DIRETORIO_SHARDS, ArmazenamentoShards
+        from processamento_bounces import ProcessadorBounces
+        
+        # Bounces de qualquer campanha: cada tracking_id é roteado ao seu shard
+        roteador = self.shards
+        if roteador is None and os.path.isdir(DIRETORIO_SHARDS):
+            roteador = ArmazenamentoShards(db_legado=self.db_principal)
+        processador = ProcessadorBounces(self.db_principal, roteador=roteador)
+        if maildir:
+            totais = processador.processar_maildir(maildir)
+        else:
+            import imaplib
+            
+            imap = imaplib.IMAP4_SSL('imap.gmail.com')
+            try:
+                imap.login(self.email, self.password)
+                # Só UIDs novos desde a última rodada (primeira vez: última semana)
+                totais = processador.processar_imap(imap)
+                imap.close()
+            finally:
+                imap.logout()
+        
+        print(f"Bounces processados: {totais['mensagens']} mensagens | "
+              f"{totais['hard']} hard, {totais['soft']} soft, {totais['reclamacao']} reclamações")
+        return totais
 
-@app.route("/unsubscribe/<tracking_id>")
-def unsubscribe(tracking_id):
-    return f"<h2>Descadastrado com sucesso!</h2><p>ID: {tracking_id}</p>"
+def create_tracking_server():
+    """
+    Aponta para o servidor de tracking versionado (tracking_server.py)
 
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8080, debug=True)
-'''
-    
-    with open('tracking_server.py', 'w') as f:
-        f.write(server_code)
-    
-    print("Servidor de tracking criado: tracking_server.py")
+    O modelo que era gravado aqui redirecionava para qualquer ?url=
+    (redirecionamento aberto); o servidor do repositório só segue links
+    assinados e URLs registradas, então não é mais gerado um substituto.
+    """
+    if os.path.exists('tracking_server.py'):
+        print("Servidor de tracking: tracking_server.py")
+    else:
+        print("⚠️ tracking_server.py não encontrado: ele faz parte do repositório (restaure com git checkout)")
     print("Para executar: python tracking_server.py")
     print("Para expor publicamente: use ngrok ou deploy em servidor")
 
-if __name__ == "__main__":
+def main():
     analytics = EmailAnalytics()
     
     print("SISTEMA DE MONITORAMENTO E ANALYTICS")
@@ -564,10 +636,13 @@ if __name__ == "__main__":
     # Gerar dashboard de exemplo
     analytics.gerar_dashboard_html()
     
-    # Criar servidor de tracking
+    # Servidor de tracking
     create_tracking_server()
     
     print("\nArquivos criados:")
     print("- dashboard_analytics.html (dashboard interativo)")
-    print("- tracking_server.py (servidor de tracking)")
-    print("- email_analytics.db (banco de dados)")
\ No newline at end of file
+    print("- email_analytics.db (banco de dados)")
+
+if __name__ == "__main__":
+    from perfilamento import executar_com_perfil
+    executar_com_perfil("sistema_monitoramento_analytics", main)
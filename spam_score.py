@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Pontuação Anti-Spam Local
+Avalia assunto e corpo contra regras no estilo SpamAssassin (frases de spam,
+densidade de emojis, proporção de links, CAIXA ALTA, cabeçalhos ausentes)
+sem enviar nenhum email.
+
+Todas as regras de texto são compiladas em uma única regex combinada: um só
+passe por finditer conta frases, links, emojis e palavras. A parte estática de
+cada template é avaliada uma vez e fica em cache; por destinatário só os
+valores substituídos ({empresa}, {razao_social}...) são analisados.
+"""
+
+import re
+import string
+from collections import Counter
+from functools import lru_cache
+
+# (nome, padrão, pontos, descrição) - padrões sem distinção de maiúsculas
+REGRAS_FRASES = [
+    ('GRATIS', r'gr[aá]tis|gratuit[oa]s?|\bfree\b', 1.5, 'Menciona grátis/gratuito'),
+    ('GARANTIDO', r'100\s*%\s*garantid[oa]|garantia total|risk[- ]free|sem risco', 2.0, 'Promessa de garantia'),
+    ('CLIQUE_AQUI', r'clique aqui|click here|acesse j[aá]', 1.5, 'Chamada "clique aqui"'),
+    ('DINHEIRO_FACIL', r'dinheiro f[aá]cil|renda extra|ganhe dinheiro|fique rico|make money', 2.5, 'Promessa de dinheiro'),
+    ('URGENCIA', r'urgente|[uú]ltima chance|s[oó] hoje|por tempo limitado|act now|n[aã]o perca', 1.5, 'Pressão de urgência'),
+    ('OFERTA', r'oferta imperd[ií]vel|promo[cç][aã]o|desconto de \d+\s*%|compre agora|buy now', 1.5, 'Linguagem de oferta'),
+    ('SEM_COMPROMISSO', r'sem compromisso|sem custo|no obligation', 0.8, 'Sem compromisso/sem custo'),
+    ('ROI_PROMESSA', r'roi (?:m[eé]dio )?de \d+\s*%|\d+\s*% de (?:redu[cç][aã]o|aumento|melhoria)', 1.0, 'Percentuais de resultado'),
+    ('MOEDA', r'r\$\s*\d|\$\$+|\bus\$', 0.7, 'Valores monetários'),
+    ('EXCLAMACOES', r'!{2,}', 1.0, 'Exclamações repetidas'),
+    ('PARABENS', r'parab[eé]ns,? voc[eê] (?:foi|ganhou)|voc[eê] foi selecionad[oa]|congratulations', 2.5, 'Prêmio/seleção'),
+]
+
+DESCRICOES_ESTRUTURAIS = {
+    'CORPO_CAIXA_ALTA': 'Mais de 30% das palavras em CAIXA ALTA',
+    'ASSUNTO_CAIXA_ALTA': 'Assunto em CAIXA ALTA',
+    'ASSUNTO_EXCLAMACAO': 'Exclamação no assunto',
+    'ASSUNTO_EMOJI': 'Emoji no assunto',
+    'EMOJI_DENSIDADE_ALTA': 'Mais de 5 emojis a cada 100 palavras',
+    'EMOJI_DENSIDADE': 'Mais de 2 emojis a cada 100 palavras',
+    'POUCO_TEXTO_MUITOS_LINKS': 'Vários links em corpo curto',
+    'PROPORCAO_LINKS': 'Mais de 3 links a cada 100 palavras',
+    'SEM_LIST_UNSUBSCRIBE': 'Cabeçalho List-Unsubscribe ausente',
+    'SEM_MESSAGE_ID': 'Cabeçalho Message-ID ausente',
+}
+
+# Tokens estruturais, depois das frases na alternação
+PADRAO_URL = r'https?://\S+|www\.\S+'
+PADRAO_EMOJI = (r'[\U0001F300-\U0001FAFF\U00002600-\U000027BF\U0001F000-\U0001F2FF'
+                r'\U00002190-\U000021FF\U00002B00-\U00002BFF✅✔✨]')
+PADRAO_CAIXA_ALTA = r'\b[A-ZÀ-Ý]{3,}\b'
+PADRAO_PALAVRA = r'\w+'
+
+
+def compilar_regras(regras=REGRAS_FRASES):
+    """Uma única regex com um grupo nomeado por regra + tokens estruturais"""
+    partes = [f"(?P<R_{nome}>(?i:{padrao}))" for nome, padrao, _, _ in regras]
+    partes += [
+        f"(?P<url>{PADRAO_URL})",
+        f"(?P<emoji>{PADRAO_EMOJI})",
+        f"(?P<caixa_alta>{PADRAO_CAIXA_ALTA})",
+        f"(?P<palavra>{PADRAO_PALAVRA})",
+        r"(?P<exclamacao>!)",
+    ]
+    return re.compile('|'.join(partes))
+
+
+class AvaliadorSpam:
+    """Motor de pontuação: quanto maior a pontuação, maior o risco de spam"""
+
+    def __init__(self, regras=None, limiar=5.0):
+        self.regras = regras or REGRAS_FRASES
+        self.pontos = {nome: pontos for nome, _, pontos, _ in self.regras}
+        self.descricoes = dict(DESCRICOES_ESTRUTURAIS)
+        self.descricoes.update({nome: desc for nome, _, _, desc in self.regras})
+        self.limiar = limiar
+        self._regex = compilar_regras(self.regras)
+        # Caches por instância (as regras podem variar entre instâncias)
+        self.estatisticas = lru_cache(maxsize=65536)(self._estatisticas)
+        self._template_cache = {}
+
+    def _estatisticas(self, texto):
+        """Contagens aditivas de um trecho de texto (um único passe na regex)"""
+        contagem = Counter()
+        for m in self._regex.finditer(texto):
+            grupo = m.lastgroup
+            if grupo.startswith('R_'):
+                contagem[grupo] += 1
+                contagem['palavras'] += len(m.group().split())
+            elif grupo == 'url':
+                contagem['links'] += 1
+            elif grupo == 'emoji':
+                contagem['emojis'] += 1
+            elif grupo == 'caixa_alta':
+                contagem['caixa_alta'] += 1
+                contagem['palavras'] += 1
+            elif grupo == 'palavra':
+                contagem['palavras'] += 1
+            else:
+                contagem['exclamacoes'] += 1
+        return contagem
+
+    def _template(self, template):
+        """Estatística da parte fixa + ocorrências de cada campo (em cache)"""
+        if template not in self._template_cache:
+            literais = []
+            campos = Counter()
+            for literal, campo, _, _ in string.Formatter().parse(template):
+                literais.append(literal)
+                if campo is not None:
+                    campos[campo] += 1
+            # Espaço entre os literais: palavras não se juntam onde havia campos
+            self._template_cache[template] = (self.estatisticas(' '.join(literais)), campos)
+        return self._template_cache[template]
+
+    def _combinar(self, template, valores):
+        estat_fixa, campos = self._template(template)
+        total = Counter(estat_fixa)
+        for campo, vezes in campos.items():
+            estat_valor = self.estatisticas(str(valores.get(campo, '')))
+            for chave, n in estat_valor.items():
+                total[chave] += n * vezes
+        return total
+
+    def _pontuar(self, estat_assunto, estat_corpo, assunto_caixa_alta, cabecalhos):
+        regras = {}
+
+        # Frases: cada regra conta uma vez (como no SpamAssassin), no assunto pesa 1.5x
+        for chave in set(estat_assunto) | set(estat_corpo):
+            if chave.startswith('R_'):
+                nome = chave[2:]
+                peso = 1.5 if estat_assunto.get(chave) else 1.0
+                regras[nome] = round(self.pontos[nome] * peso, 2)
+
+        palavras = max(estat_corpo['palavras'], 1)
+
+        if estat_corpo['palavras'] >= 10 and estat_corpo['caixa_alta'] / palavras > 0.3:
+            regras['CORPO_CAIXA_ALTA'] = 1.5
+        if assunto_caixa_alta:
+            regras['ASSUNTO_CAIXA_ALTA'] = 2.0
+        if estat_assunto['exclamacoes']:
+            regras['ASSUNTO_EXCLAMACAO'] = 0.5
+        if estat_assunto['emojis']:
+            regras['ASSUNTO_EMOJI'] = 0.5
+
+        densidade_emoji = estat_corpo['emojis'] * 100.0 / palavras
+        if densidade_emoji > 5:
+            regras['EMOJI_DENSIDADE_ALTA'] = 2.0
+        elif densidade_emoji > 2:
+            regras['EMOJI_DENSIDADE'] = 1.0
+
+        links = estat_corpo['links']
+        if links and estat_corpo['palavras'] < 50 and links >= 2:
+            regras['POUCO_TEXTO_MUITOS_LINKS'] = 1.5
+        elif links * 100.0 / palavras > 3:
+            regras['PROPORCAO_LINKS'] = 1.0
+
+        if cabecalhos is not None:
+            nomes = {nome.lower() for nome in cabecalhos.keys()}
+            if 'list-unsubscribe' not in nomes:
+                regras['SEM_LIST_UNSUBSCRIBE'] = 1.0
+            if 'message-id' not in nomes:
+                regras['SEM_MESSAGE_ID'] = 1.5
+
+        pontuacao = round(sum(regras.values()), 2)
+        return {
+            'pontuacao': pontuacao,
+            'spam': pontuacao >= self.limiar,
+            'regras': regras
+        }
+
+    def avaliar(self, assunto, corpo, cabecalhos=None):
+        """Avalia textos já personalizados (cabecalhos: dict ou email.message)"""
+        return self._pontuar(
+            self.estatisticas(assunto), self.estatisticas(corpo),
+            _caixa_alta(assunto), cabecalhos
+        )
+
+    def avaliar_template(self, subject_template, body_template, valores, cabecalhos=None):
+        """Avalia um destinatário reaproveitando a parte estática do template em cache"""
+        estat_assunto = self._combinar(subject_template, valores)
+        estat_corpo = self._combinar(body_template, valores)
+        assunto_caixa_alta = _caixa_alta(subject_template.format_map(_Valores(valores)))
+        return self._pontuar(estat_assunto, estat_corpo, assunto_caixa_alta, cabecalhos)
+
+    def avaliar_mensagem(self, msg):
+        """Avalia um email.message pronto (assunto, parte text/plain e cabeçalhos)"""
+        corpo = ''
+        for parte in msg.walk():
+            if parte.get_content_type() == 'text/plain':
+                corpo = parte.get_payload(decode=True).decode(parte.get_content_charset() or 'utf-8', 'replace')
+                break
+        return self.avaliar(str(msg.get('Subject', '')), corpo, msg)
+
+    def avaliar_campanha(self, destinatarios, subject_template, body_template, cabecalhos=None):
+        """
+        Pré-avalia uma campanha inteira
+
+        destinatarios: iterável de dicts com os campos do template
+        Retorna (resultados, total_acima_do_limiar)
+        """
+        resultados = []
+        acima = 0
+        for valores in destinatarios:
+            resultado = self.avaliar_template(subject_template, body_template, valores, cabecalhos)
+            acima += resultado['spam']
+            resultados.append(resultado)
+        return resultados, acima
+
+    def explicar(self, resultado):
+        """Linhas legíveis com as regras disparadas"""
+        linhas = [f"Pontuação: {resultado['pontuacao']} (limiar {self.limiar}) "
+                  f"{'❌ provável spam' if resultado['spam'] else '✅ ok'}"]
+        for nome, pontos in sorted(resultado['regras'].items(), key=lambda r: -r[1]):
+            linhas.append(f"  {pontos:5.2f}  {nome:28s} {self.descricoes.get(nome, '')}")
+        return '\n'.join(linhas)
+
+
+class _Valores(dict):
+    """format_map tolerante: campos ausentes viram string vazia"""
+
+    def __missing__(self, chave):
+        return ''
+
+
+def _caixa_alta(texto):
+    letras = [c for c in texto if c.isalpha()]
+    return len(letras) >= 8 and sum(c.isupper() for c in letras) / len(letras) > 0.7
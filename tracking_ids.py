@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+IDs de Tracking Ordenáveis
+Gerador no estilo ULID/Snowflake: 18 caracteres base32 (Crockford) com
+timestamp em ms, nó (máquina), PID e sequência. Sem hash por envio e sem
+colisões entre processos e máquinas; IDs ordenados por tempo fazem os
+INSERTs caírem no fim do índice UNIQUE de tracking_id.
+
+Layout (90 bits, cada campo alinhado em caracteres):
+    45 bits timestamp ms desde EPOCA_MS (9 caracteres, ~1100 anos)
+     8 bits nó, TRACKING_NODE_ID (0-255)        ┐ 6 caracteres,
+    22 bits PID (pid_max do Linux é 2^22)       ┘ fixos por processo
+    15 bits sequência dentro do mesmo ms (3 caracteres)
+"""
+
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+
+ALFABETO = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'  # Crockford: ordem ASCII = ordem numérica
+EPOCA_MS = 1704067200000  # 2024-01-01 00:00:00 UTC
+
+# Separa o código da campanha (shard) do ID: "<campanha>-<id>"; fora do alfabeto
+SEPARADOR_CAMPANHA = '-'
+
+BITS_TEMPO, BITS_NO, BITS_PID, BITS_SEQUENCIA = 45, 8, 22, 15
+MAX_NO = (1 << BITS_NO) - 1
+MAX_SEQUENCIA = (1 << BITS_SEQUENCIA) - 1
+TAMANHO_ID = (BITS_TEMPO + BITS_NO + BITS_PID + BITS_SEQUENCIA) // 5
+
+# Pares de caracteres para cada valor de 10 bits: metade das consultas
+_PARES = [ALFABETO[i >> 5] + ALFABETO[i & 31] for i in range(1024)]
+_VALORES = {c: i for i, c in enumerate(ALFABETO)}
+
+
+def codificar(valor, caracteres):
+    """Inteiro → base32 Crockford com largura fixa"""
+    partes = []
+    if caracteres % 2:
+        partes.append(ALFABETO[valor & 31])
+        valor >>= 5
+        caracteres -= 1
+    for _ in range(caracteres // 2):
+        partes.append(_PARES[valor & 1023])
+        valor >>= 10
+    return ''.join(reversed(partes))
+
+
+def codificar_id(numero):
+    """Inteiro → base32 Crockford sem largura fixa (1 → '1', 1024 → '100')"""
+    codigo = ''
+    while True:
+        codigo = ALFABETO[numero & 31] + codigo
+        numero >>= 5
+        if not numero:
+            return codigo
+
+
+def decodificar_id(codigo):
+    """Inverso de codificar_id; KeyError para caracteres fora do alfabeto"""
+    numero = 0
+    for c in codigo.upper():
+        numero = (numero << 5) | _VALORES[c]
+    return numero
+
+
+# Nó sorteado quando TRACKING_NODE_ID não está definido (um por processo, herdado no fork)
+_no_sorteado = None
+
+
+def no_padrao():
+    """
+    TRACKING_NODE_ID se definido; senão um nó sorteado no início do
+    processo (e avisado no console). Numa máquina só isso basta: os
+    processos diferem pelo PID. IDs de várias máquinas (ou containers, onde
+    o PID costuma ser 1 em todos) misturados no mesmo banco precisam de um
+    TRACKING_NODE_ID distinto em cada uma: com nós sorteados, dois
+    geradores têm 1/256 de chance de cair no mesmo nó. Em vários nós de
+    tracking (TRACKING_LOG_DIR), onde IDs repetidos seriam descartados em
+    silêncio como eventos duplicados, ele é obrigatório.
+    """
+    global _no_sorteado
+    valor = os.getenv('TRACKING_NODE_ID')
+    if valor is not None:
+        no = int(valor)
+        if not 0 <= no <= MAX_NO:
+            raise ValueError(f"TRACKING_NODE_ID deve estar entre 0 e {MAX_NO}: {no}")
+        return no
+    if os.getenv('TRACKING_LOG_DIR'):
+        raise RuntimeError(f"TRACKING_LOG_DIR definido sem TRACKING_NODE_ID: defina um número de 0 a {MAX_NO} "
+                           "distinto em cada nó de tracking")
+    if _no_sorteado is None:
+        _no_sorteado = secrets.randbelow(MAX_NO + 1)
+        print(f"⚠️ TRACKING_NODE_ID não definido: nó {_no_sorteado} sorteado para este processo "
+              f"(defina um nó distinto por máquina se IDs de mais de uma forem juntados)")
+    return _no_sorteado
+
+
+class GeradorTrackingId:
+    """
+    Gerador monotônico e thread-safe; o PID é relido após fork
+
+    Use um por processo (gerar_tracking_id); para instâncias próprias, cada
+    uma precisa de um nó distinto.
+    """
+
+    def __init__(self, no=None):
+        self.no = no_padrao() if no is None else no
+        if not 0 <= self.no <= MAX_NO:
+            raise ValueError(f"Nó deve estar entre 0 e {MAX_NO}: {self.no}")
+        self._reiniciar()
+        os.register_at_fork(after_in_child=self._reiniciar)
+
+    def _reiniciar(self):
+        self._lock = threading.Lock()
+        self.pid = os.getpid() & ((1 << BITS_PID) - 1)
+        self._sufixo_processo = codificar((self.no << BITS_PID) | self.pid, (BITS_NO + BITS_PID) // 5)
+        self._ultimo_ms = -1
+        self._prefixo_tempo = ''
+        self._sequencia = 0
+
+    def gerar(self):
+        """Próximo ID; estritamente crescente dentro do processo"""
+        with self._lock:
+            agora = time.time_ns() // 1000000 - EPOCA_MS
+            if agora > self._ultimo_ms:
+                self._ultimo_ms = agora
+                self._prefixo_tempo = codificar(agora, BITS_TEMPO // 5)
+                self._sequencia = 0
+            else:
+                # Mesmo ms ou relógio voltou: segue no último ms incrementando a sequência
+                self._sequencia += 1
+                if self._sequencia > MAX_SEQUENCIA:
+                    self._ultimo_ms += 1
+                    self._prefixo_tempo = codificar(self._ultimo_ms, BITS_TEMPO // 5)
+                    self._sequencia = 0
+            sequencia = self._sequencia
+            prefixo = self._prefixo_tempo
+        return prefixo + self._sufixo_processo + _PARES[sequencia >> 5] + ALFABETO[sequencia & 31]
+
+
+def decodificar(tracking_id):
+    """
+    Campos de um ID gerado aqui: criado_em (datetime local), no, pid, sequencia
+
+    Retorna None para IDs antigos (16 caracteres hex do MD5). O prefixo de
+    campanha ("3-...", ver armazenamento_shards) é ignorado.
+    """
+    tracking_id = tracking_id.rpartition(SEPARADOR_CAMPANHA)[2]
+    if len(tracking_id) != TAMANHO_ID:
+        return None
+    try:
+        valor = 0
+        for c in tracking_id.upper():
+            valor = (valor << 5) | _VALORES[c]
+    except KeyError:
+        return None
+    sequencia = valor & MAX_SEQUENCIA
+    valor >>= BITS_SEQUENCIA
+    pid = valor & ((1 << BITS_PID) - 1)
+    valor >>= BITS_PID
+    no = valor & MAX_NO
+    ms = (valor >> BITS_NO) + EPOCA_MS
+    return {
+        'criado_em': datetime.fromtimestamp(ms / 1000),
+        'no': no,
+        'pid': pid,
+        'sequencia': sequencia
+    }
+
+
+# Um único gerador por processo: dois geradores com o mesmo nó e PID
+# poderiam repetir a sequência no mesmo ms
+_gerador = None
+_lock_gerador = threading.Lock()
+
+
+def gerar_tracking_id():
+    """ID de tracking do processo atual (gerador criado na primeira chamada)"""
+    global _gerador
+    if _gerador is None:
+        with _lock_gerador:
+            if _gerador is None:
+                _gerador = GeradorTrackingId()
+    return _gerador.gerar()
@@ -1,71 +1,116 @@
 
-from flask import Flask, request, send_file, redirect
-import sqlite3
+from flask import Flask, request, send_file, redirect, abort
 from datetime import datetime
 import io
 import base64
+from dashboard_ao_vivo import ContadoresEventos, registrar_rotas
+from links_rastreados import RegistroLinks
+from filtro_bots import ClassificadorEventos, HUMANO
+from enriquecimento_eventos import EnriquecedorEventos
+from armazenamento_shards import ArmazenamentoShards, criar_schema
+from series_temporais import SeriesTemporais
+from ingestao_eventos import JANELA_DEDUP_SEGUNDOS, JanelaDeduplicacao, LogEventos, gravar_evento
+import banco_dados
+import os
 
 app = Flask(__name__)
 
+DB_FILE = "email_analytics.db"
+criar_schema(DB_FILE)
+
+# Roteador tracking_id → arquivo do shard da campanha (IDs sem prefixo: DB_FILE)
+shards = ArmazenamentoShards(db_legado=DB_FILE)
+# Shards criados antes de tabelas/colunas novas do schema são migrados aqui
+for _, arquivo in shards.arquivos(incluir_legado=False):
+    criar_schema(arquivo)
+
+# Matchers de user agent/faixas de IP compilados uma vez; UAs ficam em LRU
+classificador = ClassificadorEventos()
+
+# Dispositivo pelo user agent e cidade pelo GeoIP local (mmap), ambos em LRU
+enriquecedor = EnriquecedorEventos.padrao()
+
+# Contadores em memória do dashboard ao vivo (/dashboard/?token=...), semeados do banco
+contadores = ContadoresEventos()
+contadores.carregar_do_banco(*[arquivo for _, arquivo in shards.arquivos()])
+# Envios/respostas (outros processos) e únicos gravados pelo agregador de logs mudam fora daqui
+contadores.iniciar_recarga(lambda: [arquivo for _, arquivo in shards.arquivos()])
+# Dashboard só com DASHBOARD_TOKEN definido (desligado por padrão: este servidor é público)
+registrar_rotas(app, contadores, os.getenv("DASHBOARD_TOKEN"))
+
+# Séries de engajamento em anéis na memória, somadas ao banco a cada 30s
+series = SeriesTemporais(DB_FILE)
+
+# Com TRACKING_LOG_DIR (vários nós atrás de um balanceador) os eventos vão para o
+# log local do nó (TRACKING_NODE_NAME) e o `cli.py agregar-logs` os aplica ao banco;
+# cada nó precisa de um TRACKING_NODE_ID próprio (sem ele a subida falha)
+log_eventos = LogEventos(os.environ["TRACKING_LOG_DIR"]) if os.getenv("TRACKING_LOG_DIR") else None
+
+# Hits repetidos do mesmo cliente (re-render do pixel, clique duplo) contam uma vez;
+# TRACKING_JANELA_DEDUP em segundos, 0 desliga
+deduplicacao = JanelaDeduplicacao(float(os.getenv("TRACKING_JANELA_DEDUP", JANELA_DEDUP_SEGUNDOS)))
+
+# Tabela de links (código → URL) em memória: cliques assinados não consultam o banco
+links = RegistroLinks(DB_FILE)
+
+# Destino dos links antigos (?url=) cuja URL não está registrada
+URL_PADRAO = "https://linkedin.com"
+
 # Pixel transparente 1x1
 PIXEL_DATA = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==")
 
-@app.route("/pixel/<tracking_id>.png")
-def track_open(tracking_id):
-    # Registrar abertura
-    conn = sqlite3.connect("email_analytics.db")
-    cursor = conn.cursor()
-    
+def registrar_evento(evento_tipo, tracking_id, url=None):
     ip_address = request.environ.get("HTTP_X_FORWARDED_FOR", request.remote_addr)
     user_agent = request.headers.get("User-Agent", "")
+    if not deduplicacao.novo(evento_tipo, tracking_id, ip_address, user_agent, url):
+        # Repetido dentro da janela: nada de banco nem log, só o contador em memória
+        contadores.registrar(evento_tipo, tracking_id, duplicado=True)
+        return
     
-    cursor.execute("""
-        INSERT INTO tracking_events 
-        (tracking_id, evento_tipo, timestamp, ip_address, user_agent)
-        VALUES (?, ?, ?, ?, ?)
-    """, (tracking_id, "abertura", datetime.now(), ip_address, user_agent))
+    classificacao = classificador.classificar(evento_tipo, tracking_id, ip_address, user_agent)
+    humano = classificacao == HUMANO
     
-    cursor.execute("""
-        UPDATE email_campaigns 
-        SET aberto = 1, 
-            primeiro_abertura = COALESCE(primeiro_abertura, ?),
-            total_aberturas = total_aberturas + 1
-        WHERE tracking_id = ?
-    """, (datetime.now(), tracking_id))
+    if log_eventos is not None:
+        # Vários nós: só o append no log local; o agregador grava no banco e nas séries.
+        # Este nó não sabe se é o primeiro evento do email (outro nó pode ter visto):
+        # abertos/clicados únicos chegam pela recarga periódica dos contadores
+        log_eventos.registrar(evento_tipo, tracking_id, ip_address, user_agent, classificacao, url)
+        contadores.registrar(evento_tipo, tracking_id, humano=humano)
+        return
     
-    conn.commit()
-    conn.close()
+    with banco_dados.transacao(shards.shard_de(tracking_id)) as conn:
+        linha = gravar_evento(conn, evento_tipo, tracking_id, datetime.now(), ip_address, user_agent,
+                              classificacao, url, enriquecedor)
     
+    primeiro = bool(linha and linha[0] == 1)
+    contadores.registrar(evento_tipo, tracking_id, primeiro=primeiro, humano=humano)
+    if primeiro:
+        series.registrar("aberturas" if evento_tipo == "abertura" else "cliques", linha[1], linha[2],
+                         enviado_em=linha[3])
+
+@app.route("/pixel/<tracking_id>.png")
+def track_open(tracking_id):
+    registrar_evento("abertura", tracking_id)
     return send_file(io.BytesIO(PIXEL_DATA), mimetype="image/png")
 
-@app.route("/click/<tracking_id>")
-def track_click(tracking_id):
-    url = request.args.get("url", "https://linkedin.com")
+@app.route("/click/<tracking_id>/<codigo>/<assinatura>")
+def track_click(tracking_id, codigo, assinatura):
+    url = links.resolver(tracking_id, codigo, assinatura)
+    if url is None:
+        # Assinatura forjada ou link inexistente: nada é gravado
+        abort(404)
     
-    # Registrar clique
-    conn = sqlite3.connect("email_analytics.db")
-    cursor = conn.cursor()
-    
-    ip_address = request.environ.get("HTTP_X_FORWARDED_FOR", request.remote_addr)
-    user_agent = request.headers.get("User-Agent", "")
-    
-    cursor.execute("""
-        INSERT INTO tracking_events 
-        (tracking_id, evento_tipo, timestamp, ip_address, user_agent, dados_extras)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (tracking_id, "clique", datetime.now(), ip_address, user_agent, url))
-    
-    cursor.execute("""
-        UPDATE email_campaigns 
-        SET clicou_link = 1,
-            primeiro_clique = COALESCE(primeiro_clique, ?),
-            total_cliques = total_cliques + 1
-        WHERE tracking_id = ?
-    """, (datetime.now(), tracking_id))
-    
-    conn.commit()
-    conn.close()
+    registrar_evento("clique", tracking_id, url)
+    return redirect(url)
+
+@app.route("/click/<tracking_id>")
+def track_click_legado(tracking_id):
+    # Emails enviados antes dos links assinados: só redireciona para URLs registradas
+    url = request.args.get("url", URL_PADRAO)
+    if not links.url_conhecida(url):
+        url = URL_PADRAO
     
+    registrar_evento("clique", tracking_id, url)
     return redirect(url)
 
 @app.route("/unsubscribe/<tracking_id>")
@@ -73,4 +118,5 @@ def unsubscribe(tracking_id):
     return f"<h2>Descadastrado com sucesso!</h2><p>ID: {tracking_id}</p>"
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8080, debug=True)
+    from perfilamento import executar_com_perfil
+    executar_com_perfil("tracking_server", app.run, host="0.0.0.0", port=8080, debug=True)
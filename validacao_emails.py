@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Validação de Emails
+Etapa de validação antes do envio: sintaxe (RFC 5322 simplificada), correção
+de domínios digitados errado (gmial.com → gmail.com), detecção de domínios
+descartáveis e endereços de função (contato@, vendas@...) e consulta de MX.
+
+O MX é consultado por um resolver plugável (dnspython em produção, um stub
+estático em testes), uma vez por domínio distinto e em paralelo, com cache
+persistente em disco com TTL.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# Parte local dot-atom (RFC 5322 sem quoted-string/comentários) e domínio LDH
+_ATOM = r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+"
+REGEX_LOCAL = re.compile(rf"\A{_ATOM}(?:\.{_ATOM})*\Z")
+REGEX_ROTULO = re.compile(r"\A(?!-)[A-Za-z0-9-]{1,63}(?<!-)\Z")
+REGEX_TLD = re.compile(r"\A(?:[A-Za-z]{2,63}|xn--[A-Za-z0-9-]{1,59})\Z")
+
+DOMINIOS_POPULARES = [
+    'gmail.com', 'hotmail.com', 'outlook.com', 'live.com', 'msn.com', 'yahoo.com',
+    'yahoo.com.br', 'icloud.com', 'uol.com.br', 'bol.com.br', 'terra.com.br',
+    'ig.com.br', 'globo.com', 'globomail.com', 'hotmail.com.br', 'outlook.com.br',
+]
+
+# Erros frequentes que a distância de edição sozinha não resolve bem
+CORRECOES_DOMINIO = {
+    'gmail.com.br': 'gmail.com',
+    'gmail.co': 'gmail.com',
+    'gmai.com': 'gmail.com',
+    'gamil.com': 'gmail.com',
+    'gnail.com': 'gmail.com',
+    'hotmail.co': 'hotmail.com',
+    'hotmal.com': 'hotmail.com',
+    'hotamil.com': 'hotmail.com',
+    'outlok.com': 'outlook.com',
+    'yaho.com.br': 'yahoo.com.br',
+    'uol.com': 'uol.com.br',
+    'bol.com': 'bol.com.br',
+}
+
+DOMINIOS_DESCARTAVEIS = {
+    'mailinator.com', 'guerrillamail.com', 'guerrillamail.net', '10minutemail.com',
+    'tempmail.com', 'temp-mail.org', 'yopmail.com', 'trashmail.com', 'sharklasers.com',
+    'getnada.com', 'dispostable.com', 'maildrop.cc', 'throwawaymail.com', 'fakeinbox.com',
+    'mohmal.com', 'emailondeck.com', 'mintemail.com', 'spamgourmet.com',
+}
+
+PREFIXOS_FUNCAO = {
+    'contato', 'contatos', 'comercial', 'vendas', 'financeiro', 'rh', 'sac', 'atendimento',
+    'adm', 'admin', 'administrativo', 'administracao', 'info', 'informacoes', 'suporte',
+    'marketing', 'compras', 'fiscal', 'contabilidade', 'diretoria', 'secretaria',
+    'recepcao', 'ouvidoria', 'juridico', 'cobranca', 'faturamento', 'noreply', 'no-reply',
+    'postmaster', 'abuse', 'webmaster', 'hostmaster', 'contact', 'sales', 'support',
+}
+
+# Endereços que nunca recebem resposta humana: sempre inválidos para campanha
+PREFIXOS_BLOQUEADOS = {'noreply', 'no-reply', 'postmaster', 'abuse', 'mailer-daemon'}
+
+
+def distancia_edicao(a, b, limite=2):
+    """Distância de Damerau-Levenshtein (transposição adjacente); acima do limite retorna limite+1"""
+    if abs(len(a) - len(b)) > limite:
+        return limite + 1
+    anterior2, anterior = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        atual = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            custo = 0 if a[i - 1] == b[j - 1] else 1
+            atual[j] = min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + custo)
+            if (anterior2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                atual[j] = min(atual[j], anterior2[j - 2] + 1)
+        anterior2, anterior = anterior, atual
+    return min(anterior[-1], limite + 1)
+
+
+@lru_cache(maxsize=65536)
+def corrigir_dominio(dominio):
+    """Domínio corrigido se parecer erro de digitação de um provedor popular, senão None"""
+    if dominio in DOMINIOS_POPULARES:
+        return None
+    if dominio in CORRECOES_DOMINIO:
+        return CORRECOES_DOMINIO[dominio]
+    # Só provedores com nome longo: "bg.com.br" não deve virar "ig.com.br"
+    candidatos = [
+        (distancia_edicao(dominio, popular, 1), popular)
+        for popular in DOMINIOS_POPULARES if len(popular.split('.')[0]) >= 5
+    ]
+    distancia, melhor = min(candidatos)
+    return melhor if distancia == 1 else None
+
+
+def validar_sintaxe(email):
+    """(local, dominio) normalizados ou motivo da falha como string"""
+    email = str(email).strip().lower()
+    if len(email) > 254 or email.count('@') != 1:
+        return 'sintaxe'
+    local, dominio = email.rsplit('@', 1)
+    if not local or len(local) > 64 or not REGEX_LOCAL.match(local):
+        return 'sintaxe'
+    try:
+        # Domínios com acento (IDN) viram punycode para validação e DNS
+        dominio = dominio.rstrip('.').encode('idna').decode('ascii')
+    except UnicodeError:
+        return 'sintaxe'
+    rotulos = dominio.split('.')
+    if len(rotulos) < 2 or not all(REGEX_ROTULO.match(r) for r in rotulos) or not REGEX_TLD.match(rotulos[-1]):
+        return 'sintaxe'
+    return local, dominio
+
+
+class ResolverEstatico:
+    """Resolver de teste: {dominio: [mx, ...]}; ausente = domínio sem MX"""
+
+    def __init__(self, mapa=None, atraso=0.0):
+        self.mapa = mapa or {}
+        self.atraso = atraso
+        self.consultas = 0
+        self._lock = threading.Lock()
+
+    def resolver_mx(self, dominio):
+        with self._lock:
+            self.consultas += 1
+        if self.atraso:
+            time.sleep(self.atraso)
+        return list(self.mapa.get(dominio, []))
+
+
+class ResolverDNS:
+    """Resolver real via dnspython; sem MX cai para registro A (MX implícito, RFC 5321)"""
+
+    def __init__(self, timeout=5.0):
+        import dns.resolver
+        self._dns = dns.resolver
+        self.resolver = dns.resolver.Resolver()
+        self.resolver.lifetime = timeout
+
+    def resolver_mx(self, dominio):
+        try:
+            respostas = self.resolver.resolve(dominio, 'MX')
+            return [str(r.exchange).rstrip('.') for r in sorted(respostas, key=lambda r: r.preference)]
+        except (self._dns.NXDOMAIN, self._dns.NoNameservers):
+            return []
+        except self._dns.NoAnswer:
+            try:
+                self.resolver.resolve(dominio, 'A')
+                return [dominio]
+            except Exception:
+                return []
+
+
+class CacheDNS:
+    """Cache persistente em SQLite: dominio → lista de MX, com expiração"""
+
+    def __init__(self, caminho='dns_cache.db', ttl_positivo=7 * 86400, ttl_negativo=86400):
+        self.caminho = caminho
+        self.ttl_positivo = ttl_positivo
+        self.ttl_negativo = ttl_negativo
+        self._lock = threading.Lock()
+        conn = sqlite3.connect(self.caminho)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS mx_cache (
+                dominio TEXT PRIMARY KEY,
+                mx TEXT,
+                expira_em REAL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def obter_varios(self, dominios):
+        """Entradas válidas (não expiradas) para os domínios pedidos"""
+        agora = time.time()
+        encontrados = {}
+        dominios = list(dominios)
+        conn = sqlite3.connect(self.caminho)
+        try:
+            # Lotes abaixo do limite de parâmetros do SQLite
+            for i in range(0, len(dominios), 500):
+                lote = dominios[i:i + 500]
+                marcadores = ','.join('?' * len(lote))
+                for dominio, mx, expira_em in conn.execute(
+                    f"SELECT dominio, mx, expira_em FROM mx_cache WHERE dominio IN ({marcadores})", lote
+                ):
+                    if expira_em > agora:
+                        encontrados[dominio] = json.loads(mx)
+        finally:
+            conn.close()
+        return encontrados
+
+    def gravar_varios(self, resultados):
+        agora = time.time()
+        linhas = [
+            (dominio, json.dumps(mx), agora + (self.ttl_positivo if mx else self.ttl_negativo))
+            for dominio, mx in resultados.items()
+        ]
+        with self._lock:
+            conn = sqlite3.connect(self.caminho)
+            try:
+                conn.executemany("INSERT OR REPLACE INTO mx_cache (dominio, mx, expira_em) VALUES (?, ?, ?)", linhas)
+                conn.commit()
+            finally:
+                conn.close()
+
+
+class ValidadorEmails:
+    """Etapa de validação em lote: sintaxe → correção → descartável/função → MX"""
+
+    def __init__(self, resolver=None, cache=None, max_workers=16, rejeitar_funcao=False):
+        self.resolver = resolver
+        self.cache = cache
+        self.max_workers = max_workers
+        self.rejeitar_funcao = rejeitar_funcao
+
+    @classmethod
+    def padrao(cls, cache_file='dns_cache.db'):
+        """Validador de produção: dnspython se instalado (senão sem etapa de MX)"""
+        try:
+            resolver = ResolverDNS()
+        except ImportError:
+            resolver = None
+        return cls(resolver=resolver, cache=CacheDNS(cache_file) if resolver else None)
+
+    def resolver_dominios(self, dominios):
+        """MX de cada domínio distinto: cache primeiro, o resto em paralelo"""
+        dominios = set(dominios)
+        if self.resolver is None or not dominios:
+            return {}
+
+        resultados = self.cache.obter_varios(dominios) if self.cache else {}
+        faltantes = sorted(dominios - resultados.keys())
+
+        if faltantes:
+            def consultar(dominio):
+                try:
+                    return dominio, self.resolver.resolver_mx(dominio)
+                except Exception:
+                    # Falha temporária (timeout, rede): não grava no cache
+                    return dominio, None
+
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(faltantes))) as pool:
+                novos = dict(pool.map(consultar, faltantes))
+            if self.cache:
+                self.cache.gravar_varios({d: mx for d, mx in novos.items() if mx is not None})
+            resultados.update(novos)
+
+        return resultados
+
+    def validar_lote(self, emails):
+        """
+        Valida uma coleção de emails
+
+        Retorna {email_original: resultado}, onde resultado é um dict com
+        email (normalizado/corrigido), valido, motivo, corrigido_de,
+        descartavel e funcao.
+        """
+        resultados = {}
+        pendentes_mx = {}
+        candidatos_correcao = set()
+
+        for original in set(emails):
+            analise = validar_sintaxe(original)
+            resultado = {
+                'email': None, 'valido': False, 'motivo': None,
+                'corrigido_de': None, 'descartavel': False, 'funcao': False
+            }
+            resultados[original] = resultado
+
+            if isinstance(analise, str):
+                resultado['motivo'] = analise
+                continue
+
+            local, dominio = analise
+            correcao = corrigir_dominio(dominio)
+            if correcao:
+                resultado['corrigido_de'] = dominio
+                dominio = correcao
+                candidatos_correcao.add(resultado['corrigido_de'])
+
+            resultado['email'] = f"{local}@{dominio}"
+            base_local = local.split('+', 1)[0]
+            resultado['funcao'] = base_local in PREFIXOS_FUNCAO
+
+            if dominio in DOMINIOS_DESCARTAVEIS:
+                resultado['descartavel'] = True
+                resultado['motivo'] = 'descartavel'
+            elif base_local in PREFIXOS_BLOQUEADOS or (self.rejeitar_funcao and resultado['funcao']):
+                resultado['motivo'] = 'funcao'
+            else:
+                resultado['valido'] = True
+                pendentes_mx.setdefault(dominio, []).append(resultado)
+
+        mx = self.resolver_dominios(set(pendentes_mx) | candidatos_correcao)
+
+        # Domínio "com erro de digitação" que tem MX próprio é real: desfaz a correção
+        for lista in pendentes_mx.values():
+            for resultado in lista:
+                original = resultado['corrigido_de']
+                if original and mx.get(original):
+                    resultado['email'] = f"{resultado['email'].rsplit('@', 1)[0]}@{original}"
+                    resultado['corrigido_de'] = None
+
+        for dominio, lista in pendentes_mx.items():
+            if dominio in mx and mx[dominio] is not None and not mx[dominio]:
+                for resultado in lista:
+                    if not resultado['email'].endswith('@' + dominio):
+                        # Correção desfeita acima: vale o MX do domínio original
+                        continue
+                    resultado['valido'] = False
+                    resultado['motivo'] = 'sem_mx'
+
+        return resultados
+
+    def resumo(self, resultados):
+        """Contagem por motivo, para log"""
+        contagem = {'validos': 0, 'corrigidos': 0, 'funcao': 0}
+        for resultado in resultados.values():
+            if resultado['valido']:
+                contagem['validos'] += 1
+            else:
+                contagem[resultado['motivo']] = contagem.get(resultado['motivo'], 0) + 1
+            contagem['corrigidos'] += bool(resultado['corrigido_de'])
+            contagem['funcao'] += resultado['funcao']
+        return contagem
+
+
+def carregar_descartaveis(caminho=None):
+    """Amplia a lista de domínios descartáveis com um arquivo (um domínio por linha)"""
+    caminho = caminho or os.getenv('DISPOSABLE_DOMAINS_FILE')
+    if caminho and os.path.exists(caminho):
+        with open(caminho, 'r', encoding='utf-8') as f:
+            linhas = (l.strip().lower() for l in f)
+            DOMINIOS_DESCARTAVEIS.update(l for l in linhas if l and not l.startswith('#'))